@@ -5,11 +5,14 @@
 import multiprocessing
 import os
 import psutil
-os.environ['OMP_NUM_THREADS'] = str(multiprocessing.cpu_count())
-os.environ['MKL_NUM_THREADS'] = str(multiprocessing.cpu_count())
-os.environ['OPENBLAS_NUM_THREADS'] = str(multiprocessing.cpu_count())
-os.environ['VECLIB_MAXIMUM_THREADS'] = str(multiprocessing.cpu_count())
-os.environ['NUMEXPR_NUM_THREADS'] = str(multiprocessing.cpu_count())
+# All CPUs for the GUI process, one thread in the worker processes (this module is imported again when they spawn)
+# as the Fit All Sheets and import pools already run one worker per CPU
+threads = str(multiprocessing.cpu_count()) if multiprocessing.parent_process() is None else '1'
+os.environ['OMP_NUM_THREADS'] = threads
+os.environ['MKL_NUM_THREADS'] = threads
+os.environ['OPENBLAS_NUM_THREADS'] = threads
+os.environ['VECLIB_MAXIMUM_THREADS'] = threads
+os.environ['NUMEXPR_NUM_THREADS'] = threads
 
 
 import matplotlib
@@ -125,7 +128,8 @@ class MyFrame(wx.Frame):
         # Variables for Undo & Redo
         self.history = []
         self.redo_stack = []
-        self.max_history = 30
+        # Memory the undo history may use, the oldest states are dropped beyond it
+        self.undo_memory_budget = 256 * 1024 ** 2
 
         # New attribute to track plot state for showing fit or not
         self.show_fit = True
@@ -168,6 +172,22 @@ class MyFrame(wx.Frame):
 
         # Initial max iteration value
         self.max_iterations = 50
+        # Worker processes used by Fit All Sheets, None for one per CPU
+        self.fit_workers = None
+        # Model evaluation used by the fits: "lmfit" CompositeModel or "vectorized" per-profile broadcast
+        self.fit_engine = "lmfit"
+        # Analytic Jacobian for the models that have one, finite differences when off
+        self.analytic_jacobian = True
+        # Half width in FWHM of the sparse Jacobian window used by least_squares, None for a dense Jacobian
+        self.sparse_jacobian_width = None
+        # Refit a sheet before saving it when its peaks changed since the curves were last computed
+        self.refit_before_save = False
+        # Digest of each sheet as last written to the Excel file, Save All only rewrites the sheets that changed
+        self.excel_saved_signatures = {}
+        # Deflate the spectra in the project file, smaller but read into memory instead of memory mapped on open
+        self.compress_project = False
+        # Write the Excel file of an import in the background, otherwise only when first saving to Excel
+        self.import_excel_export = True
         # Initial fitting method
         self.selected_fitting_method = "GL (Area)"
 
@@ -2936,23 +2956,26 @@ class MyFrame(wx.Frame):
         grid_fitting_method = self.peak_params_grid.GetCellValue(row, 13)  # Column 13 contains fitting method
         sheet_name = self.sheet_combobox.GetValue()
 
-        # Skip fit_peaks for D-parameter model
-        if grid_fitting_method != "D-parameter":
-            if hasattr(self, 'peak_params_grid') and self.peak_params_grid.GetNumberRows() > 0:
-                from Functions import fit_peaks
-                fit_result = fit_peaks(self, self.peak_params_grid)
+        # No fitted curves for D-parameter model
+        if grid_fitting_method == "D-parameter":
+            return data
 
-                if fit_result:
-                    if hasattr(self, 'ax'):
-                        for line in self.ax.lines:
-                            if line.get_label() == 'Overall Fit':
-                                data['calculated_fit'] = line.get_ydata()
-                            elif line.get_label() == 'Residuals':
-                                data['residuals'] = line.get_ydata()
+        # Curves kept by the last redraw, only recomputed if the peaks changed since
+        from libraries.Excel_Save import get_fit_curves
+        curves = get_fit_curves(self, sheet_name)
+        if curves is None:
+            if self.refit_before_save:
+                from Functions import fit_peaks
+                fit_peaks(self, self.peak_params_grid)
+            else:
+                # Curves of the peaks as they are in the grid, without fitting them again
+                self.plot_manager.update_overall_fit_and_residuals(self)
+            curves = get_fit_curves(self, sheet_name)
 
-                        for collection in self.ax.collections:
-                            if collection.get_label().startswith(sheet_name):
-                                data['individual_peak_fits'].append(collection.get_paths()[0].vertices[:, 1])
+        if curves is not None:
+            data['calculated_fit'] = curves['Envelope']
+            data['residuals'] = curves['Residuals']
+            data['individual_peak_fits'] = curves['Peaks']
 
         return data
 
@@ -3013,6 +3036,14 @@ class MyFrame(wx.Frame):
                 self.library_type = config.get('library_type', 'TPP-2M')
                 self.use_angular_correction = config.get('use_angular_correction', False)
                 self.analysis_angle = config.get('analysis_angle', 54.7)
+                self.fit_workers = config.get('fit_workers', None)
+                self.fit_engine = config.get('fit_engine', 'lmfit')
+                self.analytic_jacobian = config.get('analytic_jacobian', True)
+                self.sparse_jacobian_width = config.get('sparse_jacobian_width', None)
+                self.refit_before_save = config.get('refit_before_save', False)
+                self.compress_project = config.get('compress_project', False)
+                self.undo_memory_budget = config.get('undo_memory_mb', 256) * 1024 ** 2
+                self.import_excel_export = config.get('import_excel_export', True)
 
         else:
             config = {}
@@ -3064,6 +3095,16 @@ class MyFrame(wx.Frame):
             'use_angular_correction': self.use_angular_correction,
             'analysis_angle': self.analysis_angle,
 
+            # Fitting settings
+            'fit_workers': self.fit_workers,
+            'fit_engine': self.fit_engine,
+            'analytic_jacobian': self.analytic_jacobian,
+            'sparse_jacobian_width': self.sparse_jacobian_width,
+            'refit_before_save': self.refit_before_save,
+            'compress_project': self.compress_project,
+            'undo_memory_mb': self.undo_memory_budget // 1024 ** 2,
+            'import_excel_export': self.import_excel_export,
+
             # Excel file settings
             'excel_width': self.excel_width,
             'excel_height': self.excel_height,
@@ -3171,7 +3212,7 @@ class MyFrame(wx.Frame):
         # Update all sheets
         for sheet_name, sheet_data in self.Data['Core levels'].items():
             # Update B.E. values
-            sheet_data['B.E.'] = [be + delta_correction for be in sheet_data['B.E.']]
+            sheet_data['B.E.'] = np.asarray(sheet_data['B.E.'], dtype=float) + delta_correction
 
             # Update Background Low and High if they exist and are not empty strings
             if 'Background' in sheet_data:
@@ -0,0 +1,96 @@
+# benchmarks/bench_avg.py
+
+# Time of parse_avg_file against the regex parser it replaced, which read the whole .avg file and ran its regexes
+# over the full text, on files from a 2000 point spectrum to a 2M value map. Both parsers must give the same values,
+# the last column checks it.
+#
+#     python benchmarks/bench_avg.py [--repeat 5]
+
+import argparse
+import os
+import re
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from libraries.Spectra_Readers import parse_avg_file
+
+# Number of LIST@ values of each file, and values per LIST@ line as Avantage writes them
+SIZES = (2000, 20000, 500000, 2000000)
+VALUES_PER_LINE = 4
+
+
+def regex_parse_avg_file(file_path):
+    """The parser before parse_avg_file streamed the file, as it was."""
+    with open(file_path, 'r') as file:
+        content = file.read()
+
+    photon_energy = float(re.search(r'DS_SOPROPID_ENERGY\s+:\s+VT_R4\s+=\s+(\d+\.\d+)', content).group(1))
+    start_energy, width, num_points = map(float, re.search(r'\$SPACEAXES=1\s+0=\s+(\d+\.\d+),\s+(\d+\.\d+),\s+(\d+),',
+                                                           content).groups())
+
+    # Modified part to handle multiple numbers per line
+    y_values = []
+    for match in re.findall(r'LIST@\s+\d+=\s+([\d., ]+)', content):
+        values = [float(val.strip()) for val in match.split(',')]
+        y_values.extend(values)
+
+    return photon_energy, start_energy, width, int(num_points), y_values
+
+
+def write_avg_file(file_path, num_values, num_points=2000, seed=0):
+    """An .avg file with the header lines both parsers look for and num_values LIST@ values."""
+    rng = np.random.default_rng(seed)
+    values = np.round(rng.uniform(1000, 50000, num_values), 6)
+    with open(file_path, 'w') as f:
+        f.write("$PROTOCOL=Avantage Data File\n")
+        f.write("DS_EXT_SUPROPID_CREATED        : VT_DATE   = 17/10/2026 10:30:00\n")
+        f.write("DS_SOPROPID_ENERGY             : VT_R4     = 1486.680054\n")
+        f.write("DS_SOPROPID_SCANS              : VT_I4     = 10\n")
+        f.write("$SPACEAXES=1\n")
+        f.write(f"0=   1196.000000, 0.050000, {num_points}, Energy, eV, eV, Kinetic Energy, Energy, ENERGY\n")
+        f.write("$DATA=*\n")
+        for i in range(0, num_values, VALUES_PER_LINE):
+            line = ', '.join(f"{value:.6f}" for value in values[i:i + VALUES_PER_LINE])
+            f.write(f"LIST@ {i:>7}=   {line}\n")
+    return values
+
+
+def best_time(function, repeat):
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--repeat', type=int, default=5, help="Runs of each parser, the best one is shown")
+    args = parser.parse_args()
+
+    print(f"{'values':>8} {'file (MB)':>10} {'regex (ms)':>11} {'streamed (ms)':>14} {'speed up':>9} {'same':>5}")
+    with tempfile.TemporaryDirectory() as directory:
+        for num_values in SIZES:
+            file_path = os.path.join(directory, f'bench_{num_values}.avg')
+            values = write_avg_file(file_path, num_values)
+            results = {}
+            old = best_time(lambda: results.__setitem__('regex', regex_parse_avg_file(file_path)), args.repeat)
+            new = best_time(lambda: results.__setitem__('streamed', parse_avg_file(file_path)), args.repeat)
+
+            regex_result, streamed_result = results['regex'], results['streamed']
+            same = regex_result[:4] == streamed_result[:4] and \
+                np.array_equal(np.array(regex_result[4]), streamed_result[4]) and \
+                np.array_equal(streamed_result[4], values)
+            size = os.path.getsize(file_path) / 1024 ** 2
+            print(f"{num_values:>8} {size:>10.1f} {old * 1000:>11.1f} {new * 1000:>14.1f} {old / new:>8.1f}x "
+                  f"{str(same):>5}")
+
+
+if __name__ == '__main__':
+    main()
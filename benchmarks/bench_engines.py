@@ -0,0 +1,76 @@
+# benchmarks/bench_engines.py
+
+# Time of one model evaluation and of a whole fit, lmfit CompositeModel against the vectorized engine, as the
+# number of peaks grows. Both engines end on the same fit, the last column checks it.
+#
+#     python benchmarks/bench_engines.py [--fits]
+
+import argparse
+import copy
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from libraries.Fitting_Engine import build_model, fit, fit_mask
+from libraries.Vectorized_Model import VectorizedPeakModel
+from tests.test_fitting_engines import synthetic_problem
+
+PEAK_COUNTS = (5, 10, 20, 40)
+EVAL_MODELS = ("GL (Area)", "Pseudo-Voigt (Area)", "Voigt (Area, σ, γ)", "LA (Area, σ, γ)")
+FIT_MODELS = ("GL (Area)", "LA (Area, σ, γ)")
+FIT_PEAK_COUNTS = (5, 10, 20)
+
+
+def best_time(function, repeat=5):
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+
+def bench_eval():
+    print(f"{'model':<22} {'peaks':>5} {'composite (ms)':>15} {'vectorized (ms)':>16} {'speed up':>9}")
+    for model in EVAL_MODELS:
+        for n_peaks in PEAK_COUNTS:
+            problem = synthetic_problem([model] * n_peaks)
+            composite, params = build_model(problem)
+            x = problem.x[fit_mask(problem)]
+            vectorized = VectorizedPeakModel(problem.peaks, x)
+            old = best_time(lambda: composite.eval(params, x=x))
+            new = best_time(lambda: vectorized.eval(params))
+            print(f"{model:<22} {n_peaks:>5} {old * 1000:>15.2f} {new * 1000:>16.2f} {old / new:>8.1f}x")
+
+
+def bench_fit():
+    print(f"{'model':<22} {'peaks':>5} {'lmfit (ms)':>11} {'vectorized (ms)':>16} {'speed up':>9} {'same fit':>9}")
+    for model in FIT_MODELS:
+        for n_peaks in FIT_PEAK_COUNTS:
+            problem = synthetic_problem([model] * n_peaks)
+            vectorized_problem = copy.deepcopy(problem)
+            vectorized_problem.engine = 'vectorized'
+            results = {}
+            old = best_time(lambda: results.__setitem__('lmfit', fit(copy.deepcopy(problem))), repeat=1)
+            new = best_time(lambda: results.__setitem__('vectorized', fit(copy.deepcopy(vectorized_problem))),
+                            repeat=1)
+            same = results['lmfit'].params == results['vectorized'].params
+            print(f"{model:<22} {n_peaks:>5} {old * 1000:>11.0f} {new * 1000:>16.0f} {old / new:>8.1f}x "
+                  f"{str(same):>9}")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--fits', action='store_true', help="Also time whole fits (tens of seconds)")
+    args = parser.parse_args()
+
+    bench_eval()
+    if args.fits:
+        print()
+        bench_fit()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,67 @@
+# benchmarks/bench_laxg.py
+
+# Time of one LA*G peak evaluation, the FFT convolution against the scipy.signal.convolve one it replaced, for
+# N = 100 to 10 000 data points (the convolution grid has 4N points). The last column is the largest difference
+# between the two curves relative to the peak height.
+#
+#     python benchmarks/bench_laxg.py
+
+import os
+import sys
+import time
+
+import numpy as np
+from scipy.signal import convolve
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from libraries.Peak_Functions import PeakFunctions
+
+SIZES = (100, 300, 1000, 3000, 10000)
+SHAPE = dict(center=285.0, amplitude=1000.0, fwhm=1.2, sigma=1.2, gamma=1.5, fwhm_g=0.64)
+
+
+def convolve_laxg(x, center, amplitude, fwhm, sigma, gamma, fwhm_g):
+    # PeakFunctions.LAxG before the FFT, as it was
+    F = 2 * fwhm / (np.sqrt(2 ** (1 / sigma) - 1) + np.sqrt(2 ** (1 / gamma) - 1))
+
+    def LA_N(x):
+        return np.where(x <= 0, 1 / (1 + 4 * (x / F) ** 2) ** gamma, 1 / (1 + 4 * (x / F) ** 2) ** sigma)
+
+    def gaussian(x, fwhm_g):
+        return np.exp(-4 * np.log(2) * (x / fwhm_g) ** 2)
+
+    x_range = max(x.max() - x.min(), 4 * fwhm)
+    x_high_res = np.linspace(- x_range / 2, + x_range / 2, len(x) * 4)
+    la = LA_N(x_high_res)
+    gauss = gaussian(x_high_res, fwhm_g)
+    convolved = convolve(la, gauss, mode='same') / sum(gauss)
+    peak_shape = np.interp(x - center, x_high_res, convolved)
+    sort_idx = np.argsort(x)
+    unit_area = abs(np.trapz(peak_shape[sort_idx], x[sort_idx]))
+    height = amplitude / unit_area if unit_area != 0 else 0
+    return height * peak_shape
+
+
+def best_time(function, repeat=5):
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+
+def main():
+    print(f"{'N':>6} {'convolve (ms)':>14} {'FFT (ms)':>9} {'speed up':>9} {'max diff / height':>18}")
+    for n in SIZES:
+        x = np.linspace(300, 270, n)
+        old = best_time(lambda: convolve_laxg(x, **SHAPE))
+        new = best_time(lambda: PeakFunctions.LAxG(x, **SHAPE))
+        expected = convolve_laxg(x, **SHAPE)
+        difference = np.max(np.abs(PeakFunctions.LAxG(x, **SHAPE) - expected)) / expected.max()
+        print(f"{n:>6} {old * 1000:>14.2f} {new * 1000:>9.2f} {old / new:>8.1f}x {difference:>18.1e}")
+
+
+if __name__ == '__main__':
+    main()
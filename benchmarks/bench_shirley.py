@@ -0,0 +1,47 @@
+# benchmarks/bench_shirley.py
+
+# Time of calculate_shirley_background against the point by point loop it replaced, for N = 200 to 20 000
+# points. The loop is O(N^2) per iteration, it is only timed up to --reference-max points (minutes past that).
+#
+#     python benchmarks/bench_shirley.py [--reference-max 5000]
+
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from libraries.Peak_Functions import BackgroundCalculations
+from tests.test_shirley_background import core_level, reference_shirley
+
+SIZES = (200, 500, 1000, 2000, 5000, 10000, 20000)
+
+
+def best_time(function, repeat=3):
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--reference-max', type=int, default=2000, help="Largest N the O(N^2) loop is timed for")
+    args = parser.parse_args()
+
+    print(f"{'N':>7} {'cumulative (ms)':>16} {'point by point (ms)':>20} {'speed up':>9}")
+    for n in SIZES:
+        x, y = core_level(n)
+        new = best_time(lambda: BackgroundCalculations.calculate_shirley_background(x, y, 0, 0))
+        if n <= args.reference_max:
+            old = best_time(lambda: reference_shirley(x, y, 0, 0), repeat=1)
+            print(f"{n:>7} {new * 1000:>16.2f} {old * 1000:>20.1f} {old / new:>8.0f}x")
+        else:
+            print(f"{n:>7} {new * 1000:>16.2f} {'-':>20} {'-':>9}")
+
+
+if __name__ == '__main__':
+    main()
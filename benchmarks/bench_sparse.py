@@ -0,0 +1,56 @@
+# benchmarks/bench_sparse.py
+
+# Time of a whole least_squares fit of separated peaks, dense Jacobian against the sparse pattern of
+# jacobian_sparsity, as the number of peaks and of points grow together. GL has analytic derivatives
+# (VectorizedPeakModel.sparse_jacobian), LA goes through grouped finite differences. Dense fits of many peaks
+# take minutes, they stop at --dense-max peaks.
+#
+#     python benchmarks/bench_sparse.py [--dense-max 20]
+
+import argparse
+import copy
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from libraries.Fitting_Engine import fit
+from tests.test_sparse_jacobian import separated_problem
+
+MODELS = ("GL (Area)", "LA (Area, σ, γ)")
+PEAK_COUNTS = (5, 10, 20, 40, 80)
+
+
+def timed_fit(problem):
+    start = time.perf_counter()
+    result = fit(copy.deepcopy(problem))
+    return time.perf_counter() - start, result
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--dense-max', type=int, default=20, help="Largest peak count also fitted dense")
+    args = parser.parse_args()
+
+    print(f"{'model':<18} {'peaks':>5} {'points':>6} {'dense (s)':>10} {'sparse (s)':>11} "
+          f"{'sparse ms/peak':>15} {'same R2':>8}")
+    for model in MODELS:
+        for n_peaks in PEAK_COUNTS:
+            problem = separated_problem(model, n_peaks)
+            sparse_time, sparse_result = timed_fit(problem)
+
+            dense_column, same = '-', '-'
+            if n_peaks <= args.dense_max:
+                dense_problem = copy.deepcopy(problem)
+                dense_problem.sparse_jacobian_width = None
+                dense_time, dense_result = timed_fit(dense_problem)
+                dense_column = f'{dense_time:.2f}'
+                same = str(abs(sparse_result.r_squared - dense_result.r_squared) < 1e-8)
+
+            print(f"{model:<18} {n_peaks:>5} {len(problem.x):>6} {dense_column:>10} {sparse_time:>11.2f} "
+                  f"{sparse_time / n_peaks * 1000:>15.1f} {same:>8}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,52 @@
+# benchmarks/bench_tougaard.py
+
+# Time of the FFT triple Tougaard background against the point by point sum it replaced, for N = 200 to 20 000
+# points. The sum is O(N^2), it is only timed up to --reference-max points.
+#
+#     python benchmarks/bench_tougaard.py [--reference-max 5000]
+
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from libraries.Peak_Functions import BackgroundCalculations
+from tests.test_tougaard_background import COMPONENTS, loss_spectrum, reference_multi_tougaard
+
+SIZES = (200, 500, 1000, 2000, 5000, 10000, 20000)
+
+
+def best_time(function, repeat=3):
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--reference-max', type=int, default=5000, help="Largest N the O(N^2) sum is timed for")
+    args = parser.parse_args()
+
+    print(f"{'N':>7} {'FFT (ms)':>9} {'point by point (ms)':>20} {'speed up':>9} {'max rel. diff':>14}")
+    for n in SIZES:
+        x, y = loss_spectrum(n)
+        new = best_time(lambda: BackgroundCalculations.calculate_multi_tougaard_background(x, y, COMPONENTS))
+        if n <= args.reference_max:
+            old = best_time(lambda: reference_multi_tougaard(x, y, COMPONENTS), repeat=1)
+            expected = reference_multi_tougaard(x, y, COMPONENTS)
+            result = BackgroundCalculations.calculate_multi_tougaard_background(x, y, COMPONENTS)
+            difference = np.max(np.abs(result - expected) / np.abs(expected))
+            print(f"{n:>7} {new * 1000:>9.2f} {old * 1000:>20.1f} {old / new:>8.0f}x {difference:>14.1e}")
+        else:
+            print(f"{n:>7} {new * 1000:>9.2f} {'-':>20} {'-':>9} {'-':>14}")
+
+
+if __name__ == '__main__':
+    main()
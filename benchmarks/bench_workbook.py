@@ -0,0 +1,84 @@
+# benchmarks/bench_workbook.py
+
+# Time of opening a KherveFitting .xlsx: read_workbook_core_levels, one read-only pass over the workbook, against
+# pd.ExcelFile for the sheet names and one pd.read_excel per core level sheet as before. The sheets have the 14
+# columns of a fitted sheet (data, fit and peak table). The last column checks both give the same arrays.
+#
+#     python benchmarks/bench_workbook.py [--repeat 3]
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+import openpyxl
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from libraries.ConfigFile import core_level_sheet_names, read_workbook_core_levels
+
+# (core level sheets, rows per sheet)
+SIZES = ((5, 1001), (20, 1001), (40, 1001), (10, 5001))
+COLUMNS = 14
+
+
+def write_workbook(file_path, num_sheets, num_rows, seed=0):
+    rng = np.random.default_rng(seed)
+    wb = openpyxl.Workbook()
+    wb.remove(wb.active)
+    for i in range(num_sheets):
+        ws = wb.create_sheet(f'Core {i}')
+        ws.append(['BE', 'Raw Data'] + [f'Column {col}' for col in range(3, COLUMNS + 1)])
+        x = np.linspace(300, 270, num_rows)
+        values = rng.uniform(100, 5000, (num_rows, COLUMNS - 2))
+        for be, row in zip(x, values):
+            ws.append([float(be), *map(float, row)])
+    wb.create_sheet('Results Table')
+    wb.save(file_path)
+
+
+def pandas_read(file_path):
+    """Sheet names and columns A and B as open_xlsx_file and add_core_level_Data read them before."""
+    sheet_names = core_level_sheet_names(pd.ExcelFile(file_path).sheet_names)
+    columns = {}
+    for sheet_name in sheet_names:
+        df = pd.read_excel(file_path, sheet_name=sheet_name)
+        columns[sheet_name] = df.iloc[:, 0].to_numpy(dtype=float), df.iloc[:, 1].to_numpy(dtype=float)
+    return columns
+
+
+def best_time(function, repeat):
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--repeat', type=int, default=3, help="Runs of each reader, the best one is shown")
+    args = parser.parse_args()
+
+    print(f"{'sheets':>7} {'rows':>6} {'pandas (s)':>11} {'openpyxl (s)':>13} {'speed up':>9} {'same':>5}")
+    with tempfile.TemporaryDirectory() as directory:
+        for num_sheets, num_rows in SIZES:
+            file_path = os.path.join(directory, f'bench_{num_sheets}_{num_rows}.xlsx')
+            write_workbook(file_path, num_sheets, num_rows)
+            results = {}
+            old = best_time(lambda: results.__setitem__('pandas', pandas_read(file_path)), args.repeat)
+            new = best_time(lambda: results.__setitem__('openpyxl', read_workbook_core_levels(file_path)[2]),
+                            args.repeat)
+
+            expected, columns = results['pandas'], results['openpyxl']
+            same = expected.keys() == columns.keys() and all(
+                np.array_equal(a, b) for name in expected for a, b in zip(expected[name], columns[name]))
+            print(f"{num_sheets:>7} {num_rows:>6} {old:>11.2f} {new:>13.2f} {old / new:>8.1f}x {str(same):>5}")
+
+
+if __name__ == '__main__':
+    main()
@@ -91,7 +91,7 @@ class BackgroundWindow(wx.Frame):
                 background = background[:min_length]
 
                 # Save background data
-                self.parent.Data['Core levels'][sheet_name]['Background']['Bkg Y'] = background.tolist()
+                self.parent.Data['Core levels'][sheet_name]['Background']['Bkg Y'] = background
 
                 # Calculate the area
                 area = round(abs(np.trapz(y_values - background, x_values)), 2)
@@ -1,7 +1,10 @@
 
 # CONFIG FILE FOR XPS DATA ------------------------------------
 # -------------------------------------------------------------
+import numpy as np
+import openpyxl
 import pandas as pd
+from libraries.Spectrum_Store import SpectrumStore
 
 def Init_Measurement_Data2(window):
     Data = {
@@ -88,41 +91,111 @@ def Init_Measurement_Data(window):
 
 
 
-def add_core_level_Data(data, window, file_path, sheet_name):
+def core_level_sheet_names(all_sheet_names):
+    """Names of the core level sheets of a workbook, the sheets before the Results Table."""
+    sheet_names = [name for name in all_sheet_names if
+                   name.lower() not in ["results table", "experimental description"]]
+
+    results_table_index = -1
+    for i, name in enumerate(all_sheet_names):
+        if name.lower() == "results table":
+            results_table_index = i
+            break
+
+    if results_table_index != -1:
+        sheet_names = sheet_names[:results_table_index]
+    return sheet_names
+
+
+def _read_xy_columns(worksheet):
+    # Columns A and B below the header row, the same rows pd.read_excel returns
+    if worksheet.max_column is not None and worksheet.max_column < 2:
+        return None
+    # pandas drops the trailing rows that are empty in every column, a row with a value past column B only (the
+    # peak table) is kept with NaN in A and B
+    rows = []
+    last_row = 0
+    for row in worksheet.iter_rows(min_row=2, values_only=True):
+        rows.append((row + (None, None))[:2])
+        if any(value is not None for value in row):
+            last_row = len(rows)
+    del rows[last_row:]
+    try:
+        xy = np.array([[np.nan if value is None else value for value in row] for row in rows], dtype=float)
+    except (TypeError, ValueError):
+        # Text in the data columns, let pandas deal with it
+        return None
+    xy = xy.reshape(-1, 2)
+    return xy[:, 0], xy[:, 1]
+
+
+def read_workbook_core_levels(file_path, read_columns=True):
+    """
+    Read the sheet names and the BE and intensity columns of every core level sheet in a single pass over the
+    workbook, in openpyxl read-only mode, instead of parsing the whole file again for each sheet.
+
+    Args:
+        file_path (str): Path of the .xlsx file
+        read_columns (bool): Also read columns A and B of the core level sheets, not needed when the data comes
+            from the .json file
+
+    Returns:
+        tuple: (all_sheet_names, sheet_names, columns) with columns a dict of sheet name to (x, y) NumPy arrays,
+            or None for a sheet that has to be read by pandas (less than two columns, text in the data)
+    """
+    workbook = openpyxl.load_workbook(file_path, read_only=True, data_only=True)
+    try:
+        all_sheet_names = workbook.sheetnames
+        sheet_names = core_level_sheet_names(all_sheet_names)
+        columns = {}
+        if read_columns:
+            for sheet_name in sheet_names:
+                columns[sheet_name] = _read_xy_columns(workbook[sheet_name])
+    finally:
+        workbook.close()
+    return all_sheet_names, sheet_names, columns
+
+
+def add_core_level_Data(data, window, file_path, sheet_name, columns=None):
     """
     Extracts X and Y data from the given Excel file and adds it to the core level in the data dictionary.
     The sheet_name corresponds to the core level label.
     Uses the window.skip_rows_spinbox value to determine how many rows to skip.
+    columns is the (x, y) pair already read by read_workbook_core_levels, the sheet is only read here without it.
     """
     # Get the number of rows to skip from the spinbox
     # skip_rows = window.skip_rows_spinbox.GetValue()
     skip_rows = 0
 
-    # Read the specified sheet from the Excel file, skipping the specified number of rows
-    df = pd.read_excel(file_path, sheet_name=sheet_name, skiprows=skip_rows)
+    if columns is not None:
+        x_values, y_values = columns
+    else:
+        # Read the specified sheet from the Excel file, skipping the specified number of rows
+        df = pd.read_excel(file_path, sheet_name=sheet_name, skiprows=skip_rows)
 
-    # Ensure we have at least two columns
-    if df.shape[1] < 2:
-        raise ValueError(f"Sheet '{sheet_name}' does not have enough columns after skipping {skip_rows} rows.")
+        # Ensure we have at least two columns
+        if df.shape[1] < 2:
+            raise ValueError(f"Sheet '{sheet_name}' does not have enough columns after skipping {skip_rows} rows.")
 
-    x_values = df.iloc[:, 0].tolist()
-    y_values = df.iloc[:, 1].tolist()
+        x_values = df.iloc[:, 0].to_numpy()
+        y_values = df.iloc[:, 1].to_numpy()
 
-    core_level = {
+    # Spectra are stored as read only float64 arrays, the background starts as the same arrays as the data
+    core_level = SpectrumStore({
         'Name': sheet_name,
-        'B.E.': df.iloc[:, 0].tolist(),
-        'Raw Data': df.iloc[:, 1].tolist(),
+        'B.E.': x_values,
+        'Raw Data': y_values,
         'Background': {
             'Bkg Type': '',
             'Bkg Low': '',
             'Bkg High': '',
             'Bkg Offset Low': '',
             'Bkg Offset High': '',
-            'Bkg X': df.iloc[:, 0].tolist(),
-            'Bkg Y': df.iloc[:, 1].tolist()
         },
         'Fitting': {}
-    }
+    })
+    core_level['Background']['Bkg X'] = core_level['B.E.']
+    core_level['Background']['Bkg Y'] = core_level['Raw Data']
 
     data['Core levels'][sheet_name] = core_level
     data['Number of Core levels'] += 1
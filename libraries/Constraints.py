@@ -0,0 +1,138 @@
+# libraries/Constraints.py
+
+# Peak constraints (Fixed, 1:10, 0.5,2, A+1.5, A*0.5#0.01, ...) parsed once per distinct cell. compile_constraint()
+# turns one constraint cell into a CompiledConstraint and is lru_cached on the cell text, so a fit only does dict
+# lookups and arithmetic instead of regex matching for every bound. constraint_bounds() evaluates a compiled
+# constraint against the start values of the peaks of the sheet. Relative constraints are bounds around the start
+# value of the referenced peak, never lmfit expr ties, so they cannot loop: B = A+1 with A = B-1 is valid.
+
+import re
+from collections import namedtuple
+from functools import lru_cache
+
+
+# Peaks A to P can be referenced. parse_constraints accepted A-P but evaluate_constraint only resolved A-J, so a
+# reference to peaks K to P used to pin the parameter to its start value
+# Pattern to match A+1.5#0.5 format
+_DELTA_PATTERN = re.compile(r'^([A-P])([+\-*/])(\d+\.?\d*)#([\d\.]+)$')
+# Pattern for A+2 or A*2 or A/2 or A-2 format
+_SIMPLE_PATTERN = re.compile(r'^([A-P])([+\-*/])(\d+\.?\d*)$')
+
+# kind is one of:
+#   'fixed'    current_value -/+ low, not varied
+#   'range'    absolute low, high
+#   'around'   current_value -/+ 0.1 (constraint could not be parsed)
+#   'relative' value of peak ref combined with low and high through op
+CompiledConstraint = namedtuple('CompiledConstraint', ['kind', 'low', 'high', 'vary', 'ref', 'op'])
+
+# Reference attribute of PeakSpec for each parameter name used by build_model
+_REFERENCE_ATTRIBUTES = {
+    'center': 'position',
+    'height': 'height',
+    'fwhm': 'fwhm',
+    'lg_ratio': 'lg_ratio',
+    'area': 'area',
+    'sigma': 'sigma',
+    'gamma': 'gamma',
+    'fwhm_g': 'fwhm_g',
+}
+
+
+@lru_cache(maxsize=1024)
+def compile_constraint(constraint_str, param_name):
+    """
+    Parse one constraint cell into a CompiledConstraint.
+
+    Args:
+        constraint_str (str): Content of the constraint cell
+        param_name (str): Parameter the constraint applies to, sets the width of Fixed and A*x constraints
+
+    Returns:
+        CompiledConstraint: Parsed constraint, evaluated later by ConstraintGraph.bounds
+    """
+    constraint_str = str(constraint_str or '').strip()
+    small_error = 0.05
+
+    if constraint_str in ['Fixed']:
+        small_error3 = 0.001
+        if param_name in ["L/G", "fraction"]:
+            return CompiledConstraint('fixed', 0.5, 0.5, False, None, None)
+        return CompiledConstraint('fixed', small_error3, small_error3, False, None, None)
+
+    match = _DELTA_PATTERN.match(constraint_str)
+    if match:
+        ref_peak, operator, value, delta = match.groups()
+        value = float(value)
+        delta = float(delta)
+        return CompiledConstraint('relative', value - delta, value + delta, True, ref_peak, operator)
+
+    match = _SIMPLE_PATTERN.match(constraint_str)
+    if match:
+        ref_peak, operator, value = match.groups()
+        value = float(value)
+        if operator in ['+', '-']:
+            error = small_error
+        elif param_name == 'fwhm_g':
+            error = 0.01
+        else:
+            error = 0.0001
+        return CompiledConstraint('relative', value - error, value + error, True, ref_peak, operator)
+
+    # If it's a simple number or range
+    if ',' in constraint_str:
+        min_val, max_val = map(float, constraint_str.split(','))
+        return CompiledConstraint('range', min_val, max_val, True, None, None)
+    if ':' in constraint_str:
+        min_val, max_val = map(float, constraint_str.split(':'))
+        return CompiledConstraint('range', min_val, max_val, True, None, None)
+
+    try:
+        value = float(constraint_str)
+        return CompiledConstraint('range', value - 0.1, value + 0.1, True, None, None)
+    except ValueError:
+        pass
+
+    # If we can't parse it, use the current value with a small range
+    return CompiledConstraint('around', 0.1, 0.1, True, None, None)
+
+
+def _apply(op, peak_value, value, current_value):
+    if op == '+':
+        return peak_value + value
+    elif op == '-':
+        return peak_value - value
+    elif op == '*':
+        return peak_value * value
+    return peak_value / value if value != 0 else current_value
+
+
+def constraint_bounds(peaks_by_letter, spec, key, current_value, param_name, reference_name):
+    """
+    Evaluate the constraint of one parameter to (min, max, vary).
+
+    Args:
+        peaks_by_letter (dict): PeakSpec of each peak of the sheet by letter, holding the values referenced
+            constraints start from
+        spec (PeakSpec): Peak the constraint belongs to
+        key (str): Constraint key (Position, Height, FWHM, L/G, Area, Sigma, Gamma, Skew)
+        current_value (float): Start value of the parameter
+        param_name (str): Parameter name used to compile the constraint
+        reference_name (str): Parameter of the referenced peak, see _REFERENCE_ATTRIBUTES
+
+    Returns:
+        tuple: (min, max, vary)
+    """
+    compiled = compile_constraint(spec.constraint(key), param_name)
+
+    if compiled.kind == 'range':
+        return compiled.low, compiled.high, compiled.vary
+    if compiled.kind in ['fixed', 'around']:
+        return current_value - compiled.low, current_value + compiled.high, compiled.vary
+
+    reference = peaks_by_letter.get(compiled.ref)
+    peak_value = getattr(reference, _REFERENCE_ATTRIBUTES[reference_name], None) if reference is not None else None
+    if peak_value is None:
+        return current_value, current_value, compiled.vary
+    return (_apply(compiled.op, peak_value, compiled.low, current_value),
+            _apply(compiled.op, peak_value, compiled.high, current_value),
+            compiled.vary)
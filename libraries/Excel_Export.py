@@ -0,0 +1,133 @@
+# libraries/Excel_Export.py
+
+# Excel files written after an import instead of during it. An importer puts the spectra in window.Data and hands
+# the writing of the .xlsx to schedule_export, which runs it in a background thread, or keeps it for later when the
+# Excel conversion is turned off. Anything that opens the .xlsx to save into it calls finish_export first, which
+# waits for a running export or runs a kept one, so the file is always complete before it is read.
+
+import os
+import re
+import threading
+
+import numpy as np
+from openpyxl import Workbook
+from openpyxl.workbook.child import avoid_duplicate_name
+
+# Characters Excel does not allow in sheet names, and their longest length
+INVALID_SHEET_CHARACTERS = re.compile(r'[\\/*?:\[\]]')
+MAX_SHEET_NAME_LENGTH = 31
+
+# Exports not finished yet, by absolute path of the .xlsx
+_exports = {}
+_lock = threading.Lock()
+
+
+class _Export:
+    def __init__(self, file_path, write):
+        self.file_path = file_path
+        self.write = write
+        self.thread = None
+        self.error = None
+
+    def run(self):
+        # Written next to the target and moved over it once complete, a half written file is never seen
+        temp_path = self.file_path + '.tmp'
+        try:
+            self.write(temp_path)
+            os.replace(temp_path, self.file_path)
+        except Exception as e:
+            self.error = e
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+
+
+def schedule_export(file_path, write, background=True, on_done=None):
+    """
+    Write an Excel file after the import. A running export of the same file is waited for first, one kept for
+    later is replaced.
+
+    Args:
+        file_path (str): Path of the .xlsx
+        write (callable): write(path) writes the file to path
+        background (bool): Start writing now in a background thread, otherwise only write it when finish_export
+            asks for it
+        on_done (callable): on_done(error) called from the background thread once written, error None on success
+    """
+    key = os.path.abspath(file_path)
+    with _lock:
+        previous = _exports.get(key)
+    if previous is not None and previous.thread is not None:
+        # Both would write file_path + '.tmp', the new export starts once the running one is done. The file it
+        # writes is replaced by the new one, its error is only reported to its own on_done
+        previous.thread.join()
+    export = _Export(file_path, write)
+
+    def run():
+        export.run()
+        with _lock:
+            if _exports.get(key) is export:
+                del _exports[key]
+        if on_done is not None:
+            on_done(export.error)
+
+    if background:
+        export.thread = threading.Thread(target=run, name=f"Excel export {os.path.basename(file_path)}", daemon=True)
+    with _lock:
+        # Replaces an export kept for later, it would write the same file
+        _exports[key] = export
+    if background:
+        export.thread.start()
+
+
+def finish_export(file_path):
+    """
+    Make sure the Excel file is complete before opening it: wait for its background export, or write it now if
+    it was kept for later. Nothing happens for files without a pending export.
+
+    Raises:
+        Exception: The error of the export if writing the file failed
+    """
+    key = os.path.abspath(file_path)
+    with _lock:
+        export = _exports.get(key)
+    if export is None:
+        return
+    if export.thread is not None:
+        export.thread.join()
+    else:
+        export.run()
+        with _lock:
+            if _exports.get(key) is export:
+                del _exports[key]
+    if export.error is not None:
+        raise export.error
+
+
+def unique_sheet_name(name, existing_names=()):
+    """Valid Excel sheet name for name, numbered like Excel does if already used."""
+    name = INVALID_SHEET_CHARACTERS.sub('_', str(name)).strip() or 'Sheet'
+    return avoid_duplicate_name(list(existing_names), name[:MAX_SHEET_NAME_LENGTH])
+
+
+def write_spectra_sheets(wb, sheet_names, spectra):
+    """
+    Add one sheet per spectrum to a write only workbook: x, corrected, raw and transmission columns.
+
+    Args:
+        wb (openpyxl.Workbook): Write only workbook
+        sheet_names (list): Sheet name of each spectrum
+        spectra (list): Spectrum dicts ('x_label', 'x', 'corrected', 'raw', 'transmission') as the readers give
+    """
+    for sheet_name, spectrum in zip(sheet_names, spectra):
+        ws = wb.create_sheet(title=sheet_name)
+        ws.append([spectrum['x_label'], "Corrected Data", "Raw Data", "Transmission"])
+        columns = np.column_stack([spectrum['x'], spectrum['corrected'], spectrum['raw'], spectrum['transmission']])
+        for row in columns.tolist():
+            ws.append(row)
+
+
+def write_spectra_workbook(excel_path, sheet_names, spectra):
+    """Write an Excel file holding one sheet per spectrum, see write_spectra_sheets."""
+    wb = Workbook(write_only=True)
+    write_spectra_sheets(wb, sheet_names, spectra)
+    wb.save(excel_path)
@@ -0,0 +1,450 @@
+# libraries/Excel_Save.py
+
+# The parts of saving to the Excel file that do not need the GUI. The curves of a sheet are kept as they were last
+# drawn, with a digest of the peaks, x and background they came from, so saving writes them without fitting again
+# while the peaks did not change. Each sheet written to the file gets a digest of its data and of the settings its
+# plot image was drawn with, and Save All only writes the sheets whose digest changed since.
+
+import hashlib
+import io
+
+import numpy as np
+import openpyxl
+import pandas as pd
+from openpyxl.drawing.image import Image
+from openpyxl.styles import Alignment, Border, Font, PatternFill, Side
+
+
+# Key of the last drawn curves in window.Data['Core levels'][sheet]['Fitting']
+FIT_CURVES_KEY = 'Curves'
+
+
+def fit_curves_signature(window):
+    """Digest of the peak grid values, x and background the stored curves of the current sheet were computed from."""
+    grid = window.peak_params_grid
+    digest = hashlib.blake2b(digest_size=16)
+    for row in range(0, grid.GetNumberRows(), 2):
+        digest.update('\t'.join(grid.GetCellValue(row, col) for col in (1, 2, 3, 4, 5, 6, 7, 8, 9, 13)).encode())
+        digest.update(b'\n')
+    for values in (window.x_values, getattr(window, 'background', None)):
+        digest.update(b'a' if values is not None else b'-')
+        if values is not None:
+            digest.update(np.ascontiguousarray(values, dtype=float).tobytes())
+    return digest.hexdigest()
+
+
+def store_fit_curves(window, sheet_name, calculated_fit, residuals, individual_peak_fits):
+    """
+    Keep the curves of a sheet as they were last drawn, so saving can write them without fitting again. They go in
+    the fit state of the sheet, window.Data['Core levels'][sheet_name]['Fitting']['Curves'], and are saved with
+    the project.
+
+    Args:
+        window: Main window
+        sheet_name (str): Sheet the curves belong to
+        calculated_fit (np.ndarray): Envelope, background plus every peak
+        residuals (np.ndarray): Data minus envelope
+        individual_peak_fits (list): Curve of each peak of the grid plus background, None for the peaks that
+            are not part of the envelope (D-parameter, SurveyID, unknown models)
+    """
+    fitting = window.Data['Core levels'][sheet_name].setdefault('Fitting', {})
+    fitting[FIT_CURVES_KEY] = {
+        'Signature': fit_curves_signature(window),
+        'Envelope': np.asarray(calculated_fit, dtype=float),
+        'Residuals': np.asarray(residuals, dtype=float),
+        'Peaks': [None if curve is None else np.asarray(curve, dtype=float) for curve in individual_peak_fits],
+    }
+
+
+def clear_fit_curves(window, sheet_name):
+    """Drop the stored curves of a sheet."""
+    window.Data['Core levels'].get(sheet_name, {}).get('Fitting', {}).pop(FIT_CURVES_KEY, None)
+
+
+def get_fit_curves(window, sheet_name):
+    """Stored curves of the sheet, or None if there are none or the peaks changed since they were computed."""
+    fitting = window.Data['Core levels'].get(sheet_name, {}).get('Fitting', {})
+    entry = fitting.get(FIT_CURVES_KEY)
+    if not isinstance(entry, dict) or entry.get('Signature') != fit_curves_signature(window):
+        return None
+    return entry
+
+
+def without_fit_curves(fitting):
+    """Fit state of a sheet without its stored curves, for the peak libraries that go to other sheets."""
+    return {key: value for key, value in fitting.items() if key != FIT_CURVES_KEY}
+
+
+# Preferences of the main window the plot images are drawn and exported with
+PLOT_WINDOW_SETTINGS = (
+    'energy_scale', 'photons', 'plot_font', 'axis_title_size', 'axis_number_size', 'x_sublines', 'y_sublines',
+    'legend_font_size', 'core_level_text_size', 'peak_line_style', 'peak_line_alpha', 'peak_line_thickness',
+    'peak_line_pattern', 'peak_fill_types', 'peak_hatch_patterns', 'hatch_density',
+    'excel_width', 'excel_height', 'excel_dpi', 'survey_excel_width', 'survey_excel_height', 'survey_excel_dpi',
+)
+
+# Styles and shown parts of the plot, as the plot manager draws them
+PLOT_MANAGER_SETTINGS = (
+    'plot_style', 'scatter_size', 'line_width', 'line_alpha', 'scatter_color', 'line_color', 'scatter_marker',
+    'background_color', 'background_alpha', 'background_linestyle', 'envelope_color', 'envelope_alpha',
+    'envelope_linestyle', 'residual_color', 'residual_alpha', 'residual_linestyle', 'raw_data_linestyle',
+    'peak_colors', 'peak_alpha', 'peak_fill_enabled', 'fitting_results_visible', 'residuals_state',
+    'residuals_visible', 'legend_visible', 'y_axis_visible', 'energy_scale',
+)
+
+
+def plot_settings(window, sheet_name):
+    """Preferences, plot styles and axis limits the plot image of a sheet is drawn with."""
+    plot_manager = getattr(window, 'plot_manager', None)
+    plot_config = getattr(window, 'plot_config', None)
+    return {
+        'Window': {name: getattr(window, name, None) for name in PLOT_WINDOW_SETTINGS},
+        'Plot': {name: getattr(plot_manager, name, None) for name in PLOT_MANAGER_SETTINGS},
+        'Limits': plot_config.plot_limits.get(sheet_name) if plot_config is not None else None,
+    }
+
+
+def sheet_signature(window, sheet_name):
+    """
+    Digest of everything window.Data holds for a sheet (data, background, peaks, fit) and of the settings of its plot
+    image, to tell the sheets that changed since they were last written to the Excel file. Spectra hash the same as
+    lists or arrays.
+    """
+    digest = hashlib.blake2b(digest_size=16)
+    sheet_data = window.Data['Core levels'].get(sheet_name)
+    # The stored curves follow from the peaks, data and background, redrawing them does not change the sheet
+    if isinstance(sheet_data, dict) and isinstance(sheet_data.get('Fitting'), dict):
+        sheet_data = {**sheet_data, 'Fitting': without_fit_curves(sheet_data['Fitting'])}
+    _update_digest(digest, sheet_data)
+    _update_digest(digest, plot_settings(window, sheet_name))
+    return digest.hexdigest()
+
+
+def results_table_signature(window):
+    """Digest of the results grid cells."""
+    grid = window.results_grid
+    digest = hashlib.blake2b(digest_size=16)
+    for row in range(grid.GetNumberRows()):
+        digest.update('\t'.join(grid.GetCellValue(row, col) for col in range(grid.GetNumberCols())).encode())
+        digest.update(b'\n')
+    return digest.hexdigest()
+
+
+def changed_sheets(window):
+    """Sheets whose data changed since they were last written to the Excel file, or never were since it was opened."""
+    return [sheet_name for sheet_name in window.Data['Core levels']
+            if window.excel_saved_signatures.get(sheet_name) != sheet_signature(window, sheet_name)]
+
+
+def _update_digest(digest, obj):
+    if isinstance(obj, dict):
+        digest.update(b'{')
+        for key, value in obj.items():
+            digest.update(repr(key).encode())
+            _update_digest(digest, value)
+        digest.update(b'}')
+    elif isinstance(obj, np.ndarray) and obj.ndim == 0:
+        _update_digest(digest, obj.item())
+    elif isinstance(obj, (np.ndarray, list, tuple)):
+        # Numbers in one block, anything else (text, None, ragged nesting) value by value
+        try:
+            values = np.asarray(obj)
+        except (TypeError, ValueError):
+            values = None
+        if values is not None and values.dtype.kind in 'biuf':
+            digest.update(b'a' + repr(values.shape).encode())
+            digest.update(np.ascontiguousarray(values, dtype=float).tobytes())
+        else:
+            digest.update(b'[')
+            for value in obj:
+                _update_digest(digest, value)
+            digest.update(b']')
+    elif isinstance(obj, np.generic):
+        digest.update(repr(obj.item()).encode())
+    else:
+        digest.update(repr(obj).encode())
+
+
+def replace_worksheet(wb, sheet_name):
+    """Replace a sheet of an open workbook by an empty one at the same position, like if_sheet_exists='replace'."""
+    if sheet_name in wb.sheetnames:
+        index = wb.sheetnames.index(sheet_name)
+        wb.remove(wb[sheet_name])
+        return wb.create_sheet(sheet_name, index)
+    return wb.create_sheet(sheet_name)
+
+
+def write_dataframe(ws, df):
+    """Write a data frame to an empty sheet as DataFrame.to_excel(index=False) does, header in bold."""
+    header_font = Font(bold=True)
+    header_alignment = Alignment(horizontal="center", vertical="top")
+    for col, name in enumerate(df.columns, start=1):
+        cell = ws.cell(row=1, column=col, value=str(name) if name != '' else None)
+        cell.font = header_font
+        cell.alignment = header_alignment
+
+    for row in df.itertuples(index=False, name=None):
+        ws.append([_excel_value(value) for value in row])
+
+
+def _excel_value(value):
+    if isinstance(value, np.generic):
+        value = value.item()
+    if isinstance(value, float):
+        if np.isnan(value):
+            return None
+        if np.isinf(value):
+            return 'inf' if value > 0 else '-inf'
+    if value == '':
+        return None
+    return value
+
+
+def write_sheet_to_workbook(window, data, wb, sheet_name):
+    """
+    Write the data, fit curves and peak table of a sheet to an open workbook, nothing is written to disk.
+
+    Args:
+        window: Main window
+        data (dict): Curves to write, as returned by window.get_data_for_save()
+        wb (openpyxl.Workbook): Workbook the sheet is replaced in
+        sheet_name (str): Sheet to write
+    """
+    existing_df = pd.read_excel(wb, sheet_name=sheet_name, engine='openpyxl')
+
+    # Remove previously fitted data if it exists
+    if existing_df.shape[1] > 5:
+        existing_df = existing_df.iloc[:, :5]
+
+    # Add columns if there aren't enough
+    while existing_df.shape[1] < 5:
+        existing_df[f'Column_{existing_df.shape[1] + 1}'] = ''
+
+    # Ensure there's an empty column E
+    if existing_df.shape[1] < 5:
+        existing_df.insert(4, '', np.nan)
+
+    if 'x_values' in data and data['x_values'] is not None:
+        x_values = data['x_values'].to_numpy() if isinstance(data['x_values'], pd.Series) else data['x_values']
+        filtered_data = pd.DataFrame({
+            'BE': x_values
+        })
+
+        if data['background'] is not None and data['calculated_fit'] is not None:
+            mask = np.isin(data['x_values'], x_values)
+            y_values = data['y_values'][mask]
+
+            if len(y_values) == len(data['calculated_fit']):
+                residuals = y_values - data['calculated_fit']
+                filtered_data['Residuals'] = residuals
+            else:
+                filtered_data['Residuals'] = np.nan
+        else:
+            filtered_data['Residuals'] = np.nan
+
+        filtered_data['Background'] = data['background'] if data['background'] is not None else np.nan
+        filtered_data['Calculated Fit'] = data['calculated_fit'] if data['calculated_fit'] is not None else np.nan
+
+        if data['individual_peak_fits']:
+            num_rows = len(x_values)
+            num_peaks = data['peak_params_grid'].GetNumberRows() // 2
+            for i in range(num_peaks):
+                row = i * 2
+                peak_label = data['peak_params_grid'].GetCellValue(row, 1)
+                if i < len(data['individual_peak_fits']) and data['individual_peak_fits'][i] is not None:
+                    filtered_data[peak_label] = np.asarray(data['individual_peak_fits'][i])[:num_rows]
+
+        # Rename columns to avoid conflicts before inserting them
+        for i, col in enumerate(filtered_data.columns):
+            new_col_name = col
+            while new_col_name in existing_df.columns:
+                new_col_name += '_new'
+            if col != 'Derivative':
+                existing_df.insert(5 + i, new_col_name, filtered_data[col])
+
+    # Ensure there are at least 23 columns (A to W)
+    while existing_df.shape[1] < 23:
+        existing_df[f'Column_{existing_df.shape[1] + 1}'] = ''
+
+    # Rename columns starting with "Unnamed" or "Column" to empty string
+    existing_df.columns = ['' if col.startswith(('Unnamed', 'Column')) else col for col in existing_df.columns]
+
+    # Ensure column E is empty
+    if existing_df.columns[4] != '':
+        existing_df.rename(columns={existing_df.columns[4]: ''}, inplace=True)
+
+    # Create DataFrame for peak fitting parameters
+    peak_params_df = pd.DataFrame()
+    for col in range(window.peak_params_grid.GetNumberCols()):
+        col_name = window.peak_params_grid.GetColLabelValue(col)
+        col_data = [window.peak_params_grid.GetCellValue(row, col) for row in
+                    range(window.peak_params_grid.GetNumberRows())]
+        peak_params_df[col_name] = col_data
+
+    # Add peak_params_df to existing_df starting from column 23 (X)
+    for i, col in enumerate(peak_params_df.columns):
+        existing_df.insert(23 + i, col, peak_params_df[col])
+
+    # Handle D-parameter derivative data
+    if window.selected_fitting_method == "D-parameter":
+        if 'Fitting' in window.Data['Core levels'][sheet_name] and 'Peaks' in window.Data['Core levels'][sheet_name][
+            'Fitting']:
+            d_param_data = window.Data['Core levels'][sheet_name]['Fitting']['Peaks'].get(
+                'D-parameter')
+            if d_param_data and 'Derivative' in d_param_data:
+                filtered_data['Derivative'] = d_param_data['Derivative']
+                existing_df.insert(7, 'Derivative', d_param_data['Derivative'])
+
+    # Replace the sheet, at the same position, with the data frame
+    worksheet = replace_worksheet(wb, sheet_name)
+    write_dataframe(worksheet, existing_df)
+
+    # Remove border from first row
+    for cell in worksheet[1]:
+        cell.border = openpyxl.styles.Border(
+            left=openpyxl.styles.Side(style=None),
+            right=openpyxl.styles.Side(style=None),
+            top=openpyxl.styles.Side(style=None),
+            bottom=openpyxl.styles.Side(style=None)
+        )
+
+    # Define styles
+    thin_side = Side(style='thin')
+    thick_side = Side(style='medium')
+    green_fill = PatternFill(start_color="90EE90", end_color="90EE90", fill_type="solid")  # Light green
+    bold_font = Font(bold=True)
+
+    start_row = 2  # Assuming data starts from the second row
+    num_peak_rows = window.peak_params_grid.GetNumberRows()
+    end_row = start_row + num_peak_rows - 1
+    start_col = 24  # Column X (24th column)
+    end_col = worksheet.max_column
+
+    for row in range(start_row - 1, end_row + 1):  # Start from header row
+        for col in range(start_col, end_col + 1):
+            cell = worksheet.cell(row=row, column=col)
+
+            # Default to thin borders
+            left = right = top = bottom = thin_side
+
+            # Header row
+            if row == start_row - 1:
+                cell.fill = green_fill
+                cell.font = bold_font
+                top = thick_side
+
+            # Add thick borders for outer edges
+            if row == start_row - 1 or row == end_row:
+                bottom = thick_side
+            if col == start_col:
+                left = thick_side
+            if col == end_col:
+                right = thick_side
+
+            # Add thick bottom border for every second row (constraints row)
+            if (row - start_row + 1) % 2 == 0:
+                bottom = thick_side
+
+            cell.border = Border(left=left, right=right, top=top, bottom=bottom)
+
+    # After saving to Excel, update the plot with the current limits
+    if hasattr(window, 'plot_config'):
+        limits = window.plot_config.get_plot_limits(window, sheet_name)
+        window.ax.set_xlim(limits['Xmax'], limits['Xmin'])  # Reverse X-axis
+        window.ax.set_ylim(limits['Ymin'], limits['Ymax'])
+        window.canvas.draw_idle()
+
+
+def write_plot_to_workbook(window, wb, sheet_name):
+    """Put the current plot, at the Excel export size, in the sheet of an open workbook in place of its image."""
+    is_survey = "survey" in sheet_name.lower() or "wide" in sheet_name.lower()
+
+    # Get dimensions based on plot type
+    width = window.survey_excel_width if is_survey else window.excel_width
+    height = window.survey_excel_height if is_survey else window.excel_height
+    dpi = window.survey_excel_dpi if is_survey else window.excel_dpi
+
+    # Save figure to buffer
+    buf = io.BytesIO()
+    original_size = window.figure.get_size_inches()
+    window.figure.set_size_inches(width, height)
+    window.figure.savefig(buf, format='png', dpi=dpi, bbox_inches='tight')
+    window.figure.set_size_inches(original_size)
+    buf.seek(0)
+
+    ws = wb.create_sheet(sheet_name) if sheet_name not in wb.sheetnames else wb[sheet_name]
+
+    # Clear existing images
+    ws._images.clear()
+
+    # Add new image
+    img = Image(buf)
+    ws.add_image(img, 'D6')
+
+
+def write_results_table_to_workbook(window, wb):
+    """Replace the Results Table sheet of an open workbook with the results grid."""
+    sheet_name = 'Results Table'
+    if sheet_name in wb.sheetnames:
+        wb.remove(wb[sheet_name])
+    ws = wb.create_sheet(sheet_name)
+
+    def get_column_letter(n):
+        result = ""
+        while n > 0:
+            n, remainder = divmod(n - 1, 26)
+            result = chr(65 + remainder) + result
+        return result
+
+    headers = [window.results_grid.GetColLabelValue(col) for col in range(window.results_grid.GetNumberCols())]
+    for col, header in enumerate(headers, start=2):
+        cell = ws.cell(row=2, column=col, value=header)
+        cell.font = Font(bold=True)
+        cell.fill = PatternFill(start_color="90EE90", end_color="90EE90", fill_type="solid")
+        cell.alignment = Alignment(horizontal="center", vertical="center")
+
+    for row in range(window.results_grid.GetNumberRows()):
+        for col in range(window.results_grid.GetNumberCols()):
+            cell = ws.cell(row=row + 3, column=col + 2, value=window.results_grid.GetCellValue(row, col))
+            cell.alignment = Alignment(horizontal="center", vertical="center")
+
+    thin_border = Border(left=Side(style='thin'), right=Side(style='thin'), top=Side(style='thin'),
+                         bottom=Side(style='thin'))
+    thick_border = Border(left=Side(style='medium'), right=Side(style='medium'), top=Side(style='medium'),
+                          bottom=Side(style='medium'))
+
+    max_row = ws.max_row
+    max_col = len(headers) + 1
+    end_letter = get_column_letter(max_col)
+
+    for row in ws[f'B2:{end_letter}2']:
+        for cell in row:
+            cell.border = thick_border
+
+    for row in ws[f'B3:{end_letter}{max_row}']:
+        for cell in row:
+            cell.border = thin_border
+
+    for col in range(2, max_col + 1):
+        ws.cell(row=2, column=col).border = Border(left=ws.cell(row=2, column=col).border.left,
+                                                   right=ws.cell(row=2, column=col).border.right,
+                                                   top=Side(style='medium'),
+                                                   bottom=ws.cell(row=2, column=col).border.bottom)
+        ws.cell(row=max_row, column=col).border = Border(left=ws.cell(row=max_row, column=col).border.left,
+                                                         right=ws.cell(row=max_row, column=col).border.right,
+                                                         top=ws.cell(row=max_row, column=col).border.top,
+                                                         bottom=Side(style='medium'))
+
+    for row in range(2, max_row + 1):
+        ws.cell(row=row, column=2).border = Border(left=Side(style='medium'),
+                                                   right=ws.cell(row=row, column=2).border.right,
+                                                   top=ws.cell(row=row, column=2).border.top,
+                                                   bottom=ws.cell(row=row, column=2).border.bottom)
+        ws.cell(row=row, column=max_col).border = Border(left=ws.cell(row=row, column=max_col).border.left,
+                                                         right=Side(style='medium'),
+                                                         top=ws.cell(row=row, column=max_col).border.top,
+                                                         bottom=ws.cell(row=row, column=max_col).border.bottom)
+
+    for column_cells in ws.columns:
+        length = max(len(str(cell.value)) for cell in column_cells)
+        ws.column_dimensions[column_cells[0].column_letter].width = length + 2
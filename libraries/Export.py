@@ -3,16 +3,20 @@ import numpy as np
 import re
 from libraries.Utilities import load_rsf_data
 from libraries.Save import save_state
-from libraries.Open import load_library_data
+from libraries.Line_Library import load_library
 from libraries.Sheet_Operations import on_sheet_selected
 from libraries.Peak_Functions import AtomicConcentrations
 
+# Instrument whose RSFs are used for lines the current instrument has no entry for
+FALLBACK_INSTRUMENT = 'C-Al1486'
+
 
 def export_results(window):
     """
     Export peak fitting results to the results grid and update window.Data.
     """
-    library_data = load_library_data()
+    # Kept in memory after the first load, no file is read here
+    library = load_library()
     current_instrument = window.current_instrument
 
     current_rows = window.results_grid.GetNumberRows()
@@ -27,7 +31,7 @@ def export_results(window):
     for i in range(num_peaks):
         row = i * 2
 
-        peak_params = _extract_peak_parameters(window, row, library_data, current_instrument)
+        peak_params = _extract_peak_parameters(window, row, library, current_instrument)
         fitting_model = window.peak_params_grid.GetCellValue(row, 13)
 
         area, normalized_area, rel_area = _calculate_peak_areas(window, peak_params, row)
@@ -147,7 +151,7 @@ def _extract_peak_parameters_OLD(window, row, library_data, current_instrument):
     }
 
 
-def _extract_peak_parameters(window, row, library_data, current_instrument):
+def _extract_peak_parameters(window, row, library, current_instrument):
     peak_name = window.peak_params_grid.GetCellValue(row, 1)  # Label
 
     # Use regex to extract element, orbital, and suborbital
@@ -164,12 +168,11 @@ def _extract_peak_parameters(window, row, library_data, current_instrument):
         element, orbital, suborbital = core_level, '', None
 
     # Get RSF directly using complete orbital designation
-    key = (element, orbital + (suborbital or ''))
-    if key in library_data and current_instrument in library_data[key]:
-        rsf = library_data[key][current_instrument]['rsf']
-    else:
+    orbital_name = orbital + (suborbital or '')
+    rsf = library.rsf(element, orbital_name, current_instrument)
+    if rsf is None:
         # Fallback to Al if instrument not found
-        rsf = library_data[key]['Al']['rsf'] if key in library_data else 1.0
+        rsf = library.rsf(element, orbital_name, FALLBACK_INSTRUMENT, 1.0)
 
     return {
         'name': peak_name,
@@ -0,0 +1,853 @@
+# libraries/Fitting_Engine.py
+
+# Headless peak fitting: a picklable description of one core level fit (FitProblem) and a pure fit() that
+# runs it without touching wx. fit_peaks builds the problem from the peak_params_grid and applies the result
+# back to the grid; batch and worker fits build it from window.Data instead.
+
+import os
+import warnings
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from dataclasses import dataclass, field
+from functools import partial
+
+import numpy as np
+import lmfit
+from scipy.optimize import least_squares
+from scipy.sparse import csr_matrix
+
+from libraries.Peak_Functions import PeakFunctions
+from libraries.Constraints import constraint_bounds
+from libraries.Vectorized_Model import VectorizedPeakModel
+from libraries.Peak_Evaluator import peak_evaluator
+
+
+# Constraint keys as stored in window.Data[...]['Peaks'][label]['Constraints'] and grid column of each
+CONSTRAINT_COLUMNS = {
+    'Position': 2,
+    'Height': 3,
+    'FWHM': 4,
+    'L/G': 5,
+    'Area': 6,
+    'Sigma': 7,
+    'Gamma': 8,
+    'Skew': 9,
+}
+
+VOIGT_MODELS = ["Voigt (Area, L/G, \u03c3)", "Voigt (Area, \u03c3, \u03b3)"]
+LA_MODELS = ["LA (Area, \u03c3, \u03b3)", "LA (Area, \u03c3/\u03b3, \u03b3)", "LA*G (Area, \u03c3/\u03b3, \u03b3)"]
+UNFITTED_MODELS = ["Unfitted", "D-parameter"]
+
+# Seconds between two on_wait calls while waiting for the worker processes
+WAIT_INTERVAL = 0.1
+# Thread counts of the BLAS / OpenMP libraries, one per worker process as the workers already fill the CPUs
+WORKER_THREAD_VARIABLES = ('OMP_NUM_THREADS', 'MKL_NUM_THREADS', 'OPENBLAS_NUM_THREADS', 'VECLIB_MAXIMUM_THREADS',
+                           'NUMEXPR_NUM_THREADS')
+
+
+@dataclass
+class PeakSpec:
+    """One peak of a fit: start values as shown in the grid and the constraint string of each parameter."""
+    letter: str
+    label: str
+    model: str
+    position: float
+    height: float
+    fwhm: float
+    lg_ratio: float
+    area: float = None
+    sigma: float = None
+    gamma: float = None
+    fwhm_g: float = None
+    constraints: dict = field(default_factory=dict)
+
+    def constraint(self, key):
+        return str(self.constraints.get(key, '') or '')
+
+
+@dataclass
+class FitProblem:
+    """Everything needed to fit one core level, with no reference to the GUI."""
+    sheet_name: str
+    x: np.ndarray
+    y: np.ndarray
+    background: np.ndarray
+    peaks: list
+    bkg_low: float = None
+    bkg_high: float = None
+    method: str = 'leastsq'
+    max_nfev: int = None
+    fitting_model: str = ''
+    engine: str = 'lmfit'
+    # Analytic derivatives for the leastsq / least_squares fits of the models that have them, finite differences
+    # if False
+    analytic_jacobian: bool = True
+    sparse_jacobian_width: float = None
+
+
+@dataclass
+class FitResult:
+    """Outcome of fit(): fitted peak values keyed by peak label plus the arrays and statistics of the fit."""
+    sheet_name: str
+    peaks: dict
+    params: dict
+    mask: np.ndarray
+    best_fit: np.ndarray
+    background_filtered: np.ndarray
+    y_values_subtracted: np.ndarray
+    fitted_peak: np.ndarray
+    r_squared: float
+    chi_square: float
+    red_chi_square: float
+    rsd: float
+    nfev: int
+    success: bool = True
+    message: str = ''
+
+
+def _to_float(value, default=None):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return default
+
+
+def _required(value, name, peak_label):
+    if value is None:
+        raise ValueError(f"Missing {name} value for peak {peak_label}")
+    return value
+
+
+def number_to_letter(n):
+    return chr(65 + n)
+
+
+def build_fit_problem_from_grid(window, peak_params_grid):
+    """Read the current sheet, its background and every peak of the peak_params_grid into a FitProblem."""
+    sheet_name = window.sheet_combobox.GetValue()
+
+    peaks = []
+    for i in range(peak_params_grid.GetNumberRows() // 2):
+        row = i * 2
+        cell = peak_params_grid.GetCellValue
+        peaks.append(PeakSpec(
+            letter=cell(row, 0) or number_to_letter(i),
+            label=cell(row, 1),
+            model=cell(row, 13),
+            position=_required(_to_float(cell(row, 2)), 'Position', cell(row, 1)),
+            height=_required(_to_float(cell(row, 3)), 'Height', cell(row, 1)),
+            fwhm=_required(_to_float(cell(row, 4)), 'FWHM', cell(row, 1)),
+            lg_ratio=_required(_to_float(cell(row, 5)), 'L/G', cell(row, 1)),
+            area=_to_float(cell(row, 6)),
+            sigma=_to_float(cell(row, 7)),
+            gamma=_to_float(cell(row, 8)),
+            fwhm_g=_to_float(cell(row, 9)),
+            constraints={key: cell(row + 1, col) for key, col in CONSTRAINT_COLUMNS.items()}
+        ))
+
+    return _build_fit_problem(window.Data, sheet_name, peaks,
+                              method=_get_optimization_method(window),
+                              max_nfev=window.max_iterations,
+                              fitting_model=window.selected_fitting_method,
+                              engine=window.fit_engine,
+                              analytic_jacobian=window.analytic_jacobian,
+                              sparse_jacobian_width=window.sparse_jacobian_width)
+
+
+def build_fit_problem_from_data(data, sheet_name, method='leastsq', max_nfev=None, fitting_model='', engine='lmfit',
+                                analytic_jacobian=True, sparse_jacobian_width=None):
+    """Build a FitProblem from the peaks stored in data['Core levels'][sheet_name]['Fitting']['Peaks']."""
+    stored_peaks = data['Core levels'][sheet_name].get('Fitting', {}).get('Peaks', {})
+
+    peaks = []
+    for i, (peak_label, peak_data) in enumerate(stored_peaks.items()):
+        peaks.append(PeakSpec(
+            letter=number_to_letter(i),
+            label=peak_label,
+            model=peak_data.get('Fitting Model', ''),
+            position=_required(_to_float(peak_data.get('Position')), 'Position', peak_label),
+            height=_required(_to_float(peak_data.get('Height')), 'Height', peak_label),
+            fwhm=_required(_to_float(peak_data.get('FWHM')), 'FWHM', peak_label),
+            lg_ratio=_required(_to_float(peak_data.get('L/G')), 'L/G', peak_label),
+            area=_to_float(peak_data.get('Area')),
+            sigma=_to_float(peak_data.get('Sigma')),
+            gamma=_to_float(peak_data.get('Gamma')),
+            fwhm_g=_to_float(peak_data.get('Skew', peak_data.get('fwhm_g'))),
+            constraints=dict(peak_data.get('Constraints', {}))
+        ))
+
+    return _build_fit_problem(data, sheet_name, peaks, method=method, max_nfev=max_nfev,
+                              fitting_model=fitting_model, engine=engine, analytic_jacobian=analytic_jacobian,
+                              sparse_jacobian_width=sparse_jacobian_width)
+
+
+def _build_fit_problem(data, sheet_name, peaks, method, max_nfev, fitting_model, engine='lmfit',
+                       analytic_jacobian=True, sparse_jacobian_width=None):
+    core_level_data = data['Core levels'][sheet_name]
+    background_data = core_level_data['Background']
+    return FitProblem(
+        sheet_name=sheet_name,
+        x=np.array(core_level_data['B.E.'], dtype=float),
+        y=np.array(core_level_data['Raw Data'], dtype=float),
+        background=np.array(background_data['Bkg Y'], dtype=float),
+        peaks=peaks,
+        bkg_low=background_data.get('Bkg Low'),
+        bkg_high=background_data.get('Bkg High'),
+        method=method,
+        max_nfev=max_nfev,
+        fitting_model=fitting_model,
+        engine=engine,
+        analytic_jacobian=analytic_jacobian,
+        sparse_jacobian_width=sparse_jacobian_width
+    )
+
+
+def _get_optimization_method(window):
+    fitting_window = getattr(window, 'fitting_window', None)
+    return fitting_window.get_optimization_method() if fitting_window else 'leastsq'
+
+
+# MODEL -------------------------------------------------------------------------
+
+def build_model(problem):
+    """
+    Build the summed lmfit model and its Parameters for every peak of the problem.
+
+    Returns (None, None) if any peak uses a model that is not fitted (Unfitted, D-parameter).
+    """
+    peaks = problem.peaks
+    model = None
+    params = lmfit.Parameters()
+
+    if any(spec.model in UNFITTED_MODELS for spec in peaks):
+        return None, None
+    # Relative constraints start from the values of the peak they refer to
+    bounds = partial(constraint_bounds, {spec.letter: spec for spec in peaks})
+
+    for i, spec in enumerate(peaks):
+        prefix = f'peak{i}_'
+        peak_model_choice = spec.model
+
+        center = spec.position
+        height = spec.height
+        fwhm = spec.fwhm
+        lg_ratio = spec.lg_ratio
+        area = spec.area if spec.area is not None else 0
+        fwhm_g = spec.fwhm_g if spec.fwhm_g is not None else 0.64
+
+        center_min, center_max, center_vary = bounds(spec, 'Position', center, "Position", 'center')
+        height_min, height_max, height_vary = bounds(spec, 'Height', height, "Height", 'height')
+        fwhm_min, fwhm_max, fwhm_vary = bounds(spec, 'FWHM', fwhm, "FWHM", 'fwhm')
+        lg_ratio_min, lg_ratio_max, lg_ratio_vary = bounds(spec, 'L/G', lg_ratio, "L/G", 'lg_ratio')
+        area_min, area_max, area_vary = bounds(spec, 'Area', area, "area", 'area')
+        if area_min == area_max:
+            area_max += 1e-6
+
+        if peak_model_choice == "Voigt (Area, L/G, \u03c3)":
+            if spec.sigma is not None:
+                sigma = spec.sigma / 2.355
+                fraction = lg_ratio
+            else:
+                sigma = fwhm / (2 * np.sqrt(2 * np.log(2)))
+                fraction = lg_ratio
+
+            sigma_min, sigma_max, sigma_vary = bounds(spec, 'Sigma', sigma, "Sigma", 'sigma')
+            fraction_min, fraction_max, fraction_vary = bounds(spec, 'L/G', fraction, "lg_ratio", 'lg_ratio')
+
+            # Calculate gamma, gamma_min, and gamma_max
+            def calc_gamma(f, s):
+                return (f * 2.355 * s) / (200 - 2 * f)
+
+            GAMMA_TOLERANCE = 1e-6  # Small tolerance value
+
+            gamma = calc_gamma(fraction, sigma)
+            gamma_min = calc_gamma(fraction_min, sigma)
+            gamma_max = calc_gamma(fraction_max, sigma)
+
+            # Ensure gamma_min and gamma_max are different
+            if abs(gamma_max - gamma_min) < GAMMA_TOLERANCE:
+                gamma_min = max(0, gamma - GAMMA_TOLERANCE)
+                gamma_max = gamma + GAMMA_TOLERANCE
+
+            # Ensure gamma is within the range
+            gamma = max(gamma_min, min(gamma, gamma_max))
+
+            peak_model = lmfit.models.VoigtModel(prefix=prefix)
+            params.add(f'{prefix}area', value=area, min=area_min, max=area_max, vary=area_vary,
+                       brute_step=area * 0.01)
+            params.add(f'{prefix}center', value=center, min=center_min, max=center_max, vary=center_vary,
+                       brute_step=0.1)
+            params.add(f'{prefix}sigma', value=sigma, min=sigma_min / 2.355, max=sigma_max / 2.355,
+                       vary=sigma_vary, brute_step=sigma * 0.01)
+            params.add(f'{prefix}gamma', value=gamma, min=gamma_min, max=gamma_max, vary=fraction_vary,
+                       brute_step=gamma * 0.01)
+            params.add(f'{prefix}amplitude', expr=f'{prefix}area')
+
+        elif peak_model_choice == "Voigt (Area, \u03c3, \u03b3)":
+            if spec.sigma is not None and spec.gamma is not None:
+                sigma = spec.sigma / 2.355
+                gamma = spec.gamma / 2
+            else:
+                sigma = fwhm / (2 * np.sqrt(2 * np.log(2)))  # Default calculation if value is invalid
+                gamma = lg_ratio / 100 * sigma  # Default calculation if value is invalid
+
+            sigma_min, sigma_max, sigma_vary = bounds(spec, 'Sigma', sigma, "Sigma", 'sigma')
+            gamma_min, gamma_max, gamma_vary = bounds(spec, 'Gamma', gamma, "Gamma", 'gamma')
+
+            peak_model = lmfit.models.VoigtModel(prefix=prefix)
+            params.add(f'{prefix}area', value=area, min=area_min, max=area_max, vary=area_vary,
+                       brute_step=area * 0.01)
+            params.add(f'{prefix}center', value=center, min=center_min, max=center_max, vary=center_vary,
+                       brute_step=0.1)
+            params.add(f'{prefix}sigma', value=sigma, min=sigma_min / 2.355, max=sigma_max / 2.355,
+                       vary=sigma_vary, brute_step=sigma * 0.01)
+            params.add(f'{prefix}gamma', value=gamma, min=gamma_min / 2, max=gamma_max / 2, vary=gamma_vary,
+                       brute_step=gamma * 0.01)
+            params.add(f'{prefix}amplitude', expr=f'{prefix}area')
+
+        elif peak_model_choice == "ExpGauss.(Area, \u03c3, \u03b3)":
+            if spec.sigma is not None and spec.gamma is not None:
+                sigma = spec.sigma
+                gamma = spec.gamma
+            else:
+                warnings.warn(f"No sigma and gamma for peak {spec.label}, estimated from the FWHM and L/G")
+                sigma = fwhm / (2 * np.sqrt(2 * np.log(2)))  # Default calculation if value is invalid
+                gamma = lg_ratio / 100 * sigma  # Default calculation if value is invalid
+
+            sigma_min, sigma_max, sigma_vary = bounds(spec, 'Sigma', sigma, "Sigma", 'sigma')
+            gamma_min, gamma_max, gamma_vary = bounds(spec, 'Gamma', gamma, "Gamma", 'gamma')
+
+            peak_model = lmfit.models.ExponentialGaussianModel(prefix=prefix)
+            params.add(f'{prefix}amplitude', value=area, min=area_min, max=area_max, vary=area_vary,
+                       brute_step=area * 0.01)
+            params.add(f'{prefix}center', value=center, min=center_min, max=center_max, vary=center_vary,
+                       brute_step=0.1)
+            params.add(f'{prefix}sigma', value=sigma, min=sigma_min, max=sigma_max, vary=sigma_vary,
+                       brute_step=sigma * 0.01)
+            params.add(f'{prefix}gamma', value=gamma, min=gamma_min, max=gamma_max, vary=gamma_vary,
+                       brute_step=gamma * 0.01)
+
+        elif peak_model_choice == "Pseudo-Voigt (Area)":
+            peak_model = lmfit.models.PseudoVoigtModel(prefix=prefix)
+            sigma = fwhm / 2.
+
+            params.add(f'{prefix}center', value=center, min=center_min, max=center_max, vary=center_vary,
+                       brute_step=0.1)
+            params.add(f'{prefix}area', value=area, min=area_min, max=area_max, vary=area_vary,
+                       brute_step=area * 0.01)
+            params.add(f'{prefix}sigma', value=sigma, min=fwhm_min / 2. if fwhm_min else None,
+                       max=fwhm_max / 2. if fwhm_max else None, vary=fwhm_vary, brute_step=sigma * 0.01)
+            params.add(f'{prefix}fraction', value=lg_ratio / 100, min=lg_ratio_min / 100, max=lg_ratio_max / 100,
+                       vary=lg_ratio_vary, brute_step=0.01)
+            params.add(f'{prefix}amplitude', expr=f'{prefix}area')
+
+        elif peak_model_choice == "LA (Area, \u03c3, \u03b3)":
+            peak_model = lmfit.Model(PeakFunctions.LA, prefix=prefix)
+            amplitude = _required(spec.area, 'Area', spec.label)
+            sigma = _required(spec.sigma, 'Sigma', spec.label)
+            gamma = _required(spec.gamma, 'Gamma', spec.label)
+
+            sigma_min, sigma_max, sigma_vary = bounds(spec, 'Sigma', sigma, "Sigma", 'sigma')
+            gamma_min, gamma_max, gamma_vary = bounds(spec, 'Gamma', gamma, "Gamma", 'gamma')
+
+            params.add(f'{prefix}amplitude', value=amplitude, min=area_min, max=area_max, vary=area_vary)
+            params.add(f'{prefix}center', value=center, min=center_min, max=center_max, vary=center_vary)
+            params.add(f'{prefix}fwhm', value=fwhm, min=fwhm_min, max=fwhm_max, vary=fwhm_vary)
+            params.add(f'{prefix}gamma', value=gamma, min=gamma_min, max=gamma_max, vary=gamma_vary)
+            params.add(f'{prefix}sigma', value=sigma, min=sigma_min, max=sigma_max, vary=sigma_vary)
+
+        elif peak_model_choice == "LA (Area, \u03c3/\u03b3, \u03b3)":
+            peak_model = lmfit.Model(PeakFunctions.LA, prefix=prefix)
+            amplitude = _required(spec.area, 'Area', spec.label)
+            gamma = _required(spec.gamma, 'Gamma', spec.label)
+
+            gamma_min, gamma_max, gamma_vary = bounds(spec, 'Gamma', gamma, "Gamma", 'gamma')
+
+            params.add(f'{prefix}amplitude', value=amplitude, min=area_min, max=area_max, vary=area_vary)
+            params.add(f'{prefix}center', value=center, min=center_min, max=center_max, vary=center_vary)
+            params.add(f'{prefix}fwhm', value=fwhm, min=fwhm_min, max=fwhm_max, vary=fwhm_vary)
+            params.add(f'{prefix}gamma', value=gamma, min=gamma_min, max=gamma_max, vary=gamma_vary)
+            params.add(f'{prefix}fraction', value=lg_ratio, min=lg_ratio_min, max=lg_ratio_max, vary=lg_ratio_vary)
+
+            # Add constraint to calculate sigma from L/G ratio and gamma
+            params.add(f'{prefix}sigma', expr=f'({prefix}fraction / 100) * {prefix}gamma / (1 -{prefix}fraction / 100)')
+
+        elif peak_model_choice == "LA*G (Area, \u03c3/\u03b3, \u03b3)":
+            peak_model = lmfit.Model(PeakFunctions.LAxG, prefix=prefix)
+            amplitude = _required(spec.area, 'Area', spec.label)
+            gamma = _required(spec.gamma, 'Gamma', spec.label)
+            fwhm_g = _required(spec.fwhm_g, 'Skew', spec.label)
+
+            gamma_min, gamma_max, gamma_vary = bounds(spec, 'Gamma', gamma, "Gamma", 'gamma')
+            fwhm_g_min, fwhm_g_max, fwhm_g_vary = bounds(spec, 'Skew', fwhm_g, "fwhm_g", 'fwhm_g')
+
+            params.add(f'{prefix}amplitude', value=amplitude, min=area_min, max=area_max, vary=area_vary)
+            params.add(f'{prefix}center', value=center, min=center_min, max=center_max, vary=center_vary)
+            params.add(f'{prefix}fwhm', value=fwhm, min=fwhm_min, max=fwhm_max, vary=fwhm_vary)
+            params.add(f'{prefix}gamma', value=gamma, min=gamma_min, max=gamma_max, vary=gamma_vary)
+            params.add(f'{prefix}fraction', value=lg_ratio, min=lg_ratio_min, max=lg_ratio_max, vary=lg_ratio_vary)
+            params.add(f'{prefix}fwhm_g', value=fwhm_g, min=fwhm_g_min, max=fwhm_g_max, vary=True)
+
+            # Add constraint to calculate sigma from L/G ratio and gamma
+            params.add(f'{prefix}sigma', expr=f'({prefix}fraction / 100) * {prefix}gamma / (1 -{prefix}fraction / 100)')
+
+        elif peak_model_choice == "GL (Area)":
+            peak_model = lmfit.Model(PeakFunctions.gauss_lorentz_Area, prefix=prefix)
+            params.add(f'{prefix}area', value=area, min=area_min, max=area_max, vary=area_vary)
+            params.add(f'{prefix}center', value=center, min=center_min, max=center_max, vary=center_vary)
+            params.add(f'{prefix}fwhm', value=fwhm, min=fwhm_min, max=fwhm_max, vary=fwhm_vary)
+            params.add(f'{prefix}fraction', value=lg_ratio, min=lg_ratio_min, max=lg_ratio_max, vary=lg_ratio_vary)
+
+        elif peak_model_choice == "SGL (Area)":
+            peak_model = lmfit.Model(PeakFunctions.S_gauss_lorentz_Area, prefix=prefix)
+            params.add(f'{prefix}area', value=area, min=area_min, max=area_max, vary=area_vary)
+            params.add(f'{prefix}center', value=center, min=center_min, max=center_max, vary=center_vary)
+            params.add(f'{prefix}fwhm', value=fwhm, min=fwhm_min, max=fwhm_max, vary=fwhm_vary)
+            params.add(f'{prefix}fraction', value=lg_ratio, min=lg_ratio_min, max=lg_ratio_max, vary=lg_ratio_vary)
+
+        elif peak_model_choice == "GL (Height)":
+            peak_model = lmfit.Model(PeakFunctions.gauss_lorentz, prefix=prefix)
+            params.add(f'{prefix}amplitude', value=height, min=height_min, max=height_max, vary=height_vary)
+            params.add(f'{prefix}center', value=center, min=center_min, max=center_max, vary=center_vary)
+            params.add(f'{prefix}fwhm', value=fwhm, min=fwhm_min, max=fwhm_max, vary=fwhm_vary)
+            params.add(f'{prefix}fraction', value=lg_ratio, min=lg_ratio_min, max=lg_ratio_max, vary=lg_ratio_vary)
+
+        elif peak_model_choice == "SGL (Height)":
+            peak_model = lmfit.Model(PeakFunctions.S_gauss_lorentz, prefix=prefix)
+            params.add(f'{prefix}amplitude', value=height, min=height_min, max=height_max, vary=height_vary)
+            params.add(f'{prefix}center', value=center, min=center_min, max=center_max, vary=center_vary)
+            params.add(f'{prefix}fwhm', value=fwhm, min=fwhm_min, max=fwhm_max, vary=fwhm_vary)
+            params.add(f'{prefix}fraction', value=lg_ratio, min=lg_ratio_min, max=lg_ratio_max, vary=lg_ratio_vary)
+
+        else:
+            raise ValueError(f"Unknown fitting model: {peak_model_choice} for peak {i}")
+
+        if model is None:
+            model = peak_model
+        else:
+            model += peak_model
+
+    return model, params
+
+
+# FIT ---------------------------------------------------------------------------
+
+def fit_mask(problem):
+    """Mask of the points inside the background range of the problem."""
+    x_values = problem.x
+    try:
+        bg_min_energy = float(problem.bkg_low)
+        bg_max_energy = float(problem.bkg_high)
+    except (ValueError, TypeError):
+        bg_min_energy = min(x_values)
+        bg_max_energy = max(x_values)
+
+    if bg_min_energy > bg_max_energy:
+        raise ValueError("Invalid background energy range")
+
+    return (x_values >= bg_min_energy) & (x_values <= bg_max_energy)
+
+
+def jacobian_sparsity(params, x_values, width=8):
+    """
+    Sparsity pattern of the fit Jacobian: each varying parameter only changes the points of its own peak.
+
+    Args:
+        params (lmfit.Parameters): Parameters from build_model, prefixed peak0_, peak1_, ...
+        x_values (numpy.ndarray): Energies of the fitted points
+        width (float): Half width of the window kept around each peak center, in FWHM
+
+    Returns:
+        scipy.sparse.csr_matrix: (points x varying parameters) pattern, in lmfit's varying-parameter order
+    """
+    var_names = [name for name, par in params.items() if par.vary and par.expr is None]
+    pattern = np.zeros((len(x_values), len(var_names)), dtype=bool)
+
+    windows = {}
+    for col, name in enumerate(var_names):
+        prefix = name.split('_')[0] + '_'
+        if prefix not in windows:
+            center = params[f'{prefix}center'].value
+            if f'{prefix}fwhm' in params:
+                fwhm = params[f'{prefix}fwhm'].value
+            else:
+                # Voigt and Pseudo-Voigt: Gaussian plus Lorentzian width is an upper bound of the FWHM
+                fwhm = 2.355 * params[f'{prefix}sigma'].value
+                if f'{prefix}gamma' in params:
+                    fwhm += 2 * params[f'{prefix}gamma'].value
+            windows[prefix] = np.abs(x_values - center) <= width * abs(fwhm)
+        pattern[:, col] = windows[prefix]
+
+    return csr_matrix(pattern)
+
+
+def _least_squares_sparse(vectorized_model, params, data, sparsity, max_nfev, fit_kws, analytic=False):
+    """
+    Run scipy least_squares with a Jacobian sparsity pattern on lmfit Parameters, as lmfit.minimize would.
+
+    With analytic, the Jacobian comes from VectorizedPeakModel.sparse_jacobian on the pattern, otherwise from
+    finite differences grouped by the pattern.
+    """
+    params = params.copy()
+    var_names = [name for name, par in params.items() if par.vary and par.expr is None]
+    start = [params[name].value for name in var_names]
+    lower = [-np.inf if params[name].min is None else params[name].min for name in var_names]
+    upper = [np.inf if params[name].max is None else params[name].max for name in var_names]
+    nfev = [0]
+
+    def set_values(values):
+        for name, value in zip(var_names, values):
+            params[name].value = value
+        params.update_constraints()
+
+    def residual(values):
+        nfev[0] += 1
+        set_values(values)
+        return vectorized_model.residual(params, data)
+
+    def jacobian(values):
+        set_values(values)
+        # The residual is data - model
+        return -vectorized_model.sparse_jacobian(params, sparsity)
+
+    jac_kws = {'jac': jacobian} if analytic else {'jac_sparsity': sparsity}
+    # lsmr needs tight tolerances and no regularization to reach the same minimum as the dense solver
+    ret = least_squares(residual, start, bounds=(lower, upper), method='trf', tr_solver='lsmr', x_scale='jac',
+                        ftol=fit_kws['ftol'], xtol=fit_kws['xtol'], max_nfev=max_nfev,
+                        tr_options={'atol': 1e-12, 'btol': 1e-12, 'regularize': False}, **jac_kws)
+
+    fun = residual(ret.x)
+    nfev[0] -= 1
+    chisqr = float(np.sum(fun ** 2))
+    nfree = max(1, len(fun) - len(var_names))
+    redchi = chisqr / nfree
+
+    # Same scaled covariance as lmfit, for the stderr of each varying parameter
+    for name in params:
+        params[name].stderr = None
+    try:
+        hess = (ret.jac.T @ ret.jac).toarray()
+        covar = np.linalg.inv(hess) * redchi
+        for name, variance in zip(var_names, np.diag(covar)):
+            params[name].stderr = float(np.sqrt(variance)) if variance >= 0 else None
+    except np.linalg.LinAlgError:
+        pass
+
+    return lmfit.minimizer.MinimizerResult(params=params, chisqr=chisqr, redchi=redchi, nfev=nfev[0],
+                                           success=ret.success, message=ret.message, residual=fun)
+
+
+def fit(problem):
+    """
+    Fit every peak of the problem to the background-subtracted data.
+
+    Args:
+        problem (FitProblem): Data, background, peaks and optimiser settings of one core level
+
+    Returns:
+        FitResult: Fitted peak values and fit statistics, or None if the peaks use a model that is not fitted
+    """
+    x_values, y_values, background = problem.x, problem.y, problem.background
+
+    mask = fit_mask(problem)
+    x_values_filtered = x_values[mask]
+    y_values_filtered = y_values[mask]
+    background_filtered = background[mask]
+
+    if len(x_values_filtered) == 0:
+        raise ValueError("No data points found in the specified energy range for background subtraction")
+
+    y_values_subtracted = y_values_filtered - background_filtered
+
+    model, params = build_model(problem)
+    if model is None:
+        return None
+
+    optimization_method = problem.method
+    # Define fit_kws only for methods that support it
+    if optimization_method in ['leastsq', 'least_squares']:
+        fit_kws = {'ftol': 1e-10, 'xtol': 1e-10}
+    else:
+        fit_kws = None  # Don't pass fit_kws for 'nelder', 'powell', or 'cobyla'
+
+    # The vectorized model is only built for the engine that fits with it, or for its analytic Jacobian
+    use_jacobian = bool(fit_kws) and problem.analytic_jacobian
+    vectorized_model = None
+    if problem.engine == 'vectorized' or use_jacobian:
+        vectorized_model = VectorizedPeakModel(problem.peaks, x_values_filtered)
+
+    # Analytic derivatives replace the (n_params + 1) model evaluations of each finite-difference Jacobian
+    jacobian = vectorized_model.jacobian_function(params) if use_jacobian else None
+    if jacobian is not None:
+        # Both engines minimize data - model, the opposite sign of the model derivatives
+        fit_kws['Dfun'] = lambda fit_params, *args, **kws: -jacobian(fit_params)
+
+    # Many-peak fits can differentiate only the points near each peak, analytically or by finite differences
+    sparsity = None
+    if problem.sparse_jacobian_width and optimization_method == 'least_squares':
+        sparsity = jacobian_sparsity(params, x_values_filtered, problem.sparse_jacobian_width)
+        # Overlapping peaks leave nothing to skip, and the sparse solver is slower than the dense one
+        if sparsity.nnz > 0.5 * sparsity.shape[0] * sparsity.shape[1]:
+            sparsity = None
+    sparse = sparsity is not None
+
+    if sparse:
+        if vectorized_model is None:
+            vectorized_model = VectorizedPeakModel(problem.peaks, x_values_filtered)
+        # Sparse Jacobian (analytic, or grouped finite differences) and a sparse trust-region solve. lmfit
+        # densifies the Jacobian, so this goes to scipy directly with the vectorized model
+        result = _least_squares_sparse(vectorized_model, params, y_values_subtracted, sparsity, problem.max_nfev,
+                                       fit_kws, analytic=jacobian is not None)
+        best_fit = vectorized_model.eval(result.params)
+    elif problem.engine == 'vectorized':
+        # Same Parameters, one broadcast call per profile type instead of the CompositeModel tree
+        result = lmfit.minimize(
+            vectorized_model.residual,
+            params,
+            args=(y_values_subtracted,),
+            method=optimization_method,
+            max_nfev=problem.max_nfev,
+            scale_covar=True,
+            nan_policy='omit',
+            **(fit_kws or {})
+        )
+        best_fit = vectorized_model.eval(result.params)
+    else:
+        result = model.fit(
+            y_values_subtracted,
+            params,
+            x=x_values_filtered,
+            max_nfev=problem.max_nfev,
+            method=optimization_method,
+            weights=np.ones(len(y_values_filtered)),
+            scale_covar=True,
+            nan_policy='omit',
+            verbose=True,
+            **({'fit_kws': fit_kws} if fit_kws else {})
+        )
+        best_fit = result.best_fit
+
+    residuals = y_values_subtracted - best_fit
+    ss_res = np.sum(residuals ** 2)
+    ss_tot = np.sum((y_values_subtracted - np.mean(y_values_subtracted)) ** 2)
+    r_squared = 1 - (ss_res / ss_tot)
+
+    fitted_peaks = {}
+    la_fit = None
+    for i, spec in enumerate(problem.peaks):
+        fitted = _fitted_peak_values(result.params, f'peak{i}_', spec, x_values)
+        if 'y_values' in fitted:
+            # LA peaks are summed on the fitted range for the RSD
+            la_fit = (0 if la_fit is None else la_fit) + fitted['y_values'][mask]
+        fitted_peaks[spec.label] = fitted
+
+    if la_fit is not None:
+        rsd = round(PeakFunctions.calculate_rsd(y_values_filtered, la_fit + background_filtered), 3)
+    else:
+        rsd = round(PeakFunctions.calculate_rsd(y_values_filtered, best_fit + background_filtered), 3)
+
+    fitted_peak = y_values.copy()
+    fitted_peak[mask] = best_fit + background_filtered
+
+    return FitResult(
+        sheet_name=problem.sheet_name,
+        peaks=fitted_peaks,
+        params={name: (param.value, param.stderr) for name, param in result.params.items()},
+        mask=mask,
+        best_fit=np.asarray(best_fit),
+        background_filtered=background_filtered,
+        y_values_subtracted=y_values_subtracted,
+        fitted_peak=fitted_peak,
+        r_squared=r_squared,
+        chi_square=result.chisqr,
+        red_chi_square=result.redchi,
+        rsd=rsd,
+        nfev=result.nfev,
+        success=bool(result.success),
+        message=str(result.message)
+    )
+
+
+def _init_worker():
+    """Pool initializer of fit_many: one BLAS / OpenMP thread per worker process."""
+    for variable in WORKER_THREAD_VARIABLES:
+        os.environ[variable] = '1'
+    # The variables only reach libraries not loaded yet, threadpoolctl (when installed) also limits loaded ones
+    try:
+        from threadpoolctl import threadpool_limits
+    except ImportError:
+        return
+    threadpool_limits(limits=1)
+
+
+def fit_many(problems, max_workers=None, on_result=None, on_wait=None):
+    """
+    Fit several core levels at once in a pool of worker processes.
+
+    Args:
+        problems (list): FitProblem of each core level to fit
+        max_workers (int): Number of worker processes, os.cpu_count() if None
+        on_result (callable): Called in the calling process as on_result(sheet_name, result, error) as soon as
+            each fit finishes, so the GUI can merge results while the slower fits are still running
+        on_wait (callable): Called in the calling process every WAIT_INTERVAL seconds while waiting for the
+            workers (and after each fit when fitting in the calling process), so the GUI can stay responsive
+
+    Returns:
+        tuple: (results, errors) dicts keyed by sheet name. results holds the FitResult (or None for unfitted
+            models), errors the exception raised by the fits that failed
+    """
+    results = {}
+    errors = {}
+    if not problems:
+        return results, errors
+
+    workers = min(max_workers or os.cpu_count() or 1, len(problems))
+
+    def collect(sheet_name, result, error):
+        if error is None:
+            results[sheet_name] = result
+        else:
+            errors[sheet_name] = error
+        if on_result is not None:
+            on_result(sheet_name, result, error)
+
+    if workers == 1:
+        # No point paying the process start-up for a single fit
+        for problem in problems:
+            try:
+                collect(problem.sheet_name, fit(problem), None)
+            except Exception as e:
+                collect(problem.sheet_name, None, e)
+            if on_wait is not None:
+                on_wait()
+        return results, errors
+
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker) as executor:
+        futures = {executor.submit(fit, problem): problem.sheet_name for problem in problems}
+        pending = set(futures)
+        while pending:
+            done, pending = wait(pending, timeout=WAIT_INTERVAL, return_when=FIRST_COMPLETED)
+            for future in done:
+                try:
+                    collect(futures[future], future.result(), None)
+                except Exception as e:
+                    collect(futures[future], None, e)
+            if on_wait is not None:
+                on_wait()
+
+    return results, errors
+
+
+def _fitted_peak_values(result_params, prefix, spec, x_values):
+    """Convert the fitted lmfit parameters of one peak to the values shown in the grid and stored in Data."""
+    peak_model_choice = spec.model
+    center = result_params[f'{prefix}center'].value
+    fwhm_g = spec.fwhm_g if spec.fwhm_g is not None else 0.64
+    y_values = None
+
+    # Start values of sigma and gamma, reported for the models that do not fit them
+    sigma = spec.fwhm / (2 * np.sqrt(2 * np.log(2)))
+    gamma = spec.lg_ratio / 100 * sigma
+
+    if peak_model_choice in VOIGT_MODELS:
+        amplitude = result_params[f'{prefix}amplitude'].value
+        sigma = result_params[f'{prefix}sigma'].value
+        gamma = result_params[f'{prefix}gamma'].value
+        height = PeakFunctions.get_voigt_height(amplitude, sigma, gamma)
+        fwhm = PeakFunctions.voigt_fwhm(sigma, gamma)
+        fraction = (2 * gamma) / (sigma * 2.355 + 2 * gamma) * 100
+        area = amplitude
+    elif peak_model_choice == "Pseudo-Voigt (Area)":
+        amplitude = result_params[f'{prefix}area'].value
+        sigma = result_params[f'{prefix}sigma'].value
+        fraction = result_params[f'{prefix}fraction'].value * 100
+        fwhm = sigma * 2
+        height = PeakFunctions.get_pseudo_voigt_height(amplitude, sigma, fraction)
+        area = amplitude
+    elif peak_model_choice == "ExpGauss.(Area, \u03c3, \u03b3)":
+        amplitude = result_params[f'{prefix}amplitude'].value
+        sigma = result_params[f'{prefix}sigma'].value
+        gamma = result_params[f'{prefix}gamma'].value
+        # Calculate height and FWHM numerically
+        curve = peak_evaluator.evaluate(peak_model_choice, x_values, center, area=amplitude, sigma=sigma, gamma=gamma)
+        height = np.max(curve)
+        half_max = height / 2
+        indices = np.where(curve >= half_max)[0]
+        if len(indices) >= 2:
+            fwhm = abs(x_values[indices[-1]] - x_values[indices[0]])
+        else:
+            fwhm = 0
+        fraction = gamma / (sigma + gamma) * 100
+        area = amplitude  # For area-based models, amplitude represents the area
+    elif peak_model_choice == "LA (Area, \u03c3, \u03b3)":
+        area = result_params[f'{prefix}amplitude'].value
+        fwhm = result_params[f'{prefix}fwhm'].value
+        sigma = result_params[f'{prefix}sigma'].value
+        gamma = result_params[f'{prefix}gamma'].value
+        # Calculate height numerically
+        y_values = peak_evaluator.evaluate(peak_model_choice, x_values, center, area=area, fwhm=fwhm, sigma=sigma,
+                                           gamma=gamma)
+        height = np.max(y_values)
+        # No direct equivalent to 'fraction' for LA model
+        fraction = sigma / (sigma + gamma)
+    elif peak_model_choice == "LA (Area, \u03c3/\u03b3, \u03b3)":
+        area = result_params[f'{prefix}amplitude'].value
+        fwhm = result_params[f'{prefix}fwhm'].value
+        sigma = result_params[f'{prefix}sigma'].value
+        gamma = result_params[f'{prefix}gamma'].value
+        fraction = result_params[f'{prefix}fraction'].value / 100
+        y_values = peak_evaluator.evaluate(peak_model_choice, x_values, center, area=area, fwhm=fwhm, sigma=sigma,
+                                           gamma=gamma)
+        height = np.max(y_values)
+    elif peak_model_choice == "LA*G (Area, \u03c3/\u03b3, \u03b3)":
+        area = result_params[f'{prefix}amplitude'].value
+        fwhm = result_params[f'{prefix}fwhm'].value
+        sigma = result_params[f'{prefix}sigma'].value
+        gamma = result_params[f'{prefix}gamma'].value
+        fraction = result_params[f'{prefix}fraction'].value / 100
+        fwhm_g = result_params[f'{prefix}fwhm_g'].value
+        y_values = peak_evaluator.evaluate(peak_model_choice, x_values, center, area=area, fwhm=fwhm, sigma=sigma,
+                                           gamma=gamma, fwhm_g=fwhm_g)
+        height = np.max(y_values)
+    elif peak_model_choice in ["GL (Height)", "SGL (Height)"]:
+        height = result_params[f'{prefix}amplitude'].value
+        fwhm = result_params[f'{prefix}fwhm'].value
+        fraction = result_params[f'{prefix}fraction'].value
+        area = height * fwhm * np.sqrt(np.pi / (4 * np.log(2)))
+    elif peak_model_choice in ["GL (Area)", "SGL (Area)"]:
+        area = result_params[f'{prefix}area'].value
+        fwhm = result_params[f'{prefix}fwhm'].value
+        fraction = result_params[f'{prefix}fraction'].value
+        height = area / (fwhm * np.sqrt(np.pi / (4 * np.log(2))))
+    else:
+        raise ValueError(f"Unknown fitting model: {peak_model_choice} for peak {spec.label}")
+
+    center = round(float(center), 2)
+    height = round(float(height), 2)
+    fwhm = round(float(fwhm), 2)
+    if peak_model_choice in ["ExpGauss.(Area, \u03c3, \u03b3)"] + LA_MODELS:
+        sigma = round(float(sigma * 1), 2)
+        gamma = round(float(gamma * 1), 2)
+        fraction = round(fraction * 100, 2)
+    else:
+        sigma = round(float(sigma * 2.355), 2)
+        gamma = round(float(gamma * 2), 2)
+        fraction = round(float(fraction), 2)
+    area = round(float(area), 2)
+    fwhm_g = round(float(fwhm_g), 2)
+
+    fitted = {
+        'Position': center,
+        'Height': height,
+        'FWHM': fwhm,
+        'L/G': fraction,
+        'Area': area,
+        'Sigma': sigma,
+        'Gamma': gamma,
+        'fwhm_g': fwhm_g,
+        'Skew': fwhm_g,
+        'Fitting Model': peak_model_choice
+    }
+    if y_values is not None:
+        # FOR RSD calc
+        fitted['y_values'] = y_values
+    return fitted
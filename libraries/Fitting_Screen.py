@@ -826,7 +826,7 @@ class FittingWindow(wx.Frame):
                     mask = (x_values >= min(bg_low, bg_high)) & (x_values <= max(bg_low, bg_high))
                     background[mask] = raw_data[mask]
 
-                    core_level_data['Background']['Bkg Y'] = background.tolist()
+                    core_level_data['Background']['Bkg Y'] = background
                     self.parent.background = background
                     self.parent.clear_and_replot()
 
@@ -1074,25 +1074,21 @@ class TougaardFitWindow(wx.Frame):
             print("Error: No data points in fitting range")
             return
 
+        baseline = y_full[-1]
+        y_shifted = y_full - baseline
+        fit_indices = np.where(fit_mask)[0]
+
+        # The background is linear in each B, so only the unit-B response of each (C, D) pair is computed
+        # and cached; residual calls that only move B coefficients reuse it.
+        loss_response = BackgroundCalculations.tougaard_response_cache(x_full, y_shifted, fit_indices)
+
         def tougaard_model(params, x_full, y_full, x_fit, y_fit):
-            baseline = y_full[-1]
-            y_shifted = y_full - baseline
-            dx = np.mean(np.diff(x_full))
-            background_full = np.zeros_like(y_full)
-
-            for i in range(len(x_full)):
-                E = x_full[i:] - x_full[i]
-                K_total = 0
-                for j in range(len(self.tougaard_params)):
-                    B = params[f'B{j + 1}'].value
-                    C = params[f'C{j + 1}'].value
-                    D = params[f'D{j + 1}'].value
-                    K_total += B * E / ((C - E ** 2) ** 2 + D * E ** 2)
-                background_full[i] = np.trapz(K_total * y_shifted[i:], dx=dx)
-
-            background_full += baseline
-            fit_indices = np.where(fit_mask)[0]
-            background_fit = background_full[fit_indices]
+            background_fit = np.full(len(x_fit), baseline, dtype=float)
+            for j in range(len(self.tougaard_params)):
+                B = params[f'B{j + 1}'].value
+                C = params[f'C{j + 1}'].value
+                D = params[f'D{j + 1}'].value
+                background_fit += B * loss_response(C, D)
             return y_fit - background_fit
 
         result = lmfit.minimize(tougaard_model,
@@ -1147,17 +1143,11 @@ class TougaardFitWindow(wx.Frame):
         # Plot each Tougaard background
         colors = plt.cm.tab10(np.linspace(0, 1, len(self.tougaard_params)))
         for j, color in enumerate(colors):
-            background = np.zeros_like(y_bg) + baseline
-            y_shifted = y_bg - baseline
-            dx = np.mean(np.diff(x_bg))
-
-            for i in range(len(x_bg)):
-                E = x_bg[i:] - x_bg[i]
-                B = fitted_params[f'B{j + 1}'].value
-                C = fitted_params[f'C{j + 1}'].value
-                D = fitted_params[f'D{j + 1}'].value
-                K = B * E / ((C - E ** 2) ** 2 + D * E ** 2)
-                background[i] += np.trapz(K * y_shifted[i:], dx=dx)
+            B = fitted_params[f'B{j + 1}'].value
+            C = fitted_params[f'C{j + 1}'].value
+            D = fitted_params[f'D{j + 1}'].value
+            background = baseline + B * BackgroundCalculations.calculate_tougaard_loss_response(
+                x_bg, y_bg - baseline, C, D)
 
             # background += baseline
             total_background += (background - baseline)
@@ -0,0 +1,234 @@
+# libraries/Line_Library.py
+
+# The XPS line library (KherveFitting_library.json): position, doublet splitting and RSF of every core level and
+# Auger line, for each instrument. load_library reads it once per process and keeps it in memory, so exports and
+# windows looking up RSFs never touch the disk again. The parsed library is also kept in a binary cache file next
+# to the JSON, valid as long as the JSON keeps the same modification time and size, so later starts skip the JSON
+# parsing. LineLibrary gives lookups by (element, orbital, instrument) and, per instrument, the lines sorted by
+# position for range queries.
+
+import json
+import os
+import pickle
+
+import numpy as np
+
+LIBRARY_FILE = 'KherveFitting_library.json'
+# Bumped when the layout of the cache file changes, older cache files are then rebuilt
+CACHE_VERSION = 1
+
+# Libraries already loaded in this process, by absolute path of the JSON
+_libraries = {}
+
+# Lines of the survey identification: Auger lines are the ones with a C-Any entry (a kinetic energy), core levels
+# use their Al Ka entry (or the first instrument they have) and are merged by main orbital, lines below 20 eV skipped
+AUGER_INSTRUMENT = 'C-Any'
+CORE_LEVEL_INSTRUMENT = 'C-Al1486'
+SURVEY_ORBITALS = ('1s', '2s', '2p', '3s', '3p', '3d', '4s', '4p', '4d', '4f', '5s', '5p', '5d', '5f')
+MIN_SURVEY_ENERGY = 20
+
+
+class LineLibrary:
+    """
+    The line library in memory. data is the {(element, orbital): {instrument: entry}} dict load_library_data always
+    gave, entry being {'position', 'ds', 'rsf', 'row'}. Equal entries are shared, data is meant to be read only.
+    """
+
+    def __init__(self, data):
+        self.data = data
+        self.instruments = sorted({instrument for entries in data.values() for instrument in entries})
+        self._be_indexes = {}
+        self._survey_indexes = {}
+
+    def get(self, element, orbital, instrument):
+        """Entry of a line for an instrument, None if the library does not have it."""
+        entries = self.data.get((element, orbital))
+        return entries.get(instrument) if entries is not None else None
+
+    def rsf(self, element, orbital, instrument, default=None):
+        """RSF of a line for an instrument, default if the library does not have it."""
+        entry = self.get(element, orbital, instrument)
+        return entry['rsf'] if entry is not None else default
+
+    def be_index(self, instrument):
+        """
+        Lines of an instrument sorted by position, built on first use.
+
+        Returns:
+            tuple: (positions, lines), positions a sorted float64 array and lines the (element, orbital) of each
+        """
+        index = self._be_indexes.get(instrument)
+        if index is None:
+            found = sorted((float(entries[instrument]['position']), key) for key, entries in self.data.items()
+                           if isinstance(entries.get(instrument, {}).get('position'), (int, float)))
+            positions = np.array([position for position, _ in found], dtype=np.float64)
+            positions.setflags(write=False)
+            index = self._be_indexes[instrument] = (positions, [key for _, key in found])
+        return index
+
+    def lines_between(self, low, high, instrument):
+        """
+        Lines of an instrument positioned between low and high (both included), by position.
+
+        Returns:
+            list: (position, element, orbital) of each line
+        """
+        positions, lines = self.be_index(instrument)
+        start = np.searchsorted(positions, low, side='left')
+        end = np.searchsorted(positions, high, side='right')
+        return [(float(positions[i]), *lines[i]) for i in range(start, end)]
+
+    def survey_index(self, photons):
+        """
+        Core level and Auger lines of every element in binding energy, sorted, for one photon energy (Auger kinetic
+        energies are converted with it). Built once per photon energy.
+
+        Returns:
+            SurveyIndex: The lines sorted by binding energy, and per element
+        """
+        index = self._survey_indexes.get(photons)
+        if index is None:
+            index = self._survey_indexes[photons] = SurveyIndex(self.data, photons)
+        return index
+
+    def element_transitions(self, element, photons):
+        """Survey lines of an element as sorted (name, binding energy) pairs, see survey_index."""
+        return self.survey_index(photons).element_transitions(element)
+
+
+class SurveyIndex:
+    """
+    Survey lines of the library in binding energy. be, elements, names, rsf and auger are parallel, sorted by
+    binding energy so lines in a range are found by binary search. names are the lower case main orbitals
+    ('2p') or Auger series ('kll').
+    """
+
+    def __init__(self, data, photons):
+        lines = {}
+        for (element, orbital), entries in data.items():
+            is_auger = AUGER_INSTRUMENT in entries
+            if is_auger:
+                instrument = AUGER_INSTRUMENT
+            else:
+                instrument = CORE_LEVEL_INSTRUMENT if CORE_LEVEL_INSTRUMENT in entries else next(iter(entries))
+            entry = entries[instrument]
+            if 'position' not in entry or float(entry['position']) < MIN_SURVEY_ENERGY:
+                continue
+
+            orbital_lower = orbital.lower()
+            if is_auger:
+                lines[(element, orbital_lower)] = (photons - float(entry['position']), 0.0, True)
+            else:
+                # The highest energy component of a main orbital gives its position (2p1/2 for 2p), the largest
+                # RSF (the whole orbital) its intensity
+                main_orbital = ''.join([c for c in orbital_lower if c.isalpha() or c.isdigit()])[:2]
+                if main_orbital in SURVEY_ORBITALS:
+                    energy = float(entry['position'])
+                    rsf = float(entry['rsf']) if entry.get('rsf') else 0.0
+                    current = lines.get((element, main_orbital))
+                    if current is None:
+                        lines[(element, main_orbital)] = (energy, rsf, False)
+                    else:
+                        lines[(element, main_orbital)] = (max(energy, current[0]), max(rsf, current[1]), False)
+
+        ordered = sorted(lines.items(), key=lambda item: item[1][0])
+        self.be = np.array([be for _, (be, _, _) in ordered], dtype=np.float64)
+        self.rsf = np.array([rsf for _, (_, rsf, _) in ordered], dtype=np.float64)
+        self.auger = np.array([auger for _, (_, _, auger) in ordered], dtype=bool)
+        self.elements = [element for (element, _), _ in ordered]
+        self.names = [name for (_, name), _ in ordered]
+        for array in (self.be, self.rsf, self.auger):
+            array.setflags(write=False)
+
+        self._by_element = {}
+        for i, element in enumerate(self.elements):
+            self._by_element.setdefault(element, []).append(i)
+
+    def element_transitions(self, element):
+        """Lines of an element as (name, binding energy) pairs, by binding energy."""
+        return [(self.names[i], float(self.be[i])) for i in self._by_element.get(element, [])]
+
+    def element_lines(self, element):
+        """Indices of the lines of an element, by binding energy."""
+        return self._by_element.get(element, [])
+
+    def rsf_values(self, element, orbitals):
+        """RSF of the named lines of an element ('2p', 'kll'), in the order given, names it has no line for left out."""
+        rsf_by_name = {self.names[i]: float(self.rsf[i]) for i in self.element_lines(element)}
+        return [rsf_by_name[orbital.lower()] for orbital in orbitals if orbital.lower() in rsf_by_name]
+
+    def near(self, energies, tolerance):
+        """
+        Lines within tolerance of each energy, for all energies at once.
+
+        Args:
+            energies (np.ndarray): Binding energies to look lines up for
+            tolerance (float): Largest distance in eV
+
+        Returns:
+            tuple: (start, end) index arrays, the lines of energies[i] are start[i]:end[i]
+        """
+        energies = np.asarray(energies, dtype=np.float64)
+        start = np.searchsorted(self.be, energies - tolerance, side='left')
+        end = np.searchsorted(self.be, energies + tolerance, side='right')
+        return start, end
+
+
+def load_library(file_path=LIBRARY_FILE):
+    """
+    The line library, read from file_path the first time it is asked for in this process.
+
+    Args:
+        file_path (str): Path of the library JSON
+
+    Returns:
+        LineLibrary: The same object on every call
+    """
+    key = os.path.abspath(file_path)
+    library = _libraries.get(key)
+    if library is None:
+        library = _libraries[key] = LineLibrary(_read_library(file_path))
+    return library
+
+
+def cache_path(file_path):
+    """Path of the binary cache of a library JSON."""
+    return os.path.splitext(file_path)[0] + '.cache'
+
+
+def _read_library(file_path):
+    stat = os.stat(file_path)
+    signature = (CACHE_VERSION, stat.st_mtime_ns, stat.st_size)
+
+    # The cache is only used if it was written from this version of the JSON
+    try:
+        with open(cache_path(file_path), 'rb') as f:
+            cached_signature, data = pickle.load(f)
+        if cached_signature == signature:
+            return data
+    except (OSError, pickle.UnpicklingError, EOFError, ValueError, TypeError):
+        pass
+
+    with open(file_path, 'r') as f:
+        json_data = json.load(f)
+
+    # Convert string keys back to tuples, equal entries (most instruments of a line) stored once. The types are
+    # part of the comparison so a position of 639 is not merged with one of 639.0
+    shared = {}
+    data = {}
+    for k, v in json_data.items():
+        element, orbital = k.split('_')
+        data[(element, orbital)] = {
+            instrument: shared.setdefault(tuple((name, type(value), value) for name, value in entry.items()), entry)
+            for instrument, entry in v.items()}
+
+    # Written next to the JSON when possible, a read only install just parses the JSON each start
+    temp_path = cache_path(file_path) + '.tmp'
+    try:
+        with open(temp_path, 'wb') as f:
+            pickle.dump((signature, data), f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(temp_path, cache_path(file_path))
+    except OSError:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+    return data
@@ -1,22 +1,26 @@
 import wx
 import os
+import sys
+import time
 import json
+import psutil
 import openpyxl
 import wx
-import re
 import pandas as pd
 import struct
 from pathlib import Path
-import shutil
-from vamas import Vamas
-from openpyxl import Workbook
 import numpy as np
-from scipy.interpolate import interp1d
 import pandas as pd
-from openpyxl.styles import Alignment
 from yadg.extractors.phi.spe import extract  # NOTE THIS LIBRARY HAS BEEN TRANSFORMED
 
-from libraries.ConfigFile import Init_Measurement_Data, add_core_level_Data
+from libraries.ConfigFile import Init_Measurement_Data, add_core_level_Data, read_workbook_core_levels
+from libraries.Project_File import load_project, project_path, PROJECT_EXTENSION
+from libraries.Line_Library import load_library
+from libraries.Spectrum_Store import adopt_spectra
+from libraries.Vamas_Reader import read_vamas, block_sheet_name, block_spectrum, write_vamas_workbook
+from libraries.Excel_Export import finish_export, schedule_export, write_spectra_workbook, unique_sheet_name
+from libraries.Spectra_Readers import (parse_avg_file, read_kal_spectra, read_spe_spectra, read_mrs_spectra,
+                                       import_many, is_importable, READERS)
 from libraries.Save import update_undo_redo_state, save_state
 from libraries.Sheet_Operations import on_sheet_selected
 from libraries.Grid_Operations import populate_results_grid
@@ -29,8 +33,16 @@ class ExcelDropTarget(wx.FileDropTarget):
 
     def OnDropFiles(self, x, y, filenames):
         from libraries.Open import open_xlsx_file, open_vamas_file
+        # Several instrument files are imported together into one project
+        importable = [file for file in filenames if is_importable(file)]
+        if len(importable) > 1:
+            wx.CallAfter(batch_import, self.window, importable)
+            return True
         for file in filenames:
-            if file.lower().endswith('.xlsx'):
+            if file.lower().endswith(PROJECT_EXTENSION):
+                wx.CallAfter(open_xlsx_file, self.window, file)
+                return True
+            elif file.lower().endswith('.xlsx'):
                 # Check if it's an Avantage file
                 try:
                     wb = openpyxl.load_workbook(file)
@@ -77,15 +89,8 @@ def load_library_data_WITHEXCEL():
 
 
 def load_library_data():
-    with open('KherveFitting_library.json', 'r') as f:
-        json_data = json.load(f)
-
-    # Convert string keys back to tuples
-    data = {}
-    for k, v in json_data.items():
-        element, orbital = k.split('_')
-        data[(element, orbital)] = v
-    return data
+    # Read once per process, later calls give the same dict without reading the file
+    return load_library().data
 
 
 def load_library_data_NEWBUTNO():
@@ -252,51 +257,19 @@ def open_spe_file2(window, file_path):
 
 def open_spe_file(window, file_path):
     try:
-        from yadg.extractors.phi.spe import extract
         import openpyxl
-        import numpy as np
-        import re
 
-        # Extract data from SPE file
-        data = extract(fn=file_path)
-
-        # Read header to get transmission coefficients
-        a, b = None, None
-        with open(file_path, 'rb') as f:
-            for line in f:
-                try:
-                    decoded_line = line.decode('utf-8', errors='ignore').strip()
-                    if b'SOFH\n' in line:
-                        continue
-                    if 'IntensityCalCoeff:' in decoded_line:
-                        _, coeffs = decoded_line.split(':', 1)
-                        a, b = map(float, coeffs.strip().split())
-                        break
-                except:
-                    continue
-
-        if a is None or b is None:
-            a, b = 31.826, 0.229  # Default values if not found
+        # Core levels of the SPE file, with their transmission from the header coefficients
+        spectra = read_spe_spectra(file_path)
 
         # Create new Excel workbook
         wb = openpyxl.Workbook()
         wb.remove(wb.active)
 
         # Process each core level
-        for core_level in data:
+        for core_level, spectrum in spectra:
             ws = wb.create_sheet(title=core_level)
 
-            # Get energy values (currently in BE)
-            energy = data[core_level].coords["E"].values
-            intensity = data[core_level].data_vars["y"].values
-
-            # Calculate KE for transmission function
-            ke_values = 1486.6 - energy  # Using Al Ka
-            transmission = a * np.power(ke_values, -b)
-
-            # Calculate corrected intensity
-            corrected_intensity = intensity / transmission
-
             # Set column headers
             ws["A1"] = "BE"
             ws["B1"] = "Corrected Data"
@@ -304,8 +277,8 @@ def open_spe_file(window, file_path):
             ws["D1"] = "Transmission"
 
             # Fill data
-            for i, (e, corr_i, raw_i, trans) in enumerate(zip(energy, corrected_intensity, intensity, transmission),
-                                                          start=2):
+            columns = zip(spectrum['x'], spectrum['corrected'], spectrum['raw'], spectrum['transmission'])
+            for i, (e, corr_i, raw_i, trans) in enumerate(columns, start=2):
                 ws[f"A{i}"] = float(e)
                 ws[f"B{i}"] = float(corr_i)
                 ws[f"C{i}"] = float(raw_i)
@@ -396,47 +369,10 @@ def import_mrs_file(window):
         wb = Workbook()
         wb.remove(wb.active)
 
-        raw_data = []
-        be_start = None
-        be_end = None
-        step_size = None
-
-        with open(file_path, 'r') as f:
-            lines = f.readlines()
-
-        # Extract metadata and data block
-        in_data_section = False
-        delimiter_count = 0  # Track the number of "!" encountered
-
-        for line in lines:
-            if line.strip() == "!":
-                delimiter_count += 1
-                if delimiter_count == 2:  # Stop processing after the second "!"
-                    break
-                in_data_section = True
-                continue
-
-            if in_data_section and line.strip().isdigit():
-                raw_data.append(int(line.strip()))
-
-            # Parse metadata
-            if 'lo_be=' in line:
-                be_start = float(line.split('=')[1].strip())
-            elif 'up_be=' in line:
-                be_end = float(line.split('=')[1].strip())
-
-        # Calculate step size if not directly provided
-        if be_start is not None and be_end is not None:
-            step_size = (be_end - be_start) / (len(raw_data) - 1)
-
-        if be_start is None or (be_end is None and step_size is None):
-            raise ValueError("Missing essential metadata: 'lo_be', 'up_be', or step size.")
-
-        # Compute BE scale
-        be_values = [be_start + i * step_size for i in range(len(raw_data))]
+        # BE scale from the 'lo_be' and 'up_be' of the file
+        sheet_name, spectrum = read_mrs_spectra(file_path)[0]
 
         # Create Excel sheet
-        sheet_name = os.path.splitext(os.path.basename(file_path))[0]
         ws = wb.create_sheet(sheet_name)
 
         # Add headers
@@ -444,7 +380,7 @@ def import_mrs_file(window):
         ws['B1'] = 'Raw Data'
 
         # Add data
-        for i, (be, intensity) in enumerate(zip(be_values, raw_data), start=2):
+        for i, (be, intensity) in enumerate(zip(spectrum['x'].tolist(), spectrum['raw'].tolist()), start=2):
             ws[f'A{i}'] = be
             ws[f'B{i}'] = intensity
 
@@ -550,28 +486,11 @@ def import_avantage_file(window):
     open_xlsx_file(window, new_file_path)
 
 
-def parse_avg_file(file_path):
-    with open(file_path, 'r') as file:
-        content = file.read()
-
-    photon_energy = float(re.search(r'DS_SOPROPID_ENERGY\s+:\s+VT_R4\s+=\s+(\d+\.\d+)', content).group(1))
-    start_energy, width, num_points = map(float, re.search(r'\$SPACEAXES=1\s+0=\s+(\d+\.\d+),\s+(\d+\.\d+),\s+(\d+),',
-                                                           content).groups())
-
-    # Modified part to handle multiple numbers per line
-    y_values = []
-    for match in re.findall(r'LIST@\s+\d+=\s+([\d., ]+)', content):
-        values = [float(val.strip()) for val in match.split(',')]
-        y_values.extend(values)
-
-    return photon_energy, start_energy, width, int(num_points), y_values
-
-
 def create_excel_from_avg(avg_file_path):
     sheet_name = os.path.basename(avg_file_path).split()[0]
     photon_energy, start_energy, width, num_points, y_values = parse_avg_file(avg_file_path)
 
-    be_values = [photon_energy - (start_energy + i * width) for i in range(num_points)]
+    be_values = photon_energy - (start_energy + np.arange(num_points) * width)
 
     df = pd.DataFrame({
         'BE': be_values,
@@ -603,64 +522,190 @@ def open_avg_file(window):
 
 
 def import_multiple_avg_files(window):
-    with wx.DirDialog(window, "Choose a directory containing AVG files",
-                      style=wx.DD_DEFAULT_STYLE | wx.DD_DIR_MUST_EXIST) as dirDialog:
+    """Import all the AVG files of a folder into one project, see batch_import_folder_dialog."""
+    batch_import_folder_dialog(window, extensions=('.avg',))
 
-        if dirDialog.ShowModal() == wx.ID_CANCEL:
+
+def batch_import_files_dialog(window):
+    """Choose instrument files (VAMAS, AVG, Kratos, PHI, MRS) and import them together into one project."""
+    patterns = ";".join(f"*{extension}" for extension in READERS)
+    with wx.FileDialog(window, "Batch Import Files", wildcard=f"Instrument files ({patterns})|{patterns}",
+                       style=wx.FD_OPEN | wx.FD_FILE_MUST_EXIST | wx.FD_MULTIPLE) as fileDialog:
+        if fileDialog.ShowModal() == wx.ID_CANCEL:
             return
+        file_paths = fileDialog.GetPaths()
+    batch_import(window, sorted(file_paths))
 
-        folder_path = dirDialog.GetPath()
 
-    try:
-        avg_files = [f for f in os.listdir(folder_path) if f.lower().endswith('.avg')]
+def batch_import_folder_dialog(window, extensions=None):
+    """
+    Choose a folder and import all its instrument files together into one project, saved as <folder>.xlsx in it.
 
-        if not avg_files:
-            wx.MessageBox("No AVG files found in the selected folder.", "Information", wx.OK | wx.ICON_INFORMATION)
+    Args:
+        window: The main application window object.
+        extensions (tuple): File extensions to import, all the supported ones if None
+    """
+    with wx.DirDialog(window, "Choose a directory containing the files to import",
+                      style=wx.DD_DEFAULT_STYLE | wx.DD_DIR_MUST_EXIST) as dirDialog:
+        if dirDialog.ShowModal() == wx.ID_CANCEL:
             return
+        folder_path = dirDialog.GetPath()
 
-        folder_name = os.path.basename(folder_path)
-        excel_file_path = os.path.join(folder_path, f"{folder_name}.xlsx")
+    extensions = tuple(extensions or READERS)
+    file_paths = [os.path.join(folder_path, f) for f in sorted(os.listdir(folder_path))
+                  if f.lower().endswith(extensions)]
+    if not file_paths:
+        wx.MessageBox("No files to import found in the selected folder.", "Information",
+                      wx.OK | wx.ICON_INFORMATION)
+        return
 
-        with pd.ExcelWriter(excel_file_path) as writer:
-            for avg_file in avg_files:
-                avg_file_path = os.path.join(folder_path, avg_file)
-                sheet_name = os.path.splitext(avg_file)[0]  # Use file name without extension as sheet name
+    folder_name = os.path.basename(folder_path)
+    batch_import(window, file_paths, os.path.join(folder_path, f"{folder_name}.xlsx"))
 
-                photon_energy, start_energy, width, num_points, y_values = parse_avg_file(avg_file_path)
-                be_values = [photon_energy - (start_energy + i * width) for i in range(num_points)]
 
-                df = pd.DataFrame({
-                    'BE': be_values,
-                    'Intensity': y_values[:num_points]
-                })
+def batch_import(window, file_paths, excel_path=None):
+    """
+    Import several instrument files into one project. The files are read in a pool of worker processes, with a
+    progress dialog that can cancel the import, and every spectrum they hold becomes a core level of a new
+    window.Data, in the order of file_paths. Nothing changes if the import is cancelled.
 
-                df.to_excel(writer, sheet_name=sheet_name, index=False)
+    Args:
+        window: The main application window object.
+        file_paths (list): Files to import
+        excel_path (str): Excel file of the project, <folder>.xlsx in the folder of the first file if None
+    """
+    if not file_paths:
+        return
+    if excel_path is None:
+        folder_path = os.path.dirname(os.path.abspath(file_paths[0]))
+        excel_path = os.path.join(folder_path, f"{os.path.basename(folder_path)}.xlsx")
+
+    start_time = time.perf_counter()
+    progress = wx.ProgressDialog("Batch Import", f"Reading {len(file_paths)} files...",
+                                 maximum=len(file_paths), parent=window,
+                                 style=wx.PD_APP_MODAL | wx.PD_AUTO_HIDE | wx.PD_ELAPSED_TIME |
+                                       wx.PD_REMAINING_TIME | wx.PD_CAN_ABORT)
+
+    def on_progress(done, total, file_path):
+        message = f"Read {os.path.basename(file_path)} ({done}/{total})" if file_path else ""
+        keep_going, _ = progress.Update(done, message)
+        wx.Yield()
+        return keep_going
 
-        wx.MessageBox(f"Excel file created: {excel_file_path}", "Success", wx.OK | wx.ICON_INFORMATION)
+    try:
+        results, errors, cancelled = import_many(file_paths, window.photons, window.workfunction,
+                                                 progress=on_progress)
+    except Exception as e:
+        wx.MessageBox(f"Error importing files: {str(e)}", "Error", wx.OK | wx.ICON_ERROR)
+        return
+    finally:
+        progress.Destroy()
+
+    if cancelled:
+        window.SetStatusText(f"Import cancelled after {len(results) + len(errors)} of {len(file_paths)} files", 0)
+        return
+
+    # Spectra of all the files, sheet names made unique across files
+    sheet_names = []
+    spectra = []
+    num_files = 0
+    for file_path, file_spectra in results:
+        if not file_spectra:
+            errors[file_path] = "No spectra found"
+            continue
+        num_files += 1
+        for name, spectrum in file_spectra:
+            sheet_names.append(unique_sheet_name(name, sheet_names))
+            spectra.append(spectrum)
+
+    if spectra:
+        show_imported_spectra(window, excel_path, sheet_names, spectra)
+        window.SetStatusText(f"Selected File: {excel_path} | Imported {len(spectra)} spectra from {num_files} "
+                             f"files in {time.perf_counter() - start_time:.2f} s", 0)
+
+    if errors or not spectra:
+        message = "\n".join(f"{os.path.basename(file_path)}: {error}" for file_path, error in errors.items())
+        wx.MessageBox(f"Some files could not be imported:\n{message}" if errors else "No spectra found.",
+                      "Batch Import", wx.OK | wx.ICON_WARNING)
+
+
+def show_imported_spectra(window, excel_path, sheet_names, spectra, write_excel=None):
+    """
+    Replace window.Data by spectra read from instrument files, one core level each, and show the first one. The
+    Excel file that goes with them is written in a background thread, or when something is first saved to Excel
+    if the Excel conversion of imports is turned off in the preferences.
 
-        # Open the created Excel file
-        from libraries.Open import open_xlsx_file
-        open_xlsx_file(window, excel_file_path)
+    Args:
+        window: The main application window object.
+        excel_path (str): Excel file of the new window.Data
+        sheet_names (list): Sheet name of each spectrum
+        spectra (list): Spectrum dicts as the readers give them
+        write_excel (callable): write_excel(path) writes the Excel file, one sheet per spectrum if None
+    """
+    # Clear undo and redo history
+    window.history = []
+    window.redo_stack = []
+    update_undo_redo_state(window)
+
+    # Clear the results grid
+    window.results_grid.ClearGrid()
+    if window.results_grid.GetNumberRows() > 0:
+        window.results_grid.DeleteRows(0, window.results_grid.GetNumberRows())
+
+    # Populate window.Data with the transmission corrected data of each spectrum
+    window.Data = Init_Measurement_Data(window)
+    window.Data['FilePath'] = excel_path
+    for sheet_name, spectrum in zip(sheet_names, spectra):
+        window.Data = add_core_level_Data(window.Data, window, excel_path, sheet_name,
+                                          (spectrum['x'], spectrum['corrected']))
+        window.Data['Core levels'][sheet_name]['Transmission'] = spectrum['transmission']
+    window.excel_saved_signatures = {}
+
+    # Write the Excel file after the import
+    if write_excel is None:
+        def write_excel(path):
+            write_spectra_workbook(path, sheet_names, spectra)
+
+    def on_exported(error):
+        if error is None:
+            wx.CallAfter(window.SetStatusText, f"Excel file written: {excel_path}", 0)
+        else:
+            wx.CallAfter(window.SetStatusText, f"Error writing Excel file {excel_path}: {error}", 0)
 
-    except Exception as e:
-        wx.MessageBox(f"Error processing AVG files: {str(e)}", "Error", wx.OK | wx.ICON_ERROR)
+    schedule_export(excel_path, write_excel, background=getattr(window, 'import_excel_export', True),
+                    on_done=on_exported)
+
+    # Update GUI elements
+    window.sheet_combobox.Clear()
+    window.sheet_combobox.AppendItems(sheet_names)
+    window.sheet_combobox.SetValue(sheet_names[0])  # Set first sheet as default
+
+    # Plot the data for the first sheet
+    window.plot_manager.plot_data(window)
 
 
 def open_xlsx_file(window, file_path=None):
     """
     Opens an Excel file, loads its data, and updates the application's state accordingly.
-    If a corresponding JSON file exists, it loads data from there instead.
+    If a corresponding project file (.kfp) exists, it loads data from there instead without reading the Excel
+    file, then from a corresponding JSON file (older projects).
     """
     print("Starting open_xlsx_file function")
     if file_path is None:
-        with wx.FileDialog(window, "Open XLSX file", wildcard="Excel files (*.xlsx)|*.xlsx",
+        with wx.FileDialog(window, "Open XLSX file",
+                           wildcard=f"Excel or project files (*.xlsx;*{PROJECT_EXTENSION})|*.xlsx;*{PROJECT_EXTENSION}",
                            style=wx.FD_OPEN | wx.FD_FILE_MUST_EXIST) as dlg:
             if dlg.ShowModal() == wx.ID_OK:
                 file_path = dlg.GetPath()
             else:
                 return
 
+    # A project file stands for the Excel file it was saved with
+    if file_path.lower().endswith(PROJECT_EXTENSION):
+        file_path = os.path.splitext(file_path)[0] + '.xlsx'
+
     window.SetStatusText(f"Selected File: {file_path}", 0)
+    start_time = time.perf_counter()
 
     try:
         # Clear undo and redo history
@@ -668,20 +713,33 @@ def open_xlsx_file(window, file_path=None):
         window.redo_stack = []
         update_undo_redo_state(window)
 
+        # Nothing of the new file has been written by this session yet
+        window.excel_saved_signatures = {}
+
         # Clear the results grid
         window.results_grid.ClearGrid()
         if window.results_grid.GetNumberRows() > 0:
             window.results_grid.DeleteRows(0, window.results_grid.GetNumberRows())
 
-        # Look for corresponding .json file
+        # Look for corresponding project file, then .json file
+        project_file = project_path(file_path)
         json_file = os.path.splitext(file_path)[0] + '.json'
-        if os.path.exists(json_file):
+        if os.path.exists(project_file):
+            print(f"Found corresponding project file: {project_file}")
+            # Spectra are memory mapped from the project file
+            window.Data = adopt_spectra(load_project(project_file))
+
+            print("Loaded data from project file")
+
+            # Populate the results grid
+            populate_results_grid(window)
+        elif os.path.exists(json_file):
             print(f"Found corresponding .json file: {json_file}")
             with open(json_file, 'r') as f:
                 loaded_data = json.load(f)
 
             # Convert data structure without changing types
-            window.Data = convert_from_serializable(loaded_data)
+            window.Data = adopt_spectra(convert_from_serializable(loaded_data))
 
             print("Loaded data from .json file")
 
@@ -692,20 +750,15 @@ def open_xlsx_file(window, file_path=None):
             # Initialize the measurement data
             window.Data = Init_Measurement_Data(window)
 
-        # Read the Excel file
-        excel_file = pd.ExcelFile(file_path)
-        all_sheet_names = excel_file.sheet_names
-        sheet_names = [name for name in all_sheet_names if
-                       name.lower() not in ["results table", "experimental description"]]
-
-        results_table_index = -1
-        for i, name in enumerate(all_sheet_names):
-            if name.lower() == "results table":
-                results_table_index = i
-                break
-
-        if results_table_index != -1:
-            sheet_names = sheet_names[:results_table_index]
+        load_from_excel = 'Core levels' not in window.Data or not window.Data['Core levels']
+        if os.path.exists(project_file) and not load_from_excel:
+            # The project file has every sheet, the Excel file is not needed (and may not exist)
+            sheet_names = list(window.Data['Core levels'].keys())
+        else:
+            # An import may still be writing this Excel file, or have kept it for later
+            finish_export(file_path)
+            # Read the Excel file once, the data columns are only needed if we didn't load from json
+            all_sheet_names, sheet_names, columns = read_workbook_core_levels(file_path, read_columns=load_from_excel)
 
         print(f"Number of sheets: {len(sheet_names)}")
 
@@ -713,12 +766,14 @@ def open_xlsx_file(window, file_path=None):
         window.Data['FilePath'] = file_path
 
         # If we didn't load from json, populate the data from Excel
-        if 'Core levels' not in window.Data or not window.Data['Core levels']:
+        if load_from_excel:
             window.Data['Number of Core levels'] = 0
             for sheet_name in sheet_names:
-                window.Data = add_core_level_Data(window.Data, window, file_path, sheet_name)
+                window.Data = add_core_level_Data(window.Data, window, file_path, sheet_name,
+                                                  columns.get(sheet_name))
 
         print(f"Final number of core levels: {window.Data['Number of Core levels']}")
+        load_time = time.perf_counter() - start_time
 
         # Load BE correction
         window.load_be_correction()
@@ -743,6 +798,8 @@ def open_xlsx_file(window, file_path=None):
         # Update recent files list
         update_recent_files(window, file_path)
 
+        window.SetStatusText(f"Selected File: {file_path} | Loaded {len(sheet_names)} sheets in {load_time:.2f} s, "
+                             f"peak RSS {peak_rss_mb():.0f} MB", 0)
         print("open_xlsx_file function completed successfully")
     except Exception as e:
         print(f"Error in open_xlsx_file: {str(e)}")
@@ -750,6 +807,21 @@ def open_xlsx_file(window, file_path=None):
         traceback.print_exc()
         wx.MessageBox(f"Error reading file: {str(e)}", "Error", wx.OK | wx.ICON_ERROR)
 
+def peak_rss_mb():
+    """Peak resident memory of the process in MB, the current one where the platform does not keep the peak."""
+    memory = psutil.Process(os.getpid()).memory_info()
+    if hasattr(memory, 'peak_wset'):
+        # Windows
+        return memory.peak_wset / 1024 ** 2
+    try:
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # Bytes on macOS, kB on Linux
+        return peak / 1024 ** 2 if sys.platform == 'darwin' else peak / 1024
+    except ImportError:
+        return memory.rss / 1024 ** 2
+
+
 def convert_from_serializable(obj):
     """
     Recursively converts a serializable object (list or dict) back into its original structure.
@@ -814,183 +886,39 @@ def open_vamas_file_dialog(window):
 
 def open_vamas_file(window, file_path):
     """
-    Open and process a VAMAS file, converting it to an Excel file format.
-    This function reads a VAMAS file, extracts its data and metadata,
-    and creates a new Excel file with multiple sheets for each data block
-    and an additional sheet for experimental description.
+    Open a VAMAS file. The blocks are read straight into window.Data, one core level per block, and shown right
+    away. The Excel file that goes with it (one sheet per block and an "Experimental description" sheet, next to
+    the .vms) is written in a background thread, or only when something is first saved to Excel if the Excel
+    conversion of imports is turned off in the preferences.
 
     Args:
     window: The main application window object.
     file_path: The path to the VAMAS file to be opened.
     """
     try:
-        # Clear undo and redo history
-        window.history = []
-        window.redo_stack = []
-        update_undo_redo_state(window)
-
         if not os.path.exists(file_path):
             raise FileNotFoundError(f"The file {file_path} does not exist.")
 
-        # Copy VAMAS file to current working directory
-        vamas_filename = os.path.basename(file_path)
-        destination_path = os.path.join(os.getcwd(), vamas_filename)
-        shutil.copy2(file_path, destination_path)
+        start_time = time.perf_counter()
 
-        # Read VAMAS file
-        vamas_data = Vamas(vamas_filename)
+        # Read VAMAS file, the ordinates of each block come as one array
+        header, blocks = read_vamas(file_path)
+        if not blocks:
+            raise ValueError("The VAMAS file has no data blocks.")
 
-        # Create new Excel workbook
-        wb = Workbook()
-        wb.remove(wb.active)
-
-        exp_data = []  # Store experimental description data
-
-        # Process each block in the VAMAS file
-        for i, block in enumerate(vamas_data.blocks, start=1):
-            # Determine sheet name
-            if block.species_label.lower() == "wide" or block.transition_or_charge_state_label.lower() == "none":
-                sheet_name = block.species_label
-            else:
-                sheet_name = f"{block.species_label}{block.transition_or_charge_state_label}"
-            sheet_name = sheet_name.replace("/", "_")
-
-            # Create new sheet
-            ws = wb.create_sheet(title=sheet_name)
-
-            # Extract and process data
-            num_points = block.num_y_values
-            x_start = block.x_start
-            x_step = block.x_step
-            x_values = [x_start + i * x_step for i in range(num_points)]
-            y_values = block.corresponding_variables[0].y_values
-            y_unit = block.corresponding_variables[0].unit
-            num_scans = block.num_scans_to_compile_block
-
-            # Convert counts to counts per second if necessary
-            if y_unit != "c/s":
-                y_values = [y / num_scans for y in y_values]
-
-            # Convert to Binding Energy if necessary
-            if block.x_label == "Kinetic Energy":
-                x_values = [window.photons - x - window.workfunction for x in x_values]
-                x_label = "Binding Energy"
-            else:
-                x_label = block.x_label
+        sheet_names = []
+        spectra = []
+        for block in blocks:
+            sheet_names.append(block_sheet_name(block, sheet_names))
+            spectra.append(block_spectrum(block, window.photons, window.workfunction))
 
-            # Write data to sheet
-            ws.append([x_label, "Corrected Data", "Raw Data", "Transmission"])
-
-            # Get transmission data if it exists
-            transmission_data = None
-            if hasattr(block, 'corresponding_variables') and len(block.corresponding_variables) > 1:
-                transmission_data = block.corresponding_variables[1].y_values
-            else:
-                transmission_data = [1.0] * len(y_values)
-
-            # Write data row by row
-            for i, (x, y) in enumerate(zip(x_values, y_values)):
-                trans = transmission_data[i]
-                corrected_y = y / trans
-                ws.append([x, corrected_y, y, trans])
-
-            # Store experimental setup data
-            exp_data.append([
-                f"Block {i}",
-                block.sample_identifier,
-                f"{block.year}/{block.month}/{block.day}",
-                f"{block.hour}:{block.minute}:{block.second}",
-                block.technique,
-                f"{block.species_label} {block.transition_or_charge_state_label}",
-                block.num_scans_to_compile_block,
-                block.analysis_source_label,
-                block.analysis_source_characteristic_energy,
-                block.analysis_source_beam_width_x,
-                block.analysis_source_beam_width_y,
-                block.analyzer_pass_energy_or_retard_ratio_or_mass_res,
-                block.analyzer_work_function_or_acceptance_energy,
-                block.analyzer_mode,
-                block.sputtering_source_energy if hasattr(block, 'sputtering_source_energy') else 'N/A',
-                block.analyzer_axis_take_off_polar_angle,
-                block.analyzer_axis_take_off_azimuth,
-                block.target_bias,
-                block.analysis_width_x,
-                block.analysis_width_y,
-                block.x_label,
-                block.x_units,
-                block.x_start,
-                block.x_step,
-                block.num_y_values,
-                block.num_scans_to_compile_block,
-                block.signal_collection_time,
-                block.signal_time_correction,
-                y_unit,
-                block.num_lines_block_comment,
-                block.block_comment
-            ])
-
-        # Create "Experimental description" sheet
-        exp_sheet = wb.create_sheet(title="Experimental description")
-        exp_sheet.column_dimensions['A'].width = 50
-        exp_sheet.column_dimensions['B'].width = 100
-        left_aligned = Alignment(horizontal='left')
-
-        # Add VAMAS header information
-        exp_sheet.append(["VAMAS Header Information"])
-        for item in [
-            ("Format Identifier", vamas_data.header.format_identifier),
-            ("Institution Identifier", vamas_data.header.institution_identifier),
-            ("Instrument Model", vamas_data.header.instrument_model_identifier),
-            ("Operator Identifier", vamas_data.header.operator_identifier),
-            ("Experiment Identifier", vamas_data.header.experiment_identifier),
-            ("Number of Comment Lines", vamas_data.header.num_lines_comment),
-            ("Comment", vamas_data.header.comment),
-            ("Experiment Mode", vamas_data.header.experiment_mode),
-            ("Scan Mode", vamas_data.header.scan_mode),
-            ("Number of Spectral Regions", vamas_data.header.num_spectral_regions),
-            ("Number of Analysis Positions", vamas_data.header.num_analysis_positions),
-            ("Number of Discrete X Coordinates", vamas_data.header.num_discrete_x_coords_in_full_map),
-            ("Number of Discrete Y Coordinates", vamas_data.header.num_discrete_y_coords_in_full_map)
-        ]:
-            exp_sheet.append(item)
-
-        exp_sheet.append([])  # Add a blank row for separation
-
-        # Define the order of block information
-        block_info_order = [
-            "Sample ID", "Year/Month/Day", "Time HH,MM,SS", "Technique", "Species & Transition", "Number of scans",
-            "Source Label", "Source Energy", "Source width X", "Source width Y", "Pass Energy", "Work Function",
-            "Analyzer Mode", "Sputtering Energy", "Take-off Polar Angle", "Take-off Azimuth", "Target Bias",
-            "Analysis Width X", "Analysis Width Y", "X Label", "X Units", "X Start", "X Step", "Num Y Values",
-            "Num Scans", "Collection Time", "Time Correction", "Y Unit", "# Comment Lines", "Block Comment"
-        ]
-
-        # Add block information
-        for i, block_data in enumerate(exp_data, start=1):
-            exp_sheet.append([f"Block {i}", ""])
-            for j, info in enumerate(block_info_order):
-                exp_sheet.append([info, block_data[j + 1]])
-            exp_sheet.append([])  # Add a blank row between blocks
-
-        # Set alignment for all cells in column B
-        for row in exp_sheet.iter_rows(min_row=1, max_row=exp_sheet.max_row, min_col=2, max_col=2):
-            for cell in row:
-                cell.alignment = left_aligned
-
-        # Save Excel file
-        excel_filename = os.path.splitext(vamas_filename)[0] + ".xlsx"
-        excel_path = os.path.join(os.path.dirname(file_path), excel_filename)
-        wb.save(excel_path)
-
-        # Remove temporary VAMAS file
-        os.remove(destination_path)
-
-        # Update window.Data with the new Excel file
-        window.Data = Init_Measurement_Data(window)
-        window.Data['FilePath'] = excel_path
+        # The Excel file also gets the "Experimental description" sheet
+        excel_path = os.path.splitext(file_path)[0] + ".xlsx"
+        show_imported_spectra(window, excel_path, sheet_names, spectra,
+                              lambda path: write_vamas_workbook(path, header, blocks, sheet_names, spectra))
 
-        # Open the Excel file and populate window.Data
-        open_xlsx_file_vamas(window, excel_path)
+        window.SetStatusText(f"Selected File: {file_path} | Imported {len(sheet_names)} blocks in "
+                             f"{time.perf_counter() - start_time:.2f} s", 0)
 
     except FileNotFoundError as e:
         wx.MessageBox(f"File not found: {str(e)}", "Error", wx.OK | wx.ICON_ERROR)
@@ -1017,7 +945,8 @@ def open_xlsx_file_vamas(window, file_path):
         window.Data = Init_Measurement_Data(window)
         window.Data['FilePath'] = file_path
 
-        # Read the Excel file
+        # Read the Excel file, once an import still writing it is done
+        finish_export(file_path)
         excel_file = pd.ExcelFile(file_path)
 
         # Get sheet names, excluding the "Experimental description" sheet
@@ -1048,30 +977,22 @@ def open_xlsx_file_vamas(window, file_path):
         wx.MessageBox(f"Error reading Excel file: {str(e)}", "Error", wx.OK | wx.ICON_ERROR)
 
 
-def extract_transmission_data(block):
+def kal_sheets(file_path):
     """
-    Extract transmission function data from a Kratos .kal file block.
+    Sheet names and spectra of a Kratos .kal file, one per block with a transmission function.
 
     Args:
-        block (str): Text block containing transmission data
+        file_path (str): Path to the .kal file
 
     Returns:
-        tuple: (ke_trans, trans_values) arrays of kinetic energies and transmission values
+        tuple: (sheet_names, spectra) as show_imported_spectra and write_spectra_workbook take them
     """
-    if 'Transmission Function Object (ke,t)' in block:
-        trans_section = block.split('Transmission Function Object (ke,t)')[1].split('Dataset filename')[0]
-
-        ke_line = trans_section.split('Transmission Function Kinetic Energy =')[1].split('\n')[0]
-        ke_str = ke_line.strip().strip('{}').strip()
-        ke_trans = np.array([float(x.strip()) for x in ke_str.split(',')])
-
-        val_line = trans_section.split('Transmission Function Value          =')[1].split('\n')[0]
-        val_str = val_line.strip().strip('{}').strip()
-        trans_values = np.array([float(x.strip()) for x in val_str.split(',')])
-
-        return ke_trans, trans_values
-    return None, None
-
+    sheet_names = []
+    spectra = []
+    for name, spectrum in read_kal_spectra(file_path):
+        sheet_names.append(unique_sheet_name(name, sheet_names))
+        spectra.append(spectrum)
+    return sheet_names, spectra
 
 def convert_kal_to_excel(file_path):
     """
@@ -1083,50 +1004,9 @@ def convert_kal_to_excel(file_path):
     Returns:
         str: Path to the created Excel file
     """
-    with open(file_path, 'r') as f:
-
-        content = f.read()
-
-    blocks = content.split('Dataset filename')
-    spectra = {}
-    PHOTON_ENERGY = 1486.67
-
-    for block in blocks:
-        if 'Ordinate values' in block and 'Object name' in block:
-            name = block.split('Object name               = ')[1].split('/')[0].strip()
-
-            ke_trans, trans_values = extract_transmission_data(block)
-            if ke_trans is not None and trans_values is not None:
-                trans_func = interp1d(ke_trans, trans_values, kind='linear', bounds_error=False,
-                                      fill_value='extrapolate')
-
-                start_ke = float(block.split('Spectrum scan start')[1].split('=')[1].split('eV')[0].strip())
-                step = float(block.split('Spectrum scan step size')[1].split('=')[1].split('eV')[0].strip())
-                raw_str = block.split('Ordinate values')[1].split('=')[1].split('}')[0].strip().strip('{').strip()
-                raw_data = np.array([float(x.strip()) for x in raw_str.split(',')])
-
-                num_points = len(raw_data)
-                ke_values = np.linspace(start_ke, start_ke + (num_points - 1) * step, num_points)
-                be_values = PHOTON_ENERGY - ke_values
-
-                transmission = trans_func(ke_values)
-                corrected_data = raw_data / transmission
-
-                df = pd.DataFrame({
-                    'BE': be_values,
-                    'Corrected Data': corrected_data,
-                    'Raw Data': raw_data,
-                    'Transmission': transmission
-                })
-
-                spectra[name] = df
-
-    output_file = file_path.replace('.kal', '.xlsx')
-    with pd.ExcelWriter(output_file) as writer:
-        for name, df in spectra.items():
-            sheet_name = name.replace(' ', '')
-            df.to_excel(writer, sheet_name=sheet_name, index=False)
-
+    sheet_names, spectra = kal_sheets(file_path)
+    output_file = os.path.splitext(file_path)[0] + '.xlsx'
+    write_spectra_workbook(output_file, sheet_names, spectra)
     return output_file
 
 def open_kal_file_dialog(window):
@@ -1139,11 +1019,19 @@ def open_kal_file_dialog(window):
         open_kal_file(window, file_path)
 
 def open_kal_file(window, file_path):
-    """Process a Kratos .kal file and convert it to Excel format"""
-
+    """
+    Open a Kratos .kal file. Its spectra go straight into window.Data and are shown right away, the Excel file
+    next to the .kal is written after, like for VAMAS files.
+    """
     try:
-        output_excel = convert_kal_to_excel(file_path)
-        open_xlsx_file(window, output_excel)
+        start_time = time.perf_counter()
+        sheet_names, spectra = kal_sheets(file_path)
+        if not spectra:
+            raise ValueError("No spectra with a transmission function found.")
+
+        show_imported_spectra(window, os.path.splitext(file_path)[0] + '.xlsx', sheet_names, spectra)
+        window.SetStatusText(f"Selected File: {file_path} | Imported {len(sheet_names)} spectra in "
+                             f"{time.perf_counter() - start_time:.2f} s", 0)
     except Exception as e:
         wx.MessageBox(f"Error processing Kratos file: {str(e)}", "Error", wx.OK | wx.ICON_ERROR)
 
@@ -0,0 +1,150 @@
+# libraries/Peak_Evaluator.py
+
+# One place that turns a peak (fitting model name and its grid values) into a curve. plot_peak, the overall fit
+# and residuals and the fit post-processing all go through the shared peak_evaluator, and its LRU cache means a
+# peak that did not change is not evaluated again on the next replot, residual update or save. Curves are keyed on
+# the model, the parameters that model uses and the x array itself, and the cache is capped in bytes.
+
+import weakref
+from collections import OrderedDict
+
+import numpy as np
+from lmfit.lineshapes import voigt, pvoigt, expgaussian
+
+from libraries.Peak_Functions import PeakFunctions
+from libraries import Profile_Math
+
+
+GL_AREA_FACTOR = np.sqrt(np.pi / (4 * np.log(2)))
+
+# Grid values each model uses, only these go in the cache key
+MODEL_VALUES = {
+    "Voigt (Area, L/G, \u03c3)": ('center', 'height', 'sigma', 'gamma'),
+    "Voigt (Area, \u03c3, \u03b3)": ('center', 'height', 'sigma', 'gamma'),
+    "Pseudo-Voigt (Area)": ('center', 'height', 'fwhm', 'lg_ratio'),
+    "ExpGauss.(Area, \u03c3, \u03b3)": ('center', 'area', 'sigma', 'gamma'),
+    "LA (Area, \u03c3, \u03b3)": ('center', 'area', 'fwhm', 'sigma', 'gamma'),
+    "LA (Area, \u03c3/\u03b3, \u03b3)": ('center', 'area', 'fwhm', 'sigma', 'gamma'),
+    "LA*G (Area, \u03c3/\u03b3, \u03b3)": ('center', 'area', 'fwhm', 'sigma', 'gamma', 'fwhm_g'),
+    "GL (Height)": ('center', 'height', 'fwhm', 'lg_ratio'),
+    "SGL (Height)": ('center', 'height', 'fwhm', 'lg_ratio'),
+    "GL (Area)": ('center', 'height', 'fwhm', 'lg_ratio', 'area'),
+    "SGL (Area)": ('center', 'height', 'fwhm', 'lg_ratio', 'area'),
+}
+
+
+def evaluate_peak(model, x, center, height=None, fwhm=None, lg_ratio=None, area=None, sigma=None, gamma=None,
+                  fwhm_g=None):
+    """
+    Evaluate one peak from the values shown in the peak grid.
+
+    Args:
+        model (str): Fitting model name as in column 13 of the peak grid
+        x (np.ndarray): Binding energies to evaluate the peak at
+        center, height, fwhm, lg_ratio, area, sigma, gamma, fwhm_g (float): Grid values of the peak. Voigt sigma
+            and gamma are the Gaussian and Lorentzian FWHM of the grid, GL and SGL (Area) use the area if given,
+            otherwise the one of a peak of that height
+
+    Returns:
+        np.ndarray: Peak curve without background
+    """
+    if model in ["Voigt (Area, L/G, \u03c3)", "Voigt (Area, \u03c3, \u03b3)"]:
+        sigma = sigma / 2.355
+        gamma = gamma / 2
+        return voigt(x, Profile_Math.voigt_amplitude(height, sigma, gamma), center, sigma, gamma)
+    elif model == "Pseudo-Voigt (Area)":
+        sigma = fwhm / 2
+        fraction = lg_ratio / 100
+        return pvoigt(x, Profile_Math.pseudo_voigt_amplitude(height, sigma, fraction), center, sigma, fraction)
+    elif model == "ExpGauss.(Area, \u03c3, \u03b3)":
+        return expgaussian(x, area, center, sigma, gamma)
+    elif model in ["LA (Area, \u03c3, \u03b3)", "LA (Area, \u03c3/\u03b3, \u03b3)"]:
+        return PeakFunctions.LA(x, center, area, fwhm, sigma, gamma)
+    elif model == "LA*G (Area, \u03c3/\u03b3, \u03b3)":
+        return PeakFunctions.LAxG(x, center, area, fwhm, sigma, gamma, fwhm_g)
+    elif model == "GL (Height)":
+        return PeakFunctions.gauss_lorentz(x, center, fwhm, lg_ratio, height)
+    elif model == "SGL (Height)":
+        return PeakFunctions.S_gauss_lorentz(x, center, fwhm, lg_ratio, height)
+    elif model == "GL (Area)":
+        area = height * fwhm * GL_AREA_FACTOR if area is None else area
+        return PeakFunctions.gauss_lorentz_Area(x, center, area, fwhm, lg_ratio)
+    elif model == "SGL (Area)":
+        area = height * fwhm * GL_AREA_FACTOR if area is None else area
+        return PeakFunctions.S_gauss_lorentz_Area(x, center, area, fwhm, lg_ratio)
+    raise ValueError(f"Unknown fitting model: {model}")
+
+
+class PeakEvaluator:
+    """
+    evaluate_peak with an LRU cache of the curves, capped in bytes.
+
+    Args:
+        max_bytes (int): Memory the cached curves may use before the least recently used ones are dropped
+    """
+
+    def __init__(self, max_bytes=32 * 1024 ** 2):
+        self.max_bytes = max_bytes
+        self.cache = OrderedDict()
+        self.nbytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def evaluate(self, model, x, center, **values):
+        """
+        Return the curve of one peak, see evaluate_peak. The returned array is shared with the cache, it is
+        read only and must be copied before changing it in place.
+        """
+        values['center'] = center
+        names = MODEL_VALUES.get(model)
+        if names is None:
+            return evaluate_peak(model, x, **values)
+
+        key = (model, id(x), x.shape) + tuple(_key_value(values.get(name)) for name in names)
+        entry = self.cache.get(key)
+        # id() can be reused once an x array is freed, the weak reference tells a new array from the cached one
+        if entry is not None and entry[0]() is x:
+            self.cache.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+        self.misses += 1
+        curve = np.asarray(evaluate_peak(model, x, **values), dtype=float)
+        curve.setflags(write=False)
+        if entry is not None:
+            self._drop(key)
+        if curve.nbytes <= self.max_bytes:
+            self.cache[key] = (weakref.ref(x), curve)
+            self.nbytes += curve.nbytes
+            while self.nbytes > self.max_bytes:
+                self._drop(next(iter(self.cache)))
+                self.evictions += 1
+        return curve
+
+    def _drop(self, key):
+        _, curve = self.cache.pop(key)
+        self.nbytes -= curve.nbytes
+
+    def clear(self):
+        self.cache.clear()
+        self.nbytes = 0
+
+    def stats(self):
+        """Cache counters, for profiling."""
+        total = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'hit_rate': self.hits / total if total else 0.0,
+            'curves': len(self.cache),
+            'bytes': self.nbytes,
+        }
+
+
+def _key_value(value):
+    return None if value is None else float(value)
+
+
+peak_evaluator = PeakEvaluator()
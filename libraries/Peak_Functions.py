@@ -1,14 +1,40 @@
 
 import numpy as np
 # from numba import jit, prange
-import lmfit
-from lmfit.models import VoigtModel
 from scipy.optimize import minimize_scalar, brentq
-from scipy.signal import convolve
+from scipy.signal import fftconvolve
 from scipy.interpolate import interp1d
 from scipy.ndimage import gaussian_filter
+from libraries import Profile_Math
+from scipy.special import hyp2f1
+from scipy import fft as sp_fft
+from functools import lru_cache
 
-import numpy as np
+
+# Rounding allowance, in grid steps, before a peak counts as reaching past the grid of the middle of the data
+_LAXG_GRID_TOLERANCE = 1e-9
+
+
+@lru_cache(maxsize=32)
+def _laxg_grid(x_range, n_points, n_low, n_high):
+    """
+    High resolution grids of LAxG, cached as they only change with the data and with whole grid steps of center.
+
+    The Gaussian kernel is sampled on the n_points grid spanning x_range around 0, as the direct convolution did.
+    The LA peak is sampled on the same grid extended by n_low and n_high steps, so x - center of a peak off the
+    middle of the data is on the grid instead of clamped to its ends.
+
+    Returns:
+        tuple: (x_kernel, x_high_res, n_fft), n_fft the FFT length of the linear convolution of the two
+    """
+    x_kernel = np.linspace(- x_range / 2, + x_range / 2, n_points)
+    step = x_range / (n_points - 1)
+    x_high_res = np.concatenate([x_kernel[0] - step * np.arange(n_low, 0, -1), x_kernel,
+                                 x_kernel[-1] + step * np.arange(1, n_high + 1)])
+    n_fft = sp_fft.next_fast_len(len(x_high_res) + n_points - 1, real=True)
+    x_kernel.setflags(write=False)
+    x_high_res.setflags(write=False)
+    return x_kernel, x_high_res, n_fft
 
 
 class PeakFunctions:
@@ -159,9 +185,7 @@ class PeakFunctions:
         Returns:
         float : The approximate FWHM of the Voigt profile
         """
-        fg = 2 * sigma * np.sqrt(2 * np.log(2))
-        fl = 2 * gamma
-        return 0.5346 * fl + np.sqrt(0.2166 * fl ** 2 + fg ** 2)
+        return Profile_Math.voigt_fwhm(sigma, gamma)
 
 
     @staticmethod
@@ -236,31 +260,22 @@ class PeakFunctions:
     @staticmethod
     def get_voigt_height(amplitude, sigma, gamma):
         """
-        Calculate the height of a Voigt profile directly using the lmfit model.
+        Calculate the height of a Voigt profile, same parameters as the lmfit VoigtModel.
         """
-        model = lmfit.models.VoigtModel()
-        params = model.make_params(amplitude=amplitude, center=0, sigma=sigma, gamma=gamma)
-        return model.eval(params, x=0)
+        return Profile_Math.voigt_height(amplitude, sigma, gamma)
 
     @staticmethod
     def voigt_height_to_area(height, sigma, gamma):
-        voigt = VoigtModel()
-        x = np.linspace(-10 * sigma, 10 * sigma, 1000)
-        params = voigt.make_params(center=0, sigma=sigma, gamma=gamma, amplitude=1)
-        y = voigt.eval(params, x=x)
-        max_y = np.max(y)
-        amplitude = height / max_y
-        return amplitude  # For distribution models, amplitude is equivalent to area
+        # For distribution models, amplitude is equivalent to area
+        return Profile_Math.voigt_amplitude(height, sigma, gamma)
 
 
     @staticmethod
     def get_pseudo_voigt_height(amplitude, sigma, fraction):
         """
-        Calculate the height of a Pseudo-Voigt profile directly using the lmfit model.
+        Calculate the height of a Pseudo-Voigt profile, same parameters as the lmfit PseudoVoigtModel.
         """
-        model = lmfit.models.PseudoVoigtModel()
-        params = model.make_params(amplitude=amplitude, center=0, sigma=sigma, fraction=fraction/100)
-        return model.eval(params, x=0)
+        return Profile_Math.pseudo_voigt_height(amplitude, sigma, fraction / 100)
 
     @staticmethod
     def find_lorentzian_fwhm(true_fwhm, center, amplitude, sigma, gamma, max_iterations=50):
@@ -390,6 +405,34 @@ class PeakFunctions:
             1 / (1 + 4 * ((x - center) / F) ** 2) ** sigma
         )
 
+    @staticmethod
+    def LA_window_area(F, sigma, gamma, center, x_min, x_max):
+        """
+        Area of the unit height LA peak between x_min and x_max, the range the peak is evaluated on.
+
+        Each side of 1/(1+4(x/F)^2)^m has the antiderivative t * 2F1(1/2, m; 3/2; -4(t/F)^2) from the center. It
+        is finite and continuous for every m > 0, including the heavy tails of m <= 0.5 where the integral over
+        an infinite range diverges, so the height does not jump when sigma or gamma crosses 0.5 during a fit.
+
+        Args:
+            F (float or array): Lorentzian width of the LA peak
+            sigma (float or array): Exponent of the high BE side
+            gamma (float or array): Exponent of the low BE side
+            center (float or array): Peak position
+            x_min (float): Lowest energy of the range
+            x_max (float): Highest energy of the range
+
+        Returns:
+            float or array: Unit area inside the range, the integral the trapz over the data approximated
+        """
+        def side(t, m):
+            return t * hyp2f1(0.5, m, 1.5, -4 * (t / F) ** 2)
+
+        low, high = x_min - center, x_max - center
+        low_side = side(np.minimum(high, 0), gamma) - side(np.minimum(low, 0), gamma)
+        high_side = side(np.maximum(high, 0), sigma) - side(np.maximum(low, 0), sigma)
+        return low_side + high_side
+
     @staticmethod
     # @jit(nopython=True, parallel=True)
     def LA(x, center, amplitude, fwhm, sigma, gamma):
@@ -405,13 +448,8 @@ class PeakFunctions:
             1 / (1 + 4 * ((x - center) / F) ** 2) ** sigma
         )
 
-        # Sort x values and corresponding peak shape for correct integration
-        sort_idx = np.argsort(x)
-        x_sorted = x[sort_idx]
-        peak_shape_sorted = peak_shape[sort_idx]
-
-        # Calculate the area of unit amplitude peak
-        unit_area = abs(np.trapz(peak_shape_sorted, x_sorted))
+        # Calculate the area of unit amplitude peak over the x range, in closed form
+        unit_area = float(PeakFunctions.LA_window_area(F, sigma, gamma, center, x.min(), x.max()))
 
         # Calculate required amplitude to achieve desired area
         height = amplitude / unit_area if unit_area != 0 else 0
@@ -426,24 +464,31 @@ class PeakFunctions:
 
         # Calculate lorentzian width from the input FWHM
         F = 2 * fwhm / (np.sqrt(2 ** (1 / sigma) - 1) + np.sqrt(2 ** (1 / gamma) - 1))
-        def LA_N(x):
-            return np.where(
-                x <= 0,
-                1 / (1 + 4 * ((x ) / F) ** 2) ** gamma,
-                1 / (1 + 4 * ((x ) / F) ** 2) ** sigma
-            )
-
-        # Define the Gaussian function
-        def gaussian(x, fwhm_g):
-            return np.exp(-4 * np.log(2) * ((x ) / fwhm_g) ** 2)
-
-        x_range = max(x.max() - x.min(), 4 * fwhm)
-        x_high_res = np.linspace(- x_range / 2, + x_range / 2, len(x) * 4)
-
-        la = LA_N(x_high_res)
-        gauss = gaussian(x_high_res, fwhm_g)
 
-        convolved = convolve(la, gauss, mode='same') / sum(gauss)
+        x_range = float(max(x.max() - x.min(), 4 * fwhm))
+        n_points = len(x) * 4
+        # Whole grid steps the offsets x - center reach past the grid of a peak in the middle of the data
+        step = x_range / (n_points - 1)
+        n_low = max(0, int(np.ceil((x.min() - center + x_range / 2) / -step - _LAXG_GRID_TOLERANCE)))
+        n_high = max(0, int(np.ceil((x.max() - center - x_range / 2) / step - _LAXG_GRID_TOLERANCE)))
+        x_kernel, x_high_res, n_fft = _laxg_grid(x_range, n_points, n_low, n_high)
+
+        # Each side of the sorted grid only needs its own exponent
+        split = np.searchsorted(x_high_res, 0, side='right')
+        base = 1 + 4 * (x_high_res / F) ** 2
+        la = np.empty(len(x_high_res))
+        la[:split] = base[:split] ** -gamma
+        la[split:] = base[split:] ** -sigma
+
+        # Unit sum Gaussian kernel, fwhm_g can be a fitted parameter
+        gauss = np.exp(-4 * np.log(2) * (x_kernel / fwhm_g) ** 2)
+        gauss /= gauss.sum()
+
+        # FFT convolution, the direct one is O(N^2) on the high resolution grid. Same centering as
+        # convolve(la, gauss, mode='same') on the grid of the kernel
+        start = (n_points - 1) // 2
+        convolved = sp_fft.irfft(sp_fft.rfft(la, n_fft) * sp_fft.rfft(gauss, n_fft), n_fft)
+        convolved = convolved[start:start + len(x_high_res)]
 
         peak_shape = np.interp(x - center, x_high_res, convolved)
 
@@ -460,7 +505,6 @@ class PeakFunctions:
 
         return height * peak_shape
 
-
     @staticmethod
     def calculate_rsd(y_experimental, y_fitted):
         residuals = y_experimental - y_fitted
@@ -528,7 +572,8 @@ class BackgroundCalculations:
         Returns:
             array: Smart background
         """
-        shirley_bg = BackgroundCalculations.calculate_shirley_background(x, y, offset_h, offset_l,num_points)
+        shirley_bg = BackgroundCalculations.calculate_shirley_background(x, y, offset_h, offset_l,
+                                                                         num_points=num_points)
         linear_bg = BackgroundCalculations.calculate_linear_background(x, y, offset_h, offset_l,num_points)
 
         # Choose background type based on first and last y-values
@@ -598,7 +643,7 @@ class BackgroundCalculations:
         # Determine background type for selected range
         if y_selected[0] > y_selected[-1]:
             new_background[mask] = BackgroundCalculations.calculate_shirley_background(x_selected, y_selected, offset_h,
-                                                                                       offset_l, num_points)
+                                                                                       offset_l, num_points=num_points)
         else:
             new_background[mask] = BackgroundCalculations.calculate_linear_background(x_selected, y_selected, offset_h,
                                                                                       offset_l, num_points)
@@ -624,7 +669,7 @@ class BackgroundCalculations:
         Returns:
             array: Shirley background
         """
-        x, y = np.asarray(x), np.asarray(y)
+        x, y = np.asarray(x, dtype=float), np.asarray(y, dtype=float)
 
         # Add padding to the data
         x_min, x_max = x[0], x[-1]
@@ -639,111 +684,162 @@ class BackgroundCalculations:
         background = np.zeros_like(y_padded)
         I0, Iend = y_padded[0], y_padded[-1]
 
-        # Iterative calculation of Shirley background
+        # Trapezoid half-widths and running integral, reused on every iteration
+        half_dx = 0.5 * np.diff(x_padded)
+        cumulative = np.zeros_like(y_padded)
+
+        # Iterative calculation of Shirley background. The integrals below and above each point are read
+        # from one cumulative sum, so each iteration is O(N) instead of two trapz calls per point.
         for _ in range(max_iter):
             prev_background = background.copy()
-            for i in range(1, len(y_padded) - 1):
-                A1 = np.trapz(y_padded[:i] - background[:i], x_padded[:i])
-                A2 = np.trapz(y_padded[i:] - background[i:], x_padded[i:])
-                background[i] = Iend + (I0 - Iend) * A2 / (A1 + A2)
+            signal = y_padded - background
+            np.cumsum(half_dx * (signal[1:] + signal[:-1]), out=cumulative[1:])
+            A1 = cumulative[:-2]
+            A2 = cumulative[-1] - cumulative[1:-1]
+            background[1:-1] = Iend + (I0 - Iend) * A2 / (A1 + A2)
             if np.all(np.abs(background - prev_background) < tol):
                 break
 
         return background[1:-1]  # Remove padding before returning
 
-    def calculate_tougaard_background(x, y, sheet_name, window):
-        bg_data = window.Data['Core levels'][sheet_name]['Background']
-        B = bg_data.get('Tougaard_B', 2866)
-        C = bg_data.get('Tougaard_C', 1643)
-        D = bg_data.get('Tougaard_D', 1)
-        T0 = bg_data.get('Tougaard_T0', 0)
+    @staticmethod
+    def calculate_tougaard_loss_integral(x, y, kernel):
+        """
+        Evaluate the Tougaard loss integral for every point of the spectrum.
 
-        # Get the baseline value (lowest BE intensity)
-        baseline = y[-1]  # Assuming x is in BE, so highest KE/lowest BE is at the end
+        For each point i this is trapz(K(x[i:] - x[i]) * y[i:], dx=mean(diff(x))), i.e. the same sum
+        the individual Tougaard backgrounds used to compute point by point. On a uniform energy grid the
+        kernel only depends on the index offset, so the whole background is one discrete correlation and
+        is done with an FFT in O(N log N). Non-uniform grids fall back to the exact per-point sum.
 
-        # Shift data to zero baseline
-        y_shifted = y  - baseline
+        Args:
+            x (array): Energy axis (eV)
+            y (array): Intensity axis (already shifted to the wanted baseline)
+            kernel (callable): Loss kernel K(E) evaluated on an array of energy differences
 
-        dx = np.mean(np.diff(x))
-        background = np.zeros_like(y)
-        for i in range(len(x)):
+        Returns:
+            array: Loss integral for each point
+        """
+        x, y = np.asarray(x, dtype=float), np.asarray(y, dtype=float)
+        n = len(x)
+        if n < 2:
+            return np.zeros_like(y)
+
+        steps = np.diff(x)
+        dx = np.mean(steps)
+
+        if np.allclose(steps, dx, rtol=1e-6, atol=0):
+            # Uniform grid: K(x[i+k] - x[i]) = K(k * dx) for every i
+            K = kernel(np.arange(n) * dx)
+            integral = fftconvolve(y, K[::-1], mode='full')[n - 1:]
+            # Trapezoid end corrections (half weight on the first and last sample of each integral)
+            integral -= 0.5 * K[0] * y + 0.5 * K[::-1] * y[-1]
+            return integral * dx
+
+        integral = np.zeros_like(y)
+        for i in range(n):
             E = x[i:] - x[i]
-            K = B * E / ((C - E ** 2) ** 2 + D * E ** 2)
-            background[i] = np.trapz(K * y_shifted[i:], dx=dx) + T0
+            integral[i] = np.trapz(kernel(E) * y[i:], dx=dx)
+        return integral
 
-        background = background + baseline
-        return background
+    @staticmethod
+    def calculate_tougaard_loss_response(x, y, C, D):
+        """
+        Calculate the U4 Tougaard background of one component for B = 1.
 
-    def calculate_double_tougaard_background(x, y, sheet_name, window):
-        bg_data = window.Data['Core levels'][sheet_name]['Background']
+        The U4 background is linear in B, so a fit can cache this response per (C, D) pair and scale it
+        by B instead of recomputing the loss integral whenever only B changes.
 
-        # First Tougaard parameters
-        B1 = bg_data.get('Tougaard_B', 2866)
-        C1 = bg_data.get('Tougaard_C', 1643)
-        D1 = bg_data.get('Tougaard_D', 1)
-        T01 = bg_data.get('Tougaard_T0', 0)
+        Args:
+            x (array): Energy axis (eV)
+            y (array): Intensity axis, shifted to a zero baseline
+            C (float): Tougaard C parameter
+            D (float): Tougaard D parameter
 
-        # Second Tougaard parameters
-        B2 = bg_data.get('Tougaard_B2', 2866)
-        C2 = bg_data.get('Tougaard_C2', 1643)
-        D2 = bg_data.get('Tougaard_D2', 1)
-        T02 = bg_data.get('Tougaard_T02', 0)
+        Returns:
+            array: Loss response for B = 1
+        """
+        def kernel(E):
+            return E / ((C - E ** 2) ** 2 + D * E ** 2)
 
-        baseline = y[-1]
-        y_shifted = y - baseline
+        return BackgroundCalculations.calculate_tougaard_loss_integral(x, y, kernel)
 
-        dx = np.mean(np.diff(x))
-        background1 = np.zeros_like(y)
-        background2 = np.zeros_like(y)
+    @staticmethod
+    def tougaard_response_cache(x, y, indices=None, maxsize=256):
+        """
+        Unit-B loss responses of one spectrum, computed once per (C, D) pair for the duration of a fit.
 
-        for i in range(len(x)):
-            E = x[i:] - x[i]
-            K1 = B1 * E / ((C1 - E ** 2) ** 2 + D1 * E ** 2)
-            K2 = B2 * E / ((C2 - E ** 2) ** 2 + D2 * E ** 2)
-            background1[i] = np.trapz(K1 * y_shifted[i:], dx=dx) + T01
-            background2[i] = np.trapz(K2 * y_shifted[i:], dx=dx) + T02
+        The U4 background is linear in B, so residual calls only scale and sum the cached responses and steps
+        that move only B do no integration at all.
 
-        background = background1 + background2 + baseline
-        return background
+        Args:
+            x (array): Energy axis (eV)
+            y (array): Intensity axis, shifted to a zero baseline
+            indices (array): Points of the response to keep (the fit range), None for all of them
+            maxsize (int): Number of (C, D) pairs kept
 
-    def calculate_triple_tougaard_background(x, y, sheet_name, window):
-        bg_data = window.Data['Core levels'][sheet_name]['Background']
+        Returns:
+            callable: response(C, D), the calculate_tougaard_loss_response of the spectrum at indices, with the
+            cache_info and cache_clear of functools.lru_cache
+        """
+        @lru_cache(maxsize=maxsize)
+        def response(C, D):
+            values = BackgroundCalculations.calculate_tougaard_loss_response(x, y, C, D)
+            return values if indices is None else values[indices]
 
-        # Parameters for all three Tougaard backgrounds
-        B1 = bg_data.get('Tougaard_B', 2866)
-        C1 = bg_data.get('Tougaard_C', 1643)
-        D1 = bg_data.get('Tougaard_D', 1)
-        T01 = bg_data.get('Tougaard_T0', 0)
+        return response
 
-        B2 = bg_data.get('Tougaard_B2', 2866)
-        C2 = bg_data.get('Tougaard_C2', 1643)
-        D2 = bg_data.get('Tougaard_D2', 1)
-        T02 = bg_data.get('Tougaard_T02', 0)
+    @staticmethod
+    def get_tougaard_parameters(bg_data, count):
+        """Read the (B, C, D, T0) sets of the first 'count' Tougaard components from the background data."""
+        suffixes = ['', '2', '3'][:count]
+        return [(bg_data.get(f'Tougaard_B{suffix}', 2866),
+                 bg_data.get(f'Tougaard_C{suffix}', 1643),
+                 bg_data.get(f'Tougaard_D{suffix}', 1),
+                 bg_data.get(f'Tougaard_T0{suffix}', 0)) for suffix in suffixes]
 
-        B3 = bg_data.get('Tougaard_B3', 2866)
-        C3 = bg_data.get('Tougaard_C3', 1643)
-        D3 = bg_data.get('Tougaard_D3', 1)
-        T03 = bg_data.get('Tougaard_T03', 0)
+    @staticmethod
+    def calculate_multi_tougaard_background(x, y, components):
+        """
+        Calculate the sum of several U4 Tougaard backgrounds in a single pass.
 
-        baseline = y[-1]
-        y_shifted = y - baseline
+        Args:
+            x (array): Energy axis (eV)
+            y (array): Intensity axis
+            components (list): (B, C, D, T0) for each Tougaard component
 
-        dx = np.mean(np.diff(x))
-        background1 = np.zeros_like(y)
-        background2 = np.zeros_like(y)
-        background3 = np.zeros_like(y)
+        Returns:
+            array: Total Tougaard background
+        """
+        y = np.asarray(y, dtype=float)
 
-        for i in range(len(x)):
-            E = x[i:] - x[i]
-            K1 = B1 * E / ((C1 - E ** 2) ** 2 + D1 * E ** 2)
-            K2 = B2 * E / ((C2 - E ** 2) ** 2 + D2 * E ** 2)
-            K3 = B3 * E / ((C3 - E ** 2) ** 2 + D3 * E ** 2)
-            background1[i] = np.trapz(K1 * y_shifted[i:], dx=dx) + T01
-            background2[i] = np.trapz(K2 * y_shifted[i:], dx=dx) + T02
-            background3[i] = np.trapz(K3 * y_shifted[i:], dx=dx) + T03
-
-        background = background1 + background2 + background3 + baseline
-        return background
+        # Get the baseline value (lowest BE intensity)
+        baseline = y[-1]  # Assuming x is in BE, so highest KE/lowest BE is at the end
+
+        # The loss integral is linear in K, so the kernels are summed before integrating
+        def kernel(E):
+            K = np.zeros_like(E)
+            for B, C, D, T0 in components:
+                K += B * E / ((C - E ** 2) ** 2 + D * E ** 2)
+            return K
+
+        background = BackgroundCalculations.calculate_tougaard_loss_integral(x, y - baseline, kernel)
+        return background + sum(T0 for B, C, D, T0 in components) + baseline
+
+    def calculate_tougaard_background(x, y, sheet_name, window):
+        bg_data = window.Data['Core levels'][sheet_name]['Background']
+        components = BackgroundCalculations.get_tougaard_parameters(bg_data, 1)
+        return BackgroundCalculations.calculate_multi_tougaard_background(x, y, components)
+
+    def calculate_double_tougaard_background(x, y, sheet_name, window):
+        bg_data = window.Data['Core levels'][sheet_name]['Background']
+        components = BackgroundCalculations.get_tougaard_parameters(bg_data, 2)
+        return BackgroundCalculations.calculate_multi_tougaard_background(x, y, components)
+
+    def calculate_triple_tougaard_background(x, y, sheet_name, window):
+        bg_data = window.Data['Core levels'][sheet_name]['Background']
+        components = BackgroundCalculations.get_tougaard_parameters(bg_data, 3)
+        return BackgroundCalculations.calculate_multi_tougaard_background(x, y, components)
 
     @staticmethod
     def calculate_w_tougaard_background(x, y, B=2866, C=1643, T0=0):
@@ -766,19 +862,14 @@ class BackgroundCalculations:
         background : array-like
             Computed W Tougaard background.
         """
-        dx = np.mean(np.diff(x))  # Ensure uniform step size in x
-        background = np.zeros_like(y)
-
         # Adjust B based on endpoint intensities
         I1, I2 = y[0], y[-1]  # Intensities at the endpoints
         B_adjusted = B * (I1 / I2) if I2 != 0 else B
 
-        for i in range(len(x)):
-            E = x[i:] - x[i]  # Energy loss
-            K = B_adjusted * E / (C + E ** 2)  # Kernel computation
-            background[i] = np.trapz(K * y[i:], dx=dx) + T0
+        def kernel(E):
+            return B_adjusted * E / (C + E ** 2)
 
-        return background
+        return BackgroundCalculations.calculate_tougaard_loss_integral(x, y, kernel) + T0
 
     @staticmethod
     def calculate_u_poly_tougaard_background(x, y, B=2866, C=1643, D=1, T0=0):
@@ -803,19 +894,11 @@ class BackgroundCalculations:
         background : array-like
             Computed U Poly Tougaard background.
         """
-        dx = np.mean(np.diff(x))
-        background = np.zeros_like(y)
+        def kernel(E):
+            # Zero for energy below threshold
+            return np.where(E > T0, B * E / (C + D * E ** 2), 0)
 
-        for i in range(len(x)):
-            E = x[i:] - x[i]  # Energy loss
-            K = np.where(
-                E > T0,
-                B * E / (C + D * E ** 2),
-                0  # Zero for energy below threshold
-            )
-            background[i] = np.trapz(K * y[i:], dx=dx)
-
-        return background
+        return BackgroundCalculations.calculate_tougaard_loss_integral(x, y, kernel)
 
 
 class AtomicConcentrations:
@@ -15,8 +15,11 @@ import matplotlib.colors as mcolors
 from scipy.ndimage import gaussian_filter
 
 from libraries.Peak_Functions import PeakFunctions, BackgroundCalculations, OtherCalc
+from libraries import Profile_Math
+from libraries.Peak_Evaluator import peak_evaluator
 
 from libraries.Save import save_state
+from libraries.Excel_Save import store_fit_curves, clear_fit_curves
 
 
 class PlotManager:
@@ -154,8 +157,6 @@ class PlotManager:
         x = peak_params['position']
         y = peak_params['height']
         peak_label = peak_params['label']
-        area = peak_params.get('area', 0)  # Get area if available
-        # print('Plot_peak Area = '+str(area))
 
         formatted_label = re.sub(r'(\d+/\d+)', r'$_{\1}$', peak_label)
 
@@ -191,79 +192,22 @@ class PlotManager:
                 self.ax.plot(x_values, normalized_deriv, '-', color=color, label=peak_label)
 
             return background  # Return background unchanged
-        elif fitting_model in ["Voigt (Area, L/G, \u03c3)", "Voigt (Area, \u03c3, \u03b3)"]:
-            peak_model = lmfit.models.VoigtModel()
-            sigma = float(peak_params.get('sigma', 1.2)) / 2.355
-            gamma = float(peak_params.get('gamma', 0.06)) / 2
-            amplitude = y / peak_model.eval(center=0, amplitude=1, sigma=sigma, gamma=gamma, x=0)
-            params = peak_model.make_params(center=x, amplitude=amplitude, sigma=sigma, gamma=gamma)
-        elif fitting_model == "ExpGauss.(Area, \u03c3, \u03b3)":
-            peak_model = lmfit.models.ExponentialGaussianModel()
-            area = float(window.peak_params_grid.GetCellValue(row, 6))
-            sigma = float(window.peak_params_grid.GetCellValue(row, 7))
-            gamma = float(window.peak_params_grid.GetCellValue(row, 8))
-            params = peak_model.make_params(center=x, amplitude=area, sigma=sigma, gamma=gamma)
-            peak_y = peak_model.eval(params, x=x_values)
-            # Calculate height numerically
-            y_values = peak_model.eval(params, x=x_values)
-            height = np.max(y_values)
-            # Estimate FWHM numerically
-            half_max = height / 2
-            indices = np.where(y_values >= half_max)[0]
-            if len(indices) >= 2:
-                fwhm = abs(x_values[indices[-1]] - x_values[indices[0]])
-            else:
-                fwhm = None  # or some default value
-            fraction = gamma / (sigma + gamma) * 100
-        elif fitting_model == "Pseudo-Voigt (Area)":
-            sigma = fwhm / 2
-            peak_model = lmfit.models.PseudoVoigtModel()
-            amplitude = y / peak_model.eval(center=0, amplitude=1, sigma=sigma, fraction=lg_ratio / 100, x=0)
-            params = peak_model.make_params(center=x, amplitude=amplitude, sigma=sigma, fraction=lg_ratio / 100)
-        elif fitting_model in ["LA (Area, \u03c3, \u03b3)", "LA (Area, \u03c3/\u03b3, \u03b3)"]:
-            peak_model = lmfit.Model(PeakFunctions.LA)
-            amplitude = float(window.peak_params_grid.GetCellValue(row, 6))
-            sigma = float(window.peak_params_grid.GetCellValue(row, 7))
-            gamma = float(window.peak_params_grid.GetCellValue(row, 8))
-            params = peak_model.make_params(center=x,amplitude=amplitude,fwhm=fwhm,sigma=sigma,gamma=gamma)
-
-
-            # No direct equivalent to 'fraction' for LA model
-            fraction = (sigma + gamma) / 2  # You could define it differently if needed
-        elif fitting_model in ["LA*G (Area, \u03c3/\u03b3, \u03b3)"]:
-            peak_model = lmfit.Model(PeakFunctions.LAxG)
-            amplitude = float(window.peak_params_grid.GetCellValue(row, 6))
-            sigma = float(window.peak_params_grid.GetCellValue(row, 7))
-            gamma = float(window.peak_params_grid.GetCellValue(row, 8))
-            fwhm_g = float(window.peak_params_grid.GetCellValue(row, 9))
-            params = peak_model.make_params(center=x,amplitude=amplitude,fwhm=fwhm,sigma=sigma,gamma=gamma,
-                                            fwhm_g=fwhm_g)
-
-            # # Calculate height numerically
-            # x_range = np.linspace(x - 5 * fwhm, x + 5 * fwhm, 1000)
-            # y_values = peak_model.eval(params, x=x_range)
-            # height = np.max(y_values)
-
-            # No direct equivalent to 'fraction' for LA model
-            fraction = (sigma + gamma) / 2  # You could define it differently if needed
-        elif fitting_model == "GL (Height)":
-            peak_model = lmfit.Model(PeakFunctions.gauss_lorentz)
-            params = peak_model.make_params(center=x, fwhm=fwhm, fraction=lg_ratio, amplitude=y)
-        elif fitting_model == "SGL (Height)":
-            peak_model = lmfit.Model(PeakFunctions.S_gauss_lorentz)
-            params = peak_model.make_params(center=x, fwhm=fwhm, fraction=lg_ratio, amplitude=y)
-        elif fitting_model == "GL (Area)":
-            peak_model = lmfit.Model(PeakFunctions.gauss_lorentz_Area)
-            area = y * (fwhm * np.sqrt(np.pi / (4 * np.log(2))))
-            params = peak_model.make_params(center=x, fwhm=fwhm, fraction=lg_ratio, area=area)
-        elif fitting_model == "SGL (Area)":
-            peak_model = lmfit.Model(PeakFunctions.S_gauss_lorentz_Area)
-            area = y * (fwhm * np.sqrt(np.pi / (4 * np.log(2))))
-            params = peak_model.make_params(center=x, fwhm=fwhm, fraction=lg_ratio, area=area)
-        else:
-            raise ValueError(f"Unknown fitting model: {fitting_model}")
 
-        peak_y = peak_model.eval(params, x=x_values) + background
+        # Only the models reading their area, sigma and gamma from the grid get them, GL and SGL (Area) are drawn
+        # from the height
+        values = {}
+        if fitting_model in ["Voigt (Area, L/G, \u03c3)", "Voigt (Area, \u03c3, \u03b3)"]:
+            values = dict(sigma=float(peak_params.get('sigma', 1.2)), gamma=float(peak_params.get('gamma', 0.06)))
+        elif fitting_model in ["ExpGauss.(Area, \u03c3, \u03b3)", "LA (Area, \u03c3, \u03b3)",
+                               "LA (Area, \u03c3/\u03b3, \u03b3)", "LA*G (Area, \u03c3/\u03b3, \u03b3)"]:
+            values = dict(area=float(window.peak_params_grid.GetCellValue(row, 6)),
+                          sigma=float(window.peak_params_grid.GetCellValue(row, 7)),
+                          gamma=float(window.peak_params_grid.GetCellValue(row, 8)))
+            if fitting_model == "LA*G (Area, \u03c3/\u03b3, \u03b3)":
+                values['fwhm_g'] = float(window.peak_params_grid.GetCellValue(row, 9))
+
+        peak_y = peak_evaluator.evaluate(fitting_model, x_values, x, height=y, fwhm=fwhm, lg_ratio=lg_ratio,
+                                         **values) + background
 
         # Rest of the function remains the same
         if color is None:
@@ -403,9 +347,9 @@ class PlotManager:
                                 sheet_name]['Background'] else window.y_values
 
             # Initialize Bkg X if not already present
-            if 'Bkg X' not in window.Data['Core levels'][sheet_name]['Background'] or not \
-                    window.Data['Core levels'][sheet_name]['Background']['Bkg X']:
-                window.Data['Core levels'][sheet_name]['Background']['Bkg X'] = window.x_values.tolist()
+            if 'Bkg X' not in window.Data['Core levels'][sheet_name]['Background'] or \
+                    len(window.Data['Core levels'][sheet_name]['Background']['Bkg X']) == 0:
+                window.Data['Core levels'][sheet_name]['Background']['Bkg X'] = window.x_values
 
             # Set x-axis limits to reverse the direction and match the min and max of the data
             if window.energy_scale == 'KE':
@@ -876,7 +820,7 @@ class PlotManager:
             # Create the selected peak using updated position and height
             if window.selected_fitting_method in ["Voigt (Area, L/G, \u03c3)", "Voigt (Area, \u03c3, \u03b3)"]:
                 peak_model = lmfit.models.VoigtModel()
-                amplitude = y / peak_model.eval(center=0, amplitude=1, sigma=sigma, gamma=gamma, x=0)
+                amplitude = Profile_Math.voigt_amplitude(y, sigma, gamma)
                 params = peak_model.make_params(center=x, amplitude=amplitude, sigma=sigma, gamma=gamma)
             elif window.selected_fitting_method in ["ExpGauss.(Area, \u03c3, \u03b3)"]:
                 peak_model = lmfit.models.VoigtModel()
@@ -885,7 +829,7 @@ class PlotManager:
                 params = peak_model.make_params(center=x, amplitude=amplitude, sigma=sigma, gamma=gamma)
             elif window.selected_fitting_method == "Pseudo-Voigt (Area)":
                 peak_model = lmfit.models.PseudoVoigtModel()
-                amplitude = y / peak_model.eval(center=0, amplitude=1, sigma=sigma, fraction=lg_ratio, x=0)
+                amplitude = Profile_Math.pseudo_voigt_amplitude(y, sigma, lg_ratio)
                 params = peak_model.make_params(center=x, amplitude=amplitude, sigma=sigma, fraction=lg_ratio)
             elif window.selected_fitting_method in ["LA (Area, \u03c3, \u03b3)", "LA (Area, \u03c3/\u03b3, \u03b3)"]:
                 peak_model = lmfit.Model(PeakFunctions.LA)
@@ -965,7 +909,8 @@ class PlotManager:
         # Ensure all arrays have same length at the start
         x_values = window.x_values
         y_values = window.y_values[:len(x_values)]
-        overall_fit = window.background.astype(float).copy()[:len(x_values)]
+        background = window.background.astype(float)[:len(x_values)]
+        overall_fit = background.copy()
 
         num_peaks = window.peak_params_grid.GetNumberRows() // 2  # Assuming each peak uses two rows
 
@@ -977,6 +922,8 @@ class PlotManager:
             return
 
         fitting_model = ""  # Default empty string
+        # Curve of each peak plus background, in grid order, kept for saving
+        peak_curves = [None] * num_peaks
 
         for i in range(num_peaks):
             row = i * 2  # Each peak uses two rows in the grid
@@ -1008,66 +955,31 @@ class PlotManager:
             # gamma = lg_ratio/100 * sigma
             bkg_y = window.background[np.argmin(np.abs(window.x_values - peak_x))]
 
-            if fitting_model in ["Voigt (Area, L/G, \u03c3)", "Voigt (Area, \u03c3, \u03b3)"]:
-                peak_model = lmfit.models.VoigtModel()
-                sigma = float(window.peak_params_grid.GetCellValue(row, 7)) / 2.355
-                gamma = float(window.peak_params_grid.GetCellValue(row, 8)) / 2
-                amplitude = peak_y / peak_model.eval(center=0, amplitude=1, sigma=sigma, gamma=gamma, x=0)
-                params = peak_model.make_params(center=peak_x, amplitude=amplitude, sigma=sigma, gamma=gamma)
-            elif fitting_model == "ExpGauss.(Area, \u03c3, \u03b3)":
-                peak_model = lmfit.models.ExponentialGaussianModel()
-                area = float(window.peak_params_grid.GetCellValue(row, 6))
-                sigma = float(window.peak_params_grid.GetCellValue(row, 7))
-                gamma = float(window.peak_params_grid.GetCellValue(row, 8))
-                amplitude = area  # Use area directly as amplitude for area-based model
-                params = peak_model.make_params(center=peak_x, amplitude=amplitude, sigma=sigma, gamma=gamma)
-            elif fitting_model == "Pseudo-Voigt (Area)":
-                sigma = fwhm / 2
-                peak_model = lmfit.models.PseudoVoigtModel()
-                amplitude = peak_y / peak_model.eval(center=0, amplitude=1, sigma=sigma, fraction=lg_ratio / 100, x=0)
-                params = peak_model.make_params(center=peak_x, amplitude=amplitude, sigma=sigma,
-                                                fraction=lg_ratio / 100)
-            elif fitting_model in ["LA (Area, \u03c3, \u03b3)", "LA (Area, \u03c3/\u03b3, \u03b3)"]:
-                peak_model = lmfit.Model(PeakFunctions.LA)
-                amplitude = float(window.peak_params_grid.GetCellValue(row, 6))
-                # area = float(window.peak_params_grid.GetCellValue(row, 6))
-                sigma = float(window.peak_params_grid.GetCellValue(row, 7))
-                gamma = float(window.peak_params_grid.GetCellValue(row, 8))
-                params = peak_model.make_params(center=peak_x,amplitude=amplitude,fwhm=fwhm,sigma=sigma,gamma=gamma)
-            elif fitting_model in ["LA*G (Area, \u03c3/\u03b3, \u03b3)"]:
-                peak_model = lmfit.Model(PeakFunctions.LAxG)
-                area = float(window.peak_params_grid.GetCellValue(row, 6))
-                sigma = float(window.peak_params_grid.GetCellValue(row, 7))
-                gamma = float(window.peak_params_grid.GetCellValue(row, 8))
-                fwhm_g = float(window.peak_params_grid.GetCellValue(row, 9))
-                params = peak_model.make_params(center=peak_x,amplitude=area,fwhm=fwhm,sigma=sigma,gamma=gamma,
-                                                fwhm_g=fwhm_g)
-            elif fitting_model == "GL (Height)":
-                peak_model = lmfit.Model(PeakFunctions.gauss_lorentz)
-                params = peak_model.make_params(center=peak_x, fwhm=fwhm, fraction=lg_ratio, amplitude=peak_y)
-            elif fitting_model == "SGL (Height)":
-                peak_model = lmfit.Model(PeakFunctions.S_gauss_lorentz)
-                params = peak_model.make_params(center=peak_x, fwhm=fwhm, fraction=lg_ratio, amplitude=peak_y)
-            elif fitting_model == "GL (Area)":
-                peak_model = lmfit.Model(PeakFunctions.gauss_lorentz_Area)
-                area = float(window.peak_params_grid.GetCellValue(row, 6))  # Assuming area is in column 6
-                params = peak_model.make_params(center=peak_x, fwhm=fwhm, fraction=lg_ratio, area=area)
-            elif fitting_model == "SGL (Area)":
-                peak_model = lmfit.Model(PeakFunctions.S_gauss_lorentz_Area)
-                area = float(window.peak_params_grid.GetCellValue(row, 6))  # Assuming area is in column 6
-                params = peak_model.make_params(center=peak_x, fwhm=fwhm, fraction=lg_ratio, area=area)
-            elif fitting_model == "D-parameter":
-                # Skip D-parameter in overall fit calculation
+            if fitting_model in ["D-parameter", "SurveyID"]:
+                # Skip D-parameter and SurveyID in overall fit calculation
                 continue
-            elif fitting_model == "SurveyID":
-                # Skip D-parameter in overall fit calculation
-                continue
-            else:
+
+            grid = window.peak_params_grid
+            values = {}
+            if fitting_model in ["Voigt (Area, L/G, \u03c3)", "Voigt (Area, \u03c3, \u03b3)"]:
+                values = dict(sigma=float(grid.GetCellValue(row, 7)), gamma=float(grid.GetCellValue(row, 8)))
+            elif fitting_model in ["ExpGauss.(Area, \u03c3, \u03b3)", "LA (Area, \u03c3, \u03b3)",
+                                   "LA (Area, \u03c3/\u03b3, \u03b3)", "LA*G (Area, \u03c3/\u03b3, \u03b3)"]:
+                values = dict(area=float(grid.GetCellValue(row, 6)), sigma=float(grid.GetCellValue(row, 7)),
+                              gamma=float(grid.GetCellValue(row, 8)))
+                if fitting_model == "LA*G (Area, \u03c3/\u03b3, \u03b3)":
+                    values['fwhm_g'] = float(grid.GetCellValue(row, 9))
+            elif fitting_model in ["GL (Area)", "SGL (Area)"]:
+                values = dict(area=float(grid.GetCellValue(row, 6)))  # Assuming area is in column 6
+
+            try:
+                peak_fit = peak_evaluator.evaluate(fitting_model, window.x_values, peak_x, height=peak_y, fwhm=fwhm,
+                                                   lg_ratio=lg_ratio, **values)
+            except ValueError:
                 print(f"Warning: Unknown fitting model '{fitting_model}' for peak {i + 1}. Skipping this peak.")
                 continue
-
-            peak_fit = peak_model.eval(params, x=window.x_values)
             overall_fit += peak_fit
+            peak_curves[i] = peak_fit + background
 
         # Calculate residuals
         # Before the subtraction, ensure arrays have same length
@@ -1077,6 +989,10 @@ class PlotManager:
 
         residuals = y_values - overall_fit
 
+        if any(curve is not None for curve in peak_curves):
+            store_fit_curves(window, window.sheet_combobox.GetValue(), overall_fit, residuals, peak_curves)
+        else:
+            clear_fit_curves(window, window.sheet_combobox.GetValue())
 
         # Determine the scaling factor
         max_raw_data = max(window.y_values) - min(window.y_values)
@@ -1493,9 +1409,9 @@ class PlotManager:
                 line.remove()
 
             # Initialize or retrieve the background data
-            if 'Bkg Y' not in window.Data['Core levels'][sheet_name]['Background'] or not \
-                    window.Data['Core levels'][sheet_name]['Background']['Bkg Y']:
-                window.Data['Core levels'][sheet_name]['Background']['Bkg Y'] = y_values.tolist()
+            if 'Bkg Y' not in window.Data['Core levels'][sheet_name]['Background'] or \
+                    len(window.Data['Core levels'][sheet_name]['Background']['Bkg Y']) == 0:
+                window.Data['Core levels'][sheet_name]['Background']['Bkg Y'] = y_values
 
             try:
                 method = window.background_method
@@ -1621,7 +1537,7 @@ class PlotManager:
 
     def _update_background_data(self, window, sheet_name, x_values, background, method, offset_h, offset_l):
         """Helper method to update the background data in window.Data."""
-        window.Data['Core levels'][sheet_name]['Background']['Bkg Y'] = background.tolist()
+        window.Data['Core levels'][sheet_name]['Background']['Bkg Y'] = background
         window.background = background
         window.Data['Core levels'][sheet_name]['Background'].update({
             'Bkg Type': method,
@@ -24,12 +24,14 @@ class PreferenceWindow(wx.Frame):
         self.text_tab = wx.Panel(self.notebook)
         self.save_tab = wx.Panel(self.notebook)
         self.instrument_tab = wx.Panel(self.notebook)
+        self.fitting_tab = wx.Panel(self.notebook)
 
         # Add tabs to notebook
         self.notebook.AddPage(self.plot_tab, "Plot Settings")
         self.notebook.AddPage(self.text_tab, "Text/Axis Settings")
         self.notebook.AddPage(self.save_tab, "Save Settings")
         self.notebook.AddPage(self.instrument_tab, "Instrument Settings")
+        self.notebook.AddPage(self.fitting_tab, "Fitting Settings")
 
         # Add notebook to sizer
         main_sizer.Add(self.notebook, 1, wx.EXPAND | wx.ALL, 5)
@@ -56,6 +58,7 @@ class PreferenceWindow(wx.Frame):
 
         self.InitUI()
         self.init_instrument_tab()
+        self.init_fitting_tab()
         self.init_text_tab()
         self.init_save_settings_tab()
         self.LoadSettings()
@@ -253,9 +256,34 @@ class PreferenceWindow(wx.Frame):
 
         other_sizer.Add(other_grid, 5, wx.ALL, 5)
 
+        # Project File Settings
+        project_box = wx.StaticBox(self.save_tab, label="Project File Settings")
+        project_sizer = wx.StaticBoxSizer(project_box, wx.VERTICAL)
+
+        # Saving writes the curves already computed, refit only if the peaks changed since and this is ticked
+        self.refit_before_save_checkbox = wx.CheckBox(self.save_tab, label="Refit Before Save")
+        project_sizer.Add(self.refit_before_save_checkbox, 0, wx.ALL, 5)
+
+        # Deflate the spectra in the project file, smaller file but no memory mapping on open
+        self.compress_project_checkbox = wx.CheckBox(self.save_tab, label="Compress Project File")
+        project_sizer.Add(self.compress_project_checkbox, 0, wx.ALL, 5)
+
+        # Write the Excel file right after an import (in the background) or only when first saving to Excel
+        self.import_excel_export_checkbox = wx.CheckBox(self.save_tab, label="Write Excel File on Import")
+        project_sizer.Add(self.import_excel_export_checkbox, 0, wx.ALL, 5)
+
+        # Memory budget of the undo history
+        undo_memory_sizer = wx.BoxSizer(wx.HORIZONTAL)
+        undo_memory_label = wx.StaticText(self.save_tab, label="Undo Memory (MB):")
+        self.undo_memory_spin = wx.SpinCtrl(self.save_tab, min=16, max=8192, initial=256)
+        undo_memory_sizer.Add(undo_memory_label, 0, wx.ALIGN_CENTER_VERTICAL | wx.RIGHT, 5)
+        undo_memory_sizer.Add(self.undo_memory_spin, 0)
+        project_sizer.Add(undo_memory_sizer, 0, wx.ALL, 5)
+
         save_sizer.Add(excel_sizer, 0, wx.EXPAND | wx.ALL, 5)
         save_sizer.Add(word_sizer, 0, wx.EXPAND | wx.ALL, 5)
         save_sizer.Add(other_sizer, 0, wx.EXPAND | wx.ALL, 5)
+        save_sizer.Add(project_sizer, 0, wx.EXPAND | wx.ALL, 5)
 
         self.save_tab.SetSizer(save_sizer)
 
@@ -301,6 +329,35 @@ class PreferenceWindow(wx.Frame):
 
         self.instrument_tab.SetSizer(sizer)
 
+    def init_fitting_tab(self):
+        sizer = wx.GridBagSizer(5, 5)
+
+        # Fitting engine, both give the same fit, vectorized is faster with many peaks
+        engine_label = wx.StaticText(self.fitting_tab, label="Fitting Engine:")
+        self.fit_engine_combo = wx.ComboBox(self.fitting_tab, choices=["lmfit", "vectorized"], style=wx.CB_READONLY)
+        self.fit_engine_combo.SetValue("lmfit")
+        sizer.Add(engine_label, pos=(0, 0), flag=wx.EXPAND | wx.ALL, border=5)
+        sizer.Add(self.fit_engine_combo, pos=(0, 1), flag=wx.EXPAND | wx.ALL, border=5)
+
+        # Worker processes for Fit All Sheets, 0 uses every CPU
+        workers_label = wx.StaticText(self.fitting_tab, label="Fit All Sheets Workers (0 = All CPUs):")
+        self.fit_workers_spin = wx.SpinCtrl(self.fitting_tab, min=0, max=256, initial=0)
+        sizer.Add(workers_label, pos=(1, 0), flag=wx.EXPAND | wx.ALL, border=5)
+        sizer.Add(self.fit_workers_spin, pos=(1, 1), flag=wx.EXPAND | wx.ALL, border=5)
+
+        # Sparse Jacobian for least_squares fits with many peaks, 0 keeps the dense Jacobian
+        sparse_label = wx.StaticText(self.fitting_tab, label="Sparse Jacobian Width (FWHM, 0 = Off):")
+        self.sparse_jacobian_spin = wx.SpinCtrlDouble(self.fitting_tab, value='0', min=0, max=50, inc=1)
+        sizer.Add(sparse_label, pos=(2, 0), flag=wx.EXPAND | wx.ALL, border=5)
+        sizer.Add(self.sparse_jacobian_spin, pos=(2, 1), flag=wx.EXPAND | wx.ALL, border=5)
+
+        # Analytic derivatives for GL, SGL, Voigt and Pseudo-Voigt fits, finite differences when unticked
+        self.analytic_jacobian_checkbox = wx.CheckBox(self.fitting_tab, label="Analytic Jacobian")
+        self.analytic_jacobian_checkbox.SetValue(True)
+        sizer.Add(self.analytic_jacobian_checkbox, pos=(3, 0), span=(1, 2), flag=wx.EXPAND | wx.ALL, border=5)
+
+        self.fitting_tab.SetSizer(sizer)
+
     def on_instrument_change(self, event):
         selected_instrument = self.instrument_combo.GetValue()
         self.parent.update_instrument(selected_instrument)
@@ -718,6 +775,22 @@ class PreferenceWindow(wx.Frame):
             self.use_angular_correction.SetValue(self.parent.use_angular_correction)
         if hasattr(self.parent, 'analysis_angle'):
             self.angle_spin.SetValue(self.parent.analysis_angle)
+        if hasattr(self.parent, 'fit_workers'):
+            self.fit_workers_spin.SetValue(self.parent.fit_workers or 0)
+        if hasattr(self.parent, 'fit_engine'):
+            self.fit_engine_combo.SetValue(self.parent.fit_engine)
+        if hasattr(self.parent, 'sparse_jacobian_width'):
+            self.sparse_jacobian_spin.SetValue(self.parent.sparse_jacobian_width or 0)
+        if hasattr(self.parent, 'analytic_jacobian'):
+            self.analytic_jacobian_checkbox.SetValue(self.parent.analytic_jacobian)
+        if hasattr(self.parent, 'refit_before_save'):
+            self.refit_before_save_checkbox.SetValue(self.parent.refit_before_save)
+        if hasattr(self.parent, 'compress_project'):
+            self.compress_project_checkbox.SetValue(self.parent.compress_project)
+        if hasattr(self.parent, 'undo_memory_budget'):
+            self.undo_memory_spin.SetValue(self.parent.undo_memory_budget // 1024 ** 2)
+        if hasattr(self.parent, 'import_excel_export'):
+            self.import_excel_export_checkbox.SetValue(self.parent.import_excel_export)
 
     def OnPeakNumberChange(self, event):
         current_peak = event.GetPosition() - 1
@@ -856,6 +929,14 @@ class PreferenceWindow(wx.Frame):
 
         self.parent.use_angular_correction = self.use_angular_correction.GetValue()
         self.parent.analysis_angle = self.angle_spin.GetValue()
+        self.parent.fit_workers = self.fit_workers_spin.GetValue() or None
+        self.parent.fit_engine = self.fit_engine_combo.GetValue()
+        self.parent.sparse_jacobian_width = self.sparse_jacobian_spin.GetValue() or None
+        self.parent.analytic_jacobian = self.analytic_jacobian_checkbox.GetValue()
+        self.parent.refit_before_save = self.refit_before_save_checkbox.GetValue()
+        self.parent.compress_project = self.compress_project_checkbox.GetValue()
+        self.parent.undo_memory_budget = self.undo_memory_spin.GetValue() * 1024 ** 2
+        self.parent.import_excel_export = self.import_excel_export_checkbox.GetValue()
 
         # Save the configuration
         self.parent.save_config()
@@ -0,0 +1,87 @@
+# libraries/Profile_Math.py
+
+# Height, area and FWHM of the Voigt and Pseudo-Voigt peaks in closed form. Same parametrisation as
+# lmfit.models.VoigtModel and PseudoVoigtModel (amplitude is the area, sigma and gamma as in lmfit, fraction 0 to 1),
+# without building a model and its parameters or evaluating a grid for each conversion. Every function broadcasts,
+# so a whole sheet of peaks can be converted in one call by passing arrays.
+
+import numpy as np
+from scipy.special import wofz
+
+# Same guard as lmfit.lineshapes
+TINY = 1.0e-15
+S2 = np.sqrt(2.0)
+S2PI = np.sqrt(2 * np.pi)
+S2LN2 = np.sqrt(2 * np.log(2))
+
+
+def voigt_unit_height(sigma, gamma):
+    """
+    Height of the Voigt peak of unit area, its value at the center.
+
+    Args:
+        sigma (float or array): Gaussian sigma, as in lmfit VoigtModel
+        gamma (float or array): Lorentzian half width, as in lmfit VoigtModel
+
+    Returns:
+        float or array: Height per unit area
+    """
+    sigma = np.asarray(sigma, dtype=float)
+    return wofz(1j * gamma / np.maximum(TINY, sigma * S2)).real / np.maximum(TINY, sigma * S2PI)
+
+
+def voigt_height(amplitude, sigma, gamma):
+    """Height of a Voigt peak of area amplitude."""
+    return amplitude * voigt_unit_height(sigma, gamma)
+
+
+def voigt_amplitude(height, sigma, gamma):
+    """Area (lmfit amplitude) of a Voigt peak of the given height."""
+    return height / voigt_unit_height(sigma, gamma)
+
+
+def voigt_fwhm(sigma, gamma):
+    """
+    FWHM of a Voigt peak, Olivero and Longbothum approximation (within about 0.05%).
+
+    Args:
+        sigma (float or array): Gaussian sigma
+        gamma (float or array): Lorentzian half width
+
+    Returns:
+        float or array: FWHM
+    """
+    fwhm_g = 2 * S2LN2 * np.asarray(sigma, dtype=float)
+    fwhm_l = 2 * np.asarray(gamma, dtype=float)
+    return 0.5346 * fwhm_l + np.sqrt(0.2166 * fwhm_l ** 2 + fwhm_g ** 2)
+
+
+def pseudo_voigt_unit_height(sigma, fraction):
+    """
+    Height of the Pseudo-Voigt peak of unit area.
+
+    Args:
+        sigma (float or array): Half width at half maximum, as in lmfit PseudoVoigtModel
+        fraction (float or array): Lorentzian fraction, 0 to 1
+
+    Returns:
+        float or array: Height per unit area
+    """
+    sigma = np.asarray(sigma, dtype=float)
+    sigma_g = sigma / S2LN2
+    return (1 - fraction) / np.maximum(TINY, sigma_g * S2PI) + fraction / np.maximum(TINY, np.pi * sigma)
+
+
+def pseudo_voigt_height(amplitude, sigma, fraction):
+    """Height of a Pseudo-Voigt peak of area amplitude."""
+    return amplitude * pseudo_voigt_unit_height(sigma, fraction)
+
+
+def pseudo_voigt_amplitude(height, sigma, fraction):
+    """Area (lmfit amplitude) of a Pseudo-Voigt peak of the given height."""
+    return height / pseudo_voigt_unit_height(sigma, fraction)
+
+
+def pseudo_voigt_fwhm(sigma):
+    """FWHM of a Pseudo-Voigt peak, both components share the half width sigma."""
+    return 2.0 * np.asarray(sigma, dtype=float)
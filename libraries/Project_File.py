@@ -0,0 +1,196 @@
+# libraries/Project_File.py
+
+# Binary project container, saved next to the .xlsx with the same name. It is a zip holding project.json, the whole
+# window.Data as JSON, and every spectrum (numeric array or list of numbers) as a raw .npy member the JSON points to
+# with {"__array__": member}. Arrays keep full precision instead of the 2 decimals of the old .json sidecar.
+# Members are stored uncompressed so they can be memory mapped straight from the file on open, sheets can be
+# compressed instead (deflate) at the cost of reading them into memory. The .xlsx itself is only written by the
+# Excel save (export) actions.
+
+import io
+import json
+import os
+import struct
+import zipfile
+
+import numpy as np
+
+PROJECT_EXTENSION = '.kfp'
+PROJECT_FORMAT = 'KherveFitting project'
+PROJECT_VERSION = 1
+METADATA_NAME = 'project.json'
+ARRAY_KEY = '__array__'
+# Shorter lists of numbers stay in the JSON
+MIN_ARRAY_LENGTH = 16
+# Size of the fixed part of a zip local file header, the name and extra field follow it
+ZIP_LOCAL_HEADER_SIZE = 30
+
+
+def project_path(file_path):
+    """Project container that goes with an .xlsx (or any) file path."""
+    return os.path.splitext(file_path)[0] + PROJECT_EXTENSION
+
+
+def save_project(data, file_path, compressed_sheets=()):
+    """
+    Write window.Data to a project container. The file is written next to the target and moved over it once
+    complete, so an interrupted save leaves the previous project in place.
+
+    Args:
+        data (dict): window.Data
+        file_path (str): Path of the .kfp file
+        compressed_sheets (iterable or bool): Core level sheets whose arrays are deflated, True for all of them
+
+    Returns:
+        int: Size of the written file in bytes
+    """
+    # Arrays mapped from the file being replaced have to be let go of first (Windows won't replace a mapped file)
+    release_mapped_arrays(data, file_path)
+
+    writer = _ArrayWriter(compressed_sheets)
+    metadata = {
+        'format': PROJECT_FORMAT,
+        'version': PROJECT_VERSION,
+        'data': writer.pack(data, ()),
+    }
+
+    temp_path = file_path + '.tmp'
+    try:
+        with zipfile.ZipFile(temp_path, 'w', allowZip64=True) as zf:
+            zf.writestr(METADATA_NAME, json.dumps(metadata, allow_nan=True), compress_type=zipfile.ZIP_DEFLATED)
+            for name, array, compress_type in writer.arrays:
+                info = zipfile.ZipInfo(name, date_time=(1980, 1, 1, 0, 0, 0))
+                info.compress_type = compress_type
+                with zf.open(info, 'w', force_zip64=array.nbytes > 2 ** 31) as member:
+                    np.lib.format.write_array(member, array, allow_pickle=False)
+        os.replace(temp_path, file_path)
+    except Exception:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+    return os.path.getsize(file_path)
+
+
+def load_project(file_path, mmap=True):
+    """
+    Read a project container back into a window.Data dict.
+
+    Args:
+        file_path (str): Path of the .kfp file
+        mmap (bool): Memory map the uncompressed arrays (copy on write, the file is never changed), read them into
+            memory otherwise
+
+    Returns:
+        dict: window.Data, spectra as numpy arrays
+    """
+    with zipfile.ZipFile(file_path, 'r') as zf:
+        metadata = json.loads(zf.read(METADATA_NAME))
+        if metadata.get('format') != PROJECT_FORMAT:
+            raise ValueError(f"{file_path} is not a KherveFitting project")
+        if metadata.get('version', 0) > PROJECT_VERSION:
+            raise ValueError(f"{file_path} was saved by a newer version of KherveFitting "
+                             f"(project version {metadata['version']})")
+        members = {info.filename: info for info in zf.infolist()}
+
+        with open(file_path, 'rb') as raw:
+            def read_array(name):
+                info = members[name]
+                if mmap and info.compress_type == zipfile.ZIP_STORED:
+                    return _map_member(file_path, raw, info)
+                return np.load(io.BytesIO(zf.read(name)), allow_pickle=False)
+
+            return _unpack(metadata['data'], read_array)
+
+
+def release_mapped_arrays(obj, file_path):
+    """Replace, in place, the arrays of a window.Data dict that are memory mapped from file_path by copies."""
+    file_path = os.path.abspath(file_path)
+
+    def release(value):
+        if isinstance(value, np.memmap) and value.filename and os.path.abspath(value.filename) == file_path:
+            return np.array(value)
+        if isinstance(value, (dict, list)):
+            release_mapped_arrays(value, file_path)
+        return value
+
+    if isinstance(obj, dict):
+        for key, value in obj.items():
+            obj[key] = release(value)
+    elif isinstance(obj, list):
+        for i, value in enumerate(obj):
+            obj[i] = release(value)
+
+
+class _ArrayWriter:
+    """Turns window.Data into JSON, collecting the arrays to write as .npy members on the way."""
+
+    def __init__(self, compressed_sheets):
+        self.compressed_sheets = compressed_sheets
+        self.arrays = []
+
+    def pack(self, obj, path):
+        if isinstance(obj, dict):
+            return {str(k): self.pack(v, path + (k,)) for k, v in obj.items()}
+        array = _as_numeric_array(obj)
+        if array is not None:
+            name = f"arrays/{len(self.arrays):05d}.npy"
+            self.arrays.append((name, array, self._compress_type(path)))
+            return {ARRAY_KEY: name}
+        if isinstance(obj, (list, tuple)):
+            return [self.pack(v, path) for v in obj]
+        if isinstance(obj, np.generic):
+            return obj.item()
+        if obj is None or isinstance(obj, (str, int, float, bool)):
+            return obj
+        if hasattr(obj, 'tolist'):
+            return self.pack(obj.tolist(), path)
+        # Same fallback as the .json sidecar
+        return str(obj)
+
+    def _compress_type(self, path):
+        if len(path) > 1 and path[0] == 'Core levels':
+            if self.compressed_sheets is True or path[1] in (self.compressed_sheets or ()):
+                return zipfile.ZIP_DEFLATED
+        return zipfile.ZIP_STORED
+
+
+def _as_numeric_array(obj):
+    """The array to store for obj, None if obj stays in the JSON."""
+    if isinstance(obj, np.ndarray):
+        if obj.dtype.kind in 'biuf' and obj.ndim > 0:
+            return np.ascontiguousarray(obj)
+        return None
+    if isinstance(obj, list) and len(obj) >= MIN_ARRAY_LENGTH:
+        # Plain numbers only, bools and None keep the list in the JSON
+        if all(type(v) in (float, int) or isinstance(v, (np.floating, np.integer)) for v in obj):
+            return np.asarray(obj, dtype=float)
+    return None
+
+
+def _unpack(obj, read_array):
+    if isinstance(obj, dict):
+        if len(obj) == 1 and ARRAY_KEY in obj:
+            return read_array(obj[ARRAY_KEY])
+        return {k: _unpack(v, read_array) for k, v in obj.items()}
+    if isinstance(obj, list):
+        return [_unpack(v, read_array) for v in obj]
+    return obj
+
+
+def _map_member(file_path, raw, info):
+    # The member data starts after its local header, whose name and extra field lengths can differ from the
+    # central directory ones
+    raw.seek(info.header_offset)
+    header = raw.read(ZIP_LOCAL_HEADER_SIZE)
+    name_length, extra_length = struct.unpack('<HH', header[26:30])
+    raw.seek(info.header_offset + ZIP_LOCAL_HEADER_SIZE + name_length + extra_length)
+
+    version = np.lib.format.read_magic(raw)
+    if version == (1, 0):
+        shape, fortran_order, dtype = np.lib.format.read_array_header_1_0(raw)
+    else:
+        shape, fortran_order, dtype = np.lib.format.read_array_header_2_0(raw)
+    if int(np.prod(shape)) == 0:
+        return np.empty(shape, dtype=dtype)
+    return np.memmap(file_path, dtype=dtype, mode='c', offset=raw.tell(), shape=shape,
+                     order='F' if fortran_order else 'C')
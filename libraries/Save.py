@@ -6,17 +6,20 @@ import numpy as np
 import wx
 # import requests
 import base64
-import io
 import os
 import pandas as pd
 from libraries.ConfigFile import add_core_level_Data
+from libraries.Project_File import save_project, project_path
+from libraries.Undo_History import freeze, thaw, snapshot_parts, history_nbytes
+from libraries.Spectrum_Store import adopt_spectra
+from libraries.Excel_Export import finish_export
+from libraries.Excel_Save import without_fit_curves, sheet_signature, results_table_signature, changed_sheets, \
+    write_sheet_to_workbook, write_plot_to_workbook, write_results_table_to_workbook
 import openpyxl
-from openpyxl.drawing.image import Image
-from openpyxl.styles import Font, Border, Side, PatternFill, Alignment
+from openpyxl.styles import Font, Border, Side, PatternFill
 from openpyxl.styles import Border, Side, PatternFill, Font
 from openpyxl import load_workbook
 from libraries.Sheet_Operations import on_sheet_selected
-from copy import deepcopy
 # from Functions import convert_to_serializable_and_round
 
 
@@ -26,35 +29,54 @@ def save_all_sheets_with_plots(window):
         return
 
     file_path = window.Data['FilePath']
+    current_sheet = window.sheet_combobox.GetValue()
 
     try:
-        for sheet_name in window.Data['Core levels'].keys():
-            # Select the sheet
-            window.sheet_combobox.SetValue(sheet_name)
+        # Only the sheets that changed since they were last written to this Excel file are written again
+        sheets_to_save = changed_sheets(window)
+        table_changed = window.excel_saved_signatures.get('Results Table') != results_table_signature(window)
+
+        if sheets_to_save or table_changed:
+            # Open the workbook once, update the sheets in memory and write it once at the end
+            finish_export(file_path)
+            wb = openpyxl.load_workbook(file_path)
+            saved_signatures = {}
             from libraries.Sheet_Operations import on_sheet_selected
-            on_sheet_selected(window, sheet_name)
+            for sheet_name in sheets_to_save:
+                # Select the sheet
+                window.sheet_combobox.SetValue(sheet_name)
+                on_sheet_selected(window, sheet_name)
+
+                # Get fitting data
+                fit_data = window.get_data_for_save()
 
-            # Get fitting data
-            fit_data = window.get_data_for_save()
+                # Fitting data and plot of the sheet
+                write_sheet_to_workbook(window, fit_data, wb, sheet_name)
+                write_plot_to_workbook(window, wb, sheet_name)
+                saved_signatures[sheet_name] = sheet_signature(window, sheet_name)
 
-            # Save fitting data to Excel
-            save_to_excel(window, fit_data, file_path, sheet_name)
+            # Save results table
+            write_results_table_to_workbook(window, wb)
+            wb.save(file_path)
 
-            # Save plot to Excel
-            save_plot_to_excel(window)
+            saved_signatures['Results Table'] = results_table_signature(window)
+            window.excel_saved_signatures.update(saved_signatures)
 
-        # Save results table
-        save_results_table(window)
+            # Back to the sheet that was shown before saving
+            if sheets_to_save and window.sheet_combobox.GetValue() != current_sheet:
+                window.sheet_combobox.SetValue(current_sheet)
+                on_sheet_selected(window, current_sheet)
 
-        json_file_path = os.path.splitext(file_path)[0] + '.json'
-        json_data = convert_to_serializable_and_round(window.Data)
-        with open(json_file_path, 'w') as json_file:
-            json.dump(json_data, json_file, indent=2)
+        write_project_file(window)
 
-        window.show_popup_message2("Save Complete", "All sheets, plots, and results table have been saved.")
+        window.show_popup_message2("Save Complete", f"{len(sheets_to_save)} changed sheet(s) of "
+                                                    f"{len(window.Data['Core levels'])}, their plots and the results "
+                                                    f"table have been saved.")
 
     except Exception as e:
         wx.MessageBox(f"Error saving sheets with plots: {str(e)}", "Error", wx.OK | wx.ICON_ERROR)
+
+
 def save_data(window, data):
     if 'FilePath' not in window.Data or not window.Data['FilePath']:
         wx.MessageBox("No file path found in window.Data. Please open a file first.", "Error", wx.OK | wx.ICON_ERROR)
@@ -64,22 +86,17 @@ def save_data(window, data):
     sheet_name = window.sheet_combobox.GetValue()
 
     try:
-        # Save to Excel
-        save_to_excel(window, data, file_path, sheet_name)
-
-        save_plot_to_excel(window)
-
-        # Save JSON file with entire window.Data
-        json_file_path = os.path.splitext(file_path)[0] + '.json'
-
-        # Create a copy of window.Data to modify
-        json_data = window.Data.copy()
-
-        # Convert numpy arrays and other non-serializable types to lists, and round floats
-        json_data = convert_to_serializable_and_round(json_data)
+        # Save the sheet and its plot to Excel, reading and writing the workbook once
+        finish_export(file_path)
+        wb = openpyxl.load_workbook(file_path)
+        write_sheet_to_workbook(window, data, wb, sheet_name)
+        write_plot_to_workbook(window, wb, sheet_name)
+        wb.save(file_path)
+        window.excel_saved_signatures[sheet_name] = sheet_signature(window, sheet_name)
+        window.show_popup_message2("Plot saved into Excel file", f"Under sheet: {sheet_name}")
 
-        with open(json_file_path, 'w') as json_file:
-            json.dump(json_data, json_file, indent=2)
+        # Save the project file with entire window.Data
+        write_project_file(window)
 
         # print(json.dumps(window.Data['Results']['Peak'], indent=2))
         print("Data Saved")
@@ -87,6 +104,33 @@ def save_data(window, data):
         wx.MessageBox(f"Error saving data: {str(e)}", "Error", wx.OK | wx.ICON_ERROR)
 
 
+def save_project_file(window):
+    """
+    Save the whole project (window.Data) to the binary project file next to the Excel file, without writing the
+    Excel file. The Excel sheets and plots are only written by Save Sheet and Save All.
+    """
+    if 'FilePath' not in window.Data or not window.Data['FilePath']:
+        wx.MessageBox("No file path found in window.Data. Please open a file first.", "Error", wx.OK | wx.ICON_ERROR)
+        return
+
+    try:
+        size = write_project_file(window)
+        window.SetStatusText(f"Project saved: {project_path(window.Data['FilePath'])} ({size / 1024 ** 2:.1f} MB)", 0)
+    except Exception as e:
+        wx.MessageBox(f"Error saving project: {str(e)}", "Error", wx.OK | wx.ICON_ERROR)
+
+
+def write_project_file(window):
+    """
+    Write window.Data to the project file that goes with window.Data['FilePath'], in place of the old .json file.
+
+    Returns:
+        int: Size of the project file in bytes
+    """
+    compressed_sheets = getattr(window, 'compress_project', False)
+    return save_project(window.Data, project_path(window.Data['FilePath']), compressed_sheets=compressed_sheets)
+
+
 def convert_to_serializable_and_round2(obj, decimal_places=2):
     try:
         if isinstance(obj, (float, np.float32, np.float64)):
@@ -198,152 +242,11 @@ def convert_to_serializable(obj):
 
 
 def save_to_excel(window, data, file_path, sheet_name):
-    existing_df = pd.read_excel(file_path, sheet_name=sheet_name)
-
-    # Remove previously fitted data if it exists
-    if existing_df.shape[1] > 5:
-        existing_df = existing_df.iloc[:, :5]
-
-    # Add columns if there aren't enough
-    while existing_df.shape[1] < 5:
-        existing_df[f'Column_{existing_df.shape[1] + 1}'] = ''
-
-    # Ensure there's an empty column E
-    if existing_df.shape[1] < 5:
-        existing_df.insert(4, '', np.nan)
-
-    if 'x_values' in data and data['x_values'] is not None:
-        x_values = data['x_values'].to_numpy() if isinstance(data['x_values'], pd.Series) else data['x_values']
-        filtered_data = pd.DataFrame({
-            'BE': x_values
-        })
-
-        if data['background'] is not None and data['calculated_fit'] is not None:
-            mask = np.isin(data['x_values'], x_values)
-            y_values = data['y_values'][mask]
-
-            if len(y_values) == len(data['calculated_fit']):
-                residuals = y_values - data['calculated_fit']
-                filtered_data['Residuals'] = residuals
-            else:
-                filtered_data['Residuals'] = np.nan
-        else:
-            filtered_data['Residuals'] = np.nan
-
-        filtered_data['Background'] = data['background'] if data['background'] is not None else np.nan
-        filtered_data['Calculated Fit'] = data['calculated_fit'] if data['calculated_fit'] is not None else np.nan
-
-        if data['individual_peak_fits']:
-            num_rows = len(x_values)
-            num_peaks = data['peak_params_grid'].GetNumberRows() // 2
-            for i in range(num_peaks):
-                row = i * 2
-                peak_label = data['peak_params_grid'].GetCellValue(row, 1)
-                if i < len(data['individual_peak_fits']):
-                    reversed_peak = np.array(data['individual_peak_fits'][i])[::-1]
-                    trimmed_peak = reversed_peak[:num_rows]
-                    filtered_data[peak_label] = trimmed_peak
-
-        # Rename columns to avoid conflicts before inserting them
-        for i, col in enumerate(filtered_data.columns):
-            new_col_name = col
-            while new_col_name in existing_df.columns:
-                new_col_name += '_new'
-            if col != 'Derivative':
-                existing_df.insert(5 + i, new_col_name, filtered_data[col])
-
-    # Ensure there are at least 23 columns (A to W)
-    while existing_df.shape[1] < 23:
-        existing_df[f'Column_{existing_df.shape[1] + 1}'] = ''
-
-    # Rename columns starting with "Unnamed" or "Column" to empty string
-    existing_df.columns = ['' if col.startswith(('Unnamed', 'Column')) else col for col in existing_df.columns]
-
-    # Ensure column E is empty
-    if existing_df.columns[4] != '':
-        existing_df.rename(columns={existing_df.columns[4]: ''}, inplace=True)
-
-    # Create DataFrame for peak fitting parameters
-    peak_params_df = pd.DataFrame()
-    for col in range(window.peak_params_grid.GetNumberCols()):
-        col_name = window.peak_params_grid.GetColLabelValue(col)
-        col_data = [window.peak_params_grid.GetCellValue(row, col) for row in
-                    range(window.peak_params_grid.GetNumberRows())]
-        peak_params_df[col_name] = col_data
+    finish_export(file_path)
+    wb = openpyxl.load_workbook(file_path)
+    write_sheet_to_workbook(window, data, wb, sheet_name)
+    wb.save(file_path)
 
-    # Add peak_params_df to existing_df starting from column 23 (X)
-    for i, col in enumerate(peak_params_df.columns):
-        existing_df.insert(23 + i, col, peak_params_df[col])
-
-    # Handle D-parameter derivative data
-    if window.selected_fitting_method == "D-parameter":
-        if 'Fitting' in window.Data['Core levels'][sheet_name] and 'Peaks' in window.Data['Core levels'][sheet_name][
-            'Fitting']:
-            d_param_data = window.Data['Core levels'][sheet_name]['Fitting']['Peaks'].get(
-                'D-parameter')
-            if d_param_data and 'Derivative' in d_param_data:
-                filtered_data['Derivative'] = d_param_data['Derivative']
-                existing_df.insert(7, 'Derivative', d_param_data['Derivative'])
-
-    with pd.ExcelWriter(file_path, engine='openpyxl', mode='a', if_sheet_exists='replace') as writer:
-        existing_df.to_excel(writer, sheet_name=sheet_name, index=False)
-
-        # Remove border from first row
-        workbook = writer.book
-        worksheet = workbook[sheet_name]
-        for cell in worksheet[1]:
-            cell.border = openpyxl.styles.Border(
-                left=openpyxl.styles.Side(style=None),
-                right=openpyxl.styles.Side(style=None),
-                top=openpyxl.styles.Side(style=None),
-                bottom=openpyxl.styles.Side(style=None)
-            )
-
-            # Define styles
-            thin_side = Side(style='thin')
-            thick_side = Side(style='medium')
-            green_fill = PatternFill(start_color="90EE90", end_color="90EE90", fill_type="solid")  # Light green
-            bold_font = Font(bold=True)
-
-            start_row = 2  # Assuming data starts from the second row
-            num_peak_rows = window.peak_params_grid.GetNumberRows()
-            end_row = start_row + num_peak_rows - 1
-            start_col = 24  # Column X (24th column)
-            end_col = worksheet.max_column
-
-            for row in range(start_row - 1, end_row + 1):  # Start from header row
-                for col in range(start_col, end_col + 1):
-                    cell = worksheet.cell(row=row, column=col)
-
-                    # Default to thin borders
-                    left = right = top = bottom = thin_side
-
-                    # Header row
-                    if row == start_row - 1:
-                        cell.fill = green_fill
-                        cell.font = bold_font
-                        top = thick_side
-
-                    # Add thick borders for outer edges
-                    if row == start_row - 1 or row == end_row:
-                        bottom = thick_side
-                    if col == start_col:
-                        left = thick_side
-                    if col == end_col:
-                        right = thick_side
-
-                    # Add thick bottom border for every second row (constraints row)
-                    if (row - start_row + 1) % 2 == 0:
-                        bottom = thick_side
-
-                    cell.border = Border(left=left, right=right, top=top, bottom=bottom)
-
-    # After saving to Excel, update the plot with the current limits
-    if hasattr(window, 'plot_config'):
-        limits = window.plot_config.get_plot_limits(window, sheet_name)
-        window.ax.set_xlim(limits['Xmax'], limits['Xmin'])  # Reverse X-axis
-        window.ax.set_ylim(limits['Ymin'], limits['Ymax'])
-        window.canvas.draw_idle()
 
 def save_to_excel_OLD(window, data, file_path, sheet_name):
     existing_df = pd.read_excel(file_path, sheet_name=sheet_name)
@@ -506,13 +409,11 @@ def refresh_sheets(window, on_sheet_selected_func):
     file_path = window.Data['FilePath']
 
     try:
-        # Save current state to JSON
-        json_file_path = os.path.splitext(file_path)[0] + '.json'
-        json_data = convert_to_serializable_and_round(window.Data)
-        with open(json_file_path, 'w') as json_file:
-            json.dump(json_data, json_file, indent=2)
+        # Save current state to the project file
+        write_project_file(window)
 
         # Reopen the XLSX file
+        finish_export(file_path)
         excel_file = pd.ExcelFile(file_path)
         sheet_names = excel_file.sheet_names
 
@@ -536,8 +437,8 @@ def refresh_sheets(window, on_sheet_selected_func):
         # Update B.E. and Raw Data with current Excel data
         for sheet_name in sheet_names:
             df = pd.read_excel(file_path, sheet_name=sheet_name)
-            window.Data['Core levels'][sheet_name]['B.E.'] = df.iloc[:, 0].tolist()
-            window.Data['Core levels'][sheet_name]['Raw Data'] = df.iloc[:, 1].tolist()
+            window.Data['Core levels'][sheet_name]['B.E.'] = df.iloc[:, 0].to_numpy()
+            window.Data['Core levels'][sheet_name]['Raw Data'] = df.iloc[:, 1].to_numpy()
 
         # Set the current sheet as selected if it still exists, otherwise select the first sheet
         if current_sheet in sheet_names:
@@ -603,6 +504,7 @@ def save_data_ORI(window, data):
     sheet_name = window.sheet_combobox.GetValue()
 
     try:
+        finish_export(file_path)
         existing_df = pd.read_excel(file_path, sheet_name=sheet_name)
 
         # Remove previously fitted data if it exists
@@ -746,35 +648,14 @@ def save_plot_to_excel(window):
 
    file_path = window.Data['FilePath']
    sheet_name = window.sheet_combobox.GetValue()
-   is_survey = "survey" in sheet_name.lower() or "wide" in sheet_name.lower()
 
    try:
-       # Get dimensions based on plot type
-       width = window.survey_excel_width if is_survey else window.excel_width
-       height = window.survey_excel_height if is_survey else window.excel_height
-       dpi = window.survey_excel_dpi if is_survey else window.excel_dpi
-
        print("Save plot to Excel")
 
-       # Save figure to buffer
-       buf = io.BytesIO()
-       original_size = window.figure.get_size_inches()
-       window.figure.set_size_inches(width, height)
-       window.figure.savefig(buf, format='png', dpi=dpi, bbox_inches='tight')
-       window.figure.set_size_inches(original_size)
-       buf.seek(0)
-
        # Save to Excel
+       finish_export(file_path)
        wb = openpyxl.load_workbook(file_path)
-       ws = wb.create_sheet(sheet_name) if sheet_name not in wb.sheetnames else wb[sheet_name]
-
-       # Clear existing images
-       for img in ws._images:
-           ws._images.remove(img)
-
-       # Add new image
-       img = Image(buf)
-       ws.add_image(img, 'D6')
+       write_plot_to_workbook(window, wb, sheet_name)
        wb.save(file_path)
 
        print(f"Plot saved to Excel file: {file_path}, Sheet: {sheet_name}")
@@ -885,74 +766,11 @@ def save_results_table(window):
     file_path = window.Data['FilePath']
 
     try:
+        finish_export(file_path)
         wb = openpyxl.load_workbook(file_path)
-
-        sheet_name = 'Results Table'
-        if sheet_name in wb.sheetnames:
-            wb.remove(wb[sheet_name])
-        ws = wb.create_sheet(sheet_name)
-
-        def get_column_letter(n):
-            result = ""
-            while n > 0:
-                n, remainder = divmod(n - 1, 26)
-                result = chr(65 + remainder) + result
-            return result
-
-        headers = [window.results_grid.GetColLabelValue(col) for col in range(window.results_grid.GetNumberCols())]
-        for col, header in enumerate(headers, start=2):
-            cell = ws.cell(row=2, column=col, value=header)
-            cell.font = Font(bold=True)
-            cell.fill = PatternFill(start_color="90EE90", end_color="90EE90", fill_type="solid")
-            cell.alignment = Alignment(horizontal="center", vertical="center")
-
-        for row in range(window.results_grid.GetNumberRows()):
-            for col in range(window.results_grid.GetNumberCols()):
-                cell = ws.cell(row=row + 3, column=col + 2, value=window.results_grid.GetCellValue(row, col))
-                cell.alignment = Alignment(horizontal="center", vertical="center")
-
-        thin_border = Border(left=Side(style='thin'), right=Side(style='thin'), top=Side(style='thin'),
-                             bottom=Side(style='thin'))
-        thick_border = Border(left=Side(style='medium'), right=Side(style='medium'), top=Side(style='medium'),
-                              bottom=Side(style='medium'))
-
-        max_row = ws.max_row
-        max_col = len(headers) + 1
-        end_letter = get_column_letter(max_col)
-
-        for row in ws[f'B2:{end_letter}2']:
-            for cell in row:
-                cell.border = thick_border
-
-        for row in ws[f'B3:{end_letter}{max_row}']:
-            for cell in row:
-                cell.border = thin_border
-
-        for col in range(2, max_col + 1):
-            ws.cell(row=2, column=col).border = Border(left=ws.cell(row=2, column=col).border.left,
-                                                       right=ws.cell(row=2, column=col).border.right,
-                                                       top=Side(style='medium'),
-                                                       bottom=ws.cell(row=2, column=col).border.bottom)
-            ws.cell(row=max_row, column=col).border = Border(left=ws.cell(row=max_row, column=col).border.left,
-                                                             right=ws.cell(row=max_row, column=col).border.right,
-                                                             top=ws.cell(row=max_row, column=col).border.top,
-                                                             bottom=Side(style='medium'))
-
-        for row in range(2, max_row + 1):
-            ws.cell(row=row, column=2).border = Border(left=Side(style='medium'),
-                                                       right=ws.cell(row=row, column=2).border.right,
-                                                       top=ws.cell(row=row, column=2).border.top,
-                                                       bottom=ws.cell(row=row, column=2).border.bottom)
-            ws.cell(row=row, column=max_col).border = Border(left=ws.cell(row=row, column=max_col).border.left,
-                                                             right=Side(style='medium'),
-                                                             top=ws.cell(row=row, column=max_col).border.top,
-                                                             bottom=ws.cell(row=row, column=max_col).border.bottom)
-
-        for column_cells in ws.columns:
-            length = max(len(str(cell.value)) for cell in column_cells)
-            ws.column_dimensions[column_cells[0].column_letter].width = length + 2
-
+        write_results_table_to_workbook(window, wb)
         wb.save(file_path)
+        window.excel_saved_signatures['Results Table'] = results_table_signature(window)
 
         window.show_popup_message2("Table Saved","Results table has been saved to the Excel file.")
 
@@ -961,28 +779,28 @@ def save_results_table(window):
 
 
 def save_state(window):
-    current_sheet = window.sheet_combobox.GetValue()
+    # Each state shares with the one before it everything that did not change, see Undo_History
+    previous = window.history[-1] if window.history else {}
     state = {
-        'Data': deepcopy(window.Data),
-        'current_sheet': current_sheet,
-        'sheets': {
-            sheet: {
-                'peak_params_grid': get_grid_data(window.peak_params_grid),
-                'peak_count': window.peak_count,
-                'selected_peak_index': window.selected_peak_index,
-            } for sheet in window.Data['Core levels'].keys()
-        },
-        'results_grid':  {
+        'Data': freeze(window.Data, previous.get('Data')),
+        'current_sheet': window.sheet_combobox.GetValue(),
+        'peak_params_grid': freeze(get_grid_data(window.peak_params_grid), previous.get('peak_params_grid')),
+        'peak_count': window.peak_count,
+        'selected_peak_index': window.selected_peak_index,
+        'results_grid': freeze({
             'data': get_grid_data(window.results_grid),
             'num_rows': window.results_grid.GetNumberRows(),
             'num_cols': window.results_grid.GetNumberCols(),
             'checkbox_states': [window.results_grid.GetCellValue(row, 7) for row in
                                 range(window.results_grid.GetNumberRows())]
-        }
+        }, previous.get('results_grid')),
     }
+    state['parts'] = snapshot_parts((state['Data'], state['peak_params_grid'], state['results_grid']))
     window.history.append(state)
     window.redo_stack.clear()
-    if len(window.history) > window.max_history:
+
+    # Drop the oldest states once the history uses more than its memory budget, always keeping the current one
+    while len(window.history) > 1 and history_nbytes(window.history) > window.undo_memory_budget:
         window.history.pop(0)
     update_undo_redo_state(window)
 
@@ -1003,14 +821,13 @@ def redo(window):
 
 
 def restore_state(window, state):
-    window.Data = deepcopy(state['Data'])
+    # New window.Data from the state, keeping the sheets and spectra that are already as in the state
+    window.Data = adopt_spectra(thaw(state['Data'], window.Data))
 
-    # Restore sheet-specific data
-    for sheet, sheet_data in state['sheets'].items():
-        if sheet == state['current_sheet']:
-            set_grid_data(window.peak_params_grid, sheet_data['peak_params_grid'])
-            window.peak_count = sheet_data['peak_count']
-            window.selected_peak_index = sheet_data['selected_peak_index']
+    # Restore the peak grid of the sheet the state was saved on
+    set_grid_data(window.peak_params_grid, state['peak_params_grid'])
+    window.peak_count = state['peak_count']
+    window.selected_peak_index = state['selected_peak_index']
 
     # Restore results grid
     results_grid_data = state['results_grid']
@@ -1077,7 +894,7 @@ def save_plot_data_and_script(window, png_filepath):
     y_values = np.array(data['y_values'])
     background = np.array(data['background'])
     envelope = np.array(data['calculated_fit'])
-    fitted_peaks = [np.array(peak) for peak in data['individual_peak_fits']]
+    fitted_peaks = [np.array(peak) for peak in data['individual_peak_fits'] if peak is not None]
 
     # Ensure all arrays have the same length as x_values
     length = len(x_values)
@@ -1129,7 +946,8 @@ def save_plot_data_and_script(window, png_filepath):
 def create_plot_script_from_excel(window):
     file_path = window.Data['FilePath']
     sheet_name = window.sheet_combobox.GetValue()
-    # Read the Excel file
+    # Read the Excel file, once an import still writing it is done
+    finish_export(file_path)
     df = pd.read_excel(file_path, sheet_name=sheet_name)
 
     # Extract data
@@ -1292,7 +1110,8 @@ def save_peaks_library(window):
         peaks_data = {
             'Core levels': {
                 sheet_name: {
-                    'Fitting': convert_numpy_to_list(window.Data['Core levels'][sheet_name]['Fitting'])
+                    'Fitting': convert_numpy_to_list(
+                        without_fit_curves(window.Data['Core levels'][sheet_name]['Fitting']))
                 }
             }
         }
@@ -1351,7 +1170,7 @@ def save_peaks_to_github(window, filename):
     peaks_data = {
         'Core levels': {
             sheet_name: {
-                'Fitting': window.Data['Core levels'][sheet_name]['Fitting'],
+                'Fitting': without_fit_curves(window.Data['Core levels'][sheet_name]['Fitting']),
                 'Background': window.Data['Core levels'][sheet_name]['Background']
             }
         }
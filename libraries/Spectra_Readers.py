@@ -0,0 +1,408 @@
+# libraries/Spectra_Readers.py
+
+# Readers that turn one instrument file (VAMAS, Avantage .avg, Kratos .kal, PHI .spe, .mrs) into in memory
+# spectra, without writing or reading any Excel file and without wx, so they can run in worker processes.
+# Every reader returns a list of (name, spectrum) pairs, spectrum being the dict of arrays block_spectrum gives
+# for VAMAS ('x_label', 'x', 'raw', 'transmission', 'corrected'). import_many reads many files at once in a pool of
+# worker processes, reporting progress as files finish and stopping when asked to.
+
+import os
+import re
+import warnings
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+from functools import lru_cache
+
+import numpy as np
+from scipy.interpolate import interp1d
+
+from libraries.Vamas_Reader import read_vamas, block_sheet_name, block_spectrum
+
+# Photon energy of the Kratos and PHI files, as used by their Excel converters
+KAL_PHOTON_ENERGY = 1486.67
+SPE_PHOTON_ENERGY = 1486.6
+# Transmission coefficients a * KE^-b of PHI files that do not give them
+SPE_DEFAULT_TRANSMISSION = (31.826, 0.229)
+# Seconds between two progress reports while waiting for the worker processes
+PROGRESS_INTERVAL = 0.1
+
+# Header lines of an Avantage .avg file: photon energy and energy axis (the line after $SPACEAXES=1)
+AVG_PHOTON_ENERGY = re.compile(r'DS_SOPROPID_ENERGY\s+:\s+VT_R4\s+=\s+(\d+\.\d+)')
+AVG_ENERGY_AXIS = re.compile(r'0=\s+(\d+\.\d+),\s+(\d+\.\d+),\s+(\d+),')
+# Size of the chunks of lines an .avg file is read in
+AVG_READ_SIZE = 1 << 20
+
+# Blocks of a Kratos .kal file start at a 'Dataset filename' line, their transmission table follows the
+# 'Transmission Function Object (ke,t)' line
+KAL_BLOCK_START = 'Dataset filename'
+KAL_TRANSMISSION = 'Transmission Function Object (ke,t)'
+KAL_TRANSMISSION_FIELDS = ('Transmission Function Kinetic Energy', 'Transmission Function Value')
+# Transmission functions kept for reuse, files usually share one or a few
+KAL_TRANSMISSION_CACHE_SIZE = 32
+
+
+def spectrum(x, raw, transmission=None, x_label="Binding Energy"):
+    """Spectrum dict of a reader, transmission of 1 if the file has none."""
+    x = np.asarray(x, dtype=float)
+    raw = np.asarray(raw, dtype=float)
+    transmission = np.ones(len(raw)) if transmission is None else np.asarray(transmission, dtype=float)
+    return {
+        'x_label': x_label,
+        'x': x,
+        'raw': raw,
+        'transmission': transmission,
+        'corrected': raw / transmission,
+    }
+
+
+def read_vamas_spectra(file_path, photons, workfunction):
+    """One spectrum per block of a VAMAS file, named like its sheet."""
+    _, blocks = read_vamas(file_path)
+    names = []
+    spectra = []
+    for block in blocks:
+        names.append(block_sheet_name(block, names))
+        spectra.append(block_spectrum(block, photons, workfunction))
+    return list(zip(names, spectra))
+
+
+def parse_avg_file(file_path):
+    """
+    Read an Avantage .avg file in chunks of lines. The photon energy and the energy axis are looked for line by line
+    only until both are found, the values of the LIST@ lines are gathered as text and converted by numpy in one go.
+
+    Args:
+        file_path (str): Path of the .avg file
+
+    Returns:
+        tuple: (photon_energy, start_energy, width, num_points, y_values), y_values a float64 array of all the
+        LIST@ values (it can be longer than num_points)
+    """
+    photon_energy = None
+    axis = None
+    after_space_axes = False
+    lists = []
+
+    with open(file_path, 'r') as file:
+        while True:
+            lines = file.readlines(AVG_READ_SIZE)
+            if not lines:
+                break
+
+            # Header lines, only until both have been found
+            if photon_energy is None or axis is None:
+                for line in lines:
+                    if photon_energy is None and 'DS_SOPROPID_ENERGY' in line:
+                        match = AVG_PHOTON_ENERGY.search(line)
+                        if match is not None:
+                            photon_energy = float(match.group(1))
+                    elif axis is None:
+                        stripped = line.strip()
+                        if after_space_axes:
+                            axis = AVG_ENERGY_AXIS.match(stripped)
+                        after_space_axes = stripped == '$SPACEAXES=1' or (after_space_axes and not stripped)
+
+            values = ','.join(line.partition('=')[2].strip() for line in lines if line.startswith('LIST@'))
+            if values:
+                lists.append(values)
+
+    if photon_energy is None or axis is None:
+        raise ValueError(f"No photon energy or energy axis found in {os.path.basename(file_path)}")
+
+    start_energy, width, num_points = float(axis.group(1)), float(axis.group(2)), int(axis.group(3))
+
+    y_values = text_values(','.join(lists), f"LIST@ values in {os.path.basename(file_path)}")
+    return photon_energy, start_energy, width, num_points, y_values
+
+
+def read_avg_spectra(file_path, photons=None, workfunction=None):
+    """The spectrum of an Avantage .avg file, named after the file."""
+    photon_energy, start_energy, width, num_points, y_values = parse_avg_file(file_path)
+    be_values = photon_energy - (start_energy + np.arange(num_points) * width)
+    name = os.path.splitext(os.path.basename(file_path))[0]
+    return [(name, spectrum(be_values, y_values[:num_points]))]
+
+
+def read_kal_blocks(file_path):
+    """
+    Read a Kratos .kal file line by line, splitting each block into its fields once. A block starts at its
+    'Dataset filename' line, a field is a 'name = value' line, and a list value in braces can run over several lines.
+
+    Args:
+        file_path (str): Path to the .kal file
+
+    Returns:
+        list: One dict per block, {field name: value text} with the first value of each field. The transmission
+        table fields are only kept after the 'Transmission Function Object (ke,t)' line of their block
+    """
+    blocks = [{}]
+    fields = blocks[0]
+    in_transmission = False
+    key = None
+    value = ''
+
+    with open(file_path, 'r') as f:
+        for line in f:
+            # Rest of a list in braces
+            if key is not None:
+                value += line
+                if value.count('{') <= value.count('}'):
+                    fields.setdefault(key, value)
+                    key = None
+                continue
+
+            if KAL_BLOCK_START in line:
+                fields = {}
+                blocks.append(fields)
+                in_transmission = False
+            if KAL_TRANSMISSION in line:
+                in_transmission = True
+                continue
+
+            name, equals, text = line.partition('=')
+            if not equals:
+                continue
+            name = name.strip()
+            if name in KAL_TRANSMISSION_FIELDS and not in_transmission:
+                continue
+            if text.count('{') > text.count('}'):
+                key, value = name, text
+            else:
+                fields.setdefault(name, text)
+
+    if key is not None:
+        fields.setdefault(key, value)
+    return blocks
+
+
+def text_values(text, what="values"):
+    """
+    float64 array of the comma separated numbers of a text, converted in one go.
+
+    Raises:
+        ValueError: If part of the text is not a number, what says which values in the message
+    """
+    # fromstring only warns about text it could not read, make that an error instead of dropping the rest
+    with warnings.catch_warnings():
+        warnings.simplefilter('error', DeprecationWarning)
+        try:
+            return np.fromstring(text, sep=',') if text.strip() else np.empty(0)
+        except DeprecationWarning:
+            raise ValueError(f"Unreadable {what}") from None
+
+
+@lru_cache(maxsize=KAL_TRANSMISSION_CACHE_SIZE)
+def kal_transmission_function(ke_text, value_text):
+    """
+    Linear interpolation of a Kratos transmission table, extrapolated past its ends. Cached by the text of the
+    table, the blocks (and files) measured with the same transmission share one function.
+
+    Args:
+        ke_text (str): Kinetic energies of the table, comma separated
+        value_text (str): Transmission values of the table, comma separated
+
+    Returns:
+        scipy.interpolate.interp1d: Transmission as a function of the kinetic energy
+    """
+    ke_trans = text_values(_braces_content(ke_text), "transmission function kinetic energies")
+    trans_values = text_values(_braces_content(value_text), "transmission function values")
+    return interp1d(ke_trans, trans_values, kind='linear', bounds_error=False, fill_value='extrapolate')
+
+
+def read_kal_spectra(file_path, photons=None, workfunction=None):
+    """The spectra of a Kratos .kal file that have a transmission function, named after their object."""
+    spectra = []
+    for fields in read_kal_blocks(file_path):
+        if 'Ordinate values' not in fields or 'Object name' not in fields:
+            continue
+        ke_text = fields.get('Transmission Function Kinetic Energy')
+        value_text = fields.get('Transmission Function Value')
+        if ke_text is None or value_text is None:
+            continue
+
+        name = fields['Object name'].split('/')[0].strip()
+        trans_func = kal_transmission_function(ke_text.strip(), value_text.strip())
+
+        start_ke = float(fields['Spectrum scan start'].split('eV')[0])
+        step = float(fields['Spectrum scan step size'].split('eV')[0])
+        raw_data = text_values(_braces_content(fields['Ordinate values']), f"ordinate values of {name}")
+
+        num_points = len(raw_data)
+        ke_values = np.linspace(start_ke, start_ke + (num_points - 1) * step, num_points)
+        spectra.append((name.replace(' ', ''), spectrum(KAL_PHOTON_ENERGY - ke_values, raw_data,
+                                                        trans_func(ke_values), x_label='BE')))
+    return spectra
+
+
+def _braces_content(text):
+    # What is between the braces of a list value, '{1, 2, 3}' -> '1, 2, 3'
+    return text.strip().lstrip('{').partition('}')[0]
+
+
+def read_spe_transmission_coefficients(file_path):
+    """(a, b) of the a * KE^-b transmission function of a PHI .spe file, the defaults if it has none."""
+    with open(file_path, 'rb') as f:
+        for line in f:
+            decoded_line = line.decode('utf-8', errors='ignore').strip()
+            if 'IntensityCalCoeff:' in decoded_line:
+                try:
+                    _, coeffs = decoded_line.split(':', 1)
+                    a, b = map(float, coeffs.strip().split())
+                    return a, b
+                except ValueError:
+                    continue
+    return SPE_DEFAULT_TRANSMISSION
+
+
+def read_spe_spectra(file_path, photons=None, workfunction=None):
+    """One spectrum per core level of a PHI .spe file."""
+    from yadg.extractors.phi.spe import extract
+
+    data = extract(fn=file_path)
+    a, b = read_spe_transmission_coefficients(file_path)
+
+    spectra = []
+    for core_level in data:
+        energy = data[core_level].coords["E"].values
+        intensity = data[core_level].data_vars["y"].values
+        # Transmission from the kinetic energy, Al Ka
+        transmission = a * np.power(SPE_PHOTON_ENERGY - energy, -b)
+        spectra.append((core_level, spectrum(energy, intensity, transmission, x_label='BE')))
+    return spectra
+
+
+def read_mrs_spectra(file_path, photons=None, workfunction=None):
+    """The spectrum of an .mrs file, named after the file."""
+    raw_data = []
+    be_start = None
+    be_end = None
+    delimiter_count = 0
+    in_data_section = False
+
+    with open(file_path, 'r') as f:
+        for line in f:
+            stripped = line.strip()
+            if stripped == "!":
+                delimiter_count += 1
+                if delimiter_count == 2:  # Stop processing after the second "!"
+                    break
+                in_data_section = True
+                continue
+
+            if in_data_section and stripped.isdigit():
+                raw_data.append(int(stripped))
+
+            if 'lo_be=' in line:
+                be_start = float(line.split('=')[1].strip())
+            elif 'up_be=' in line:
+                be_end = float(line.split('=')[1].strip())
+
+    if be_start is None or be_end is None or len(raw_data) < 2:
+        raise ValueError("Missing essential metadata: 'lo_be', 'up_be', or step size.")
+
+    step_size = (be_end - be_start) / (len(raw_data) - 1)
+    be_values = be_start + np.arange(len(raw_data)) * step_size
+    name = os.path.splitext(os.path.basename(file_path))[0]
+    return [(name, spectrum(be_values, raw_data, x_label='BE'))]
+
+
+# Reader of each file extension
+READERS = {
+    '.vms': read_vamas_spectra,
+    '.avg': read_avg_spectra,
+    '.kal': read_kal_spectra,
+    '.spe': read_spe_spectra,
+    '.mrs': read_mrs_spectra,
+}
+
+
+def is_importable(file_path):
+    """True if a reader handles the file."""
+    return os.path.splitext(file_path)[1].lower() in READERS
+
+
+def read_spectra_file(file_path, photons, workfunction):
+    """
+    Read the spectra of one instrument file with the reader of its extension.
+
+    Args:
+        file_path (str): Path of the file
+        photons (float): Photon energy, to convert kinetic energies (VAMAS)
+        workfunction (float): Work function, to convert kinetic energies (VAMAS)
+
+    Returns:
+        list: (name, spectrum) pairs
+    """
+    reader = READERS.get(os.path.splitext(file_path)[1].lower())
+    if reader is None:
+        raise ValueError(f"Unsupported file type: {os.path.basename(file_path)}")
+    return reader(file_path, photons, workfunction)
+
+
+def import_many(file_paths, photons, workfunction, max_workers=None, progress=None):
+    """
+    Read many instrument files at once in a pool of worker processes.
+
+    Args:
+        file_paths (list): Files to read
+        photons (float), workfunction (float): Passed to the readers
+        max_workers (int): Number of worker processes, os.cpu_count() if None
+        progress (callable): Called in the calling process as progress(done, total, file_path) each time a file
+            has been read and every PROGRESS_INTERVAL seconds while waiting (file_path None), so the GUI can update
+            and stay responsive. Returning False cancels the import: files not started are dropped and the call
+            returns without waiting for the ones being read
+
+    Returns:
+        tuple: (results, errors, cancelled). results is a list of (file_path, spectra) in the order of file_paths,
+            errors a dict of the exception raised by each file that could not be read
+    """
+    results = {}
+    errors = {}
+    total = len(file_paths)
+
+    def collect(file_path, spectra, error=None):
+        if error is None:
+            results[file_path] = spectra
+        else:
+            errors[file_path] = error
+
+    def report(file_path):
+        return progress is None or progress(len(results) + len(errors), total, file_path) is not False
+
+    def ordered(cancelled):
+        return [(path, results[path]) for path in file_paths if path in results], errors, cancelled
+
+    workers = min(max_workers or os.cpu_count() or 1, total)
+    if workers <= 1:
+        # No point paying the process start-up for a single file
+        for file_path in file_paths:
+            try:
+                collect(file_path, read_spectra_file(file_path, photons, workfunction))
+            except Exception as e:
+                collect(file_path, None, e)
+            if not report(file_path):
+                return ordered(True)
+        return ordered(False)
+
+    executor = ProcessPoolExecutor(max_workers=workers)
+    cancelled = False
+    try:
+        futures = {executor.submit(read_spectra_file, file_path, photons, workfunction): file_path
+                   for file_path in file_paths}
+        pending = set(futures)
+        while pending and not cancelled:
+            done, pending = wait(pending, timeout=PROGRESS_INTERVAL, return_when=FIRST_COMPLETED)
+            if not done:
+                cancelled = not report(None)
+            for future in done:
+                file_path = futures[future]
+                try:
+                    collect(file_path, future.result())
+                except Exception as e:
+                    collect(file_path, None, e)
+                cancelled = not report(file_path)
+                if cancelled:
+                    break
+    finally:
+        # A cancelled import does not wait for the files being read
+        executor.shutdown(wait=not cancelled, cancel_futures=True)
+    return ordered(cancelled)
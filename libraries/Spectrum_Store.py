@@ -0,0 +1,93 @@
+# libraries/Spectrum_Store.py
+
+# Core levels of window.Data keep their energy, intensity, transmission and background as contiguous float64
+# arrays instead of Python lists. SpectrumStore is the dict of one core level (and of its Background): it works
+# like the plain dict it replaces, but every spectrum assigned to it is stored once as a read only float64 array,
+# so the plot, background and fitting code get arrays they can use directly instead of converting lists each
+# time. Arrays memory mapped from a project file are kept mapped. Converting to and from lists only happens when
+# reading or writing files (Excel, JSON), and the read only arrays can be shared (sheet copies, undo) without copying.
+
+import numpy as np
+
+# Keys of a core level (and of its Background) that hold spectra
+SPECTRUM_KEYS = ('B.E.', 'Raw Data', 'Transmission', 'Bkg X', 'Bkg Y')
+
+
+def spectrum_array(values):
+    """
+    Read only contiguous float64 array of a spectrum.
+
+    Args:
+        values (list or np.ndarray): Spectrum values
+
+    Returns:
+        np.ndarray: values itself if it already is a read only float64 array, a read only view if it is memory
+        mapped, a read only copy otherwise
+    """
+    if isinstance(values, np.ndarray) and values.dtype == np.float64 and values.ndim == 1 and \
+            values.flags.c_contiguous:
+        if isinstance(values, np.memmap):
+            view = values.view()
+            view.flags.writeable = False
+            return view
+        if not values.flags.writeable:
+            return values
+    array = np.array(values, dtype=np.float64)
+    array.setflags(write=False)
+    return array
+
+
+class SpectrumStore(dict):
+    """
+    dict of one core level of window.Data, or of its Background, that stores its spectra (SPECTRUM_KEYS) as read
+    only float64 arrays. Anything else is stored as given, a Background dict becomes a SpectrumStore too. Values
+    that are not a 1D list of numbers (text columns, '') are kept as they are.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__()
+        self.update(*args, **kwargs)
+
+    def __setitem__(self, key, value):
+        if key in SPECTRUM_KEYS:
+            value = _stored_spectrum(value)
+        elif key == 'Background' and isinstance(value, dict) and not isinstance(value, SpectrumStore):
+            value = SpectrumStore(value)
+        super().__setitem__(key, value)
+
+    def update(self, *args, **kwargs):
+        for key, value in dict(*args, **kwargs).items():
+            self[key] = value
+
+    def setdefault(self, key, default=None):
+        if key not in self:
+            self[key] = default
+        return self[key]
+
+    def copy(self):
+        # Spectra are read only, the copy shares them
+        return type(self)(self)
+
+
+def adopt_spectra(data):
+    """
+    Turn every core level of a window.Data dict read from a file or restored from the undo history into a
+    SpectrumStore, in place.
+
+    Returns:
+        dict: data
+    """
+    core_levels = data.get('Core levels')
+    if isinstance(core_levels, dict):
+        for sheet_name, core_level in core_levels.items():
+            if isinstance(core_level, dict) and not isinstance(core_level, SpectrumStore):
+                core_levels[sheet_name] = SpectrumStore(core_level)
+    return data
+
+
+def _stored_spectrum(value):
+    try:
+        array = spectrum_array(value)
+    except (TypeError, ValueError):
+        return value
+    return array if array.ndim == 1 else value
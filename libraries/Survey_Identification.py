@@ -0,0 +1,138 @@
+# libraries/Survey_Identification.py
+
+# Automatic identification of the elements of a survey (Wide) spectrum. The peaks are found in one go with
+# scipy's find_peaks on a lightly smoothed spectrum, their prominence judged against the noise of the counts.
+# Every peak is then matched against the lines of all elements at once, by binary search in the binding energy
+# sorted SurveyIndex of the line library. An element is a candidate when its strongest line within the spectrum
+# is matched, and the candidates are ranked by how much of their expected lines were found and how strong their
+# main peak is.
+
+import numpy as np
+from scipy.ndimage import uniform_filter1d
+from scipy.signal import find_peaks
+
+# Distance in eV between a peak and a library line for them to match
+SURVEY_TOLERANCE = 1.5
+# Points of the moving average applied before looking for peaks
+SMOOTHING_POINTS = 5
+# Peaks need a prominence of this many times the noise, and of this fraction of the spectrum range
+MIN_PEAK_SIGNIFICANCE = 5.0
+MIN_PEAK_FRACTION = 0.005
+# Weight of a matched Auger line against an element's strongest core level (the library has no RSF for them)
+AUGER_WEIGHT = 0.3
+# Score kept by an element whose main line falls on a peak a more likely element already explains
+SHARED_PEAK_FACTOR = 0.25
+# Elements scoring lower are not returned
+MIN_CANDIDATE_SCORE = 0.02
+# Main core levels the "Add to Grid" button of the survey window takes
+GRID_ORBITALS = ('1s', '2p', '3d', '4f')
+# Core levels weaker than this fraction of the element's strongest one are not expected to be seen
+MIN_LINE_WEIGHT = 0.1
+
+
+def find_survey_peaks(x, y, smoothing=SMOOTHING_POINTS):
+    """
+    Peaks of a survey spectrum.
+
+    Args:
+        x (np.ndarray): Binding energies
+        y (np.ndarray): Intensities
+        smoothing (int): Points of the moving average applied first, 1 for none
+
+    Returns:
+        tuple: (energies, prominences) of the peaks, arrays sorted by prominence, strongest first
+    """
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    if len(y) < 3:
+        return np.empty(0), np.empty(0)
+
+    # Noise of the counts from the point to point differences, robust to the peaks themselves
+    noise = 1.4826 * np.median(np.abs(np.diff(y))) / np.sqrt(2)
+
+    if smoothing > 1 and len(y) > smoothing:
+        # The ends are averaged with copies of the end point, zero padding would dip and leave a false peak there
+        y = uniform_filter1d(y, smoothing, mode='nearest')
+
+    min_prominence = max(MIN_PEAK_SIGNIFICANCE * noise, MIN_PEAK_FRACTION * (y.max() - y.min()))
+
+    indices, properties = find_peaks(y, prominence=min_prominence)
+    order = np.argsort(properties['prominences'])[::-1] if len(indices) else np.empty(0, dtype=int)
+    return x[indices][order], properties['prominences'][order]
+
+
+def identify_survey(x, y, index, tolerance=SURVEY_TOLERANCE):
+    """
+    Elements whose lines match the peaks of a survey spectrum, most likely first, those scoring below
+    MIN_CANDIDATE_SCORE left out.
+
+    Args:
+        x (np.ndarray): Binding energies
+        y (np.ndarray): Intensities
+        index (SurveyIndex): Lines of the library for the photon energy of the spectrum
+        tolerance (float): Distance in eV between a peak and a line for them to match
+
+    Returns:
+        list: One dict per candidate element, by score:
+            'element', 'score' (0 to 1),
+            'main' (name, binding energy) of its strongest matched line, as the "Add to Grid" list takes it,
+            'lines' [(name, line binding energy, peak binding energy)] of every matched line
+    """
+    peaks, prominences = find_survey_peaks(x, y)
+    if not len(peaks):
+        return []
+    strength = prominences / prominences.max()
+
+    # Closest peak to each line near one, all peaks at once
+    start, end = index.near(peaks, tolerance)
+    matched = {}
+    for peak, (first, last) in enumerate(zip(start, end)):
+        for line in range(first, last):
+            distance = abs(index.be[line] - peaks[peak])
+            if line not in matched or distance < matched[line][1]:
+                matched[line] = (peak, distance)
+
+    low, high = np.min(x), np.max(x)
+    candidates = []
+    for element in {index.elements[line] for line in matched}:
+        # Lines of the element that should show in this spectrum, weighted by RSF
+        lines = [line for line in index.element_lines(element) if low <= index.be[line] <= high]
+        core_levels = [line for line in lines if not index.auger[line]]
+        if not core_levels:
+            continue
+        max_rsf = max(index.rsf[line] for line in core_levels)
+        weights = {line: AUGER_WEIGHT if index.auger[line] else
+                   (index.rsf[line] / max_rsf if max_rsf > 0 else 1.0) for line in lines}
+        expected = [line for line in lines if weights[line] >= MIN_LINE_WEIGHT]
+
+        # The strongest core level has to be there
+        main = max(core_levels, key=lambda line: weights[line])
+        if main not in matched:
+            continue
+
+        found = [line for line in expected if line in matched]
+        coverage = sum(weights[line] for line in found) / sum(weights[line] for line in expected)
+
+        # Line given for the grid: the strongest matched one it takes, the strongest core level otherwise
+        grid_lines = [line for line in found if index.names[line] in GRID_ORBITALS]
+        shown = max(grid_lines, key=lambda line: weights[line]) if grid_lines else main
+        candidates.append({
+            'element': element,
+            'score': float(coverage * strength[matched[main][0]]),
+            'main': (index.names[shown], float(index.be[shown])),
+            'main_peak': matched[main][0],
+            'lines': [(index.names[line], float(index.be[line]), float(peaks[matched[line][0]]))
+                      for line in sorted(found, key=lambda line: -weights[line])],
+        })
+
+    # A peak already explained by the main line of a more likely element counts less for the next ones
+    candidates.sort(key=lambda candidate: -candidate['score'])
+    explained = set()
+    for candidate in candidates:
+        main_peak = candidate.pop('main_peak')
+        if main_peak in explained:
+            candidate['score'] *= SHARED_PEAK_FACTOR
+        explained.add(main_peak)
+
+    candidates.sort(key=lambda candidate: -candidate['score'])
+    return [candidate for candidate in candidates if candidate['score'] >= MIN_CANDIDATE_SCORE]
@@ -0,0 +1,185 @@
+# libraries/Undo_History.py
+
+# Snapshots of window.Data for undo and redo that share what did not change. Each snapshot is built against the
+# previous one: a sheet, dict, list or spectrum equal to the one in the previous snapshot is reused as is, so an
+# action that changes one sheet only costs that sheet. Spectra (numeric arrays and long lists of numbers) are kept
+# as read only arrays, shared by every snapshot they did not change in. Snapshots are never handed to the
+# application, restoring builds a new window.Data and keeps the live objects that already hold the right values.
+# The history is capped by the memory it uses (shared arrays counted once) instead of a number of entries.
+
+import sys
+from copy import deepcopy
+
+import numpy as np
+
+# Shorter lists of numbers are kept as lists
+MIN_SPECTRUM_LENGTH = 16
+# Rough size of a dict entry, list item or scalar held by a snapshot, for the memory estimate
+NODE_BYTES = 64
+
+
+class Spectrum:
+    """
+    A read only copy of a spectrum held by one or more snapshots, restored as a list or an array.
+
+    Args:
+        values (np.ndarray): Read only numbers of the spectrum
+        as_list (bool): The spectrum was a list
+        writable (bool): The spectrum was a writable array, restored as a copy instead of the shared values
+    """
+    __slots__ = ('values', 'as_list', 'writable')
+
+    def __init__(self, values, as_list, writable=False):
+        self.values = values
+        self.as_list = as_list
+        self.writable = writable
+
+    def matches(self, value, values=None):
+        """
+        True if value is a list or array of the same kind holding the same numbers.
+
+        Args:
+            value: List or array to compare with
+            values (np.ndarray): value as an array if already converted, None to convert it here
+        """
+        if self.as_list != isinstance(value, list):
+            return False
+        if not self.as_list and self.writable != bool(value.flags.writeable):
+            return False
+        if values is None:
+            values = _as_spectrum_values(value)
+        if values is None or values.dtype != self.values.dtype or values.shape != self.values.shape:
+            return False
+        return np.array_equal(self.values, values, equal_nan=values.dtype.kind == 'f')
+
+    def thaw(self):
+        if self.as_list:
+            return self.values.tolist()
+        if self.writable:
+            return self.values.copy()
+        # Read only arrays can go back shared, nothing can change them
+        return self.values
+
+
+def freeze(value, previous=None):
+    """
+    Snapshot of value (window.Data or any part of it), reusing the parts of previous that are unchanged.
+
+    Args:
+        value: Live data
+        previous: Snapshot of the same data taken before, None for none
+
+    Returns:
+        Snapshot, previous itself if nothing changed
+    """
+    if isinstance(value, dict):
+        previous_dict = previous if isinstance(previous, dict) else {}
+        frozen = {key: freeze(item, previous_dict.get(key)) for key, item in value.items()}
+        if isinstance(previous, dict) and frozen.keys() == previous.keys() and \
+                all(frozen[key] is previous[key] for key in frozen):
+            return previous
+        return frozen
+
+    spectrum = _as_spectrum_values(value)
+    if spectrum is not None:
+        if isinstance(previous, Spectrum) and previous.matches(value, spectrum):
+            return previous
+        if _is_immutable(spectrum):
+            # Read only arrays of a SpectrumStore are shared as they are
+            return Spectrum(spectrum, False)
+        values = np.array(spectrum)
+        values.setflags(write=False)
+        return Spectrum(values, isinstance(value, list),
+                        writable=isinstance(value, np.ndarray) and bool(value.flags.writeable))
+
+    if isinstance(value, (list, tuple)):
+        previous_items = previous if type(previous) is type(value) and len(previous) == len(value) else None
+        frozen = [freeze(item, previous_items[i] if previous_items is not None else None)
+                  for i, item in enumerate(value)]
+        if previous_items is not None and all(a is b for a, b in zip(frozen, previous_items)):
+            return previous
+        return frozen if isinstance(value, list) else tuple(frozen)
+
+    if value is None or isinstance(value, (str, bool, int, float, complex, np.generic)):
+        if type(previous) is type(value) and previous == value:
+            return previous
+        return value
+
+    # Anything else (fit results, arrays of objects) is copied as before
+    return deepcopy(value)
+
+
+def thaw(frozen, live=None):
+    """
+    Build live data back from a snapshot. Parts of live that already hold the snapshot values are kept, the rest
+    are new copies, so the result never shares anything with the snapshot that the application could change.
+
+    Args:
+        frozen: Snapshot made by freeze
+        live: Current data to reuse unchanged parts of, None to copy everything
+
+    Returns:
+        Live data equal to what was frozen
+    """
+    if isinstance(frozen, dict):
+        live_dict = live if isinstance(live, dict) else {}
+        return {key: thaw(item, live_dict.get(key)) for key, item in frozen.items()}
+    if isinstance(frozen, Spectrum):
+        return live if live is not None and frozen.matches(live) else frozen.thaw()
+    if isinstance(frozen, (list, tuple)):
+        live_items = live if type(live) is type(frozen) and len(live) == len(frozen) else None
+        items = [thaw(item, live_items[i] if live_items is not None else None) for i, item in enumerate(frozen)]
+        return items if isinstance(frozen, list) else tuple(items)
+    if frozen is None or isinstance(frozen, (str, bool, int, float, complex, np.generic)):
+        return frozen
+    return deepcopy(frozen)
+
+
+def snapshot_parts(frozen):
+    """
+    Memory held by the parts of a snapshot, keyed by id so parts shared by several snapshots are counted once.
+
+    Returns:
+        dict: {id(part): estimated bytes} for every spectrum, dict and list of the snapshot
+    """
+    parts = {}
+    stack = [frozen]
+    while stack:
+        item = stack.pop()
+        if id(item) in parts:
+            continue
+        if isinstance(item, Spectrum):
+            parts[id(item)] = item.values.nbytes + NODE_BYTES
+        elif isinstance(item, (dict, list, tuple)):
+            children = list(item.values()) if isinstance(item, dict) else list(item)
+            parts[id(item)] = sum(sys.getsizeof(child) if isinstance(child, str) else NODE_BYTES
+                                  for child in children)
+            stack.extend(child for child in children if isinstance(child, (Spectrum, dict, list, tuple)))
+    return parts
+
+
+def history_nbytes(states):
+    """Memory used by a list of states, parts shared by several states counted once."""
+    parts = {}
+    for state in states:
+        parts.update(state['parts'])
+    return sum(parts.values())
+
+
+def _is_immutable(values):
+    # An array that owns its memory and is read only, not a view of (or mapped from) anything that could change
+    return isinstance(values, np.ndarray) and not isinstance(values, np.memmap) and values.base is None and \
+        not values.flags.writeable
+
+
+def _as_spectrum_values(value):
+    """The numbers of value as an array if it is a spectrum, None otherwise."""
+    if isinstance(value, np.ndarray):
+        if value.dtype.kind in 'biuf' and value.ndim > 0:
+            return value
+        return None
+    if isinstance(value, list) and len(value) >= MIN_SPECTRUM_LENGTH:
+        # Floats only, the ints of a list would come back as floats
+        if all(isinstance(item, float) for item in value):
+            return np.asarray(value, dtype=np.float64)
+    return None
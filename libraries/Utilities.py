@@ -3,10 +3,10 @@ import wx
 import numpy as np
 import openpyxl
 from openpyxl import load_workbook
-import os
 import pandas as pd
 import libraries.Sheet_Operations
-import json
+from libraries.Spectrum_Store import SpectrumStore
+from libraries.Excel_Export import finish_export
 from scipy.ndimage import gaussian_filter
 from scipy.signal import savgol_filter
 from scipy.integrate import cumulative_trapezoid
@@ -207,6 +207,7 @@ def on_delete_sheet(window, event):
 
     if dlg.ShowModal() == wx.ID_YES:
         # Remove from Excel file
+        finish_export(window.Data['FilePath'])
         wb = openpyxl.load_workbook(window.Data['FilePath'])
         if sheet_name in wb.sheetnames:
             wb.remove(wb[sheet_name])
@@ -240,6 +241,7 @@ def rename_sheet(window, new_sheet_name):
     file_path = window.Data['FilePath']
 
     # Rename in Excel file
+    finish_export(file_path)
     wb = openpyxl.load_workbook(file_path)
     if old_sheet_name in wb.sheetnames:
         sheet = wb[old_sheet_name]
@@ -297,6 +299,7 @@ def copy_sheet(window):
     window.Data['Number of Core levels'] += 1
 
     # Create Excel sheet
+    finish_export(window.Data['FilePath'])
     wb = openpyxl.load_workbook(window.Data['FilePath'])
     df = pd.DataFrame({
         'BE': window.Data['Core levels'][sheet_name]['B.E.'],
@@ -308,13 +311,9 @@ def copy_sheet(window):
     with pd.ExcelWriter(window.Data['FilePath'], engine='openpyxl', mode='a') as writer:
         df.to_excel(writer, sheet_name=new_sheet_name, index=False)
 
-    # Update JSON file
-    json_file_path = os.path.splitext(window.Data['FilePath'])[0] + '.json'
-    if os.path.exists(json_file_path):
-        from libraries.Save import convert_to_serializable_and_round
-        json_data = convert_to_serializable_and_round(window.Data)
-        with open(json_file_path, 'w') as json_file:
-            json.dump(json_data, json_file, indent=2)
+    # Update the project file, opening the file takes its sheets from there
+    from libraries.Save import write_project_file
+    write_project_file(window)
 
     # Update sheet list and display
     window.sheet_combobox.Append(new_sheet_name)
@@ -323,6 +322,7 @@ def copy_sheet(window):
     on_sheet_selected(window, new_sheet_name)
 
 def save_modified_data(self, x, y, sheet_name, operation_type):
+    finish_export(self.parent.Data['FilePath'])
     wb = openpyxl.load_workbook(self.parent.Data['FilePath'])
     sheet_name = get_unique_sheet_name(sheet_name, wb.sheetnames)
 
@@ -419,6 +419,7 @@ class CropWindow(wx.Frame):
     def on_crop(self, event):
         sheet_name = self.parent.sheet_combobox.GetValue()
         # new_name = self.name_ctrl.GetValue()
+        finish_export(self.parent.Data['FilePath'])
         wb = openpyxl.load_workbook(self.parent.Data['FilePath'])
         new_name = get_unique_sheet_name(self.name_ctrl.GetValue(), wb.sheetnames)
         min_be = self.min_ctrl.GetValue()
@@ -429,12 +430,12 @@ class CropWindow(wx.Frame):
         mask = (x_values >= min_be) & (x_values <= max_be)
 
         # Create new sheet data
-        new_data = {
-            'B.E.': x_values[mask].tolist(),
-            'Raw Data': np.array(data['Raw Data'])[mask].tolist(),
-            'Background': {'Bkg Y': np.array(data['Background']['Bkg Y'])[mask].tolist()},
-            'Transmission': np.ones(sum(mask)).tolist()
-        }
+        new_data = SpectrumStore({
+            'B.E.': x_values[mask],
+            'Raw Data': np.asarray(data['Raw Data'])[mask],
+            'Background': {'Bkg Y': np.asarray(data['Background']['Bkg Y'])[mask]},
+            'Transmission': np.ones(np.count_nonzero(mask))
+        })
 
         # Update window.Data
         self.parent.Data['Core levels'][new_name] = new_data
@@ -458,13 +459,9 @@ class CropWindow(wx.Frame):
         with pd.ExcelWriter(self.parent.Data['FilePath'], engine='openpyxl', mode='a') as writer:
             df.to_excel(writer, sheet_name=new_name, index=False)
 
-        # Update JSON file
-        json_file_path = os.path.splitext(self.parent.Data['FilePath'])[0] + '.json'
-        if os.path.exists(json_file_path):
-            from libraries.Save import convert_to_serializable_and_round
-            json_data = convert_to_serializable_and_round(self.parent.Data)
-            with open(json_file_path, 'w') as json_file:
-                json.dump(json_data, json_file, indent=2)
+        # Update the project file, opening the file takes its sheets from there
+        from libraries.Save import write_project_file
+        write_project_file(self.parent)
 
         # Update sheet list
         self.parent.sheet_combobox.Append(new_name)
@@ -574,26 +571,23 @@ class PlotModWindow(wx.Frame):
         })
 
         # Load workbook and add new sheet
+        finish_export(self.parent.Data['FilePath'])
         wb = openpyxl.load_workbook(self.parent.Data['FilePath'])
         with pd.ExcelWriter(self.parent.Data['FilePath'], engine='openpyxl', mode='a',
                             if_sheet_exists='replace') as writer:
             df.to_excel(writer, sheet_name=sheet_name, index=False)
 
-        # Update window.Data - convert to list only if needed
-        self.parent.Data['Core levels'][sheet_name] = {
-            'B.E.': x if isinstance(x, list) else x.tolist(),
-            'Raw Data': y if isinstance(y, list) else y.tolist(),
-            'Background': {'Bkg Y': np.ones_like(x).tolist()},
-            'Transmission': np.ones_like(x).tolist()
-        }
-
-        # Update JSON file
-        json_file_path = os.path.splitext(self.parent.Data['FilePath'])[0] + '.json'
-        if os.path.exists(json_file_path):
-            from libraries.Save import convert_to_serializable_and_round
-            json_data = convert_to_serializable_and_round(self.parent.Data)
-            with open(json_file_path, 'w') as json_file:
-                json.dump(json_data, json_file, indent=2)
+        # Update window.Data
+        self.parent.Data['Core levels'][sheet_name] = SpectrumStore({
+            'B.E.': x,
+            'Raw Data': y,
+            'Background': {'Bkg Y': np.ones(len(x))},
+            'Transmission': np.ones(len(x))
+        })
+
+        # Update the project file, opening the file takes its sheets from there
+        from libraries.Save import write_project_file
+        write_project_file(self.parent)
 
         # Update sheet list
         self.parent.sheet_combobox.Append(sheet_name)
@@ -618,6 +612,7 @@ class PlotModWindow(wx.Frame):
             smoothed = np.convolve(y, kernel, mode='same')
 
         # new_sheet = f"{sheet_name}_s"
+        finish_export(self.parent.Data['FilePath'])
         wb = openpyxl.load_workbook(self.parent.Data['FilePath'])
         new_sheet = get_unique_sheet_name(f"{sheet_name}_s", wb.sheetnames)
         self.save_modified_data(x, smoothed, new_sheet, "Smoothed")
@@ -633,6 +628,7 @@ class PlotModWindow(wx.Frame):
         smoothed_deriv = savgol_filter(derivative, width, 3)
 
         # new_sheet = f"{sheet_name}_d"
+        finish_export(self.parent.Data['FilePath'])
         wb = openpyxl.load_workbook(self.parent.Data['FilePath'])
         new_sheet = get_unique_sheet_name(f"{sheet_name}_d", wb.sheetnames)
         self.save_modified_data(x, smoothed_deriv, new_sheet, "Differentiated")
@@ -648,6 +644,7 @@ class PlotModWindow(wx.Frame):
         smoothed_int = savgol_filter(integrated, width, 3)
 
         # new_sheet = f"{sheet_name}_i"
+        finish_export(self.parent.Data['FilePath'])
         wb = openpyxl.load_workbook(self.parent.Data['FilePath'])
         new_sheet = get_unique_sheet_name(f"{sheet_name}_i", wb.sheetnames)
         self.save_modified_data(x, smoothed_int, new_sheet, "Integrated")
@@ -692,12 +689,12 @@ class JoinSheetsWindow(wx.Frame):
 
         # Create new sheet
         new_sheet = "Joined_Scan"
-        self.parent.Data['Core levels'][new_sheet] = {
+        self.parent.Data['Core levels'][new_sheet] = SpectrumStore({
             'B.E.': joined_be,
             'Raw Data': joined_data,
             'Background': {'Bkg Y': joined_data},
-            'Transmission': [1.0] * len(joined_be)
-        }
+            'Transmission': np.ones(len(joined_be))
+        })
 
         # Update Excel file
         df = pd.DataFrame({
@@ -707,6 +704,7 @@ class JoinSheetsWindow(wx.Frame):
             'Transmission': [1.0] * len(joined_be)
         })
 
+        finish_export(self.parent.Data['FilePath'])
         with pd.ExcelWriter(self.parent.Data['FilePath'], engine='openpyxl', mode='a') as writer:
             df.to_excel(writer, sheet_name=new_sheet, index=False)
 
@@ -0,0 +1,365 @@
+# libraries/Vamas_Reader.py
+
+# Reader for VAMAS (ISO 14976) files that goes through the file once and turns the ordinates of every block into a
+# numpy array in one call, instead of a Python float per value. Blocks are plain dicts keyed by the same names as the
+# vamas package (species_label, x_start, num_scans_to_compile_block...), parameters left out of the later blocks by
+# the inclusion list are taken from the first block as the standard says. block_spectrum gives the binding energy,
+# intensity and transmission arrays of a block, ready for the spectrum store, write_vamas_workbook the same sheets
+# and the "Experimental description" the old import wrote.
+
+from itertools import islice
+
+import numpy as np
+from openpyxl import Workbook
+from openpyxl.cell import WriteOnlyCell
+from openpyxl.styles import Alignment
+
+from libraries.Excel_Export import write_spectra_sheets, unique_sheet_name
+
+FORMAT_IDENTIFIER = "VAMAS Surface Chemical Analysis Standard Data Transfer Format 1988 May 4"
+# Number of block parameters the inclusion list of the header can leave out
+NUM_BLOCK_PARAMS = 40
+
+SPUTTERING_TECHNIQUES = ["SNMS energy spec", "FABMS", "FABMS energy spec", "ISS", "SIMS", "SIMS energy spec", "SNMS"]
+SPUTTERING_SOURCE_TECHNIQUES = ["AES diff", "AES dir", "EDX", "ELS", "UPS", "XPS", "XRF"]
+
+# Rows of the "Experimental description" sheet for each block
+BLOCK_INFO_ORDER = [
+    "Sample ID", "Year/Month/Day", "Time HH,MM,SS", "Technique", "Species & Transition", "Number of scans",
+    "Source Label", "Source Energy", "Source width X", "Source width Y", "Pass Energy", "Work Function",
+    "Analyzer Mode", "Sputtering Energy", "Take-off Polar Angle", "Take-off Azimuth", "Target Bias",
+    "Analysis Width X", "Analysis Width Y", "X Label", "X Units", "X Start", "X Step", "Num Y Values",
+    "Num Scans", "Collection Time", "Time Correction", "Y Unit", "# Comment Lines", "Block Comment"
+]
+
+
+class _Lines:
+    """The lines of an open VAMAS file, read one at a time."""
+
+    def __init__(self, f):
+        self.f = f
+
+    def text(self):
+        line = self.f.readline()
+        if not line:
+            raise ValueError("Unexpected end of VAMAS file")
+        return line.strip()
+
+    def int(self):
+        return int(float(self.text()))
+
+    def float(self):
+        return float(self.text())
+
+    def texts(self, count):
+        return [self.text() for _ in range(count)]
+
+    def values(self, count):
+        # All the ordinates of a block converted by numpy at once
+        lines = list(islice(self.f, count))
+        if len(lines) != count:
+            raise ValueError("Unexpected end of VAMAS file")
+        return np.array(lines, dtype=np.float64)
+
+
+def read_vamas(file_path):
+    """
+    Read a VAMAS file.
+
+    Args:
+        file_path (str): Path of the .vms file
+
+    Returns:
+        tuple: (header, blocks), header a dict of the file header, blocks a list of dicts, one per block, each with
+        'y_values', a float64 array of shape (points, corresponding variables)
+    """
+    with open(file_path, 'r', encoding='utf-8', errors='replace') as f:
+        lines = _Lines(f)
+        header = _read_header(lines)
+        blocks = []
+        for _ in range(header['num_blocks']):
+            blocks.append(_read_block(lines, header, blocks[0] if blocks else None))
+    return header, blocks
+
+
+def _read_header(lines):
+    h = {'format_identifier': lines.text()}
+    if h['format_identifier'] != FORMAT_IDENTIFIER:
+        raise ValueError("Not a VAMAS file, unknown format identifier")
+
+    h['institution_identifier'] = lines.text()
+    h['instrument_model_identifier'] = lines.text()
+    h['operator_identifier'] = lines.text()
+    h['experiment_identifier'] = lines.text()
+    h['num_lines_comment'] = lines.int()
+    h['comment'] = "\n".join(lines.texts(h['num_lines_comment']))
+    h['experiment_mode'] = lines.text()
+    h['scan_mode'] = lines.text()
+    if h['scan_mode'] != "REGULAR":
+        raise ValueError(f"Only REGULAR VAMAS scans are supported, not {h['scan_mode']}")
+
+    h['num_spectral_regions'] = None
+    h['num_analysis_positions'] = None
+    h['num_discrete_x_coords_in_full_map'] = None
+    h['num_discrete_y_coords_in_full_map'] = None
+    if h['experiment_mode'] in ["MAP", "MAPD", "NORM", "SDP"]:
+        h['num_spectral_regions'] = lines.int()
+    if h['experiment_mode'] in ["MAP", "MAPD"]:
+        h['num_analysis_positions'] = lines.int()
+        h['num_discrete_x_coords_in_full_map'] = lines.int()
+        h['num_discrete_y_coords_in_full_map'] = lines.int()
+
+    h['num_experiment_variables'] = lines.int()
+    h['experiment_variables'] = [(lines.text(), lines.text()) for _ in range(h['num_experiment_variables'])]
+
+    # Positive: only the listed parameters (numbered from 1) are in the later blocks, negative: all but those
+    num_entries = lines.int()
+    includes = [num_entries <= 0] * NUM_BLOCK_PARAMS
+    for _ in range(abs(num_entries)):
+        includes[lines.int() - 1] = num_entries > 0
+    h['block_params_includes'] = includes
+
+    h['num_manually_entered_items_in_block'] = lines.int()
+    h['num_future_upgrade_experiment_entries'] = lines.int()
+    h['future_upgrade_experiment_entries'] = [(lines.text(), lines.text())
+                                              for _ in range(h['num_future_upgrade_experiment_entries'])]
+    h['num_future_upgrade_block_entries'] = lines.int()
+    h['num_blocks'] = lines.int()
+    return h
+
+
+def _read_block(lines, header, first):
+    """Read one block, parameters the inclusion list leaves out are copied from the first block."""
+    includes = header['block_params_includes'] if first is not None else [True] * NUM_BLOCK_PARAMS
+    mode = header['experiment_mode']
+    b = {}
+
+    def read(param, *fields):
+        # fields are (name, read function) pairs, all of them belong to block parameter number param + 1
+        for name, read_value in fields:
+            b[name] = read_value() if includes[param] else first[name]
+
+    b['block_identifier'] = lines.text()
+    b['sample_identifier'] = lines.text()
+    read(0, ('year', lines.int))
+    read(1, ('month', lines.int))
+    read(2, ('day', lines.int))
+    read(3, ('hour', lines.int))
+    read(4, ('minute', lines.int))
+    read(5, ('second', lines.int))
+    read(6, ('num_hours_advance_gmt', lines.float))
+    if includes[7]:
+        b['num_lines_block_comment'] = lines.int()
+        b['block_comment'] = "\n".join(lines.texts(b['num_lines_block_comment']))
+    else:
+        b['num_lines_block_comment'] = first['num_lines_block_comment']
+        b['block_comment'] = first['block_comment']
+    read(8, ('technique', lines.text))
+    if mode in ["MAP", "MAPD"]:
+        read(9, ('x_coord', lines.int), ('y_coord', lines.int))
+    read(10, ('values_exp_var', lambda: lines.texts(header['num_experiment_variables'])))
+    read(11, ('analysis_source_label', lines.text))
+    if mode in ["MAPDP", "MAPSVDP", "SDP", "SDPSV"] or b['technique'] in SPUTTERING_TECHNIQUES:
+        read(12, ('sputtering_z', lines.int), ('sputtering_num_particles', lines.float),
+             ('sputtering_charge', lines.float))
+    read(13, ('analysis_source_characteristic_energy', lines.float))
+    read(14, ('analysis_source_strength', lines.float))
+    read(15, ('analysis_source_beam_width_x', lines.float), ('analysis_source_beam_width_y', lines.float))
+    if mode in ["MAP", "MAPDP", "MAPSV", "MAPSVDP", "SEM"]:
+        read(16, ('field_view_x', lines.float), ('field_view_y', lines.float))
+    if mode in ["MAPSV", "MAPSVDP", "SEM"]:
+        read(17, ('linescan_coordinates', lambda: [lines.int() for _ in range(6)]))
+    read(18, ('analysis_source_polar_incidence_angle', lines.float))
+    read(19, ('analysis_source_azimuth', lines.float))
+    read(20, ('analyzer_mode', lines.text))
+    read(21, ('analyzer_pass_energy_or_retard_ratio_or_mass_res', lines.float))
+    if b['technique'] == "AES diff":
+        read(22, ('differential_width', lines.float))
+    read(23, ('magnification_analyzer_transfer_lens', lines.float))
+    read(24, ('analyzer_work_function_or_acceptance_energy', lines.float))
+    read(25, ('target_bias', lines.float))
+    read(26, ('analysis_width_x', lines.float), ('analysis_width_y', lines.float))
+    read(27, ('analyzer_axis_take_off_polar_angle', lines.float), ('analyzer_axis_take_off_azimuth', lines.float))
+    read(28, ('species_label', lines.text))
+    read(29, ('transition_or_charge_state_label', lines.text), ('charge_detected_particle', lines.int))
+    read(30, ('x_label', lines.text), ('x_units', lines.text), ('x_start', lines.float), ('x_step', lines.float))
+    if includes[31]:
+        b['num_corresponding_variables'] = lines.int()
+        b['corresponding_variables'] = [{'label': lines.text(), 'unit': lines.text()}
+                                        for _ in range(b['num_corresponding_variables'])]
+    else:
+        b['num_corresponding_variables'] = first['num_corresponding_variables']
+        b['corresponding_variables'] = [{'label': var['label'], 'unit': var['unit']}
+                                        for var in first['corresponding_variables']]
+    read(32, ('signal_mode', lines.text))
+    read(33, ('signal_collection_time', lines.float))
+    read(34, ('num_scans_to_compile_block', lines.int))
+    read(35, ('signal_time_correction', lines.float))
+    if mode in ["MAPDP", "MAPSVDP", "SDP", "SDPSV"] and b['technique'] in SPUTTERING_SOURCE_TECHNIQUES:
+        read(36, ('sputtering_source_energy', lines.float), ('sputtering_source_beam_current', lines.float),
+             ('sputtering_source_width_x', lines.float), ('sputtering_source_width_y', lines.float),
+             ('sputtering_source_polar_incidence_angle', lines.float), ('sputtering_source_azimuth', lines.float),
+             ('sputtering_mode', lines.text))
+    read(37, ('sample_normal_polar_angle_tilt', lines.float), ('sample_normal_tilt_azimuth', lines.float))
+    read(38, ('sample_rotation_angle', lines.float))
+    if includes[39]:
+        b['num_additional_numerical_params'] = lines.int()
+        b['additional_numerical_params'] = [(lines.text(), lines.text(), lines.float())
+                                            for _ in range(b['num_additional_numerical_params'])]
+    else:
+        b['num_additional_numerical_params'] = first['num_additional_numerical_params']
+        b['additional_numerical_params'] = first['additional_numerical_params']
+
+    # num_y_values counts the ordinates of all the corresponding variables, stored point by point
+    b['num_y_values'] = lines.int()
+    for var in b['corresponding_variables']:
+        var['y_min'] = lines.float()
+        var['y_max'] = lines.float()
+    num_variables = max(b['num_corresponding_variables'], 1)
+    b['y_values'] = lines.values(b['num_y_values']).reshape(-1, num_variables)
+    return b
+
+
+def block_sheet_name(block, existing_names=()):
+    """Sheet name of a block, species and transition ("C1s"), numbered like Excel does if already used."""
+    if block['species_label'].lower() == "wide" or block['transition_or_charge_state_label'].lower() == "none":
+        sheet_name = block['species_label']
+    else:
+        sheet_name = f"{block['species_label']}{block['transition_or_charge_state_label']}"
+    return unique_sheet_name(sheet_name, existing_names)
+
+
+def block_spectrum(block, photons, workfunction):
+    """
+    Arrays of one block as the import shows them.
+
+    Args:
+        block (dict): Block from read_vamas
+        photons (float): Photon energy, to convert kinetic energies
+        workfunction (float): Work function, to convert kinetic energies
+
+    Returns:
+        dict: 'x_label', 'x' (binding energy if the block is in kinetic energy), 'raw' (per second unless already
+        in c/s), 'transmission' (ones if the block has none) and 'corrected' (raw / transmission)
+    """
+    y_values = block['y_values']
+    num_points = y_values.shape[0]
+    x_values = block['x_start'] + np.arange(num_points) * block['x_step']
+    raw = y_values[:, 0].copy()
+
+    # Convert counts to counts per second if necessary
+    if block['corresponding_variables'] and block['corresponding_variables'][0]['unit'] != "c/s":
+        raw /= block['num_scans_to_compile_block']
+
+    # Convert to Binding Energy if necessary
+    if block['x_label'] == "Kinetic Energy":
+        x_values = photons - x_values - workfunction
+        x_label = "Binding Energy"
+    else:
+        x_label = block['x_label']
+
+    transmission = y_values[:, 1].copy() if y_values.shape[1] > 1 else np.ones(num_points)
+    return {
+        'x_label': x_label,
+        'x': x_values,
+        'raw': raw,
+        'transmission': transmission,
+        'corrected': raw / transmission,
+    }
+
+
+def write_vamas_workbook(excel_path, header, blocks, sheet_names, spectra):
+    """
+    Write the Excel file of an imported VAMAS file: one sheet per block (x, corrected, raw and transmission
+    columns) and the "Experimental description" sheet. Uses a write only workbook, rows go straight to the file.
+
+    Args:
+        excel_path (str): Path of the .xlsx to write
+        header (dict), blocks (list): As returned by read_vamas
+        sheet_names (list): Sheet name of each block
+        spectra (list): block_spectrum of each block
+    """
+    wb = Workbook(write_only=True)
+    write_spectra_sheets(wb, sheet_names, spectra)
+
+    exp_sheet = wb.create_sheet(title="Experimental description")
+    exp_sheet.column_dimensions['A'].width = 50
+    exp_sheet.column_dimensions['B'].width = 100
+    left_aligned = Alignment(horizontal='left')
+
+    def append(label, value=None):
+        # Column B is left aligned
+        if value is None:
+            exp_sheet.append([label])
+            return
+        cell = WriteOnlyCell(exp_sheet, value=value)
+        cell.alignment = left_aligned
+        exp_sheet.append([label, cell])
+
+    # Add VAMAS header information
+    append("VAMAS Header Information")
+    for label, key in [
+        ("Format Identifier", 'format_identifier'),
+        ("Institution Identifier", 'institution_identifier'),
+        ("Instrument Model", 'instrument_model_identifier'),
+        ("Operator Identifier", 'operator_identifier'),
+        ("Experiment Identifier", 'experiment_identifier'),
+        ("Number of Comment Lines", 'num_lines_comment'),
+        ("Comment", 'comment'),
+        ("Experiment Mode", 'experiment_mode'),
+        ("Scan Mode", 'scan_mode'),
+        ("Number of Spectral Regions", 'num_spectral_regions'),
+        ("Number of Analysis Positions", 'num_analysis_positions'),
+        ("Number of Discrete X Coordinates", 'num_discrete_x_coords_in_full_map'),
+        ("Number of Discrete Y Coordinates", 'num_discrete_y_coords_in_full_map'),
+    ]:
+        if header[key] is None:
+            exp_sheet.append([label])
+        else:
+            append(label, header[key])
+    exp_sheet.append([])
+
+    for i, block in enumerate(blocks, start=1):
+        append(f"Block {i}", "")
+        for label, value in zip(BLOCK_INFO_ORDER, _block_info(block)):
+            append(label, value)
+        exp_sheet.append([])
+
+    wb.save(excel_path)
+
+
+def _block_info(block):
+    """Values of BLOCK_INFO_ORDER for one block."""
+    y_unit = block['corresponding_variables'][0]['unit'] if block['corresponding_variables'] else ''
+    return [
+        block['sample_identifier'],
+        f"{block['year']}/{block['month']}/{block['day']}",
+        f"{block['hour']}:{block['minute']}:{block['second']}",
+        block['technique'],
+        f"{block['species_label']} {block['transition_or_charge_state_label']}",
+        block['num_scans_to_compile_block'],
+        block['analysis_source_label'],
+        block['analysis_source_characteristic_energy'],
+        block['analysis_source_beam_width_x'],
+        block['analysis_source_beam_width_y'],
+        block['analyzer_pass_energy_or_retard_ratio_or_mass_res'],
+        block['analyzer_work_function_or_acceptance_energy'],
+        block['analyzer_mode'],
+        block.get('sputtering_source_energy', 'N/A'),
+        block['analyzer_axis_take_off_polar_angle'],
+        block['analyzer_axis_take_off_azimuth'],
+        block['target_bias'],
+        block['analysis_width_x'],
+        block['analysis_width_y'],
+        block['x_label'],
+        block['x_units'],
+        block['x_start'],
+        block['x_step'],
+        block['num_y_values'],
+        block['num_scans_to_compile_block'],
+        block['signal_collection_time'],
+        block['signal_time_correction'],
+        y_unit,
+        block['num_lines_block_comment'],
+        block['block_comment'],
+    ]
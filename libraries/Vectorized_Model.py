@@ -0,0 +1,328 @@
+# libraries/Vectorized_Model.py
+
+# Alternative to the summed lmfit CompositeModel used by Fitting_Engine.fit. Peaks sharing a profile are stacked
+# and evaluated in one broadcast NumPy call over a (peaks x points) array, then summed, so a residual costs one
+# call per profile type instead of one Model per peak plus the CompositeModel tree. The parameters are the same
+# lmfit Parameters built by build_model, so bounds and expr ties behave exactly as in the lmfit path.
+
+import numpy as np
+from scipy.sparse import csr_matrix
+from scipy.special import wofz, erfc
+
+from libraries.Peak_Functions import PeakFunctions
+
+
+# Same guards as lmfit.lineshapes, taken element-wise so they broadcast
+TINY = 1.0e-15
+S2 = np.sqrt(2.0)
+S2PI = np.sqrt(2 * np.pi)
+LOG2 = np.log(2)
+
+
+def voigt(x, amplitude, center, sigma, gamma):
+    z = (x - center + 1j * gamma) / np.maximum(TINY, sigma * S2)
+    return amplitude * wofz(z).real / np.maximum(TINY, sigma * S2PI)
+
+
+def pseudo_voigt(x, amplitude, center, sigma, fraction):
+    sigma_g = sigma / np.sqrt(2 * LOG2)
+    # Squared one peak at a time as lmfit does, the scalar and array powers can differ in the last bit
+    two_sigma_g2 = np.array([[2 * (s / np.sqrt(2 * LOG2)) ** 2] for s in sigma[:, 0].tolist()])
+    gaussian = ((amplitude / np.maximum(TINY, S2PI * sigma_g))
+                * np.exp(-(1.0 * x - center) ** 2 / np.maximum(TINY, two_sigma_g2)))
+    lorentzian = ((amplitude / (1 + ((1.0 * x - center) / np.maximum(TINY, sigma)) ** 2))
+                  / np.maximum(TINY, np.pi * sigma))
+    return (1 - fraction) * gaussian + fraction * lorentzian
+
+
+def exp_gauss(x, amplitude, center, sigma, gamma):
+    gss = gamma * sigma * sigma
+    arg1 = gamma * (center + gss / 2.0 - x)
+    arg2 = (center + gss - x) / np.maximum(TINY, S2 * sigma)
+    return amplitude * (gamma / 2) * np.exp(arg1) * erfc(arg2)
+
+
+def la(x, center, amplitude, fwhm, sigma, gamma):
+    """PeakFunctions.LA for a stack of peaks: every argument but x is a column of per-peak values."""
+    # The Lorentzian widths go through the scalar expression of PeakFunctions.LA, one peak at a time: numpy's
+    # SIMD pow on arrays can differ from the scalar pow in the last bit, enough to move a long leastsq fit
+    F = np.array([[2 * w / (np.sqrt(2 ** (1 / s) - 1) + np.sqrt(2 ** (1 / g) - 1))]
+                  for w, s, g in zip(fwhm[:, 0].tolist(), sigma[:, 0].tolist(), gamma[:, 0].tolist())])
+    base = 1 + 4 * ((x - center) / F) ** 2
+    # Each row is raised to its own scalar exponent as in PeakFunctions.LA, numpy takes sqrt or square for
+    # 0.5 and 2 there where a column of exponents would go through pow
+    peak_shape = np.array([np.where(x[0] <= c, 1 / b ** g, 1 / b ** s) for b, c, s, g in
+                           zip(base, center[:, 0].tolist(), sigma[:, 0].tolist(), gamma[:, 0].tolist())])
+
+    unit_area = PeakFunctions.LA_window_area(F, sigma, gamma, center, x.min(), x.max())
+    with np.errstate(divide='ignore', invalid='ignore'):
+        height = np.where(unit_area != 0, amplitude / unit_area, 0)
+    return height * peak_shape
+
+
+# Analytic derivatives, d(profile)/d(parameter) for every parameter of the profile, same broadcasting as above
+
+def _gl_terms(x, center, fwhm, fraction):
+    u = (x - center) / fwhm
+    p = fraction / 100
+    a = 4 * LOG2
+    q = 1 + 4 * p * u ** 2
+    shape = np.exp(-a * (1 - p) * u ** 2) / q
+    # Derivatives of log(shape) with respect to u and to fraction
+    dlog_du = -2 * a * (1 - p) * u - 8 * p * u / q
+    dlog_dfraction = (a * u ** 2 - 4 * u ** 2 / q) / 100
+    return u, shape, shape * dlog_du, shape * dlog_dfraction
+
+
+def _sgl_terms(x, center, fwhm, fraction):
+    u = (x - center) / fwhm
+    p = fraction / 100
+    a = 4 * LOG2
+    g = np.exp(-a * u ** 2)
+    lor = 1 / (1 + 4 * u ** 2)
+    shape = (1 - p) * g + p * lor
+    dshape_du = -2 * a * u * (1 - p) * g - 8 * u * p * lor ** 2
+    dshape_dfraction = (lor - g) / 100
+    return u, shape, dshape_du, dshape_dfraction
+
+
+def _height_derivatives(terms, x, center, fwhm, fraction, amplitude):
+    u, shape, dshape_du, dshape_dfraction = terms(x, center, fwhm, fraction)
+    return {
+        'center': -amplitude * dshape_du / fwhm,
+        'fwhm': -amplitude * dshape_du * u / fwhm,
+        'fraction': amplitude * dshape_dfraction,
+        'amplitude': shape,
+    }
+
+
+def _area_derivatives(terms, x, center, area, fwhm, fraction):
+    # height = area / (sigma * sqrt(2 pi)) with sigma = fwhm / (2 sqrt(2 ln2))
+    height_per_area = np.sqrt(4 * LOG2 / np.pi) / fwhm
+    u, shape, dshape_du, dshape_dfraction = terms(x, center, fwhm, fraction)
+    height = area * height_per_area
+    return {
+        'center': -height * dshape_du / fwhm,
+        'fwhm': -height * (dshape_du * u + shape) / fwhm,
+        'fraction': height * dshape_dfraction,
+        'area': height_per_area * shape,
+    }
+
+
+def gauss_lorentz_derivatives(x, center, fwhm, fraction, amplitude):
+    return _height_derivatives(_gl_terms, x, center, fwhm, fraction, amplitude)
+
+
+def s_gauss_lorentz_derivatives(x, center, fwhm, fraction, amplitude):
+    return _height_derivatives(_sgl_terms, x, center, fwhm, fraction, amplitude)
+
+
+def gauss_lorentz_area_derivatives(x, center, area, fwhm, fraction):
+    return _area_derivatives(_gl_terms, x, center, area, fwhm, fraction)
+
+
+def s_gauss_lorentz_area_derivatives(x, center, area, fwhm, fraction):
+    return _area_derivatives(_sgl_terms, x, center, area, fwhm, fraction)
+
+
+def voigt_derivatives(x, amplitude, center, sigma, gamma):
+    z = (x - center + 1j * gamma) / (sigma * S2)
+    w = wofz(z)
+    # Faddeeva function derivative: w'(z) = -2 z w(z) + 2i / sqrt(pi)
+    dw = -2 * z * w + 2j / np.sqrt(np.pi)
+    norm = 1 / (sigma * S2PI)
+    shape = w.real * norm
+    return {
+        'amplitude': shape,
+        'center': amplitude * norm * (-dw / (sigma * S2)).real,
+        'sigma': amplitude * norm * (-dw * z / sigma).real - amplitude * shape / sigma,
+        'gamma': amplitude * norm * (1j * dw / (sigma * S2)).real,
+    }
+
+
+def pseudo_voigt_derivatives(x, amplitude, center, sigma, fraction):
+    sigma_g = sigma / np.sqrt(2 * LOG2)
+    d = x - center
+    t = d / sigma
+    gaussian = np.exp(-d ** 2 / (2 * sigma_g ** 2)) / (S2PI * sigma_g)
+    lorentzian = 1 / (np.pi * sigma * (1 + t ** 2))
+    dgaussian_dsigma = gaussian * (d ** 2 / sigma_g ** 3 - 1 / sigma_g) / np.sqrt(2 * LOG2)
+    dlorentzian_dsigma = lorentzian * (2 * t ** 2 / (1 + t ** 2) - 1) / sigma
+    return {
+        'amplitude': (1 - fraction) * gaussian + fraction * lorentzian,
+        'center': amplitude * ((1 - fraction) * gaussian * d / sigma_g ** 2
+                               + fraction * lorentzian * 2 * t / (sigma * (1 + t ** 2))),
+        'sigma': amplitude * ((1 - fraction) * dgaussian_dsigma + fraction * dlorentzian_dsigma),
+        'fraction': amplitude * (lorentzian - gaussian),
+    }
+
+
+# Profile of each peak model: vectorized function and the parameter names it takes, in lmfit prefix form.
+# Models not listed here (LA*G) are evaluated one peak at a time with their PeakFunctions function.
+PROFILES = {
+    "GL (Area)": (PeakFunctions.gauss_lorentz_Area, ['center', 'area', 'fwhm', 'fraction']),
+    "SGL (Area)": (PeakFunctions.S_gauss_lorentz_Area, ['center', 'area', 'fwhm', 'fraction']),
+    "GL (Height)": (PeakFunctions.gauss_lorentz, ['center', 'fwhm', 'fraction', 'amplitude']),
+    "SGL (Height)": (PeakFunctions.S_gauss_lorentz, ['center', 'fwhm', 'fraction', 'amplitude']),
+    "Voigt (Area, L/G, \u03c3)": (voigt, ['amplitude', 'center', 'sigma', 'gamma']),
+    "Voigt (Area, \u03c3, \u03b3)": (voigt, ['amplitude', 'center', 'sigma', 'gamma']),
+    "Pseudo-Voigt (Area)": (pseudo_voigt, ['amplitude', 'center', 'sigma', 'fraction']),
+    "ExpGauss.(Area, \u03c3, \u03b3)": (exp_gauss, ['amplitude', 'center', 'sigma', 'gamma']),
+    "LA (Area, \u03c3, \u03b3)": (la, ['center', 'amplitude', 'fwhm', 'sigma', 'gamma']),
+    "LA (Area, \u03c3/\u03b3, \u03b3)": (la, ['center', 'amplitude', 'fwhm', 'sigma', 'gamma']),
+}
+
+DERIVATIVES = {
+    PeakFunctions.gauss_lorentz_Area: gauss_lorentz_area_derivatives,
+    PeakFunctions.S_gauss_lorentz_Area: s_gauss_lorentz_area_derivatives,
+    PeakFunctions.gauss_lorentz: gauss_lorentz_derivatives,
+    PeakFunctions.S_gauss_lorentz: s_gauss_lorentz_derivatives,
+    voigt: voigt_derivatives,
+    pseudo_voigt: pseudo_voigt_derivatives,
+}
+
+SINGLE_PROFILES = {
+    "LA*G (Area, \u03c3/\u03b3, \u03b3)": (PeakFunctions.LAxG, ['center', 'amplitude', 'fwhm', 'sigma', 'gamma', 'fwhm_g']),
+}
+
+
+class VectorizedPeakModel:
+    """
+    Sum of every peak of a fit, evaluated one profile type at a time.
+
+    Args:
+        peaks (list): PeakSpec of each peak, in the order used for the lmfit prefixes (peak0_, peak1_, ...)
+        x (numpy.ndarray): Energies the model is evaluated on
+    """
+
+    def __init__(self, peaks, x):
+        self.x = np.asarray(x, dtype=float)
+        self.x_row = self.x[None, :]
+        self.n_peaks = len(peaks)
+
+        groups = {}
+        self.singles = []
+        self.single_indices = []
+        for i, spec in enumerate(peaks):
+            if spec.model in PROFILES:
+                func, names = PROFILES[spec.model]
+                groups.setdefault(func, (names, []))[1].append(i)
+            elif spec.model in SINGLE_PROFILES:
+                func, names = SINGLE_PROFILES[spec.model]
+                self.singles.append((func, [f'peak{i}_{name}' for name in names]))
+                self.single_indices.append(i)
+            else:
+                raise ValueError(f"Unknown fitting model: {spec.model} for peak {i}")
+
+        # One (parameters x peaks) table of lmfit names per profile type, and the peak index of each row
+        self.groups = [(func, names, [[f'peak{i}_{name}' for i in indices] for name in names])
+                       for func, (names, indices) in groups.items()]
+        self.group_indices = [indices for _, indices in groups.values()]
+
+    def eval(self, params):
+        """Total of all peaks for the current values of the lmfit Parameters."""
+        values = params.valuesdict()
+        curves = [None] * self.n_peaks
+
+        for (func, names, param_names), indices in zip(self.groups, self.group_indices):
+            columns = {name: np.array([values[p] for p in row])[:, None] for name, row in zip(names, param_names)}
+            for i, curve in zip(indices, func(self.x_row, **columns)):
+                curves[i] = curve
+
+        for (func, param_names), i in zip(self.singles, self.single_indices):
+            curves[i] = func(self.x, *[values[p] for p in param_names])
+
+        # Summed in peak order, as the CompositeModel tree does, so both engines give the same bits
+        total = np.zeros_like(self.x)
+        for curve in curves:
+            total += curve
+        return total
+
+    def residual(self, params, data):
+        """data - model, the residual of lmfit's Model.fit, so the optimizer runs the same arithmetic."""
+        return data - self.eval(params)
+
+    def jacobian_function(self, params):
+        """
+        Return the analytic Jacobian of the residual for these Parameters, or None if it is not available.
+
+        It is only available if every peak has derivatives in DERIVATIVES and every tied parameter is a plain
+        alias of another one (amplitude = area in the Voigt and Pseudo-Voigt models). Otherwise the optimizer
+        keeps its finite differences.
+        """
+        if self.singles or any(func not in DERIVATIVES for func, _, _ in self.groups):
+            return None
+
+        used = {p for _, _, param_names in self.groups for row in param_names for p in row}
+        aliases = {}
+        for name, param in params.items():
+            if param.expr is None or name not in used:
+                continue
+            target = param.expr.strip()
+            if target not in params:
+                return None
+            aliases[name] = target
+
+        def resolve(name):
+            seen = set()
+            while name in aliases and name not in seen:
+                seen.add(name)
+                name = aliases[name]
+            return name
+
+        self.aliases = {name: resolve(name) for name in used}
+        return self.jacobian
+
+    def jacobian(self, params, *args, **kws):
+        """d(model)/d(varying parameter) as a (points x varying parameters) array, the lmfit Dfun layout."""
+        values = params.valuesdict()
+        var_index = {name: i for i, name in enumerate(n for n, p in params.items() if p.vary and p.expr is None)}
+        jac = np.zeros((len(self.x), len(var_index)))
+
+        for func, names, param_names in self.groups:
+            columns = {name: np.array([values[p] for p in row])[:, None] for name, row in zip(names, param_names)}
+            derivatives = DERIVATIVES[func](self.x_row, **columns)
+            for name, row in zip(names, param_names):
+                derivative = np.broadcast_to(derivatives[name], (len(row), len(self.x)))
+                for j, param_name in enumerate(row):
+                    col = var_index.get(self.aliases[param_name])
+                    if col is not None:
+                        jac[:, col] += derivative[j]
+
+        return jac
+
+    def sparse_jacobian(self, params, sparsity):
+        """
+        d(model)/d(varying parameter) on the points of a Jacobian sparsity pattern only, as a csr_matrix.
+
+        Each peak is differentiated on the window of its own columns in the pattern (see
+        Fitting_Engine.jacobian_sparsity), so the cost follows the number of points near each peak instead of
+        points x peaks. Derivatives outside the window are dropped, as the grouped finite differences do.
+        """
+        values = params.valuesdict()
+        var_index = {name: i for i, name in enumerate(n for n, p in params.items() if p.vary and p.expr is None)}
+        sparsity = sparsity.tocsc()
+        rows, cols, data = [], [], []
+
+        for func, names, param_names in self.groups:
+            for j in range(len(param_names[0])):
+                peak_cols = [var_index.get(self.aliases[row[j]]) for row in param_names]
+                varying = [col for col in peak_cols if col is not None]
+                if not varying:
+                    continue
+                window = sparsity.indices[sparsity.indptr[varying[0]]:sparsity.indptr[varying[0] + 1]]
+                if len(window) == 0:
+                    continue
+                columns = {name: np.array([[values[row[j]]]]) for name, row in zip(names, param_names)}
+                derivatives = DERIVATIVES[func](self.x[window][None, :], **columns)
+                for name, col in zip(names, peak_cols):
+                    if col is not None:
+                        rows.append(window)
+                        cols.append(np.full(len(window), col))
+                        data.append(np.broadcast_to(derivatives[name], (1, len(window)))[0])
+
+        if not rows:
+            return csr_matrix((len(self.x), len(var_index)))
+        # Duplicate entries, from a parameter tied to another one of the same peak, are summed
+        return csr_matrix((np.concatenate(data), (np.concatenate(rows), np.concatenate(cols))),
+                          shape=(len(self.x), len(var_index)))
@@ -9,10 +9,12 @@ from matplotlib.backends.backend_wxagg import NavigationToolbar2WxAgg as Navigat
 from libraries.Sheet_Operations import CheckboxRenderer
 from libraries.Open import ExcelDropTarget, open_xlsx_file
 from libraries.Plot_Operations import PlotManager
-from Functions import toggle_Col_1
+from Functions import toggle_Col_1, fit_all_sheets
 from libraries.Save import update_undo_redo_state
 from libraries.Save import save_peaks_library, load_peaks_library
+from libraries.Save import save_project_file
 from libraries.Open import open_vamas_file_dialog, open_kal_file_dialog, import_mrs_file, open_spe_file_dialog
+from libraries.Open import batch_import_files_dialog, batch_import_folder_dialog
 from libraries.Export import export_word_report
 from libraries.Utilities import CropWindow, PlotModWindow, on_delete_sheet, copy_sheet, JoinSheetsWindow
 from libraries.Help import show_libraries_used
@@ -262,6 +264,10 @@ def create_menu(window):
     save_Table_item = save_menu.Append(wx.NewId(), "Save Results Table")
     window.Bind(wx.EVT_MENU, lambda event: save_results_table(window), save_Table_item)
 
+    # Project file only, the Excel file is left as it is
+    save_project_item = save_menu.Append(wx.NewId(), "Save Project")
+    window.Bind(wx.EVT_MENU, lambda event: save_project_file(window), save_project_item)
+
     file_menu.AppendSubMenu(save_menu, "Save")
 
     # Import submenu items
@@ -286,6 +292,13 @@ def create_menu(window):
     import_multiple_avg_item = import_menu.Append(wx.NewId(), "Import Multiple AVG files (folder)")
     window.Bind(wx.EVT_MENU, lambda event: import_multiple_avg_files(window), import_multiple_avg_item)
 
+    # Several instrument files read in parallel into one project
+    batch_import_files_item = import_menu.Append(wx.NewId(), "Batch Import Files")
+    window.Bind(wx.EVT_MENU, lambda event: batch_import_files_dialog(window), batch_import_files_item)
+
+    batch_import_folder_item = import_menu.Append(wx.NewId(), "Batch Import Folder")
+    window.Bind(wx.EVT_MENU, lambda event: batch_import_folder_dialog(window), batch_import_folder_item)
+
     # Export submenu items
     export_python_plot_item = export_menu.Append(wx.NewId(), "Python Plot")
     window.Bind(wx.EVT_MENU, lambda event: create_plot_script_from_excel(window), export_python_plot_item)
@@ -350,6 +363,9 @@ def create_menu(window):
     Fitting_item = tools_menu.Append(wx.NewId(), "Create Peak Model\tCtrl+P")
     window.Bind(wx.EVT_MENU, lambda event: window.on_open_fitting_window(), Fitting_item)
 
+    Fit_all_item = tools_menu.Append(wx.NewId(), "Fit All Sheets")
+    window.Bind(wx.EVT_MENU, lambda event: fit_all_sheets(window), Fit_all_item)
+
     Dparam_item = tools_menu.Append(wx.NewId(), "D-parameter\tCtrl+D")
     window.Bind(wx.EVT_MENU, window.on_differentiate, Dparam_item)
 
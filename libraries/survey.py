@@ -1,6 +1,8 @@
 import wx
 import numpy as np
 from libraries.Sheet_Operations import on_sheet_selected
+from libraries.Line_Library import load_library
+from libraries.Survey_Identification import identify_survey
 
 
 class PeriodicTableWindow(wx.Frame):
@@ -11,6 +13,7 @@ class PeriodicTableWindow(wx.Frame):
         # self.SetBackgroundColour(wx.WHITE)
 
         self.library_data = self.parent_window.library_data
+        self.library = load_library()
 
         self.button_states = {}
         self.element_lines = {}
@@ -88,6 +91,7 @@ class PeriodicTableWindow(wx.Frame):
         self.remove_all_btn = wx.Button(panel, label="Clear All List")
         self.remove_last_label_btn = wx.Button(panel, label="Clear Last Label")
         self.remove_all_labels_btn = wx.Button(panel, label="Clear All Labels")
+        self.auto_id_btn = wx.Button(panel, label="Auto ID Survey")
 
         self.add_labels_btn.Bind(wx.EVT_BUTTON, self.OnAddLabels)
         self.add_peak_btn.Bind(wx.EVT_BUTTON, self.OnAddPeak)
@@ -95,6 +99,7 @@ class PeriodicTableWindow(wx.Frame):
         self.remove_all_btn.Bind(wx.EVT_BUTTON, self.OnRemoveAll)
         self.remove_last_label_btn.Bind(wx.EVT_BUTTON, self.OnRemoveLastLabel)
         self.remove_all_labels_btn.Bind(wx.EVT_BUTTON, self.OnRemoveAllLabels)
+        self.auto_id_btn.Bind(wx.EVT_BUTTON, self.OnAutoIdentify)
 
         button_sizer.Add(self.add_labels_btn, pos=(0, 0), flag=wx.EXPAND)
         button_sizer.Add(self.add_peak_btn, pos=(0, 1), flag=wx.EXPAND)
@@ -102,6 +107,7 @@ class PeriodicTableWindow(wx.Frame):
         button_sizer.Add(self.remove_all_btn, pos=(1, 1), flag=wx.EXPAND)
         button_sizer.Add(self.remove_last_label_btn, pos=(2, 0), flag=wx.EXPAND)
         button_sizer.Add(self.remove_all_labels_btn, pos=(2, 1), flag=wx.EXPAND)
+        button_sizer.Add(self.auto_id_btn, pos=(3, 0), span=(1, 2), flag=wx.EXPAND)
 
         right_sizer.Add(button_sizer, 0, wx.ALL | wx.EXPAND, 5)
 
@@ -143,39 +149,47 @@ class PeriodicTableWindow(wx.Frame):
             self.parent_window.canvas.draw_idle()
 
     def get_element_transitions(self, element):
-        allowed_orbitals = ['1s', '2s', '2p', '3s', '3p', '3d', '4s', '4p', '4d', '4f', '5s', '5p', '5d', '5f']
-        transitions = {}
-        photon_energy = self.parent_window.photons  # Get photon energy
-
-        for (elem, orbital), data in self.library_data.items():
-            if elem == element:
-                # Choose instrument based on whether it's an Auger line
-                if 'C-Any' in data:
-                    instrument = 'C-Any'  # For Auger lines
-                else:
-                    instrument = 'C-Al1486' if 'C-Al1486' in data else next(iter(data))
-
-                if 'position' in data[instrument] and float(data[instrument]['position']) >= 20:
-                    # Check if it's a core level or Auger transition
-                    is_auger = instrument == 'C-Any'
-                    # is_auger = data[instrument]['Auger'] == '1'  # Corrected this line
-                    orbital_lower = orbital.lower()
-
-                    if is_auger:
-                        # Subtract photon energy for Auger transitions
-                        kinetic_energy = float(data[instrument]['position'])
-                        binding_energy = photon_energy - kinetic_energy  # Convert KE to BE
-                        transitions[orbital_lower] = binding_energy
-                    else:
-                        # For core levels
-                        main_orbital = ''.join([c for c in orbital_lower if c.isalpha() or c.isdigit()])[:2]
-                        if main_orbital in allowed_orbitals:
-                            energy = float(data[instrument]['position'])
-                            if main_orbital not in transitions or energy > transitions[main_orbital]:
-                                transitions[main_orbital] = energy
-
-        sorted_transitions = sorted(transitions.items(), key=lambda x: x[1])
-        return sorted_transitions
+        # From the binding energy index of the library, built once per photon energy
+        return self.library.element_transitions(element, self.parent_window.photons)
+
+    def OnAutoIdentify(self, event):
+        sheet_name = self.parent_window.sheet_combobox.GetValue()
+        if not any(x in sheet_name.lower() for x in ['survey', 'wide']):
+            wx.MessageBox("Automatic identification works on Survey or Wide sheets.", "Info",
+                          wx.OK | wx.ICON_INFORMATION)
+            return
+
+        core_level = self.parent_window.Data['Core levels'][sheet_name]
+        index = self.library.survey_index(self.parent_window.photons)
+        candidates = identify_survey(core_level['B.E.'], core_level['Raw Data'], index)
+        if not candidates:
+            self.info_text1.SetLabelMarkup("<b>Auto ID</b>: No elements found")
+            self.info_text2.SetLabelMarkup("")
+            self.Layout()
+            return
+
+        # Main line of each element in the list, most likely first, ready for Add to Grid
+        existing_items = [self.core_level_list.GetString(i) for i in range(self.core_level_list.GetCount())]
+        for candidate in candidates:
+            element = candidate['element']
+            orbital, be = candidate['main']
+            item = f"{element}{orbital}: {be:.1f} eV"
+            if item not in existing_items:
+                self.core_level_list.Append(item)
+
+            # Same as clicking the element
+            if element in self.button_states and not self.button_states[element]:
+                self.button_states[element] = True
+                btn = self.FindWindowByLabel(element)
+                if btn:
+                    btn.SetBackgroundColour(wx.GREEN)
+                    btn.Refresh()
+                self.plot_element_lines(element)
+
+        self.info_text1.SetLabelMarkup("<b>Auto ID</b>: " + ", ".join(
+            f"{candidate['element']} ({candidate['score']:.2f})" for candidate in candidates))
+        self.info_text2.SetLabelMarkup("")
+        self.Layout()
 
     def OnElementClick(self, event):
         element = event.GetEventObject().GetLabel()
@@ -262,12 +276,11 @@ class PeriodicTableWindow(wx.Frame):
             return False
 
         position = None
-        for (elem, orb), data in self.library_data.items():
-            if elem == element and orb.lower() == orbital.lower():
-                instrument = 'Al' if 'Al' in data else next(iter(data))
-                if 'position' in data[instrument]:
-                    position = float(data[instrument]['position'])
-                    break
+        data = self.library.data.get((element, orbital.lower()))
+        if data:
+            instrument = 'Al' if 'Al' in data else next(iter(data))
+            if 'position' in data[instrument]:
+                position = float(data[instrument]['position'])
 
         if position:
             # Add to window.Data
@@ -417,23 +430,8 @@ class PeriodicTableWindow(wx.Frame):
         self.parent_window.canvas.draw_idle()
 
     def get_rsf_values(self, element, orbitals):
-        rsf_values = []
-        print(f"Searching RSF values for element: {element}")
-        print(f"Orbitals to search for: {orbitals}")
-
-        for (elem, orbital), data in self.library_data.items():
-            if elem == element:
-                orbital_lower = orbital.lower()
-                if orbital_lower in [o.lower() for o in orbitals]:
-                    # Check if 'Al' key exists, if not, use the first available instrument
-                    instrument = 'Al1486' if 'Al1486' in data else next(iter(data))
-                    print(data[instrument])
-                    if 'rsf' in data[instrument]:
-                        rsf_values.append(float(data[instrument]['rsf']))
-                        print(f"Added RSF value: {data[instrument]['rsf']} for orbital {orbital}")
-
-        print(f"Final RSF values: {rsf_values}")
-        return rsf_values
+        # RSF of each transition of the element, from the same index as get_element_transitions
+        return self.library.survey_index(self.parent_window.photons).rsf_values(element, orbitals)
 
     def OnElementHover(self, event):
         element = event.GetEventObject().GetLabel()
@@ -0,0 +1,9 @@
+# tests/conftest.py
+
+# The tests import the application modules as the application does (from libraries import ...), from the
+# repository root.
+
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
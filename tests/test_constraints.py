@@ -0,0 +1,80 @@
+# tests/test_constraints.py
+
+# compile_constraint / constraint_bounds: each distinct cell parsed once, relative constraints as bounds around the
+# start value of the referenced peak, references to any peak from A to P.
+
+import pytest
+
+from libraries.Constraints import compile_constraint, constraint_bounds
+from libraries.Fitting_Engine import PeakSpec
+
+
+def peak(letter, position, **constraints):
+    return PeakSpec(letter=letter, label=f'C1s {letter}', model='GL (Area)', position=position, height=1000.0,
+                    fwhm=1.2, lg_ratio=30.0, area=1500.0, constraints=constraints)
+
+
+def by_letter(peaks):
+    return {spec.letter: spec for spec in peaks}
+
+
+def test_mutual_bound_references_are_not_a_cycle():
+    # B = A+1 and A = B-1 are both bounds around the other's start value
+    peaks = [peak('A', 285.0, Position='B-1'), peak('B', 286.0, Position='A+1')]
+
+    low, high, vary = constraint_bounds(by_letter(peaks), peaks[1], 'Position', 286.0, 'center', 'center')
+    assert (low, high, vary) == (pytest.approx(285.95), pytest.approx(286.05), True)
+    # B-1 goes from B-0.95 down to B-1.05, in that order as before
+    low, high, vary = constraint_bounds(by_letter(peaks), peaks[0], 'Position', 285.0, 'center', 'center')
+    assert (low, high, vary) == (pytest.approx(285.05), pytest.approx(284.95), True)
+
+
+@pytest.mark.parametrize('constraint, expected', [
+    ('280,290', (280.0, 290.0, True)),
+    ('281:289', (281.0, 289.0, True)),
+    ('Fixed', (284.999, 285.001, False)),
+    ('284', (283.9, 284.1, True)),
+    ('A+1.5#0.5', (285.0, 286.0, True)),
+    ('A*0.5#0.01', (284.0 * 0.49, 284.0 * 0.51, True)),
+    ('A/2', (284.0 / 1.9999, 284.0 / 2.0001, True)),
+    ('not a constraint', (284.9, 285.1, True)),
+])
+def test_constraint_kinds(constraint, expected):
+    peaks = [peak('A', 284.0), peak('B', 285.0, Position=constraint)]
+
+    result = constraint_bounds(by_letter(peaks), peaks[1], 'Position', 285.0, 'Position', 'center')
+    assert result == (pytest.approx(expected[0]), pytest.approx(expected[1]), expected[2])
+
+
+def test_references_to_peaks_k_to_p_are_resolved():
+    # The 16 peak letters the constraint cells accept, the 12th peak (L) refers to the 11th (K)
+    peaks = [peak(chr(65 + i), 280.0 + i) for i in range(16)]
+    peaks[11] = peak('L', 291.0, Position='K+1.2')
+    peaks[15] = peak('P', 295.0, Position='O*1.01#0.002')
+
+    low, high, _ = constraint_bounds(by_letter(peaks), peaks[11], 'Position', 291.0, 'Position', 'center')
+    assert (low, high) == (pytest.approx(291.15), pytest.approx(291.25))
+    low, high, _ = constraint_bounds(by_letter(peaks), peaks[15], 'Position', 295.0, 'Position', 'center')
+    assert (low, high) == (pytest.approx(294.0 * 1.008), pytest.approx(294.0 * 1.012))
+
+
+def test_missing_reference_pins_the_start_value():
+    peaks = [peak('A', 285.0, Position='C+1'), peak('B', 286.0, Position='Q+1')]
+
+    assert constraint_bounds(by_letter(peaks), peaks[0], 'Position', 285.0, 'center', 'center') == \
+        (285.0, 285.0, True)
+    # Q is past P, not a reference, so the cell is not understood at all
+    assert constraint_bounds(by_letter(peaks), peaks[1], 'Position', 286.0, 'center', 'center') == \
+        (pytest.approx(285.9), pytest.approx(286.1), True)
+
+
+def test_each_cell_is_compiled_once():
+    compile_constraint.cache_clear()
+    peaks = [peak(chr(65 + i), 280.0 + i, Position='A+1', FWHM='0.5,2') for i in range(8)]
+
+    for spec in peaks:
+        constraint_bounds(by_letter(peaks), spec, 'Position', spec.position, 'Position', 'center')
+        constraint_bounds(by_letter(peaks), spec, 'FWHM', spec.fwhm, 'FWHM', 'fwhm')
+
+    info = compile_constraint.cache_info()
+    assert info.misses == 2 and info.hits == 14
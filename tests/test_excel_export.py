@@ -0,0 +1,102 @@
+# tests/test_excel_export.py
+
+# schedule_export / finish_export: the file is complete once finish_export returns, and a second export of the same
+# file waits for the running one instead of writing the same .tmp next to it.
+
+import os
+import threading
+
+import pytest
+
+from libraries.Excel_Export import finish_export, schedule_export
+
+
+def writer(content, started=None, release=None, log=None):
+    def write(path):
+        if started is not None:
+            started.set()
+        if release is not None:
+            assert release.wait(5)
+        if log is not None:
+            log.append(('start', content, os.path.exists(path)))
+        with open(path, 'w') as f:
+            f.write(content)
+        if log is not None:
+            log.append(('end', content))
+    return write
+
+
+def read(path):
+    with open(path) as f:
+        return f.read()
+
+
+def test_finish_export_waits_for_the_background_export(tmp_path):
+    file_path = str(tmp_path / 'sample.xlsx')
+    release = threading.Event()
+    done = []
+    schedule_export(file_path, writer('first', release=release), on_done=done.append)
+
+    threading.Timer(0.05, release.set).start()
+    finish_export(file_path)
+
+    assert read(file_path) == 'first' and done == [None]
+    assert not os.path.exists(file_path + '.tmp')
+
+
+def test_kept_export_is_written_by_finish_export(tmp_path):
+    file_path = str(tmp_path / 'sample.xlsx')
+    schedule_export(file_path, writer('kept'), background=False)
+    assert not os.path.exists(file_path)
+
+    finish_export(file_path)
+
+    assert read(file_path) == 'kept'
+    # Nothing is pending anymore
+    os.remove(file_path)
+    finish_export(file_path)
+    assert not os.path.exists(file_path)
+
+
+def test_second_export_waits_for_the_running_one(tmp_path):
+    file_path = str(tmp_path / 'sample.xlsx')
+    started, release, log = threading.Event(), threading.Event(), []
+    schedule_export(file_path, writer('first', started, release, log))
+    assert started.wait(5)
+
+    second = threading.Thread(target=schedule_export, args=(file_path, writer('second', log=log)))
+    second.start()
+    second.join(0.1)
+    # Still waiting for the first export, which has not written anything yet
+    assert second.is_alive() and log == []
+
+    release.set()
+    second.join(5)
+    finish_export(file_path)
+
+    assert log == [('start', 'first', False), ('end', 'first'), ('start', 'second', False), ('end', 'second')]
+    assert read(file_path) == 'second'
+
+
+def test_kept_export_is_replaced(tmp_path):
+    file_path = str(tmp_path / 'sample.xlsx')
+    schedule_export(file_path, writer('old'), background=False)
+    schedule_export(file_path, writer('new'), background=False)
+
+    finish_export(file_path)
+
+    assert read(file_path) == 'new'
+
+
+def test_export_error_is_raised_by_finish_export(tmp_path):
+    file_path = str(tmp_path / 'sample.xlsx')
+
+    def fail(path):
+        with open(path, 'w') as f:
+            f.write('half')
+        raise OSError("disk full")
+
+    schedule_export(file_path, fail, background=False)
+    with pytest.raises(OSError, match='disk full'):
+        finish_export(file_path)
+    assert not os.path.exists(file_path) and not os.path.exists(file_path + '.tmp')
@@ -0,0 +1,354 @@
+# tests/test_excel_save.py
+
+# Saving to the Excel file without the GUI. changed_sheets tells the sheets whose data or plot settings changed since
+# they were written, and the sheets written to an open workbook are the ones pd.ExcelWriter wrote before, cell by
+# cell and style by style.
+
+import hashlib
+import shutil
+from types import SimpleNamespace
+
+import numpy as np
+import openpyxl
+import pandas as pd
+import pytest
+from openpyxl.styles import Border, Font, PatternFill, Side
+
+from libraries.Excel_Save import (_update_digest, changed_sheets, plot_settings, sheet_signature, store_fit_curves,
+                                  write_plot_to_workbook, write_results_table_to_workbook, write_sheet_to_workbook)
+
+
+class Grid:
+    # The wx.grid.Grid calls the writers make
+    def __init__(self, labels, rows):
+        self.labels = labels
+        self.rows = rows
+
+    def GetNumberRows(self):
+        return len(self.rows)
+
+    def GetNumberCols(self):
+        return len(self.labels)
+
+    def GetColLabelValue(self, col):
+        return self.labels[col]
+
+    def GetCellValue(self, row, col):
+        return self.rows[row][col]
+
+
+PEAK_LABELS = ['ID', 'Label', 'Position', 'Height', 'FWHM', 'L/G', 'Area', 'Sigma', 'Gamma', 'Skew', 'Split',
+               'Area Ratio', 'Fitting Model', 'Model']
+
+
+def peak_grid():
+    rows = []
+    for letter, label, position in (('A', 'C1s p1', '285.00'), ('B', 'C1s p2', '286.50')):
+        rows.append([letter, label, position, '1000', '1.20', '30', '1500', '0.8', '0.4', '', '', '', '', 'GL (Area)'])
+        rows.append([''] * 2 + ['280,290'] + [''] * 11)
+    return Grid(PEAK_LABELS, rows)
+
+
+def core_level(center):
+    x = np.linspace(center + 10, center - 10, 101)
+    y = 100 + 1000 * np.exp(-(x - center) ** 2)
+    return {'Name': 'C1s', 'B.E.': x, 'Raw Data': y,
+            'Background': {'Bkg Type': 'Shirley', 'Bkg Low': center - 8, 'Bkg High': center + 8,
+                           'Bkg X': x, 'Bkg Y': np.full(len(x), 100.0)},
+            'Fitting': {'Peaks': {'C1s p1': {'Position': center, 'Height': 1000.0, 'FWHM': 1.2}}}}
+
+
+def window():
+    plot_manager = SimpleNamespace(plot_style='scatter', scatter_size=20, line_width=1, line_alpha=0.7,
+                                   scatter_color='#000000', line_color='#000000', scatter_marker='o',
+                                   peak_colors=['#FF0000', '#00FF00'], peak_alpha=0.3, legend_visible=True,
+                                   residuals_visible=True, y_axis_visible=True, peak_fill_enabled=True)
+    plot_config = SimpleNamespace(plot_limits={'C1s': {'Xmin': 280, 'Xmax': 295, 'Ymin': 0, 'Ymax': 1200}})
+    return SimpleNamespace(
+        Data={'Core levels': {'C1s': core_level(285.0), 'O1s': core_level(532.0)}},
+        excel_saved_signatures={}, plot_manager=plot_manager, plot_config=plot_config, energy_scale='BE',
+        excel_width=8, excel_height=6, excel_dpi=300, survey_excel_width=10, survey_excel_height=5,
+        survey_excel_dpi=200, plot_font='Arial', peak_params_grid=peak_grid(), selected_fitting_method='GL (Area)',
+        x_values=core_level(285.0)['B.E.'], background=np.full(101, 100.0))
+
+
+def record(window):
+    window.excel_saved_signatures.update({name: sheet_signature(window, name) for name in window.Data['Core levels']})
+
+
+def test_sheets_are_changed_until_written():
+    w = window()
+    assert changed_sheets(w) == ['C1s', 'O1s']
+    record(w)
+    assert changed_sheets(w) == []
+    # The same values in new arrays and lists
+    w.Data['Core levels']['C1s']['Raw Data'] = list(w.Data['Core levels']['C1s']['Raw Data'])
+    assert changed_sheets(w) == []
+
+
+def test_changed_data_changes_only_its_sheet():
+    w = window()
+    record(w)
+
+    raw = w.Data['Core levels']['O1s']['Raw Data'].copy()
+    raw[50] += 1
+    w.Data['Core levels']['O1s']['Raw Data'] = raw
+    assert changed_sheets(w) == ['O1s']
+    record(w)
+
+    w.Data['Core levels']['C1s']['Fitting']['Peaks']['C1s p1']['FWHM'] = 1.3
+    assert changed_sheets(w) == ['C1s']
+
+
+def test_redrawn_curves_do_not_change_the_sheet():
+    w = window()
+    record(w)
+    store_fit_curves(w, 'C1s', np.ones(101), np.zeros(101), [np.ones(101), None])
+    assert changed_sheets(w) == []
+
+
+@pytest.mark.parametrize('change', [
+    lambda w: setattr(w, 'excel_dpi', 150),
+    lambda w: setattr(w, 'plot_font', 'Calibri'),
+    lambda w: setattr(w, 'energy_scale', 'KE'),
+    lambda w: setattr(w.plot_manager, 'legend_visible', False),
+    lambda w: setattr(w.plot_manager, 'scatter_color', '#FF00FF'),
+    lambda w: w.plot_manager.peak_colors.__setitem__(1, '#0000FF'),
+])
+def test_plot_settings_change_every_sheet(change):
+    w = window()
+    record(w)
+    change(w)
+    assert changed_sheets(w) == ['C1s', 'O1s']
+
+
+def test_plot_limits_change_their_sheet():
+    w = window()
+    record(w)
+    w.plot_config.plot_limits['C1s']['Xmin'] = 281
+    assert changed_sheets(w) == ['C1s']
+    record(w)
+    # Limits set for a sheet that had none
+    w.plot_config.plot_limits['O1s'] = {'Xmin': 525, 'Xmax': 540, 'Ymin': 0, 'Ymax': 1200}
+    assert changed_sheets(w) == ['O1s']
+
+
+def test_plot_settings_without_plot():
+    w = window()
+    del w.plot_manager, w.plot_config
+    settings = plot_settings(w, 'C1s')
+    assert settings['Limits'] is None and set(settings['Plot'].values()) == {None}
+    assert settings['Window']['excel_dpi'] == 300
+
+
+def digest(obj):
+    h = hashlib.blake2b(digest_size=16)
+    _update_digest(h, obj)
+    return h.hexdigest()
+
+
+def test_zero_dimensional_arrays():
+    # np.float64(1.5) kept as an array, np.array(...) of an object
+    assert digest(np.array(1.5)) == digest(1.5)
+    assert digest({'Bkg Low': np.array(280.0)}) != digest({'Bkg Low': np.array(281.0)})
+    assert digest(np.array({'a': 1}, dtype=object)) == digest({'a': 1})
+    assert digest([np.array(1.0), 'text']) == digest([1.0, 'text'])
+
+
+def test_digest_values():
+    assert digest([1, 2, 3]) == digest(np.array([1.0, 2.0, 3.0])) == digest((1.0, 2.0, 3.0))
+    assert digest([1.0, 2.0]) != digest([1.0, 2.5])
+    assert digest(np.arange(4.0)) != digest(np.arange(4.0).reshape(2, 2))
+    assert digest(['1', '2']) != digest([1, 2])
+    assert digest([1.0, None]) != digest([1.0, np.nan])
+    assert digest([[1.0, 2.0], [3.0]]) == digest([np.array([1.0, 2.0]), (3.0,)])
+    assert digest({'a': 1, 'b': 2}) != digest({'a': 2, 'b': 1})
+    assert digest(np.float32(0.5)) == digest(0.5)
+
+
+def excel_file(path):
+    wb = openpyxl.Workbook()
+    ws = wb.active
+    ws.title = 'C1s'
+    ws.append(['BE', 'Raw Data', '', '', '', 'BE', 'Old fit'])
+    for be, y in zip(np.linspace(295, 275, 101), np.linspace(100, 200, 101)):
+        ws.append([float(be), float(y), None, None, None, float(be), 1.0])
+    wb.create_sheet('O1s').append(['BE', 'Raw Data'])
+    wb.create_sheet('Results Table')
+    wb.save(path)
+    return str(path)
+
+
+def fit_data(w):
+    x = w.x_values
+    envelope = 100 + 1000 * np.exp(-(x - 285) ** 2)
+    peak = envelope.copy()
+    peak[0] = np.inf
+    return {'x_values': x, 'y_values': envelope + 5, 'background': w.background, 'calculated_fit': envelope,
+            'individual_peak_fits': [peak, None], 'peak_params_grid': w.peak_params_grid}
+
+
+def excelwriter_save_to_excel(window, data, file_path, sheet_name):
+    # save_to_excel before the workbook was written in memory, with the curves in x order as they are stored now
+    existing_df = pd.read_excel(file_path, sheet_name=sheet_name)
+    if existing_df.shape[1] > 5:
+        existing_df = existing_df.iloc[:, :5]
+    while existing_df.shape[1] < 5:
+        existing_df[f'Column_{existing_df.shape[1] + 1}'] = ''
+
+    x_values = data['x_values']
+    filtered_data = pd.DataFrame({'BE': x_values})
+    filtered_data['Residuals'] = data['y_values'] - data['calculated_fit']
+    filtered_data['Background'] = data['background']
+    filtered_data['Calculated Fit'] = data['calculated_fit']
+    for i in range(data['peak_params_grid'].GetNumberRows() // 2):
+        if data['individual_peak_fits'][i] is not None:
+            filtered_data[data['peak_params_grid'].GetCellValue(i * 2, 1)] = data['individual_peak_fits'][i]
+    for i, col in enumerate(filtered_data.columns):
+        new_col_name = col
+        while new_col_name in existing_df.columns:
+            new_col_name += '_new'
+        existing_df.insert(5 + i, new_col_name, filtered_data[col])
+    while existing_df.shape[1] < 23:
+        existing_df[f'Column_{existing_df.shape[1] + 1}'] = ''
+    existing_df.columns = ['' if col.startswith(('Unnamed', 'Column')) else col for col in existing_df.columns]
+    if existing_df.columns[4] != '':
+        existing_df.rename(columns={existing_df.columns[4]: ''}, inplace=True)
+
+    grid = window.peak_params_grid
+    peak_params_df = pd.DataFrame()
+    for col in range(grid.GetNumberCols()):
+        peak_params_df[grid.GetColLabelValue(col)] = [grid.GetCellValue(row, col) for row in range(grid.GetNumberRows())]
+    for i, col in enumerate(peak_params_df.columns):
+        existing_df.insert(23 + i, col, peak_params_df[col])
+
+    with pd.ExcelWriter(file_path, engine='openpyxl', mode='a', if_sheet_exists='replace') as writer:
+        existing_df.to_excel(writer, sheet_name=sheet_name, index=False)
+        worksheet = writer.book[sheet_name]
+        for cell in worksheet[1]:
+            cell.border = Border(left=Side(style=None), right=Side(style=None), top=Side(style=None),
+                                 bottom=Side(style=None))
+        thin_side, thick_side = Side(style='thin'), Side(style='medium')
+        start_row, end_row, start_col, end_col = 2, 1 + grid.GetNumberRows(), 24, worksheet.max_column
+        for row in range(start_row - 1, end_row + 1):
+            for col in range(start_col, end_col + 1):
+                cell = worksheet.cell(row=row, column=col)
+                left = right = top = bottom = thin_side
+                if row == start_row - 1:
+                    cell.fill = PatternFill(start_color="90EE90", end_color="90EE90", fill_type="solid")
+                    cell.font = Font(bold=True)
+                    top = thick_side
+                if row == start_row - 1 or row == end_row:
+                    bottom = thick_side
+                if col == start_col:
+                    left = thick_side
+                if col == end_col:
+                    right = thick_side
+                if (row - start_row + 1) % 2 == 0:
+                    bottom = thick_side
+                cell.border = Border(left=left, right=right, top=top, bottom=bottom)
+
+
+def cell_styles_of(cell):
+    return (cell.value, cell.font.b, cell.fill.fill_type, cell.fill.fgColor.rgb, cell.alignment.horizontal,
+            cell.alignment.vertical, cell.border.left.style, cell.border.right.style, cell.border.top.style,
+            cell.border.bottom.style)
+
+
+def value_fill_and_borders(cell):
+    return (cell.value, cell.fill.fill_type, cell.fill.fgColor.rgb, cell.border.left.style, cell.border.right.style,
+            cell.border.top.style, cell.border.bottom.style)
+
+
+def cell_styles(ws):
+    return [[cell_styles_of(cell) for cell in row] for row in ws.iter_rows()]
+
+
+@pytest.mark.parametrize('sheet_name', ['C1s', 'O1s'])
+def test_sheet_is_written_as_excelwriter_wrote_it(tmp_path, sheet_name):
+    w = window()
+    # No plot to put the limits back on
+    del w.plot_config
+    reference_path = excel_file(tmp_path / 'reference.xlsx')
+    path = shutil.copy(reference_path, tmp_path / 'in_memory.xlsx')
+    excelwriter_save_to_excel(w, fit_data(w), reference_path, sheet_name)
+
+    wb = openpyxl.load_workbook(path)
+    write_sheet_to_workbook(w, fit_data(w), wb, sheet_name)
+    wb.save(path)
+
+    expected, result = openpyxl.load_workbook(reference_path), openpyxl.load_workbook(path)
+    assert result.sheetnames == expected.sheetnames == ['C1s', 'O1s', 'Results Table']
+    for name in expected.sheetnames:
+        if name != sheet_name:
+            assert cell_styles(result[name]) == cell_styles(expected[name])
+    assert cell_styles(result[sheet_name])[1:] == cell_styles(expected[sheet_name])[1:]
+    # The header as pandas 2 wrote it, bold and centred, pandas 3 writes it plain
+    for cell, expected_cell in zip(result[sheet_name][1], expected[sheet_name][1]):
+        assert value_fill_and_borders(cell) == value_fill_and_borders(expected_cell)
+        assert (cell.font.b, cell.alignment.horizontal, cell.alignment.vertical) == (True, 'center', 'top')
+
+
+def test_results_table_is_replaced(tmp_path):
+    w = window()
+    w.results_grid = Grid(['Peak', 'Position', 'Area', 'Checkbox'],
+                          [['C1s p1', '285.00', '1500', '1'], ['C1s p2', '286.50', '700', '0'],
+                           ['O1s p1', '532.10', '2100', '1']])
+    wb = openpyxl.load_workbook(excel_file(tmp_path / 'table.xlsx'))
+    wb['Results Table']['A1'] = 'stale'
+
+    write_results_table_to_workbook(w, wb)
+
+    ws = wb['Results Table']
+    assert wb.sheetnames == ['C1s', 'O1s', 'Results Table']
+    assert [list(row) for row in ws.iter_rows(values_only=True)] == \
+        [[None] * 5, [None, 'Peak', 'Position', 'Area', 'Checkbox']] + \
+        [[None] + row for row in w.results_grid.rows]
+    header = ws['B2:E2'][0]
+    assert all(cell.font.b and cell.fill.fgColor.rgb == '0090EE90' for cell in header)
+    # Medium borders around the table and under the header, thin ones inside
+    assert [ws.cell(row=2, column=col).border.bottom.style for col in range(2, 6)] == ['medium'] * 4
+    assert [ws.cell(row=row, column=2).border.left.style for row in range(2, 6)] == ['medium'] * 4
+    assert [ws.cell(row=row, column=5).border.right.style for row in range(2, 6)] == ['medium'] * 4
+    assert [ws.cell(row=5, column=col).border.bottom.style for col in range(2, 6)] == ['medium'] * 4
+    assert ws['C4'].border.left.style == ws['C4'].border.bottom.style == 'thin'
+    assert ws.column_dimensions['B'].width == len('C1s p1') + 2
+
+
+class Figure:
+    # The matplotlib figure calls write_plot_to_workbook makes, a PNG of the export size in pixels
+    def __init__(self):
+        self.size = (10.0, 7.0)
+        self.saved = []
+
+    def get_size_inches(self):
+        return self.size
+
+    def set_size_inches(self, width, height=None):
+        self.size = (width, height) if height is not None else tuple(width)
+
+    def savefig(self, buf, format, dpi, bbox_inches):
+        from PIL import Image
+        self.saved.append((self.size, dpi))
+        Image.new('RGB', (int(self.size[0] * dpi / 100), int(self.size[1] * dpi / 100))).save(buf, format=format)
+
+
+@pytest.mark.parametrize('sheet_name, size, dpi', [('C1s', (8, 6), 300), ('Survey', (10, 5), 200),
+                                                   ('Wide scan', (10, 5), 200)])
+def test_plot_replaces_the_image(tmp_path, sheet_name, size, dpi):
+    pytest.importorskip('PIL')
+    w = window()
+    w.figure = Figure()
+    wb = openpyxl.load_workbook(excel_file(tmp_path / 'plot.xlsx'))
+
+    write_plot_to_workbook(w, wb, sheet_name)
+    write_plot_to_workbook(w, wb, sheet_name)
+
+    assert w.figure.saved == [(size, dpi)] * 2
+    assert w.figure.get_size_inches() == (10.0, 7.0)
+    images = wb[sheet_name]._images
+    assert len(images) == 1 and images[0].anchor == 'D6'
+    assert (images[0].width, images[0].height) == (size[0] * dpi // 100, size[1] * dpi // 100)
+    path = tmp_path / 'saved.xlsx'
+    wb.save(path)
+    assert len(openpyxl.load_workbook(path)[sheet_name]._images) == 1
@@ -0,0 +1,103 @@
+# tests/test_fit_curves.py
+
+# store_fit_curves / get_fit_curves: the curves of the last redraw are handed back to saving while the peak grid, x
+# and background are the ones they were drawn from, and not once any of them changes.
+
+import numpy as np
+
+from libraries.Excel_Save import clear_fit_curves, get_fit_curves, store_fit_curves, without_fit_curves
+
+
+class Grid:
+    # The peak grid calls fit_curves_signature makes, a row of values and a row of constraints per peak
+    def __init__(self, rows):
+        self.rows = rows
+
+    def GetNumberRows(self):
+        return len(self.rows)
+
+    def GetCellValue(self, row, col):
+        return self.rows[row][col]
+
+
+def peak_rows(label, position):
+    values = ['A', label, position, '1000', '1.2', '30', '1500', '0.8', '0.4', '0', '', '', '', 'GL (Area)']
+    return [values, [''] * 14]
+
+
+class Window:
+    def __init__(self):
+        self.x_values = np.linspace(295, 275, 201)
+        self.background = np.full(201, 100.0)
+        self.peak_params_grid = Grid(peak_rows('C1s p1', '285.00') + peak_rows('C1s p2', '286.50'))
+        self.Data = {'Core levels': {'C1s': {'Fitting': {'Peaks': {}}}}}
+
+
+def draw(window):
+    envelope = window.background + np.exp(-(window.x_values - 285) ** 2)
+    peaks = [window.background + np.exp(-(window.x_values - 285) ** 2), None]
+    store_fit_curves(window, 'C1s', envelope, envelope - 150, peaks)
+    return envelope
+
+
+def test_curves_are_reused_while_the_peaks_are_unchanged():
+    window = Window()
+    envelope = draw(window)
+
+    for _ in range(3):
+        curves = get_fit_curves(window, 'C1s')
+        assert curves is window.Data['Core levels']['C1s']['Fitting']['Curves']
+        np.testing.assert_array_equal(curves['Envelope'], envelope)
+        np.testing.assert_array_equal(curves['Residuals'], envelope - 150)
+        assert curves['Peaks'][1] is None
+    # Same values in new arrays are the same peaks
+    window.x_values = window.x_values.copy()
+    assert get_fit_curves(window, 'C1s') is not None
+
+
+def test_changed_peak_drops_the_curves():
+    window = Window()
+    draw(window)
+
+    window.peak_params_grid.rows[2][2] = '286.60'
+    assert get_fit_curves(window, 'C1s') is None
+    window.peak_params_grid.rows[2][2] = '286.50'
+    assert get_fit_curves(window, 'C1s') is not None
+    # The fitting model of a peak
+    window.peak_params_grid.rows[0][13] = 'Voigt (Area, σ, γ)'
+    assert get_fit_curves(window, 'C1s') is None
+
+
+def test_changed_data_or_background_drops_the_curves():
+    window = Window()
+    draw(window)
+    window.background = window.background + 1
+    assert get_fit_curves(window, 'C1s') is None
+
+    draw(window)
+    window.background = None
+    assert get_fit_curves(window, 'C1s') is None
+
+    window.background = np.full(201, 100.0)
+    draw(window)
+    window.x_values = window.x_values[:-1]
+    assert get_fit_curves(window, 'C1s') is None
+
+
+def test_cleared_or_missing_curves():
+    window = Window()
+    assert get_fit_curves(window, 'C1s') is None
+    assert get_fit_curves(window, 'O1s') is None
+
+    draw(window)
+    clear_fit_curves(window, 'C1s')
+    assert get_fit_curves(window, 'C1s') is None
+    clear_fit_curves(window, 'O1s')
+
+
+def test_curves_stay_out_of_the_peak_library():
+    window = Window()
+    draw(window)
+    fitting = window.Data['Core levels']['C1s']['Fitting']
+    assert without_fit_curves(fitting) == {'Peaks': {}}
+    assert 'Curves' in fitting
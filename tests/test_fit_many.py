@@ -0,0 +1,86 @@
+# tests/test_fit_many.py
+
+# Fit All Sheets without the GUI: fit_many on the problems fit_all_sheets builds from window.Data gives the same
+# fits as fitting each sheet on its own, in the calling process or in a pool of workers, and reports each sheet
+# and each failure as it finishes.
+
+import copy
+
+import numpy as np
+import pytest
+
+from libraries.Fitting_Engine import build_fit_problem_from_data, fit, fit_many
+from tests.test_fitting_engines import CONSTRAINTS
+
+SHEETS = {'C1s': ("GL (Area)", 285.0), 'O1s': ("Voigt (Area, σ, γ)", 532.0), 'N1s': ("Pseudo-Voigt (Area)", 400.0)}
+
+
+def stored_peak(model, center):
+    return {'Fitting Model': model, 'Position': center + 0.15, 'Height': 700.0, 'FWHM': 1.4, 'L/G': 20.0,
+            'Area': 1100.0, 'Sigma': 0.6, 'Gamma': 0.3,
+            'Constraints': {**CONSTRAINTS, 'Position': f'{center - 5},{center + 5}'}}
+
+
+def window_data(seed=3):
+    rng = np.random.default_rng(seed)
+    core_levels = {}
+    for sheet_name, (model, center) in SHEETS.items():
+        x = np.linspace(center + 12, center - 12, 480)
+        y = 100 + 800 * np.exp(-(x - center) ** 2 / (2 * 0.55 ** 2)) + \
+            300 * np.exp(-(x - center - 2.1) ** 2 / (2 * 0.6 ** 2)) + rng.normal(0, 3, len(x))
+        core_levels[sheet_name] = {
+            'B.E.': x,
+            'Raw Data': y,
+            'Background': {'Bkg Y': np.full(len(x), 100.0), 'Bkg Low': center - 12, 'Bkg High': center + 12},
+            'Fitting': {'Peaks': {f'{sheet_name} p1': stored_peak(model, center),
+                                  f'{sheet_name} p2': stored_peak(model, center + 2.1)}},
+        }
+    return {'Core levels': core_levels}
+
+
+def sheet_problems(data):
+    # As fit_all_sheets builds them
+    return [build_fit_problem_from_data(data, sheet_name, method='leastsq', max_nfev=2000)
+            for sheet_name in data['Core levels']]
+
+
+@pytest.mark.parametrize('max_workers', [1, 2])
+def test_fit_many_gives_the_serial_fits(max_workers):
+    problems = sheet_problems(window_data())
+    serial = {problem.sheet_name: fit(copy.deepcopy(problem)) for problem in problems}
+
+    finished = []
+    results, errors = fit_many(problems, max_workers=max_workers,
+                               on_result=lambda sheet_name, result, error: finished.append(sheet_name))
+
+    assert errors == {}
+    assert sorted(finished) == sorted(SHEETS) and set(results) == set(SHEETS)
+    for sheet_name, result in results.items():
+        assert result.params == serial[sheet_name].params
+        assert result.peaks == serial[sheet_name].peaks
+        np.testing.assert_array_equal(result.best_fit, serial[sheet_name].best_fit)
+        assert result.success
+
+
+@pytest.mark.parametrize('max_workers', [1, 2])
+def test_failed_fits_are_collected(max_workers):
+    problems = sheet_problems(window_data())
+    # A background shorter than the data makes this fit raise
+    problems[1].background = problems[1].background[:10]
+
+    reported = {}
+    results, errors = fit_many(problems, max_workers=max_workers,
+                               on_result=lambda sheet_name, result, error: reported.setdefault(sheet_name, error))
+
+    assert set(errors) == {'O1s'} and set(results) == {'C1s', 'N1s'}
+    assert reported['O1s'] is not None and reported['C1s'] is None and reported['N1s'] is None
+
+
+def test_on_wait_runs_after_each_serial_fit():
+    waits = []
+    fit_many(sheet_problems(window_data()), max_workers=1, on_wait=lambda: waits.append(True))
+    assert len(waits) == len(SHEETS)
+
+
+def test_nothing_to_fit():
+    assert fit_many([]) == ({}, {})
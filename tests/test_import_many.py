@@ -0,0 +1,114 @@
+# tests/test_import_many.py
+
+# import_many on small .avg files, in the calling process (max_workers=1) and in a pool of two workers: the spectra
+# of each file as read_spectra_file reads them, in the order of the files, the files that cannot be read collected
+# with their error, and the import cancelled when the progress callback returns False.
+
+import numpy as np
+import pytest
+
+from libraries.Spectra_Readers import import_many, read_spectra_file
+
+
+def write_avg_file(path, num_points, seed):
+    rng = np.random.default_rng(seed)
+    values = np.round(rng.uniform(1000, 50000, num_points), 4)
+    with open(path, 'w') as f:
+        f.write("DS_SOPROPID_ENERGY             : VT_R4     = 1486.680054\n")
+        f.write("$SPACEAXES=1\n")
+        f.write(f"0=   1196.000000, 0.050000, {num_points}, Energy, eV, eV, Kinetic Energy, Energy, ENERGY\n")
+        for i in range(0, num_points, 4):
+            f.write(f"LIST@ {i:>7}=   {', '.join(f'{value:.4f}' for value in values[i:i + 4])}\n")
+    return str(path)
+
+
+@pytest.fixture
+def files(tmp_path):
+    # Larger files first, so the pool tends to finish them out of order
+    return [write_avg_file(tmp_path / f'spectrum_{i}.avg', num_points, i)
+            for i, num_points in enumerate((20000, 8000, 400, 40, 4))]
+
+
+@pytest.fixture
+def broken(tmp_path):
+    no_header = tmp_path / 'no_header.avg'
+    no_header.write_text("LIST@       0=   1.0, 2.0\n")
+    unsupported = tmp_path / 'notes.txt'
+    unsupported.write_text("not a spectrum\n")
+    return [str(no_header), str(unsupported)]
+
+
+def assert_same_spectra(result, expected):
+    assert [name for name, _ in result] == [name for name, _ in expected]
+    for (_, spectrum), (_, expected_spectrum) in zip(result, expected):
+        assert spectrum.keys() == expected_spectrum.keys()
+        for key, value in spectrum.items():
+            if isinstance(value, np.ndarray):
+                np.testing.assert_array_equal(value, expected_spectrum[key])
+            else:
+                assert value == expected_spectrum[key]
+
+
+@pytest.mark.parametrize('max_workers', [1, 2])
+def test_results_are_in_the_order_of_the_files(files, max_workers):
+    calls = []
+    results, errors, cancelled = import_many(files, 1486.67, 4.5, max_workers=max_workers,
+                                             progress=lambda done, total, path: calls.append((done, total, path)))
+
+    assert not cancelled and errors == {}
+    assert [path for path, _ in results] == files
+    for path, spectra in results:
+        assert_same_spectra(spectra, read_spectra_file(path, 1486.67, 4.5))
+    # Each file reported once it is read, the count never goes back
+    reported = [path for _, _, path in calls if path is not None]
+    assert sorted(reported) == sorted(files)
+    assert [done for done, _, _ in calls] == sorted(done for done, _, _ in calls)
+    assert calls[-1][:2] == (len(files), len(files))
+
+
+@pytest.mark.parametrize('max_workers', [1, 2])
+def test_errors_are_collected(files, broken, max_workers):
+    paths = [files[0], broken[0], files[3], broken[1]]
+
+    results, errors, cancelled = import_many(paths, 1486.67, 4.5, max_workers=max_workers)
+
+    assert not cancelled
+    assert [path for path, _ in results] == [files[0], files[3]]
+    assert set(errors) == set(broken)
+    assert all(isinstance(error, ValueError) for error in errors.values())
+    assert 'notes.txt' in str(errors[broken[1]])
+
+
+def test_cancel_in_the_calling_process(files):
+    calls = []
+
+    def progress(done, total, path):
+        calls.append(path)
+        return done < 2
+
+    results, errors, cancelled = import_many(files, 1486.67, 4.5, max_workers=1, progress=progress)
+
+    # The file being read when the import was cancelled is kept, the others are not read
+    assert cancelled and errors == {}
+    assert [path for path, _ in results] == files[:2]
+    assert calls == files[:2]
+
+
+def test_cancel_in_a_pool(files):
+    calls = []
+
+    def progress(done, total, path):
+        calls.append((done, path))
+        return path is None
+
+    results, errors, cancelled = import_many(files, 1486.67, 4.5, max_workers=2, progress=progress)
+
+    # Cancelled when the first file was read, that file is returned and the others are dropped
+    assert cancelled and errors == {}
+    assert calls[-1][0] == 1 and all(path is None for _, path in calls[:-1])
+    assert results == [(calls[-1][1], results[0][1])]
+    assert_same_spectra(results[0][1], read_spectra_file(calls[-1][1], 1486.67, 4.5))
+
+
+def test_no_files():
+    assert import_many([], 1486.67, 4.5) == ([], {}, False)
@@ -0,0 +1,120 @@
+# tests/test_jacobians.py
+
+# The analytic derivatives of Vectorized_Model against central finite differences, per profile (DERIVATIVES)
+# and for the whole model Jacobian, where the Voigt and Pseudo-Voigt amplitude is an alias tied to the area, and
+# whole fits with the analytic Jacobian against the same fits with finite differences.
+
+import copy
+
+import numpy as np
+import pytest
+
+from libraries import Fitting_Engine
+from libraries.Fitting_Engine import build_model, fit, fit_mask
+from libraries.Peak_Functions import PeakFunctions
+from libraries.Vectorized_Model import DERIVATIVES, VectorizedPeakModel, pseudo_voigt, voigt
+from tests.test_fitting_engines import synthetic_problem
+
+JACOBIAN_MODELS = ["GL (Area)", "SGL (Area)", "GL (Height)", "SGL (Height)", "Voigt (Area, σ, γ)",
+                   "Pseudo-Voigt (Area)"]
+
+# Profile, one column of values per peak for each parameter
+PROFILE_VALUES = [
+    (PeakFunctions.gauss_lorentz_Area, dict(center=[284.6, 286.1], area=[1500.0, 400.0], fwhm=[1.2, 1.6],
+                                             fraction=[20.0, 45.0])),
+    (PeakFunctions.S_gauss_lorentz_Area, dict(center=[284.6, 286.1], area=[1500.0, 400.0], fwhm=[1.2, 1.6],
+                                               fraction=[20.0, 45.0])),
+    (PeakFunctions.gauss_lorentz, dict(center=[284.6, 286.1], fwhm=[1.2, 1.6], fraction=[20.0, 45.0],
+                                       amplitude=[1000.0, 300.0])),
+    (PeakFunctions.S_gauss_lorentz, dict(center=[284.6, 286.1], fwhm=[1.2, 1.6], fraction=[20.0, 45.0],
+                                         amplitude=[1000.0, 300.0])),
+    (voigt, dict(amplitude=[1500.0, 400.0], center=[284.6, 286.1], sigma=[0.5, 0.7], gamma=[0.2, 0.35])),
+    (pseudo_voigt, dict(amplitude=[1500.0, 400.0], center=[284.6, 286.1], sigma=[0.6, 0.8],
+                        fraction=[0.3, 0.6])),
+]
+
+
+def central_difference(function, value, step):
+    return (function(value + step) - function(value - step)) / (2 * step)
+
+
+@pytest.mark.parametrize('func, values', PROFILE_VALUES, ids=[func.__name__ for func, _ in PROFILE_VALUES])
+def test_profile_derivatives_match_finite_differences(func, values):
+    x = np.linspace(280, 291, 500)[None, :]
+    columns = {name: np.array(column)[:, None] for name, column in values.items()}
+    derivatives = DERIVATIVES[func](x, **columns)
+
+    for name, column in columns.items():
+        step = 1e-6 * np.maximum(1, np.abs(column))
+
+        def with_value(value):
+            return func(x, **{**columns, name: value})
+
+        numeric = central_difference(with_value, column, step)
+        analytic = np.broadcast_to(derivatives[name], numeric.shape)
+        scale = np.abs(numeric).max(axis=1, keepdims=True)
+        np.testing.assert_allclose(analytic / scale, numeric / scale, atol=1e-6, err_msg=name)
+
+
+@pytest.mark.parametrize('model', JACOBIAN_MODELS)
+def test_model_jacobian_matches_finite_differences(model):
+    problem = synthetic_problem([model] * 3)
+    _, params = build_model(problem)
+    x = problem.x[fit_mask(problem)]
+    vectorized = VectorizedPeakModel(problem.peaks, x)
+
+    jacobian = vectorized.jacobian_function(params)
+    assert jacobian is not None
+    analytic = jacobian(params)
+
+    var_names = [name for name, param in params.items() if param.vary and param.expr is None]
+    assert analytic.shape == (len(x), len(var_names))
+    if model.startswith(('Voigt', 'Pseudo-Voigt')):
+        # The amplitude the profile takes is tied to the varying area, its derivative lands on the area column
+        assert any(param.expr for param in params.values())
+
+    for col, name in enumerate(var_names):
+        start = params[name].value
+        step = 1e-6 * max(1.0, abs(start))
+
+        def model_at(value):
+            trial = params.copy()
+            trial[name].value = value
+            trial.update_constraints()
+            return vectorized.eval(trial)
+
+        numeric = central_difference(model_at, start, step)
+        scale = max(np.abs(numeric).max(), 1e-12)
+        np.testing.assert_allclose(analytic[:, col] / scale, numeric / scale, atol=1e-5, err_msg=name)
+
+
+@pytest.mark.parametrize('method', ['leastsq', 'least_squares'])
+@pytest.mark.parametrize('model', JACOBIAN_MODELS)
+def test_analytic_and_finite_difference_fits_agree(model, method, monkeypatch):
+    problem = synthetic_problem([model] * 3, method=method)
+    jacobian_calls = []
+    jacobian_function = Fitting_Engine.VectorizedPeakModel.jacobian_function
+
+    def counted(self, params):
+        jacobian = jacobian_function(self, params)
+        if jacobian is None:
+            return None
+
+        def call(fit_params):
+            jacobian_calls.append(True)
+            return jacobian(fit_params)
+        return call
+
+    monkeypatch.setattr(Fitting_Engine.VectorizedPeakModel, 'jacobian_function', counted)
+    analytic = fit(copy.deepcopy(problem))
+    assert jacobian_calls, "the analytic Jacobian was not used"
+
+    jacobian_calls.clear()
+    problem.analytic_jacobian = False
+    finite_difference = fit(copy.deepcopy(problem))
+    assert not jacobian_calls
+
+    assert analytic.success and finite_difference.success
+    for name, (value, _) in finite_difference.params.items():
+        assert analytic.params[name][0] == pytest.approx(value, rel=1e-6, abs=1e-9), name
+    assert analytic.r_squared == pytest.approx(finite_difference.r_squared, rel=1e-9)
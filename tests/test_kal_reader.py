@@ -0,0 +1,137 @@
+# tests/test_kal_reader.py
+
+# read_kal_spectra against convert_kal_to_excel as it was before the one pass reader, on a small Kratos .kal file:
+# ordinates wrapped over several lines, a block without a transmission table, transmission fields before the
+# transmission object of their block, and two blocks sharing one table.
+
+import numpy as np
+import pytest
+from scipy.interpolate import interp1d
+
+from libraries.Spectra_Readers import kal_transmission_function, read_kal_blocks, read_kal_spectra
+
+TABLE = ([300.0, 600.0, 900.0, 1200.0, 1500.0], [0.41, 0.33, 0.27, 0.24, 0.22])
+OTHER_TABLE = ([250.0, 750.0, 1250.0, 1750.0], [0.50, 0.35, 0.28, 0.20])
+
+
+def kal_block(name, start_ke, step, ordinates, table=None, per_line=7, early_table=None):
+    lines = ['Dataset filename          = C:\\Data\\sample.kal',
+             f'Object name               = {name}/Region 1',
+             f'Spectrum scan start       = {start_ke} eV',
+             f'Spectrum scan step size   = {step} eV']
+    if early_table is not None:
+        # Fields of the same name outside the transmission object, not the table
+        lines += [f'Transmission Function Kinetic Energy = {{{", ".join(map(str, early_table[0]))}}}',
+                  f'Transmission Function Value          = {{{", ".join(map(str, early_table[1]))}}}']
+    rows = [', '.join(f'{value:.1f}' for value in ordinates[i:i + per_line])
+            for i in range(0, len(ordinates), per_line)]
+    lines.append('Ordinate values           = {' + ',\n    '.join(rows) + '}')
+    if table is not None:
+        lines += ['Transmission Function Object (ke,t)',
+                  f'Transmission Function Kinetic Energy = {{{", ".join(map(str, table[0]))}}}',
+                  f'Transmission Function Value          = {{{", ".join(map(str, table[1]))}}}']
+    return '\n'.join(lines) + '\n'
+
+
+def ordinates(n, center, seed):
+    rng = np.random.default_rng(seed)
+    x = np.arange(n)
+    return np.round(500 + 8000 * np.exp(-0.5 * ((x - center) / 6) ** 2) + rng.normal(0, 20, n), 1)
+
+
+@pytest.fixture
+def kal_file(tmp_path):
+    path = tmp_path / 'sample.kal'
+    path.write_text('Kratos Analytical\nFile version = 2\n' +
+                    kal_block('C 1s', 1186.0, 0.1, ordinates(150, 70, 0), TABLE) +
+                    kal_block('O 1s', 940.0, 0.1, ordinates(90, 40, 1)) +
+                    kal_block('Survey', 200.0, 1.0, ordinates(400, 300, 2), OTHER_TABLE, per_line=11,
+                              early_table=TABLE) +
+                    kal_block('N 1s', 1080.0, 0.1, ordinates(60, 30, 3), TABLE, per_line=60))
+    return str(path)
+
+
+def reference_kal_spectra(file_path):
+    # convert_kal_to_excel and extract_transmission_data before the one pass reader, columns instead of the .xlsx
+    with open(file_path, 'r') as f:
+        content = f.read()
+
+    spectra = {}
+    for block in content.split('Dataset filename'):
+        if 'Ordinate values' in block and 'Object name' in block:
+            name = block.split('Object name               = ')[1].split('/')[0].strip()
+            if 'Transmission Function Object (ke,t)' not in block:
+                continue
+            trans_section = block.split('Transmission Function Object (ke,t)')[1].split('Dataset filename')[0]
+            ke_line = trans_section.split('Transmission Function Kinetic Energy =')[1].split('\n')[0]
+            ke_trans = np.array([float(x.strip()) for x in ke_line.strip().strip('{}').strip().split(',')])
+            val_line = trans_section.split('Transmission Function Value          =')[1].split('\n')[0]
+            trans_values = np.array([float(x.strip()) for x in val_line.strip().strip('{}').strip().split(',')])
+            trans_func = interp1d(ke_trans, trans_values, kind='linear', bounds_error=False, fill_value='extrapolate')
+
+            start_ke = float(block.split('Spectrum scan start')[1].split('=')[1].split('eV')[0].strip())
+            step = float(block.split('Spectrum scan step size')[1].split('=')[1].split('eV')[0].strip())
+            raw_str = block.split('Ordinate values')[1].split('=')[1].split('}')[0].strip().strip('{').strip()
+            raw_data = np.array([float(x.strip()) for x in raw_str.split(',')])
+
+            num_points = len(raw_data)
+            ke_values = np.linspace(start_ke, start_ke + (num_points - 1) * step, num_points)
+            transmission = trans_func(ke_values)
+            spectra[name.replace(' ', '')] = {'BE': 1486.67 - ke_values, 'Corrected Data': raw_data / transmission,
+                                              'Raw Data': raw_data, 'Transmission': transmission}
+    return spectra
+
+
+def test_spectra_match_the_old_converter(kal_file):
+    expected = reference_kal_spectra(kal_file)
+
+    spectra = read_kal_spectra(kal_file)
+
+    # O 1s has no transmission table and is left out, as before
+    assert [name for name, _ in spectra] == list(expected) == ['C1s', 'Survey', 'N1s']
+    for name, spectrum in spectra:
+        assert spectrum['x_label'] == 'BE'
+        np.testing.assert_array_equal(spectrum['x'], expected[name]['BE'])
+        np.testing.assert_array_equal(spectrum['raw'], expected[name]['Raw Data'])
+        np.testing.assert_array_equal(spectrum['transmission'], expected[name]['Transmission'])
+        np.testing.assert_array_equal(spectrum['corrected'], expected[name]['Corrected Data'])
+
+
+def test_wrapped_ordinates_are_read_whole(kal_file):
+    blocks = [fields for fields in read_kal_blocks(kal_file) if 'Object name' in fields]
+
+    assert [fields['Object name'].strip() for fields in blocks] == \
+        ['C 1s/Region 1', 'O 1s/Region 1', 'Survey/Region 1', 'N 1s/Region 1']
+    assert [len(dict(read_kal_spectra(kal_file))[name]['raw']) for name in ('C1s', 'Survey', 'N1s')] == [150, 400, 60]
+    # The table fields before the transmission object are not the table
+    assert 'Transmission Function Value' not in blocks[1]
+    assert blocks[2]['Transmission Function Value'].strip() == '{' + ', '.join(map(str, OTHER_TABLE[1])) + '}'
+
+
+def test_blocks_share_a_transmission_function(kal_file):
+    kal_transmission_function.cache_clear()
+    read_kal_spectra(kal_file)
+    read_kal_spectra(kal_file)
+
+    # TABLE and OTHER_TABLE, then every block from the cache
+    info = kal_transmission_function.cache_info()
+    assert info.misses == 2 and info.hits == 4
+
+
+def test_wrapped_transmission_table(tmp_path):
+    # The old converter only read the first line of a table, the new reader reads all of it
+    path = tmp_path / 'wrapped.kal'
+    block = kal_block('C 1s', 1186.0, 0.1, ordinates(50, 25, 4), TABLE)
+    path.write_text(block.replace('600.0, ', '600.0,\n    ').replace('0.33, ', '0.33,\n    '))
+
+    (name, spectrum), = read_kal_spectra(str(path))
+
+    ke_values = 1186.0 + 0.1 * np.arange(50)
+    np.testing.assert_allclose(spectrum['transmission'], np.interp(ke_values, *TABLE), rtol=1e-12)
+
+
+def test_unreadable_ordinates(tmp_path):
+    path = tmp_path / 'bad.kal'
+    path.write_text(kal_block('C 1s', 1186.0, 0.1, ordinates(20, 10, 5), TABLE).replace('{', '{1.0, text, ', 1))
+    with pytest.raises(ValueError, match='ordinate values of C 1s'):
+        read_kal_spectra(str(path))
@@ -0,0 +1,53 @@
+# tests/test_la_normalisation.py
+
+# LA peaks are normalised to their area inside the x range, in closed form for every exponent: the result is the
+# trapz over a fine grid, and the height does not jump when sigma or gamma crosses 0.5.
+
+import numpy as np
+import pytest
+
+from libraries.Peak_Functions import PeakFunctions
+from libraries.Vectorized_Model import la
+
+
+def unit_shape(x, center, F, sigma, gamma):
+    base = 1 + 4 * ((x - center) / F) ** 2
+    return np.where(x <= center, base ** -gamma, base ** -sigma)
+
+
+@pytest.mark.parametrize('sigma, gamma', [(0.3, 0.45), (0.5, 0.5), (0.8, 1.1), (1.5, 0.6), (4.0, 2.5)])
+@pytest.mark.parametrize('center', [285.0, 271.0, 310.0])
+def test_window_area_is_the_integral_over_the_range(sigma, gamma, center):
+    x = np.linspace(300, 270, 600001)
+    F = 1.3
+
+    area = PeakFunctions.LA_window_area(F, sigma, gamma, center, x.min(), x.max())
+
+    sort_idx = np.argsort(x)
+    numeric = np.trapz(unit_shape(x, center, F, sigma, gamma)[sort_idx], x[sort_idx])
+    assert area == pytest.approx(numeric, rel=1e-8)
+
+
+@pytest.mark.parametrize('side', ['sigma', 'gamma'])
+def test_height_is_continuous_across_one_half(side):
+    x = np.linspace(300, 270, 601)
+    values = dict(center=285.0, amplitude=1500.0, fwhm=1.4, sigma=1.2, gamma=1.5)
+
+    heights = []
+    for exponent in (0.5 - 1e-9, 0.5, 0.5 + 1e-9):
+        heights.append(PeakFunctions.LA(x, **{**values, side: exponent}).max())
+
+    np.testing.assert_allclose(heights, heights[1], rtol=1e-7)
+
+
+def test_vectorized_la_is_the_scalar_one():
+    x = np.linspace(300, 270, 601)
+    columns = dict(center=[284.0, 287.5, 290.0], amplitude=[1500.0, 400.0, 800.0], fwhm=[1.4, 1.1, 2.0],
+                   sigma=[0.3, 0.5, 1.2], gamma=[0.45, 0.9, 1.5])
+
+    stacked = la(x[None, :], **{name: np.array(values)[:, None] for name, values in columns.items()})
+
+    for i in range(3):
+        single = PeakFunctions.LA(x, **{name: values[i] for name, values in columns.items()})
+        np.testing.assert_array_equal(stacked[i], single)
+        assert abs(np.trapz(single[::-1], x[::-1])) == pytest.approx(columns['amplitude'][i], rel=1e-4)
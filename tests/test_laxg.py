@@ -0,0 +1,103 @@
+# tests/test_laxg.py
+
+# The FFT LA*G peak against the direct convolution it replaced: the same curve for a peak in the middle of the data,
+# the same direct convolution on a grid extended to the offsets of a peak off the middle, and an area equal to the
+# amplitude in both cases.
+
+import numpy as np
+import pytest
+from scipy.signal import convolve
+
+from libraries.Peak_Functions import PeakFunctions
+
+
+def reference_laxg(x, center, amplitude, fwhm, sigma, gamma, fwhm_g, n_low=0, n_high=0):
+    # PeakFunctions.LAxG before the FFT, with the LA grid optionally extended by n_low and n_high steps
+    F = 2 * fwhm / (np.sqrt(2 ** (1 / sigma) - 1) + np.sqrt(2 ** (1 / gamma) - 1))
+
+    def LA_N(x):
+        return np.where(x <= 0, 1 / (1 + 4 * (x / F) ** 2) ** gamma, 1 / (1 + 4 * (x / F) ** 2) ** sigma)
+
+    def gaussian(x, fwhm_g):
+        return np.exp(-4 * np.log(2) * (x / fwhm_g) ** 2)
+
+    x_range = max(x.max() - x.min(), 4 * fwhm)
+    n_points = len(x) * 4
+    x_high_res = np.linspace(- x_range / 2, + x_range / 2, n_points)
+    gauss = gaussian(x_high_res, fwhm_g)
+
+    step = x_range / (n_points - 1)
+    x_la = np.concatenate([x_high_res[0] - step * np.arange(n_low, 0, -1), x_high_res,
+                           x_high_res[-1] + step * np.arange(1, n_high + 1)])
+    start = (n_points - 1) // 2
+    convolved = convolve(LA_N(x_la), gauss, mode='full', method='direct')[start:start + len(x_la)] / sum(gauss)
+
+    peak_shape = np.interp(x - center, x_la, convolved)
+    sort_idx = np.argsort(x)
+    unit_area = abs(np.trapz(peak_shape[sort_idx], x[sort_idx]))
+    height = amplitude / unit_area if unit_area != 0 else 0
+    return height * peak_shape
+
+
+SHAPES = [dict(fwhm=1.2, sigma=1.0, gamma=1.0, fwhm_g=0.64), dict(fwhm=0.9, sigma=0.45, gamma=1.4, fwhm_g=0.3),
+          dict(fwhm=1.8, sigma=2.5, gamma=0.8, fwhm_g=1.1), dict(fwhm=1.4, sigma=1.2, gamma=1.5, fwhm_g=0.05)]
+
+
+def area(x, y):
+    return abs(np.trapz(y[::-1], x[::-1]))
+
+
+@pytest.mark.parametrize('shape', SHAPES)
+@pytest.mark.parametrize('n', [150, 301])
+def test_centred_peak_matches_the_direct_convolution(shape, n):
+    x = np.linspace(300, 270, n)
+    # The middle of the data, the grid of the direct convolution covers every x - center
+    expected = reference_laxg(x, 285.0, 1000.0, **shape)
+
+    result = PeakFunctions.LAxG(x, 285.0, 1000.0, **shape)
+
+    np.testing.assert_allclose(result, expected, rtol=1e-9, atol=1e-12 * expected.max())
+    assert area(x, result) == pytest.approx(1000.0, rel=1e-12)
+
+
+@pytest.mark.parametrize('shape', SHAPES)
+@pytest.mark.parametrize('center', [272.3, 281.0, 291.7, 299.5])
+def test_off_centre_peak_is_on_an_extended_grid(shape, center):
+    x = np.linspace(300, 270, 301)
+    x_range, n_points = 30.0, 4 * 301
+    step = x_range / (n_points - 1)
+    n_low = max(0, int(np.ceil((center - x_range / 2 - x.min()) / step)))
+    n_high = max(0, int(np.ceil((x.max() - center - x_range / 2) / step)))
+    assert n_low + n_high > 0
+    expected = reference_laxg(x, center, 1000.0, **shape, n_low=n_low, n_high=n_high)
+
+    result = PeakFunctions.LAxG(x, center, 1000.0, **shape)
+
+    np.testing.assert_allclose(result, expected, rtol=1e-9, atol=1e-12 * expected.max())
+    assert area(x, result) == pytest.approx(1000.0, rel=1e-12)
+
+
+def test_off_centre_tail_is_not_clamped():
+    # On the grid of a centred peak, x - center past its end took the value at the end: a flat tail
+    x = np.linspace(300, 270, 301)
+    result = PeakFunctions.LAxG(x, 272.0, 1000.0, fwhm=1.2, sigma=1.0, gamma=1.0, fwhm_g=0.64)
+
+    far_side = result[x > 290]
+    assert np.all(np.diff(far_side) > 0)
+    unextended = reference_laxg(x, 272.0, 1000.0, fwhm=1.2, sigma=1.0, gamma=1.0, fwhm_g=0.64)
+    assert np.ptp(unextended[x > 290]) == 0
+
+
+def test_grid_is_reused_while_the_peak_moves():
+    from libraries.Peak_Functions import _laxg_grid
+
+    x = np.linspace(300, 270, 301)
+    step = 30.0 / (4 * 301 - 1)
+    _laxg_grid.cache_clear()
+    # Moves of less than a grid step around the middle keep the grid of the direct convolution or add one step on
+    # the side the peak moved away from: three grids
+    for _ in range(3):
+        for center in 285.0 + np.linspace(-0.4, 0.4, 9) * step:
+            PeakFunctions.LAxG(x, center, 1000.0, fwhm=1.2, sigma=1.0, gamma=1.0, fwhm_g=0.64)
+    info = _laxg_grid.cache_info()
+    assert info.misses == 3 and info.hits == 24
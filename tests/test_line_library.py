@@ -0,0 +1,132 @@
+# tests/test_line_library.py
+
+# The line library read through its binary cache: the same data as load_library_data read from the JSON, and a
+# cache that is rebuilt as soon as the JSON changes modification time or size.
+
+import json
+import os
+import shutil
+
+import pytest
+
+from libraries import Line_Library
+from libraries.Line_Library import LIBRARY_FILE, _read_library, cache_path, load_library
+
+LIBRARY_JSON = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), LIBRARY_FILE)
+
+
+def reference_load_library_data(file_path):
+    # load_library_data of Open.py before the library was loaded once
+    with open(file_path, 'r') as f:
+        json_data = json.load(f)
+
+    data = {}
+    for k, v in json_data.items():
+        element, orbital = k.split('_')
+        data[(element, orbital)] = v
+    return data
+
+
+def small_library(path, rsf=0.296):
+    path.write_text(json.dumps({
+        'C_1s': {'C-Al1486': {'position': 284.8, 'ds': 0, 'rsf': rsf, 'row': 'C'},
+                 'C-Mg1253': {'position': 284.8, 'ds': 0, 'rsf': rsf, 'row': 'C'}},
+        'O_1s': {'C-Al1486': {'position': 531, 'ds': 0, 'rsf': 0.711, 'row': 'O'}},
+    }))
+    return str(path)
+
+
+def read_from_json(monkeypatch):
+    # Counts the JSON parses, a read served from the cache does not parse
+    parses = []
+    original = json.load
+    monkeypatch.setattr(json, 'load', lambda f: parses.append(f.name) or original(f))
+    return parses
+
+
+@pytest.mark.parametrize('from_cache', [False, True])
+def test_same_data_as_load_library_data(tmp_path, monkeypatch, from_cache):
+    file_path = shutil.copy(LIBRARY_JSON, tmp_path / LIBRARY_FILE)
+    expected = reference_load_library_data(file_path)
+    if from_cache:
+        _read_library(file_path)
+    parses = read_from_json(monkeypatch)
+
+    data = _read_library(file_path)
+
+    assert len(parses) == (0 if from_cache else 1)
+    assert data == expected
+    # Same types and order too: a position of 639 stays an int
+    assert repr(data) == repr(expected)
+
+
+def test_cache_is_used_while_the_json_is_unchanged(tmp_path, monkeypatch):
+    file_path = small_library(tmp_path / 'library.json')
+    first = _read_library(file_path)
+    assert os.path.exists(cache_path(file_path))
+    parses = read_from_json(monkeypatch)
+
+    assert _read_library(file_path) == first
+    assert parses == []
+
+
+def test_cache_is_rebuilt_when_the_modification_time_changes(tmp_path, monkeypatch):
+    file_path = small_library(tmp_path / 'library.json')
+    _read_library(file_path)
+    stat = os.stat(file_path)
+    # Same size, another RSF and a later modification time
+    small_library(tmp_path / 'library.json', rsf=0.297)
+    assert os.stat(file_path).st_size == stat.st_size
+    os.utime(file_path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10 ** 9))
+    parses = read_from_json(monkeypatch)
+
+    data = _read_library(file_path)
+
+    assert parses == [file_path]
+    assert data[('C', '1s')]['C-Al1486']['rsf'] == 0.297
+    # The rebuilt cache is the one used next
+    assert _read_library(file_path) == data and len(parses) == 1
+
+
+def test_cache_is_rebuilt_when_the_size_changes(tmp_path, monkeypatch):
+    file_path = small_library(tmp_path / 'library.json')
+    _read_library(file_path)
+    stat = os.stat(file_path)
+    # A longer RSF, the modification time put back
+    small_library(tmp_path / 'library.json', rsf=0.2961)
+    assert os.stat(file_path).st_size != stat.st_size
+    os.utime(file_path, ns=(stat.st_atime_ns, stat.st_mtime_ns))
+    parses = read_from_json(monkeypatch)
+
+    assert _read_library(file_path)[('C', '1s')]['C-Al1486']['rsf'] == 0.2961
+    assert parses == [file_path]
+
+
+@pytest.mark.parametrize('content', [b'', b'not a pickle', None])
+def test_unreadable_or_older_cache_is_rebuilt(tmp_path, monkeypatch, content):
+    file_path = small_library(tmp_path / 'library.json')
+    expected = _read_library(file_path)
+    if content is None:
+        monkeypatch.setattr(Line_Library, 'CACHE_VERSION', Line_Library.CACHE_VERSION + 1)
+    else:
+        with open(cache_path(file_path), 'wb') as f:
+            f.write(content)
+    parses = read_from_json(monkeypatch)
+
+    assert _read_library(file_path) == expected
+    assert parses == [file_path]
+    parses.clear()
+    assert _read_library(file_path) == expected and parses == []
+
+
+def test_equal_entries_are_shared(tmp_path):
+    data = _read_library(small_library(tmp_path / 'library.json'))
+    assert data[('C', '1s')]['C-Al1486'] is data[('C', '1s')]['C-Mg1253']
+
+
+def test_library_is_loaded_once_per_path(tmp_path, monkeypatch):
+    monkeypatch.setattr(Line_Library, '_libraries', {})
+    file_path = small_library(tmp_path / 'library.json')
+    library = load_library(file_path)
+    assert load_library(file_path) is library
+    assert library.rsf('O', '1s', 'C-Al1486') == 0.711 and library.rsf('O', '1s', 'C-Mg1253', 1.0) == 1.0
@@ -0,0 +1,86 @@
+# tests/test_peak_evaluator.py
+
+# The curve cache of PeakEvaluator: an unchanged peak on the same x array is a hit and returns the same curve as
+# evaluate_peak, changing a value the model uses or the x array is a miss, and a cached curve whose x array was freed
+# is not returned for a new array that got the same id.
+
+import gc
+
+import numpy as np
+import pytest
+
+from libraries.Peak_Evaluator import PeakEvaluator, evaluate_peak
+
+PEAK = dict(height=1000.0, fwhm=1.2, lg_ratio=30.0, area=1500.0, sigma=0.8, gamma=0.4, fwhm_g=0.5)
+MODELS = ["GL (Area)", "Voigt (Area, σ, γ)", "Pseudo-Voigt (Area)", "LA*G (Area, σ/γ, γ)"]
+
+
+@pytest.mark.parametrize('model', MODELS)
+def test_unchanged_peak_is_a_hit(model):
+    evaluator = PeakEvaluator()
+    x = np.linspace(295, 275, 401)
+
+    first = evaluator.evaluate(model, x, 285.0, **PEAK)
+    second = evaluator.evaluate(model, x, 285.0, **PEAK)
+
+    assert second is first
+    assert evaluator.hits == 1 and evaluator.misses == 1
+    np.testing.assert_array_equal(first, evaluate_peak(model, x, 285.0, **PEAK))
+    assert not first.flags.writeable
+
+
+def test_changed_values_are_a_miss():
+    evaluator = PeakEvaluator()
+    x = np.linspace(295, 275, 401)
+    first = evaluator.evaluate("GL (Area)", x, 285.0, **PEAK)
+
+    moved = evaluator.evaluate("GL (Area)", x, 285.5, **PEAK)
+    wider = evaluator.evaluate("GL (Area)", x, 285.0, **{**PEAK, 'fwhm': 1.5})
+    other_x = evaluator.evaluate("GL (Area)", x.copy(), 285.0, **PEAK)
+
+    assert evaluator.hits == 0 and evaluator.misses == 4
+    assert not np.array_equal(moved, first) and not np.array_equal(wider, first)
+    np.testing.assert_array_equal(other_x, first)
+    np.testing.assert_array_equal(wider, evaluate_peak("GL (Area)", x, 285.0, **{**PEAK, 'fwhm': 1.5}))
+
+
+def test_values_the_model_does_not_use_keep_the_curve():
+    # GL (Height) does not read sigma and gamma
+    evaluator = PeakEvaluator()
+    x = np.linspace(295, 275, 401)
+    first = evaluator.evaluate("GL (Height)", x, 285.0, **PEAK)
+
+    assert evaluator.evaluate("GL (Height)", x, 285.0, **{**PEAK, 'sigma': 2.0, 'gamma': 1.0}) is first
+    assert evaluator.hits == 1
+
+
+def test_curve_of_a_freed_x_array_is_not_returned():
+    evaluator = PeakEvaluator()
+    x = np.linspace(295, 275, 401)
+    evaluator.evaluate("GL (Area)", x, 285.0, **PEAK)
+    (key, (x_ref, _)), = evaluator.cache.items()
+    del x
+    gc.collect()
+    assert x_ref() is None
+
+    # Another array with the id of the freed one, as numpy may well give it
+    new_x = np.linspace(300, 270, 401)
+    evaluator.cache[(key[0], id(new_x)) + key[2:]] = evaluator.cache.pop(key)
+    curve = evaluator.evaluate("GL (Area)", new_x, 285.0, **PEAK)
+
+    assert evaluator.hits == 0 and evaluator.misses == 2
+    np.testing.assert_array_equal(curve, evaluate_peak("GL (Area)", new_x, 285.0, **PEAK))
+    assert len(evaluator.cache) == 1 and evaluator.nbytes == curve.nbytes
+
+
+def test_cache_is_capped_in_bytes():
+    x = np.linspace(295, 275, 401)
+    evaluator = PeakEvaluator(max_bytes=3 * x.nbytes)
+
+    for center in (284.0, 285.0, 286.0, 287.0):
+        evaluator.evaluate("GL (Area)", x, center, **PEAK)
+
+    assert len(evaluator.cache) == 3 and evaluator.evictions == 1 and evaluator.nbytes == 3 * x.nbytes
+    # The oldest curve went first
+    evaluator.evaluate("GL (Area)", x, 284.0, **PEAK)
+    assert evaluator.misses == 5
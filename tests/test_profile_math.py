@@ -0,0 +1,94 @@
+# tests/test_profile_math.py
+
+# Closed-form Voigt and Pseudo-Voigt conversions against lmfit's VoigtModel and PseudoVoigtModel and against the
+# model-building conversions they replaced, for several peaks converted in one call.
+
+import numpy as np
+import pytest
+from lmfit.models import PseudoVoigtModel, VoigtModel
+
+from libraries import Profile_Math
+from libraries.Peak_Functions import PeakFunctions
+
+SIGMA = np.array([0.25, 0.6, 1.0, 1.7])
+GAMMA = np.array([0.05, 0.3, 1.2, 0.8])
+FRACTION = np.array([0.0, 0.2, 0.55, 1.0])
+AMPLITUDE = np.array([150.0, 2500.0, 8000.0, 40.0])
+
+
+def old_get_voigt_height(amplitude, sigma, gamma):
+    model = VoigtModel()
+    params = model.make_params(amplitude=amplitude, center=0, sigma=sigma, gamma=gamma)
+    return model.eval(params, x=0)
+
+
+def old_voigt_height_to_area(height, sigma, gamma):
+    voigt = VoigtModel()
+    x = np.linspace(-10 * sigma, 10 * sigma, 1000)
+    params = voigt.make_params(center=0, sigma=sigma, gamma=gamma, amplitude=1)
+    return height / np.max(voigt.eval(params, x=x))
+
+
+def old_get_pseudo_voigt_height(amplitude, sigma, fraction):
+    model = PseudoVoigtModel()
+    params = model.make_params(amplitude=amplitude, center=0, sigma=sigma, fraction=fraction / 100)
+    return model.eval(params, x=0)
+
+
+def numerical_fwhm(model, **values):
+    width = 20 * (values['sigma'] + values.get('gamma', 0))
+    x = np.linspace(-width, width, 400001)
+    y = model.eval(model.make_params(center=0, **values), x=x)
+    above = x[y >= y.max() / 2]
+    return above[-1] - above[0]
+
+
+def test_voigt_height_matches_lmfit():
+    heights = Profile_Math.voigt_height(AMPLITUDE, SIGMA, GAMMA)
+
+    expected = [old_get_voigt_height(*values) for values in zip(AMPLITUDE, SIGMA, GAMMA)]
+    np.testing.assert_allclose(heights, expected, rtol=1e-12)
+    np.testing.assert_allclose(PeakFunctions.get_voigt_height(AMPLITUDE, SIGMA, GAMMA), expected, rtol=1e-12)
+
+
+def test_voigt_area_matches_the_old_conversion():
+    heights = np.array([120.0, 900.0, 3000.0, 15.0])
+    areas = PeakFunctions.voigt_height_to_area(heights, SIGMA, GAMMA)
+
+    # The old conversion took the maximum of a 1000 point grid, which misses the center by up to 1% of sigma
+    expected = [old_voigt_height_to_area(*values) for values in zip(heights, SIGMA, GAMMA)]
+    np.testing.assert_allclose(areas, expected, rtol=1e-4)
+    np.testing.assert_allclose(Profile_Math.voigt_height(areas, SIGMA, GAMMA), heights, rtol=1e-12)
+
+
+def test_voigt_fwhm_matches_lmfit():
+    fwhm = Profile_Math.voigt_fwhm(SIGMA, GAMMA)
+
+    for value, sigma, gamma in zip(fwhm, SIGMA, GAMMA):
+        model = VoigtModel()
+        lmfit_fwhm = model.make_params(amplitude=1, center=0, sigma=sigma, gamma=gamma)['fwhm'].value
+        assert value == pytest.approx(lmfit_fwhm, rel=1e-3)
+        assert value == pytest.approx(numerical_fwhm(model, amplitude=1, sigma=sigma, gamma=gamma), rel=1e-3)
+
+
+def test_pseudo_voigt_height_matches_lmfit():
+    heights = Profile_Math.pseudo_voigt_height(AMPLITUDE, SIGMA, FRACTION)
+
+    expected = [old_get_pseudo_voigt_height(amplitude, sigma, fraction * 100)
+                for amplitude, sigma, fraction in zip(AMPLITUDE, SIGMA, FRACTION)]
+    np.testing.assert_allclose(heights, expected, rtol=1e-12)
+    np.testing.assert_allclose(PeakFunctions.get_pseudo_voigt_height(AMPLITUDE, SIGMA, FRACTION * 100), expected,
+                               rtol=1e-12)
+    np.testing.assert_allclose(Profile_Math.pseudo_voigt_amplitude(heights, SIGMA, FRACTION), AMPLITUDE,
+                               rtol=1e-12)
+
+
+def test_pseudo_voigt_fwhm_matches_lmfit():
+    fwhm = Profile_Math.pseudo_voigt_fwhm(SIGMA)
+
+    for value, sigma, fraction in zip(fwhm, SIGMA, FRACTION):
+        model = PseudoVoigtModel()
+        assert value == pytest.approx(model.make_params(amplitude=1, center=0, sigma=sigma,
+                                                        fraction=fraction)['fwhm'].value, rel=1e-12)
+        assert value == pytest.approx(numerical_fwhm(model, amplitude=1, sigma=sigma, fraction=fraction),
+                                      rel=1e-3)
@@ -0,0 +1,163 @@
+# tests/test_project_file.py
+
+# save_project / load_project round trips of a window.Data dict: spectra as memory mapped or deflated .npy members,
+# short and non-numeric lists kept in the JSON, and a project saved over the file its arrays are mapped from.
+
+import json
+import zipfile
+
+import numpy as np
+import pytest
+
+from libraries.Project_File import (ARRAY_KEY, METADATA_NAME, MIN_ARRAY_LENGTH, PROJECT_VERSION, load_project,
+                                    project_path, save_project)
+
+
+def project_data():
+    x = np.linspace(295, 280, 151)
+    return {
+        'FilePath': '/data/sample.xlsx',
+        'Number of Core levels': 2,
+        'Core levels': {
+            'C1s': {
+                'B.E.': x,
+                'Raw Data': [float(v) for v in 1000 + 50 * np.exp(-(x - 285) ** 2)],
+                'Background': {'Bkg Y': np.full(151, 1000.0), 'Bkg Low': 281.0, 'Bkg Type': 'Shirley'},
+                'Fitting': {
+                    'Model': 'GL (Area)',
+                    'Peaks': {'C1s p1': {'Position': 285.0, 'FWHM': 1.2, 'Pos. Constraint': '280,290'}},
+                    'Curves': {'Signature': '0f' * 16, 'Envelope': np.ones(151), 'Residuals': np.zeros(151),
+                               'Peaks': [np.arange(151.0), None]},
+                },
+            },
+            'O1s': {
+                'B.E.': np.linspace(540, 525, 76),
+                'Raw Data': np.linspace(10, 20, 76),
+                'Background': {'Bkg Y': [0.5, 1.5, 2.5]},
+            },
+        },
+        'Results': {'Peak': {}},
+        'Short list': [1, 2.5, 3],
+        'Mixed list': [1.0, None] * MIN_ARRAY_LENGTH,
+        'Flags': [True, False] * MIN_ARRAY_LENGTH,
+    }
+
+
+def assert_same_data(loaded, expected):
+    if isinstance(expected, dict):
+        assert set(loaded) == set(expected)
+        for key in expected:
+            assert_same_data(loaded[key], expected[key])
+    elif isinstance(expected, np.ndarray) or (isinstance(expected, list) and len(expected) >= MIN_ARRAY_LENGTH
+                                              and all(type(v) in (int, float) for v in expected)):
+        assert isinstance(loaded, np.ndarray)
+        np.testing.assert_array_equal(loaded, np.asarray(expected, dtype=float))
+    elif isinstance(expected, list):
+        assert isinstance(loaded, list) and len(loaded) == len(expected)
+        for value, expected_value in zip(loaded, expected):
+            assert_same_data(value, expected_value)
+    else:
+        assert loaded == expected and type(loaded) is type(expected)
+
+
+def members(file_path):
+    with zipfile.ZipFile(file_path) as zf:
+        metadata = json.loads(zf.read(METADATA_NAME))
+        return metadata, {info.filename: info.compress_type for info in zf.infolist()}
+
+
+def test_project_path_goes_with_the_excel_file():
+    assert project_path('/data/sample.xlsx') == '/data/sample.kfp'
+
+
+def test_round_trip_memory_maps_the_spectra(tmp_path):
+    file_path = str(tmp_path / 'sample.kfp')
+    data = project_data()
+    save_project(data, file_path)
+
+    loaded = load_project(file_path)
+
+    assert_same_data(loaded, data)
+    assert isinstance(loaded['Core levels']['C1s']['B.E.'], np.memmap)
+    assert isinstance(loaded['Core levels']['C1s']['Fitting']['Curves']['Peaks'][0], np.memmap)
+    # Copy on write, the file is never changed through the arrays
+    loaded['Core levels']['C1s']['B.E.'][0] = -1
+    assert load_project(file_path)['Core levels']['C1s']['B.E.'][0] == 295
+
+
+def test_short_and_non_numeric_lists_stay_in_the_json(tmp_path):
+    file_path = str(tmp_path / 'sample.kfp')
+    save_project(project_data(), file_path)
+
+    metadata, _ = members(file_path)
+    data = metadata['data']
+    assert data['Short list'] == [1, 2.5, 3]
+    assert data['Core levels']['O1s']['Background']['Bkg Y'] == [0.5, 1.5, 2.5]
+    assert data['Mixed list'][:2] == [1.0, None]
+    assert data['Flags'][:2] == [True, False]
+    assert ARRAY_KEY in data['Core levels']['C1s']['Raw Data']
+
+    loaded = load_project(file_path)
+    assert loaded['Short list'] == [1, 2.5, 3] and type(loaded['Short list'][0]) is int
+
+
+def test_compressed_sheets_are_read_into_memory(tmp_path):
+    file_path = str(tmp_path / 'sample.kfp')
+    data = project_data()
+    save_project(data, file_path, compressed_sheets=['C1s'])
+
+    metadata, compress_types = members(file_path)
+    c1s_member = metadata['data']['Core levels']['C1s']['B.E.'][ARRAY_KEY]
+    o1s_member = metadata['data']['Core levels']['O1s']['B.E.'][ARRAY_KEY]
+    assert compress_types[c1s_member] == zipfile.ZIP_DEFLATED
+    assert compress_types[o1s_member] == zipfile.ZIP_STORED
+
+    loaded = load_project(file_path)
+    assert_same_data(loaded, data)
+    assert not isinstance(loaded['Core levels']['C1s']['B.E.'], np.memmap)
+    assert isinstance(loaded['Core levels']['O1s']['B.E.'], np.memmap)
+
+
+def test_all_sheets_compressed_and_no_mmap(tmp_path):
+    file_path = str(tmp_path / 'sample.kfp')
+    data = project_data()
+    save_project(data, file_path, compressed_sheets=True)
+
+    _, compress_types = members(file_path)
+    assert zipfile.ZIP_STORED not in {t for name, t in compress_types.items() if name != METADATA_NAME}
+
+    loaded = load_project(file_path, mmap=False)
+    assert_same_data(loaded, data)
+    assert not isinstance(loaded['Core levels']['O1s']['B.E.'], np.memmap)
+
+
+def test_save_over_the_mapped_file(tmp_path):
+    file_path = str(tmp_path / 'sample.kfp')
+    save_project(project_data(), file_path)
+    loaded = load_project(file_path)
+
+    # A sheet added after opening, as copy sheet does, is in the project saved over the mapped file
+    loaded['Core levels']['C1s_copy'] = dict(loaded['Core levels']['C1s'])
+    loaded['Number of Core levels'] += 1
+    save_project(loaded, file_path)
+
+    assert not isinstance(loaded['Core levels']['C1s']['B.E.'], np.memmap)
+    reloaded = load_project(file_path)
+    assert list(reloaded['Core levels']) == ['C1s', 'O1s', 'C1s_copy']
+    np.testing.assert_array_equal(reloaded['Core levels']['C1s_copy']['B.E.'], np.linspace(295, 280, 151))
+
+
+def test_newer_project_version_is_refused(tmp_path):
+    file_path = str(tmp_path / 'sample.kfp')
+    save_project(project_data(), file_path)
+    with zipfile.ZipFile(file_path) as zf:
+        contents = {info.filename: zf.read(info.filename) for info in zf.infolist()}
+    metadata = json.loads(contents[METADATA_NAME])
+    metadata['version'] = PROJECT_VERSION + 1
+    contents[METADATA_NAME] = json.dumps(metadata).encode()
+    with zipfile.ZipFile(file_path, 'w') as zf:
+        for name, content in contents.items():
+            zf.writestr(name, content)
+
+    with pytest.raises(ValueError, match='newer version'):
+        load_project(file_path)
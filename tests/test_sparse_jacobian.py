@@ -0,0 +1,92 @@
+# tests/test_sparse_jacobian.py
+
+# Sparse Jacobian fits of many separated peaks: the sparsity pattern reaches scipy least_squares, as an analytic
+# sparse Jacobian for the profiles with derivatives and as jac_sparsity for finite differences, and the sparse
+# fit ends where the dense one does.
+
+import copy
+
+import numpy as np
+import pytest
+from scipy.sparse import issparse
+
+from libraries import Fitting_Engine
+from libraries.Fitting_Engine import FitProblem, build_model, fit, fit_mask, jacobian_sparsity
+from libraries.Vectorized_Model import VectorizedPeakModel
+from tests.test_fitting_engines import peak_spec
+
+
+def separated_problem(model, n_peaks, spacing=4.0, points_per_ev=20, width=3.0, seed=1):
+    """n_peaks Gaussian peaks spacing eV apart, the energy range and the points growing with the peak count."""
+    rng = np.random.default_rng(seed)
+    span = spacing * (n_peaks + 1)
+    n_points = int(span * points_per_ev)
+    x = np.linspace(100 + span, 100, n_points)
+    centers = 100 + spacing * (np.arange(n_peaks) + 1)
+    y = 100 + rng.normal(0, 3, n_points)
+    peaks = []
+    for i, center in enumerate(centers):
+        y += 800 * np.exp(-(x - center) ** 2 / (2 * 0.55 ** 2))
+        spec = peak_spec(model, i, center)
+        spec.constraints['Position'] = f'{center - 1.5},{center + 1.5}'
+        peaks.append(spec)
+    return FitProblem(sheet_name=f'{model} x{n_peaks} separated', x=x, y=y, background=np.full(n_points, 100.0),
+                      peaks=peaks, method='least_squares', sparse_jacobian_width=width)
+
+
+@pytest.fixture
+def least_squares_calls(monkeypatch):
+    calls = []
+    original = Fitting_Engine.least_squares
+
+    def recording_least_squares(*args, **kwargs):
+        calls.append(kwargs)
+        return original(*args, **kwargs)
+
+    monkeypatch.setattr(Fitting_Engine, 'least_squares', recording_least_squares)
+    return calls
+
+
+def test_finite_difference_fit_passes_the_pattern(least_squares_calls):
+    problem = separated_problem("LA (Area, σ, γ)", 8)
+    fit(problem)
+
+    assert len(least_squares_calls) == 1
+    sparsity = least_squares_calls[0]['jac_sparsity']
+    assert issparse(sparsity)
+    assert sparsity.nnz < 0.5 * sparsity.shape[0] * sparsity.shape[1]
+
+
+@pytest.mark.parametrize('model', ["GL (Area)", "Voigt (Area, σ, γ)"])
+def test_analytic_fit_uses_the_sparse_jacobian(least_squares_calls, model):
+    problem = separated_problem(model, 8)
+    sparse_result = fit(copy.deepcopy(problem))
+
+    assert len(least_squares_calls) == 1
+    assert callable(least_squares_calls[0]['jac'])
+    assert 'jac_sparsity' not in least_squares_calls[0]
+
+    dense = copy.deepcopy(problem)
+    dense.sparse_jacobian_width = None
+    dense_result = fit(dense)
+    assert len(least_squares_calls) == 1
+    assert sparse_result.r_squared == pytest.approx(dense_result.r_squared, rel=1e-9)
+    for label, peak in dense_result.peaks.items():
+        assert sparse_result.peaks[label]['Position'] == pytest.approx(peak['Position'], abs=1e-4)
+
+
+def test_sparse_jacobian_is_the_dense_one_on_the_pattern():
+    problem = separated_problem("Pseudo-Voigt (Area)", 6)
+    _, params = build_model(problem)
+    x = problem.x[fit_mask(problem)]
+    vectorized = VectorizedPeakModel(problem.peaks, x)
+    jacobian = vectorized.jacobian_function(params)
+    sparsity = jacobian_sparsity(params, x, problem.sparse_jacobian_width)
+
+    sparse = vectorized.sparse_jacobian(params, sparsity)
+    dense = jacobian(params)
+
+    assert sparse.shape == dense.shape
+    pattern = sparsity.toarray()
+    assert not sparse.toarray()[~pattern].any()
+    np.testing.assert_allclose(sparse.toarray()[pattern], dense[pattern], rtol=1e-12, atol=1e-12)
@@ -0,0 +1,144 @@
+# tests/test_spectrum_store.py
+
+# SpectrumStore, spectrum_array and adopt_spectra: spectra are stored as read only float64 arrays, without a copy when
+# they already are one and as a view when they are memory mapped, anything that is not a spectrum is kept as given,
+# and a Background dict becomes a SpectrumStore however it is assigned.
+
+import numpy as np
+import pytest
+
+from libraries.Spectrum_Store import SpectrumStore, adopt_spectra, spectrum_array
+
+
+def assert_read_only_float64(array):
+    assert isinstance(array, np.ndarray) and array.dtype == np.float64 and array.flags.c_contiguous
+    assert not array.flags.writeable
+    with pytest.raises(ValueError):
+        array[0] = 1.0
+
+
+@pytest.mark.parametrize('values', [[290.0, 289.5, 289.0], [290, 289, 288], (1.5, 2.5), np.arange(5),
+                                    np.arange(5, dtype=np.float32), np.arange(10.0)[::2]])
+def test_values_become_read_only_float64(values):
+    array = spectrum_array(values)
+    assert_read_only_float64(array)
+    np.testing.assert_array_equal(array, np.asarray(values, dtype=float))
+
+
+def test_writable_array_is_copied():
+    values = np.linspace(290, 280, 11)
+    array = spectrum_array(values)
+    assert_read_only_float64(array)
+    assert not np.shares_memory(array, values)
+    # The caller's array is left writable and unchanged
+    values[0] = 0.0
+    assert values.flags.writeable and array[0] == 290.0
+
+
+def test_read_only_array_is_kept():
+    values = np.linspace(290, 280, 11)
+    values.setflags(write=False)
+    assert spectrum_array(values) is values
+
+
+def test_memmap_is_kept_as_read_only_view(tmp_path):
+    mapped = np.memmap(tmp_path / 'spectrum.dat', dtype=np.float64, mode='w+', shape=(100,))
+    mapped[:] = np.arange(100.0)
+
+    array = spectrum_array(mapped)
+
+    assert_read_only_float64(array)
+    assert array is not mapped and np.shares_memory(array, mapped)
+    assert mapped.flags.writeable
+    mapped[3] = -1.0
+    assert array[3] == -1.0
+
+
+def test_core_level_spectra_are_stored_as_arrays():
+    x = [290.0, 289.0, 288.0]
+    core_level = SpectrumStore({'Name': 'C1s', 'B.E.': x, 'Raw Data': np.array([10, 20, 30]),
+                                'Transmission': [1.0, 1.0, 1.0], 'Fitting': {'Peaks': {}}})
+
+    for key in ('B.E.', 'Raw Data', 'Transmission'):
+        assert_read_only_float64(core_level[key])
+    np.testing.assert_array_equal(core_level['B.E.'], x)
+    assert core_level['Name'] == 'C1s' and core_level['Fitting'] == {'Peaks': {}}
+    # Not a spectrum key, kept as given
+    core_level['Notes'] = [1, 2, 3]
+    assert core_level['Notes'] == [1, 2, 3] and isinstance(core_level['Notes'], list)
+
+
+@pytest.mark.parametrize('value', [['BE', 'Counts'], '', 'text', None, 5.0, [[1.0, 2.0], [3.0, 4.0]]])
+def test_values_that_are_not_spectra_are_kept(value):
+    core_level = SpectrumStore()
+    core_level['Raw Data'] = value
+    assert core_level['Raw Data'] is value
+
+
+def test_background_is_wrapped_by_setitem_update_and_setdefault():
+    background = {'Bkg Type': 'Shirley', 'Bkg X': [290.0, 289.0], 'Bkg Y': [5.0, 4.0]}
+
+    stores = [SpectrumStore({'Background': dict(background)}), SpectrumStore(Background=dict(background))]
+    store = SpectrumStore()
+    store['Background'] = dict(background)
+    stores.append(store)
+    store = SpectrumStore()
+    store.update({'Background': dict(background)})
+    stores.append(store)
+    store = SpectrumStore()
+    store.update(Background=dict(background))
+    stores.append(store)
+    store = SpectrumStore()
+    assert store.setdefault('Background', dict(background)) is store['Background']
+    stores.append(store)
+
+    for store in stores:
+        assert isinstance(store['Background'], SpectrumStore)
+        assert store['Background']['Bkg Type'] == 'Shirley'
+        assert_read_only_float64(store['Background']['Bkg X'])
+        assert_read_only_float64(store['Background']['Bkg Y'])
+        # Spectra put in the Background later are stored as arrays too
+        store['Background']['Bkg Y'] = [1.0, 2.0]
+        assert_read_only_float64(store['Background']['Bkg Y'])
+
+
+def test_setdefault_keeps_an_existing_value():
+    store = SpectrumStore({'B.E.': [1.0, 2.0]})
+    existing = store['B.E.']
+    assert store.setdefault('B.E.', [3.0, 4.0]) is existing
+    assert store.setdefault('Fitting') is None and 'Fitting' in store
+
+
+def test_background_store_is_not_wrapped_again():
+    background = SpectrumStore({'Bkg Y': [1.0]})
+    store = SpectrumStore({'Background': background})
+    assert store['Background'] is background
+
+
+def test_copy_shares_the_spectra():
+    store = SpectrumStore({'B.E.': [1.0, 2.0], 'Background': {'Bkg Y': [3.0, 4.0]}})
+    copy = store.copy()
+    assert isinstance(copy, SpectrumStore) and copy is not store
+    assert copy['B.E.'] is store['B.E.']
+    copy['B.E.'] = [5.0, 6.0]
+    np.testing.assert_array_equal(store['B.E.'], [1.0, 2.0])
+
+
+def test_adopt_spectra():
+    kept = SpectrumStore({'B.E.': [1.0]})
+    data = {'FilePath': 'file.xlsx', 'Core levels': {
+        'C1s': {'B.E.': [290.0, 289.0], 'Raw Data': [1, 2], 'Background': {'Bkg Y': [0.5, 0.5]}},
+        'O1s': kept,
+        'Bad': 'not a core level',
+    }}
+
+    assert adopt_spectra(data) is data
+
+    c1s = data['Core levels']['C1s']
+    assert isinstance(c1s, SpectrumStore) and isinstance(c1s['Background'], SpectrumStore)
+    assert_read_only_float64(c1s['Raw Data'])
+    assert_read_only_float64(c1s['Background']['Bkg Y'])
+    assert data['Core levels']['O1s'] is kept
+    assert data['Core levels']['Bad'] == 'not a core level'
+    assert adopt_spectra({'FilePath': ''}) == {'FilePath': ''}
+    assert adopt_spectra({'Core levels': []}) == {'Core levels': []}
@@ -0,0 +1,218 @@
+# tests/test_survey_identification.py
+
+# Survey identification against the line library: the transitions and RSFs of the binding energy index against the
+# scans of the library the survey window did before, the peaks of a survey smoothed without the dip the zero padded
+# moving average left at the ends, and the elements found in a synthetic survey.
+
+import os
+
+import numpy as np
+import pytest
+from scipy.signal import find_peaks
+
+from libraries.Line_Library import LIBRARY_FILE, SurveyIndex, load_library
+from libraries.Survey_Identification import MIN_PEAK_FRACTION, MIN_PEAK_SIGNIFICANCE, find_survey_peaks, \
+    identify_survey
+
+LIBRARY_JSON = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), LIBRARY_FILE)
+PHOTONS = 1486.67
+
+
+@pytest.fixture(scope='module')
+def library():
+    return load_library(LIBRARY_JSON)
+
+
+def reference_element_transitions(library_data, element, photon_energy):
+    # get_element_transitions of survey.py before the binding energy index
+    allowed_orbitals = ['1s', '2s', '2p', '3s', '3p', '3d', '4s', '4p', '4d', '4f', '5s', '5p', '5d', '5f']
+    transitions = {}
+
+    for (elem, orbital), data in library_data.items():
+        if elem == element:
+            if 'C-Any' in data:
+                instrument = 'C-Any'
+            else:
+                instrument = 'C-Al1486' if 'C-Al1486' in data else next(iter(data))
+
+            if 'position' in data[instrument] and float(data[instrument]['position']) >= 20:
+                is_auger = instrument == 'C-Any'
+                orbital_lower = orbital.lower()
+
+                if is_auger:
+                    kinetic_energy = float(data[instrument]['position'])
+                    binding_energy = photon_energy - kinetic_energy
+                    transitions[orbital_lower] = binding_energy
+                else:
+                    main_orbital = ''.join([c for c in orbital_lower if c.isalpha() or c.isdigit()])[:2]
+                    if main_orbital in allowed_orbitals:
+                        energy = float(data[instrument]['position'])
+                        if main_orbital not in transitions or energy > transitions[main_orbital]:
+                            transitions[main_orbital] = energy
+
+    return sorted(transitions.items(), key=lambda x: x[1])
+
+
+def reference_rsf_values(library_data, element, orbitals):
+    # get_rsf_values of survey.py before the binding energy index, without its prints
+    rsf_values = []
+    for (elem, orbital), data in library_data.items():
+        if elem == element:
+            orbital_lower = orbital.lower()
+            if orbital_lower in [o.lower() for o in orbitals]:
+                instrument = 'Al1486' if 'Al1486' in data else next(iter(data))
+                if 'rsf' in data[instrument]:
+                    rsf_values.append(float(data[instrument]['rsf']))
+    return rsf_values
+
+
+def reference_find_survey_peaks(x, y, smoothing=5):
+    # find_survey_peaks with the zero padded moving average
+    noise = 1.4826 * np.median(np.abs(np.diff(y))) / np.sqrt(2)
+    y = np.convolve(y, np.ones(smoothing) / smoothing, mode='same')
+    min_prominence = max(MIN_PEAK_SIGNIFICANCE * noise, MIN_PEAK_FRACTION * (y.max() - y.min()))
+    indices, properties = find_peaks(y, prominence=min_prominence)
+    order = np.argsort(properties['prominences'])[::-1]
+    return x[indices][order], properties['prominences'][order]
+
+
+def gaussian(x, center, height, fwhm=1.8):
+    return height * np.exp(-4 * np.log(2) * ((x - center) / fwhm) ** 2)
+
+
+def survey(peaks, seed=0):
+    # Al Ka survey from 1200 to 0 eV, the background rising with binding energy, Poisson counts
+    x = np.linspace(1200, 0, 2401)
+    y = 300 + 0.8 * x
+    for center, height in peaks:
+        y = y + gaussian(x, center, height)
+    return x, np.random.default_rng(seed).poisson(y).astype(np.float64)
+
+
+@pytest.mark.parametrize('photons', [PHOTONS, 1253.6])
+def test_element_transitions_match_the_old_scan(library, photons):
+    elements = sorted({element for element, _ in library.data})
+    assert len(elements) == 96
+
+    for element in elements:
+        assert library.element_transitions(element, photons) == \
+            reference_element_transitions(library.data, element, photons), element
+
+
+def test_rsf_values_match_the_old_scan(library):
+    # Asked one line at a time, the old scan gave the RSF of the whole orbital entry, the merged line of the index
+    # keeps the largest RSF of its components, the same value
+    compared = 0
+    for element in sorted({element for element, _ in library.data}):
+        for name, _ in library.element_transitions(element, PHOTONS):
+            expected = reference_rsf_values(library.data, element, [name])
+            if len(expected) == 1 and (element, name) in library.data:
+                assert library.survey_index(PHOTONS).rsf_values(element, [name]) == expected, (element, name)
+                compared += 1
+    assert compared > 300
+
+
+def test_rsf_values_of_an_orbital_without_a_whole_entry(library):
+    # As 2p only has its 2p1/2 and 2p3/2 entries, the old scan found nothing and the values after it were shifted
+    index = library.survey_index(PHOTONS)
+    names = [name for name, _ in index.element_transitions('As')]
+    assert '2p' in names and ('As', '2p') not in library.data
+    assert reference_rsf_values(library.data, 'As', ['2p']) == []
+
+    # No Al Ka entry, the first instrument of each component
+    rsf = [float(next(iter(library.data[('As', orbital)].values()))['rsf']) for orbital in ('2p3/2', '2p1/2')]
+    assert index.rsf_values('As', ['2p']) == [max(rsf)]
+    assert len(index.rsf_values('As', names)) == len(names)
+
+
+def test_rsf_values_in_the_order_asked(library):
+    # In the order of the names, case insensitive, names the element has no line for left out
+    index = library.survey_index(PHOTONS)
+
+    assert index.rsf_values('Cu', ['2P', '1s', '2S']) == [25.39, 5.46]
+    assert index.rsf_values('Cu', ['2s', '2p']) == [5.46, 25.39]
+    assert index.rsf_values('Xx', ['1s']) == []
+
+
+def test_survey_index_lines():
+    data = {
+        ('Fe', '2p'): {'C-Al1486': {'position': 707.0, 'rsf': 10.82}},
+        ('Fe', '2p3/2'): {'C-Al1486': {'position': 707.0, 'rsf': 7.17}, 'C-Mg1253': {'position': 1.0}},
+        ('Fe', '2p1/2'): {'C-Al1486': {'position': 720.1, 'rsf': 3.65}},
+        ('Fe', '3d'): {'C-Al1486': {'position': 5.0, 'rsf': 0.1}},
+        ('Fe', 'LMM'): {'C-Any': {'position': 703.0, 'rsf': 0}},
+        ('O', '1s'): {'C-Mg1253': {'position': 531.0, 'rsf': 2.93}},
+        ('O', '2p'): {'C-Al1486': {'rsf': 0.1}},
+    }
+
+    index = SurveyIndex(data, PHOTONS)
+
+    # Augers in binding energy, the 3d below 20 eV and the 2p of O without a position left out, a main orbital at
+    # its highest energy component with its largest RSF, an instrument other than Al Ka when it is the only one
+    assert index.names == ['1s', '2p', 'lmm']
+    assert index.elements == ['O', 'Fe', 'Fe']
+    np.testing.assert_array_equal(index.be, [531.0, 720.1, PHOTONS - 703.0])
+    np.testing.assert_array_equal(index.rsf, [2.93, 10.82, 0.0])
+    np.testing.assert_array_equal(index.auger, [False, False, True])
+    assert not index.be.flags.writeable
+    assert index.element_transitions('Fe') == [('2p', 720.1), ('lmm', PHOTONS - 703.0)]
+    assert index.element_lines('Fe') == [1, 2] and index.element_lines('Cu') == []
+
+    start, end = index.near([530.0, 720.0, 900.0, 783.0], 1.5)
+    assert [list(range(first, last)) for first, last in zip(start, end)] == [[0], [1], [], [2]]
+
+
+def test_survey_index_is_built_once_per_photon_energy(library):
+    assert library.survey_index(PHOTONS) is library.survey_index(PHOTONS)
+    assert library.survey_index(1253.6) is not library.survey_index(PHOTONS)
+    # Core levels do not move with the photon energy, Augers do
+    shift = dict(library.element_transitions('O', PHOTONS))['kll'] - \
+        dict(library.element_transitions('O', 1253.6))['kll']
+    assert shift == pytest.approx(PHOTONS - 1253.6)
+    assert dict(library.element_transitions('O', PHOTONS))['1s'] == dict(library.element_transitions('O', 1253.6))['1s']
+
+
+def test_sloped_ends_are_not_a_peak():
+    x = np.linspace(1200, 0, 2401)
+    y = 300 + 0.8 * x + gaussian(x, 532.0, 400.0)
+
+    # The zero padding of the moving average dropped the first two points, the third was a peak
+    old_peaks, _ = reference_find_survey_peaks(x, y)
+    assert any(peak > 1198 for peak in old_peaks)
+
+    peaks, _ = find_survey_peaks(x, y)
+    assert list(peaks) == [pytest.approx(532.0)]
+    # In the middle both averages are the same, so are the peaks away from the ends
+    assert sorted(peaks) == sorted(peak for peak in old_peaks if 1 < peak < 1198)
+
+
+def test_survey_peaks_strongest_first():
+    x, y = survey([(284.0, 1000.0), (532.0, 2900.0), (399.0, 500.0)])
+
+    peaks, prominences = find_survey_peaks(x, y)
+
+    assert np.all(np.diff(prominences) <= 0)
+    np.testing.assert_allclose(peaks[:3], [532.0, 284.0, 399.0], atol=0.5)
+    assert find_survey_peaks(x[:2], y[:2])[0].size == 0
+
+
+def test_identify_survey(library):
+    x, y = survey([(284.0, 1000.0), (532.0, 2900.0), (399.0, 500.0), (983.67, 600.0), (1111.67, 100.0)])
+
+    candidates = identify_survey(x, y, library.survey_index(PHOTONS))
+
+    assert [candidate['element'] for candidate in candidates[:3]] == ['O', 'C', 'N']
+    assert [candidate['main'] for candidate in candidates[:3]] == [('1s', 532.0), ('1s', 284.0), ('1s', 399.0)]
+    scores = [candidate['score'] for candidate in candidates]
+    assert scores == sorted(scores, reverse=True) and scores[0] <= 1.0
+    # The O KLL Auger is matched along with the 1s
+    o_lines = {name: (be, peak) for name, be, peak in candidates[0]['lines']}
+    assert set(o_lines) >= {'1s', 'kll'}
+    assert o_lines['kll'][1] == pytest.approx(983.67, abs=1.5)
+
+
+def test_identify_flat_survey(library):
+    x = np.linspace(1200, 0, 2401)
+
+    assert identify_survey(x, np.full_like(x, 300.0), library.survey_index(PHOTONS)) == []
+    assert identify_survey(x, 300 + 0.8 * x, library.survey_index(PHOTONS)) == []
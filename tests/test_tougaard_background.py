@@ -0,0 +1,133 @@
+# tests/test_tougaard_background.py
+
+# The FFT Tougaard backgrounds against the point by point O(N^2) sums they replaced, on ascending, descending and
+# non-uniform energy grids.
+
+import numpy as np
+import pytest
+
+from libraries.Peak_Functions import BackgroundCalculations
+
+COMPONENTS = [(2866, 1643, 1, 0), (1200, 900, 40, 2.5), (400, 3500, 300, -1.0)]
+
+
+def reference_multi_tougaard(x, y, components):
+    # calculate_triple_tougaard_background before the FFT: one trapz per point and per component
+    baseline = y[-1]
+    y_shifted = y - baseline
+    dx = np.mean(np.diff(x))
+    backgrounds = [np.zeros_like(y) for _ in components]
+    for i in range(len(x)):
+        E = x[i:] - x[i]
+        for background, (B, C, D, T0) in zip(backgrounds, components):
+            K = B * E / ((C - E ** 2) ** 2 + D * E ** 2)
+            background[i] = np.trapz(K * y_shifted[i:], dx=dx) + T0
+    return sum(backgrounds) + baseline
+
+
+def reference_w_tougaard(x, y, B=2866, C=1643, T0=0):
+    dx = np.mean(np.diff(x))
+    background = np.zeros_like(y)
+    I1, I2 = y[0], y[-1]
+    B_adjusted = B * (I1 / I2) if I2 != 0 else B
+    for i in range(len(x)):
+        E = x[i:] - x[i]
+        K = B_adjusted * E / (C + E ** 2)
+        background[i] = np.trapz(K * y[i:], dx=dx) + T0
+    return background
+
+
+def reference_u_poly_tougaard(x, y, B=2866, C=1643, D=1, T0=0):
+    dx = np.mean(np.diff(x))
+    background = np.zeros_like(y)
+    for i in range(len(x)):
+        E = x[i:] - x[i]
+        K = np.where(E > T0, B * E / (C + D * E ** 2), 0)
+        background[i] = np.trapz(K * y[i:], dx=dx)
+    return background
+
+
+def loss_spectrum(n, grid='descending', seed=2):
+    # Peak with an inelastic tail on the high binding energy side, over a wide window so the kernel matters
+    rng = np.random.default_rng(seed)
+    x = np.linspace(340, 270, n)
+    if grid == 'ascending':
+        x = x[::-1]
+    elif grid == 'non-uniform':
+        x = x + 0.3 * np.sin(np.arange(n)) * np.abs(x[1] - x[0])
+    y = 500 + 4000 * np.exp(-0.5 * ((x - 285) / 0.8) ** 2) + 1500 / (1 + np.exp((287 - x) / 1.5))
+    return x, y + rng.normal(0, 5, n)
+
+
+GRIDS = ['descending', 'ascending', 'non-uniform']
+
+
+@pytest.mark.parametrize('grid', GRIDS)
+@pytest.mark.parametrize('count', [1, 2, 3])
+def test_multi_tougaard_matches_point_by_point_sum(grid, count):
+    x, y = loss_spectrum(401, grid)
+    expected = reference_multi_tougaard(x, y, COMPONENTS[:count])
+    result = BackgroundCalculations.calculate_multi_tougaard_background(x, y, COMPONENTS[:count])
+    np.testing.assert_allclose(result, expected, rtol=1e-12, atol=1e-9 * np.ptp(y))
+
+
+def test_sheet_backgrounds_read_their_components():
+    x, y = loss_spectrum(301)
+    bg_data = {'Tougaard_B2': 1200, 'Tougaard_C2': 900, 'Tougaard_D2': 40, 'Tougaard_T02': 2.5}
+    window = type('Window', (), {'Data': {'Core levels': {'C1s': {'Background': bg_data}}}})()
+    defaults = (2866, 1643, 1, 0)
+
+    np.testing.assert_allclose(BackgroundCalculations.calculate_tougaard_background(x, y, 'C1s', window),
+                               reference_multi_tougaard(x, y, [defaults]), rtol=1e-12)
+    np.testing.assert_allclose(BackgroundCalculations.calculate_double_tougaard_background(x, y, 'C1s', window),
+                               reference_multi_tougaard(x, y, [defaults, COMPONENTS[1]]), rtol=1e-12)
+    np.testing.assert_allclose(BackgroundCalculations.calculate_triple_tougaard_background(x, y, 'C1s', window),
+                               reference_multi_tougaard(x, y, [defaults, COMPONENTS[1], defaults]), rtol=1e-12)
+
+
+@pytest.mark.parametrize('grid', GRIDS)
+def test_w_and_u_poly_tougaard_match_point_by_point_sum(grid):
+    x, y = loss_spectrum(401, grid)
+    np.testing.assert_allclose(BackgroundCalculations.calculate_w_tougaard_background(x, y, 2000, 800, 3.0),
+                               reference_w_tougaard(x, y, 2000, 800, 3.0), rtol=1e-12, atol=1e-9 * np.ptp(y))
+    np.testing.assert_allclose(BackgroundCalculations.calculate_u_poly_tougaard_background(x, y, 2000, 800, 2, 1.5),
+                               reference_u_poly_tougaard(x, y, 2000, 800, 2, 1.5),
+                               rtol=1e-12, atol=1e-9 * np.ptp(y))
+
+
+def test_short_spectra():
+    single = BackgroundCalculations.calculate_tougaard_loss_integral([285.0], [10.0], np.ones_like)
+    np.testing.assert_array_equal(single, [0.0])
+    x, y = np.array([286.0, 285.0]), np.array([12.0, 10.0])
+    np.testing.assert_allclose(BackgroundCalculations.calculate_multi_tougaard_background(x, y, COMPONENTS),
+                               reference_multi_tougaard(x, y, COMPONENTS), rtol=1e-12)
+
+
+def test_cached_response_equals_the_uncached_one():
+    x, y = loss_spectrum(401)
+    y_shifted = y - y[-1]
+    indices = np.where((x >= 280) & (x <= 300))[0]
+    response = BackgroundCalculations.tougaard_response_cache(x, y_shifted, indices)
+
+    for C, D in [(1643, 1), (900, 40), (1643, 1)]:
+        expected = BackgroundCalculations.calculate_tougaard_loss_response(x, y_shifted, C, D)[indices]
+        np.testing.assert_array_equal(response(C, D), expected)
+    # U4 is linear in B: the unit response scaled by B is the single Tougaard background
+    np.testing.assert_allclose(y[-1] + 2866 * BackgroundCalculations.tougaard_response_cache(x, y_shifted)(1643, 1),
+                               reference_multi_tougaard(x, y, [(2866, 1643, 1, 0)]), rtol=1e-12)
+
+
+def test_response_cache_is_keyed_on_both_c_and_d():
+    x, y = loss_spectrum(201)
+    response = BackgroundCalculations.tougaard_response_cache(x, y - y[-1])
+
+    first = response(1643, 1)
+    assert response(1643, 1) is first
+    other_d = response(1643, 50)
+    other_c = response(900, 1)
+    assert not np.allclose(other_d, first) and not np.allclose(other_c, first)
+    assert response.cache_info().hits == 1 and response.cache_info().misses == 3
+
+    response(1643, 50)
+    response(900, 1)
+    assert response.cache_info().hits == 3 and response.cache_info().misses == 3
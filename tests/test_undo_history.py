@@ -0,0 +1,150 @@
+# tests/test_undo_history.py
+
+# freeze / thaw snapshots of window.Data: unchanged parts shared with the previous snapshot, restores that never
+# alias what the snapshot holds, lists and arrays back as they were, and shared parts counted once in the memory
+# of the history.
+
+import numpy as np
+import pytest
+
+from libraries.Undo_History import MIN_SPECTRUM_LENGTH, Spectrum, freeze, history_nbytes, snapshot_parts, thaw
+
+
+def read_only(values):
+    values = np.array(values, dtype=float)
+    values.setflags(write=False)
+    return values
+
+
+def window_data():
+    return {
+        'FilePath': '/data/sample.xlsx',
+        'Core levels': {
+            'C1s': {
+                'B.E.': read_only(np.linspace(295, 280, 301)),
+                'Raw Data': [float(v) for v in np.linspace(100, 200, 301)],
+                'Background': {'Bkg Y': np.linspace(90, 95, 301), 'Bkg Low': 281.0},
+                'Fitting': {'Peaks': {'C1s p1': {'Position': 285.0, 'Area': 1200}}},
+            },
+            'O1s': {
+                'B.E.': read_only(np.linspace(540, 525, 151)),
+                'Raw Data': [float(v) for v in np.linspace(10, 20, 151)],
+            },
+        },
+    }
+
+
+def state(data, previous=None):
+    frozen = freeze(data, previous['Data'] if previous else None)
+    return {'Data': frozen, 'parts': snapshot_parts(frozen)}
+
+
+def test_unchanged_parts_are_shared():
+    data = window_data()
+    first = freeze(data)
+    assert freeze(data, first) is first
+
+    data['Core levels']['C1s']['Fitting']['Peaks']['C1s p1']['Position'] = 285.2
+    second = freeze(data, first)
+
+    assert second is not first
+    assert second['Core levels']['O1s'] is first['Core levels']['O1s']
+    assert second['Core levels']['C1s']['B.E.'] is first['Core levels']['C1s']['B.E.']
+    assert second['Core levels']['C1s']['Raw Data'] is first['Core levels']['C1s']['Raw Data']
+    assert second['Core levels']['C1s']['Background'] is first['Core levels']['C1s']['Background']
+    assert second['Core levels']['C1s']['Fitting'] is not first['Core levels']['C1s']['Fitting']
+
+
+def test_read_only_arrays_are_shared_not_copied():
+    data = window_data()
+    frozen = freeze(data)
+
+    spectrum = frozen['Core levels']['C1s']['B.E.']
+    assert isinstance(spectrum, Spectrum)
+    assert spectrum.values is data['Core levels']['C1s']['B.E.']
+
+
+def test_restore_does_not_alias_the_snapshot():
+    data = window_data()
+    frozen = freeze(data)
+
+    restored = thaw(frozen)
+    restored['Core levels']['C1s']['Raw Data'][0] = -1.0
+    restored['Core levels']['C1s']['Background']['Bkg Y'][0] = -1.0
+    restored['Core levels']['C1s']['Fitting']['Peaks']['C1s p1']['Position'] = 0.0
+    restored['Core levels']['O1s']['Extra'] = True
+
+    again = thaw(frozen)
+    assert again['Core levels']['C1s']['Raw Data'][0] == 100.0
+    assert again['Core levels']['C1s']['Background']['Bkg Y'][0] == 90.0
+    assert again['Core levels']['C1s']['Fitting']['Peaks']['C1s p1']['Position'] == 285.0
+    assert 'Extra' not in again['Core levels']['O1s']
+    # Read only spectra can come back shared, nothing can write to them
+    assert not again['Core levels']['C1s']['B.E.'].flags.writeable
+
+
+def test_restore_keeps_the_live_parts_that_did_not_change():
+    data = window_data()
+    frozen = freeze(data)
+    live = window_data()
+    live['Core levels']['C1s']['Background']['Bkg Y'] = np.zeros(301)
+
+    restored = thaw(frozen, live)
+
+    assert restored['Core levels']['O1s']['Raw Data'] is live['Core levels']['O1s']['Raw Data']
+    background = restored['Core levels']['C1s']['Background']['Bkg Y']
+    assert background is not live['Core levels']['C1s']['Background']['Bkg Y']
+    np.testing.assert_array_equal(background, np.linspace(90, 95, 301))
+
+
+@pytest.mark.parametrize('value', [
+    [float(v) for v in range(MIN_SPECTRUM_LENGTH + 4)],
+    [1.5, 2] * MIN_SPECTRUM_LENGTH,
+    list(range(MIN_SPECTRUM_LENGTH + 4)),
+    [1.0, None] * MIN_SPECTRUM_LENGTH,
+    [1.0, 'a'] * MIN_SPECTRUM_LENGTH,
+    [1, 2.5, 3],
+], ids=['floats', 'mixed int float', 'ints', 'with None', 'with str', 'short'])
+def test_lists_come_back_as_the_same_list(value):
+    restored = thaw(freeze(value))
+
+    assert isinstance(restored, list)
+    assert restored == value
+    assert [type(item) for item in restored] == [type(item) for item in value]
+
+
+def test_arrays_come_back_as_arrays():
+    writable = np.linspace(0, 1, 50)
+    integers = np.arange(40, dtype=np.int32)
+    frozen = freeze({'writable': writable, 'read only': read_only(writable), 'integers': integers})
+
+    restored = thaw(frozen)
+
+    assert isinstance(restored['writable'], np.ndarray) and restored['writable'].flags.writeable
+    assert restored['writable'] is not writable
+    np.testing.assert_array_equal(restored['writable'], writable)
+    assert not restored['read only'].flags.writeable
+    assert restored['integers'].dtype == np.int32 and restored['integers'].flags.writeable
+
+
+def test_history_counts_shared_parts_once():
+    data = window_data()
+    first = state(data)
+    spectrum_bytes = sum(part.values.nbytes for part in (first['Data']['Core levels']['C1s']['B.E.'],
+                                                          first['Data']['Core levels']['C1s']['Raw Data'],
+                                                          first['Data']['Core levels']['C1s']['Background']['Bkg Y'],
+                                                          first['Data']['Core levels']['O1s']['B.E.'],
+                                                          first['Data']['Core levels']['O1s']['Raw Data']))
+    assert history_nbytes([first]) >= spectrum_bytes
+
+    data['Core levels']['C1s']['Fitting']['Peaks']['C1s p1']['Position'] = 285.2
+    second = state(data, first)
+
+    # Only the dicts on the path to the changed value are new, less than any one spectrum
+    extra = history_nbytes([first, second]) - history_nbytes([first])
+    assert 0 < extra < 301 * 8
+
+    data['Core levels']['C1s']['Raw Data'] = [v + 1 for v in data['Core levels']['C1s']['Raw Data']]
+    third = state(data, second)
+    extra = history_nbytes([first, second, third]) - history_nbytes([first, second])
+    assert extra >= 301 * 8
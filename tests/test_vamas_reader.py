@@ -0,0 +1,70 @@
+# tests/test_vamas_reader.py
+
+# read_vamas on small files written by the test: the parameters of each experiment mode and technique are read in
+# the order of the standard, so the ordinates of every block come out whole.
+
+import numpy as np
+import pytest
+
+from libraries.Vamas_Reader import FORMAT_IDENTIFIER, block_spectrum, read_vamas
+
+Y_VALUES = [np.linspace(100, 180, 9), np.linspace(40, 60, 9)]
+
+
+def header_lines(mode, num_blocks):
+    lines = [FORMAT_IDENTIFIER, "Institution", "Instrument", "Operator", "Experiment", 0, mode, "REGULAR"]
+    if mode in ["MAP", "MAPD", "NORM", "SDP"]:
+        lines.append(1)
+    # One experiment variable, every block parameter in every block, no future upgrade entries
+    lines += [1, "Etch time", "s", 0, 0, 0, 0, num_blocks]
+    return lines
+
+
+def block_lines(mode, technique, index, y_values):
+    sputtered = mode in ["MAPDP", "MAPSVDP", "SDP", "SDPSV"]
+    lines = [f"Block {index}", "Sample", 2024, 5, 17, 10, 30, 0, 0, 0, technique, 60 * index, "Al"]
+    if sputtered:
+        lines += [18, 1.0e15, 1]
+    lines += [1486.6, 300, 400, 400, 54.7, 0, "FAT", 20, 1, 4.5, 0, 400, 400, 0, 0, "C", "1s", -1,
+              "Kinetic Energy", "eV", 1196.6, 0.1, 1, "counts", "d", "pulse counting", 0.1, 5, 0]
+    if sputtered:
+        lines += [3000, 1.5, 2000, 2000, 45, 0, "continuous"]
+    lines += [0, 0, 0, 0, len(y_values), y_values.min(), y_values.max()]
+    return lines + list(y_values)
+
+
+def write_vamas(path, mode, technique):
+    lines = header_lines(mode, len(Y_VALUES))
+    for index, y_values in enumerate(Y_VALUES, start=1):
+        lines += block_lines(mode, technique, index, y_values)
+    lines.append("end of experiment")
+    path.write_text("\n".join(str(line) for line in lines) + "\n")
+    return str(path)
+
+
+@pytest.mark.parametrize('mode, technique', [('NORM', 'XPS'), ('SDP', 'XPS'), ('SDP', 'AES dir'), ('SDP', 'UPS')])
+def test_blocks_are_read_whole(tmp_path, mode, technique):
+    header, blocks = read_vamas(write_vamas(tmp_path / 'sample.vms', mode, technique))
+
+    assert header['experiment_mode'] == mode and header['num_blocks'] == 2
+    for index, (block, y_values) in enumerate(zip(blocks, Y_VALUES), start=1):
+        assert block['block_identifier'] == f"Block {index}"
+        assert block['values_exp_var'] == [str(60 * index)]
+        assert block['species_label'] == "C" and block['transition_or_charge_state_label'] == "1s"
+        assert block['num_scans_to_compile_block'] == 5
+        assert block['sample_rotation_angle'] == 0
+        np.testing.assert_array_equal(block['y_values'][:, 0], y_values)
+
+
+def test_xps_depth_profile_reads_the_sputtering_source(tmp_path):
+    _, blocks = read_vamas(write_vamas(tmp_path / 'profile.vms', 'SDP', 'XPS'))
+
+    for block in blocks:
+        assert block['sputtering_z'] == 18
+        assert block['sputtering_source_energy'] == 3000
+        assert block['sputtering_source_beam_current'] == 1.5
+        assert block['sputtering_mode'] == "continuous"
+
+    spectrum = block_spectrum(blocks[1], photons=1486.6, workfunction=4.5)
+    np.testing.assert_allclose(spectrum['x'], 1486.6 - (1196.6 + 0.1 * np.arange(9)) - 4.5)
+    np.testing.assert_allclose(spectrum['raw'], Y_VALUES[1] / 5)
@@ -0,0 +1,134 @@
+# tests/test_workbook_reading.py
+
+# read_workbook_core_levels against the pd.ExcelFile / pd.read_excel calls it replaced: the same sheet names and the
+# same columns A and B as floats, with NaN for the empty cells and the trailing empty rows dropped as pandas drops
+# them. The sheets pandas has to read (text in the data, fewer than two columns) come back as None.
+
+import numpy as np
+import openpyxl
+import pandas as pd
+import pytest
+
+from libraries.ConfigFile import read_workbook_core_levels
+
+
+def core_level(ws, n=201, center=285.0):
+    # Columns A and B as a core level sheet has them, the fit next to them and the peak table from column X
+    ws.append(['BE', 'Raw Data', '', '', '', 'BE', 'Residuals'])
+    x = np.linspace(center + 10, center - 10, n)
+    for i, be in enumerate(x):
+        ws.append([float(be), float(100 + 1000 * np.exp(-(be - center) ** 2)), None, None, None, float(be), 0.5 * i])
+    ws['X1'] = 'Label'
+    for row in range(2, 8):
+        ws.cell(row=row, column=24, value=f'C1s p{row}')
+
+
+def write_workbook(path, sheets):
+    wb = openpyxl.Workbook()
+    wb.remove(wb.active)
+    for name, fill in sheets.items():
+        fill(wb.create_sheet(name))
+    wb.save(path)
+    return str(path)
+
+
+def pandas_columns(path, sheet_name):
+    # What add_core_level_Data read before
+    df = pd.read_excel(path, sheet_name=sheet_name)
+    if df.shape[1] < 2:
+        return None
+    return df.iloc[:, 0].to_numpy(dtype=float), df.iloc[:, 1].to_numpy(dtype=float)
+
+
+def assert_same_columns(columns, path, sheet_name):
+    expected = pandas_columns(path, sheet_name)
+    assert columns is not None and expected is not None
+    for values, expected_values in zip(columns, expected):
+        np.testing.assert_array_equal(values, expected_values)
+        assert values.dtype == np.float64
+
+
+def trailing_empty_rows(ws):
+    core_level(ws, n=50)
+    # Formatted but empty cells below the data, then a peak table longer than the data
+    ws['A80'].font = openpyxl.styles.Font(bold=True)
+    ws['B90'].number_format = '0.00'
+
+
+def peak_table_past_the_data(ws):
+    core_level(ws, n=3)
+
+
+def nan_cells(ws):
+    core_level(ws, n=20)
+    ws['A5'] = None
+    ws['B9'] = None
+    for col in 'ABFG':
+        ws[f'{col}12'] = None
+
+
+def text_cell(ws):
+    core_level(ws, n=20)
+    ws['B7'] = 'saturated'
+
+
+def one_column(ws):
+    ws.append(['BE'])
+    for be in range(10):
+        ws.append([290.0 - be])
+
+
+def header_only(ws):
+    ws.append(['BE', 'Raw Data'])
+
+
+def empty(ws):
+    pass
+
+
+def test_sheet_names_match_pandas(tmp_path):
+    path = write_workbook(tmp_path / 'names.xlsx', {'C1s': core_level, 'O1s': core_level, 'Results Table': empty,
+                                                    'Experimental description': empty, 'Old sheet': core_level})
+
+    all_sheet_names, sheet_names, columns = read_workbook_core_levels(path)
+
+    assert all_sheet_names == pd.ExcelFile(path).sheet_names
+    # The sheets before the Results Table
+    assert sheet_names == ['C1s', 'O1s']
+    assert set(columns) == {'C1s', 'O1s'}
+    for sheet_name in sheet_names:
+        assert_same_columns(columns[sheet_name], path, sheet_name)
+
+
+@pytest.mark.parametrize('fill', [trailing_empty_rows, peak_table_past_the_data, nan_cells, header_only])
+def test_columns_match_pandas(tmp_path, fill):
+    path = write_workbook(tmp_path / f'{fill.__name__}.xlsx', {'C1s': fill})
+
+    _, _, columns = read_workbook_core_levels(path)
+
+    assert_same_columns(columns['C1s'], path, 'C1s')
+
+
+def test_trailing_rows_are_those_pandas_keeps(tmp_path):
+    path = write_workbook(tmp_path / 'rows.xlsx', {'Short': peak_table_past_the_data, 'Long': trailing_empty_rows})
+
+    _, _, columns = read_workbook_core_levels(path)
+
+    # The peak table runs two rows past 3 data points, the formatted cells below the data are not rows
+    assert len(columns['Short'][0]) == 6 and np.isnan(columns['Short'][0][3:]).all()
+    assert len(columns['Long'][0]) == 50
+
+
+@pytest.mark.parametrize('fill', [text_cell, one_column, empty])
+def test_sheets_left_to_pandas(tmp_path, fill):
+    path = write_workbook(tmp_path / f'{fill.__name__}.xlsx', {'C1s': fill, 'O1s': core_level})
+
+    _, _, columns = read_workbook_core_levels(path)
+
+    assert columns['C1s'] is None
+    assert_same_columns(columns['O1s'], path, 'O1s')
+
+
+def test_names_only(tmp_path):
+    path = write_workbook(tmp_path / 'names_only.xlsx', {'C1s': core_level, 'Results Table': empty})
+    assert read_workbook_core_levels(path, read_columns=False) == (['C1s', 'Results Table'], ['C1s'], {})